@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_clientemodel_cedula'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentemodel',
+            index=models.Index(fields=['fecha_ingreso', 'id'], name='accounts_ag_fecha_i_091c6b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientemodel',
+            index=models.Index(fields=['fecha_ingreso', 'id'], name='accounts_cl_fecha_i_d122ed_idx'),
+        ),
+    ]
@@ -21,6 +21,11 @@ class AgenteModel(models.Model):
     zona_especializacion = models.IntegerField(null=True, blank=True)
     estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='activo')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_ingreso', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name}" if self.user else "Agente sin usuario"
   
@@ -48,4 +53,9 @@ class ClienteModel(models.Model):
     """ )
     notas = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_ingreso', 'id']),
+        ]
+
     
\ No newline at end of file
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import AgenteModel, ClienteModel
+from igh.api import CamposDinamicosMixin
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -12,7 +13,7 @@ class UserSerializer(serializers.ModelSerializer):
             'password': {'write_only': True}
         }
 
-class AgenteSerializer(serializers.ModelSerializer):
+class AgenteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     user = UserSerializer()
     
     class Meta:
@@ -36,7 +37,7 @@ class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
-class ClienteSerializer(serializers.ModelSerializer):
+class ClienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = ClienteModel
         fields = '__all__'
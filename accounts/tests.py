@@ -1,3 +1,35 @@
 from django.test import TestCase
+from django.utils import timezone
 
-# Create your tests here.
+from .models import ClienteModel
+
+
+class PaginacionCursorTests(TestCase):
+    """Los listados se paginan por cursor sobre (fecha_ingreso, id)."""
+
+    def recorrer(self, url):
+        ids = []
+        while url:
+            pagina = self.client.get(url).json()
+            ids.extend(cliente['id'] for cliente in pagina['results'])
+            url = pagina['next']
+        return ids
+
+    def test_recorre_todas_las_filas_una_vez(self):
+        clientes = [ClienteModel.objects.create(nombre=f'Cliente {n}') for n in range(7)]
+        esperado = [c.id for c in sorted(clientes, key=lambda c: (c.fecha_ingreso, c.id), reverse=True)]
+        self.assertEqual(self.recorrer('/accounts/cliente/?page_size=3'), esperado)
+
+    def test_filas_con_la_misma_fecha(self):
+        clientes = [ClienteModel.objects.create(nombre=f'Cliente {n}') for n in range(5)]
+        # Misma fecha de ingreso: el cursor las separa con el desplazamiento y el desempate por id
+        ClienteModel.objects.update(fecha_ingreso=timezone.now())
+        esperado = sorted((c.id for c in clientes), reverse=True)
+        self.assertEqual(self.recorrer('/accounts/cliente/?page_size=2'), esperado)
+
+    def test_page_size_maximo(self):
+        ClienteModel.objects.bulk_create([ClienteModel(nombre=f'Cliente {n}') for n in range(3)])
+        pagina = self.client.get('/accounts/cliente/?page_size=1').json()
+        self.assertEqual(len(pagina['results']), 1)
+        self.assertIsNotNone(pagina['next'])
+        self.assertIsNone(pagina['previous'])
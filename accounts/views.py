@@ -13,8 +13,9 @@ from rest_framework.decorators import action
 # Create your views here.
 
 class AgenteModelViewSet(viewsets.ModelViewSet):
-    queryset = AgenteModel.objects.all()
+    queryset = AgenteModel.objects.select_related('user')
     serializer_class = AgenteSerializer
+    ordering = ('-fecha_ingreso',)
 
     def create(self, request, *args, **kwargs):
         try:
@@ -51,6 +52,7 @@ class AgenteModelViewSet(viewsets.ModelViewSet):
 class ClienteModelViewSet(viewsets.ModelViewSet):
     queryset = ClienteModel.objects.all()
     serializer_class = ClienteSerializer
+    ordering = ('-fecha_ingreso',)
 
     def create(self, request, *args, **kwargs):
         try:
@@ -73,10 +75,6 @@ class ClienteModelViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
 
 @api_view(['POST', 'OPTIONS'])
 def register_cliente(request):
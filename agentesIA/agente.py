@@ -1,17 +1,20 @@
+import datetime
 import os
 from typing import Dict, List, Tuple, Any
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+from crm.IA.base import chat_openai
 from .tools.inventarioTool import obtener_todas_propiedades, buscar_propiedades, InventarioTool
 from .tools.agendaTool import AgendaTool, obtener_agentes_disponibles
 from agentesIA.tools.requerimientoTool import get_requerimiento_tool
+from .historial import HISTORIAL_TURNOS, acotar_mensajes, resumir_mensajes
+from .intenciones import AGENDA, CREAR_CITA, DISPONIBILIDAD, NOMBRES_DIAS, PROPIEDADES, buscar_agente, detectar_intencion
 
 # Cargar variables de entorno
 load_dotenv()
 
 # Definir el modelo de lenguaje
-llm = ChatOpenAI(model="gpt-4o-mini")
+llm = chat_openai(model="gpt-4o-mini")
 
 # Mensaje de sistema para definir el comportamiento del agente
 SYSTEM_MESSAGE = """
@@ -39,7 +42,19 @@ IMPORTANTE:
 - Cuando un cliente quiera agendar una cita, utiliza la herramienta de agenda para crear la cita directamente.
 """
 
-def procesar_mensaje(mensaje: str, historial: List[Any] = None, cliente_id: str = None) -> Tuple[str, List[Any]]:
+def resumir_conversacion(resumen: str, mensajes: List[Tuple[str, str]]) -> str:
+    """
+    Actualiza el resumen de una conversación con mensajes ``(role, content)``
+    que ya no se envían al modelo en cada turno.
+    """
+    return resumir_mensajes(
+        llm, resumen,
+        [HumanMessage(content=content) if role == 'user' else AIMessage(content=content) for role, content in mensajes],
+        instrucciones="Resume la conversación entre un cliente y NORA, una asistente inmobiliaria.",
+    )
+
+def procesar_mensaje(mensaje: str, historial: List[Any] = None, cliente_id: str = None,
+                     historial_acotado: bool = False) -> Tuple[str, List[Any]]:
     """
     Procesa un mensaje del usuario y devuelve la respuesta del agente.
     
@@ -47,6 +62,10 @@ def procesar_mensaje(mensaje: str, historial: List[Any] = None, cliente_id: str
         mensaje: El mensaje del usuario
         historial: Lista opcional de mensajes previos
         cliente_id: ID del cliente que está interactuando con el agente
+        historial_acotado: True si el historial ya viene recortado a una ventana
+            y resumido por quien llama (ver ConversationHistory en chat/models.py);
+            en ese caso solo se aplica el límite de tokens, no el de turnos, para
+            no resumir de nuevo en cada turno lo que la ventana ya decidió
         
     Returns:
         Tupla con (respuesta, nuevo_historial)
@@ -73,54 +92,12 @@ def procesar_mensaje(mensaje: str, historial: List[Any] = None, cliente_id: str
     else:
         mensajes = historial + [user_message]
     
-    # Detectar si el mensaje está relacionado con propiedades
-    palabras_clave_propiedades = [
-        "propiedad", "propiedades", "casa", "apartamento", "lote", "terreno", 
-        "oficina", "local", "inmueble", "inmuebles", "venta", "arriendo", 
-        "alquiler", "comprar", "rentar", "disponible", "disponibles", 
-        "inventario", "mostrar", "ver", "listar", "económica", "economica",
-        "barata", "precio"
-    ]
-    
-    # Detectar si el mensaje está relacionado con agendar una cita
-    palabras_clave_agenda = [
-        "agendar", "cita", "reunión", "reunion", "visita", "programar", 
-        "calendario", "agenda", "disponibilidad", "horario", "fecha", 
-        "hora", "día", "dia", "semana", "mes", "contactar", "hablar", 
-        "conocer", "entrevistar", "consultar"
-    ]
-    
-    # Palabras clave que indican una solicitud explícita de crear una cita
-    palabras_clave_crear_cita = [
-        "crear", "agendar", "programar", "reservar", "quiero una cita", 
-        "necesito una cita", "hacer una cita", "concertar", "confirmar"
-    ]
-    
-    # Palabras clave que indican una consulta de disponibilidad
-    palabras_clave_disponibilidad = [
-        "disponibilidad", "disponible", "horarios", "cuando", "qué días", 
-        "que dias", "qué horas", "que horas", "tienes tiempo", "hay espacio"
-    ]
-    
-    palabras_encontradas_propiedades = [palabra for palabra in palabras_clave_propiedades if palabra in mensaje.lower()]
-    es_consulta_propiedades = len(palabras_encontradas_propiedades) > 0
-    
-    palabras_encontradas_agenda = [palabra for palabra in palabras_clave_agenda if palabra in mensaje.lower()]
-    es_consulta_agenda = len(palabras_encontradas_agenda) > 0
-    
-    palabras_encontradas_crear_cita = [palabra for palabra in palabras_clave_crear_cita if palabra in mensaje.lower()]
-    es_solicitud_crear_cita = len(palabras_encontradas_crear_cita) > 0
-    
-    palabras_encontradas_disponibilidad = [palabra for palabra in palabras_clave_disponibilidad if palabra in mensaje.lower()]
-    es_consulta_disponibilidad = len(palabras_encontradas_disponibilidad) > 0
-    
-    print(f"¿Es consulta de propiedades? {es_consulta_propiedades}")
-    print(f"¿Es consulta de agenda? {es_consulta_agenda}")
-    print(f"¿Es solicitud explícita de crear cita? {es_solicitud_crear_cita}")
-    print(f"¿Es consulta de disponibilidad? {es_consulta_disponibilidad}")
+    # Intención y datos del mensaje en una sola pasada (ver agentesIA/intenciones.py)
+    intencion = detectar_intencion(mensaje)
+    print(f"Intención detectada: {intencion.ruta} {intencion.palabras} {intencion.datos}")
     
     # Si es una consulta de disponibilidad, responder con opciones
-    if es_consulta_agenda and es_consulta_disponibilidad and not es_solicitud_crear_cita:
+    if intencion.ruta == DISPONIBILIDAD:
         try:
             print("Procesando consulta de disponibilidad...")
             
@@ -135,55 +112,15 @@ def procesar_mensaje(mensaje: str, historial: List[Any] = None, cliente_id: str
             
             print(f"Se encontraron {len(agentes)} agentes disponibles")
             
-            # Extraer información de fecha si se menciona
-            import re
-            import datetime
-            
-            fecha_mencionada = None
-            hoy = datetime.datetime.now()
-            
-            # Detectar "fin de semana"
-            if "fin de semana" in mensaje.lower() or "finde" in mensaje.lower():
-                # Calcular el próximo sábado
-                dias_hasta_sabado = (5 - hoy.weekday()) % 7
-                if dias_hasta_sabado == 0:
-                    dias_hasta_sabado = 7  # Si hoy es sábado, ir al próximo
-                
-                proximo_sabado = hoy + datetime.timedelta(days=dias_hasta_sabado)
-                proximo_domingo = proximo_sabado + datetime.timedelta(days=1)
-                
-                fecha_mencionada = f"el fin de semana ({proximo_sabado.strftime('%d/%m/%Y')} y {proximo_domingo.strftime('%d/%m/%Y')})"
-            
-            # Detectar "próxima semana"
-            elif "próxima semana" in mensaje.lower() or "proxima semana" in mensaje.lower():
-                # Calcular el lunes de la próxima semana
-                dias_hasta_lunes = (0 - hoy.weekday()) % 7
-                if dias_hasta_lunes == 0:
-                    dias_hasta_lunes = 7  # Si hoy es lunes, ir al próximo
-                
-                proximo_lunes = hoy + datetime.timedelta(days=dias_hasta_lunes)
-                proximo_viernes = proximo_lunes + datetime.timedelta(days=4)
-                
-                fecha_mencionada = f"la próxima semana (del {proximo_lunes.strftime('%d/%m/%Y')} al {proximo_viernes.strftime('%d/%m/%Y')})"
-            
-            # Detectar días específicos
-            dias_semana = {
-                'lunes': 0, 'martes': 1, 'miércoles': 2, 'miercoles': 2, 
-                'jueves': 3, 'viernes': 4, 'sábado': 5, 'sabado': 5, 'domingo': 6
-            }
-            
-            for dia, num in dias_semana.items():
-                if f"próximo {dia}" in mensaje.lower() or f"proximo {dia}" in mensaje.lower():
-                    dias_hasta = (num - hoy.weekday()) % 7
-                    if dias_hasta == 0:
-                        dias_hasta = 7  # Si hoy es el mismo día, ir al próximo
-                    
-                    proximo_dia = hoy + datetime.timedelta(days=dias_hasta)
-                    fecha_mencionada = f"el próximo {dia} ({proximo_dia.strftime('%d/%m/%Y')})"
-                    break
-            
-            # Si no se detectó ninguna fecha específica
-            if not fecha_mencionada:
+            # Describir la fecha mencionada, si la hay
+            fecha = intencion.fecha
+            if intencion.referencia_fecha == 'fin de semana':
+                fecha_mencionada = f"el fin de semana ({fecha.strftime('%d/%m/%Y')} y {(fecha + datetime.timedelta(days=1)).strftime('%d/%m/%Y')})"
+            elif intencion.referencia_fecha == 'proxima semana':
+                fecha_mencionada = f"la próxima semana (del {fecha.strftime('%d/%m/%Y')} al {(fecha + datetime.timedelta(days=4)).strftime('%d/%m/%Y')})"
+            elif intencion.referencia_fecha and intencion.referencia_fecha.startswith('proximo '):
+                fecha_mencionada = f"el próximo {NOMBRES_DIAS[fecha.weekday()]} ({fecha.strftime('%d/%m/%Y')})"
+            else:
                 fecha_mencionada = "en los próximos días"
             
             # Crear respuesta con opciones de disponibilidad
@@ -213,7 +150,7 @@ def procesar_mensaje(mensaje: str, historial: List[Any] = None, cliente_id: str
             traceback.print_exc()
     
     # Si es una solicitud explícita de crear una cita, proceder con la creación
-    elif es_consulta_agenda and es_solicitud_crear_cita:
+    elif intencion.ruta == CREAR_CITA:
         try:
             print("Procesando solicitud de creación de cita...")
             
@@ -245,177 +182,31 @@ def procesar_mensaje(mensaje: str, historial: List[Any] = None, cliente_id: str
                 mensajes.append(ai_message)
                 return respuesta_agenda, mensajes
             
-            # Extraer información de la agenda del mensaje
-            import re
-            import datetime
+            # Agente: "agente <id>", nombre completo o nombre de pila
+            agente_id = buscar_agente(intencion, agentes)
+            if agente_id:
+                print(f"Agente detectado en el mensaje: {agente_id}")
             
-            # Extraer ID o nombre del agente
-            agente_id = None
-            agente_match = re.search(r'agente (\d+)', mensaje.lower())
-            if agente_match:
-                agente_id_texto = agente_match.group(1)
-                print(f"ID de agente detectado en texto: {agente_id_texto}")
-                
-                # Verificar que el ID existe en la lista de agentes
-                agente_id_valido = None
-                for agente in agentes:
-                    if str(agente.get('id')) == agente_id_texto:
-                        agente_id_valido = agente.get('id')
-                        print(f"ID de agente validado: {agente_id_valido}")
-                        break
-                
-                if agente_id_valido:
-                    agente_id = agente_id_valido
-                else:
-                    print(f"ADVERTENCIA: El ID de agente {agente_id_texto} no existe en la base de datos")
-            
-            # Si no se encontró por ID, buscar por nombre
-            if not agente_id:
-                print("Buscando agente por nombre...")
-                for agente in agentes:
-                    nombre_completo = f"{agente.get('user', {}).get('first_name', '')} {agente.get('user', {}).get('last_name', '')}".lower()
-                    first_name = agente.get('user', {}).get('first_name', '').lower() if agente.get('user', {}).get('first_name') else ""
-                    
-                    print(f"Comparando con: {first_name} / {nombre_completo}")
-                    
-                    if first_name and first_name in mensaje.lower():
-                        agente_id = agente.get('id')
-                        print(f"Agente encontrado por nombre: {first_name} (ID: {agente_id})")
-                        break
-                    elif nombre_completo and nombre_completo in mensaje.lower():
-                        agente_id = agente.get('id')
-                        print(f"Agente encontrado por nombre completo: {nombre_completo} (ID: {agente_id})")
-                        break
-                    # Buscar coincidencias parciales
-                    elif first_name and len(first_name) > 2:
-                        palabras = mensaje.lower().split()
-                        for palabra in palabras:
-                            if first_name in palabra or palabra in first_name:
-                                agente_id = agente.get('id')
-                                print(f"Agente encontrado por coincidencia parcial: {first_name} / {palabra} (ID: {agente_id})")
-                            break
-        
             # Si aún no hay agente_id, usar el primer agente disponible
             if not agente_id and agentes:
                 agente_id = agentes[0].get('id')
                 print(f"Usando primer agente disponible por defecto: {agente_id}")
             
-            # Extraer fecha
-            fecha = None
-            fecha_match = re.search(r'(\d{4}-\d{2}-\d{2})', mensaje)
-            if fecha_match:
-                fecha = fecha_match.group(1)
-                print(f"Fecha detectada en formato ISO: {fecha}")
+            # Fecha: si no se detectó ninguna, mañana
+            if intencion.fecha:
+                fecha = intencion.fecha.strftime('%Y-%m-%d')
+                print(f"Fecha detectada ({intencion.referencia_fecha}): {fecha}")
             else:
-                # Intentar detectar fechas en formato más natural
-                hoy = datetime.datetime.now()
-                print(f"Fecha actual: {hoy.strftime('%Y-%m-%d')}")
-                
-                # Detectar "mañana"
-                if "mañana" in mensaje.lower() or "manana" in mensaje.lower():
-                    manana = hoy + datetime.timedelta(days=1)
-                    fecha = manana.strftime('%Y-%m-%d')
-                    print(f"Fecha calculada para mañana: {fecha}")
-                
-                # Detectar "fin de semana"
-                elif "fin de semana" in mensaje.lower() or "finde" in mensaje.lower():
-                    # Calcular el próximo sábado
-                    dias_hasta_sabado = (5 - hoy.weekday()) % 7
-                    if dias_hasta_sabado == 0:
-                        dias_hasta_sabado = 7  # Si hoy es sábado, ir al próximo
-                    
-                    proximo_sabado = hoy + datetime.timedelta(days=dias_hasta_sabado)
-                    fecha = proximo_sabado.strftime('%Y-%m-%d')
-                    print(f"Fecha calculada para el próximo sábado: {fecha}")
-                
-                # Detectar fechas en formato "14 de marzo de 2025"
-                fecha_natural_match = re.search(r'(\d{1,2}) de (enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre) de (\d{4})', mensaje.lower())
-                if fecha_natural_match:
-                    dia = int(fecha_natural_match.group(1))
-                    mes = fecha_natural_match.group(2)
-                    ano = int(fecha_natural_match.group(3))
-                    
-                    meses = {
-                        'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
-                        'julio': 7, 'agosto': 8, 'septiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
-                    }
-                    
-                    mes_num = meses.get(mes, 1)
-                    
-                    try:
-                        fecha_dt = datetime.datetime(ano, mes_num, dia)
-                        fecha = fecha_dt.strftime('%Y-%m-%d')
-                        print(f"Fecha detectada en formato natural: {fecha}")
-                    except ValueError:
-                        print(f"Fecha inválida: {dia}/{mes_num}/{ano}")
-                
-                # Detectar "próximo sábado", "próximo lunes", etc.
-                dias_semana = {
-                    'lunes': 0, 'martes': 1, 'miércoles': 2, 'miercoles': 2, 
-                    'jueves': 3, 'viernes': 4, 'sábado': 5, 'sabado': 5, 'domingo': 6
-                }
-                
-                for dia, num in dias_semana.items():
-                    if f"próximo {dia}" in mensaje.lower() or f"proximo {dia}" in mensaje.lower():
-                        # Calcular la fecha del próximo día de la semana mencionado
-                        dias_hasta = (num - hoy.weekday()) % 7
-                        if dias_hasta == 0:
-                            dias_hasta = 7  # Si hoy es el mismo día, ir al próximo
-                        
-                        proximo_dia = hoy + datetime.timedelta(days=dias_hasta)
-                        fecha = proximo_dia.strftime('%Y-%m-%d')
-                        print(f"Fecha calculada para próximo {dia}: {fecha}")
-                        break
-                
-                # Si no se detectó ninguna fecha, usar una fecha por defecto (mañana)
-                if not fecha:
-                    manana = hoy + datetime.timedelta(days=1)
-                    fecha = manana.strftime('%Y-%m-%d')
-                    print(f"Usando fecha por defecto (mañana): {fecha}")
-            
-            # Extraer hora
-            hora = None
-            hora_match = re.search(r'(\d{1,2}):(\d{2})', mensaje)
-            if hora_match:
-                hora_h = int(hora_match.group(1))
-                hora_m = hora_match.group(2)
-                hora = f"{hora_h:02d}:{hora_m}:00"
-                print(f"Hora detectada con formato HH:MM: {hora}")
-            else:
-                # Buscar horas sin minutos (por ejemplo, "a las 3")
-                hora_simple_match = re.search(r'a las (\d{1,2})', mensaje.lower())
-                if hora_simple_match:
-                    hora_h = int(hora_simple_match.group(1))
-                    hora = f"{hora_h:02d}:00:00"
-                    print(f"Hora simple detectada: {hora}")
-                else:
-                    # Buscar referencias a "medio día" o "mediodía"
-                    if "medio dia" in mensaje.lower() or "mediodía" in mensaje.lower() or "medio día" in mensaje.lower():
-                        hora = "12:00:00"
-                        print(f"Hora detectada (medio día): {hora}")
-                    # Buscar referencias a "tarde"
-                    elif "tarde" in mensaje.lower():
-                        hora = "15:00:00"
-                        print(f"Hora detectada (tarde): {hora}")
-                    # Buscar referencias a "mañana" (como momento del día)
-                    elif "mañana" in mensaje.lower() and "por la mañana" in mensaje.lower():
-                        hora = "10:00:00"
-                        print(f"Hora detectada (mañana): {hora}")
-                    else:
-                        # Si no se detectó ninguna hora, usar una hora por defecto (10:00)
-                        hora = "10:00:00"
-                        print(f"Usando hora por defecto: {hora}")
-            
-            # Extraer notas
-            notas = None
-            notas_match = re.search(r'para (ver|hablar|consultar|discutir) (.*?)(\.|$)', mensaje.lower())
-            if notas_match:
-                notas = notas_match.group(2).strip()
-                print(f"Notas detectadas: {notas}")
-            else:
-                # Si no hay notas específicas, usar todo el mensaje como nota
-                notas = f"Solicitud original: {mensaje}"
-                print(f"Usando mensaje completo como notas")
+                fecha = (datetime.date.today() + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+                print(f"Usando fecha por defecto (mañana): {fecha}")
+            
+            # Hora: si no se detectó ninguna, 10:00
+            hora = intencion.hora or "10:00:00"
+            print(f"Hora: {hora}")
+            
+            # Notas: si no hay notas específicas, usar todo el mensaje como nota
+            notas = intencion.notas or f"Solicitud original: {mensaje}"
+            print(f"Notas: {notas}")
             
             # Si tenemos la información necesaria, crear la agenda
             if agente_id and fecha and hora:
@@ -508,7 +299,7 @@ Por favor, intenta nuevamente con un formato más claro, por ejemplo:
             return respuesta_error, mensajes
     
     # Si es una consulta general de agenda, mostrar opciones
-    elif es_consulta_agenda:
+    elif intencion.ruta == AGENDA:
         try:
             print("Procesando consulta general de agenda...")
             
@@ -553,51 +344,10 @@ Por favor, intenta nuevamente con un formato más claro, por ejemplo:
             # Si hay un error, continuar con la respuesta general
     
     # Si es una consulta de propiedades, buscar en la base de datos
-    elif es_consulta_propiedades:
+    elif intencion.ruta == PROPIEDADES:
         try:
             print("Analizando consulta para extraer criterios de búsqueda...")
-            # Extraer posibles criterios de búsqueda
-            criterios = {}
-            
-            # Tipos de propiedad
-            tipos_propiedad = ["casa", "apartamento", "lote", "terreno", "oficina", "local"]
-            for tipo in tipos_propiedad:
-                if tipo in mensaje.lower():
-                    criterios["tipo"] = tipo
-                    print(f"Tipo de propiedad detectado: {tipo}")
-                    break
-            
-            # Ubicaciones comunes
-            ubicaciones = ["bogota", "medellin", "cali", "barranquilla", "cartagena"]
-            for ubicacion in ubicaciones:
-                if ubicacion in mensaje.lower():
-                    criterios["ubicacion"] = ubicacion
-                    print(f"Ubicación detectada: {ubicacion}")
-                    break
-            
-            # Características
-            if "terraza" in mensaje.lower():
-                criterios["caracteristicas"] = ["Terraza"]
-                print("Característica detectada: Terraza")
-            elif "balcon" in mensaje.lower() or "balcón" in mensaje.lower():
-                criterios["caracteristicas"] = ["Balcón"]
-                print("Característica detectada: Balcón")
-            
-            # Precio
-            if "económica" in mensaje.lower() or "economica" in mensaje.lower() or "barata" in mensaje.lower():
-                criterios["precio_max"] = 300000
-                print("Filtro de precio máximo aplicado: 300,000")
-            elif "lujo" in mensaje.lower() or "cara" in mensaje.lower():
-                criterios["precio_min"] = 400000
-                print("Filtro de precio mínimo aplicado: 400,000")
-            
-            # Modalidad de negocio
-            if "venta" in mensaje.lower() or "comprar" in mensaje.lower():
-                criterios["tipo_negocio"] = "Venta"
-                print("Modalidad de negocio: Venta")
-            elif "arriendo" in mensaje.lower() or "alquiler" in mensaje.lower() or "rentar" in mensaje.lower():
-                criterios["tipo_negocio"] = "Renta"
-                print("Modalidad de negocio: Renta")
+            criterios = intencion.criterios()
             
             # Limitar resultados
             criterios["limit"] = 5
@@ -665,7 +415,9 @@ DETALLES: {propiedad.get('habitaciones', 0)} hab, {propiedad.get('baños', 0)} b
     
     # Para cualquier otro tipo de mensaje o si hubo un error en la búsqueda de propiedades
     print("Generando respuesta general con el modelo de lenguaje...")
-    response = llm.invoke(mensajes)
+    # Solo los turnos recientes van literales; los anteriores, resumidos
+    max_turnos = None if historial_acotado else HISTORIAL_TURNOS
+    response = llm.invoke(acotar_mensajes(llm, mensajes, max_turnos=max_turnos))
     mensajes.append(response)
     
     print("===== FIN DE PROCESAMIENTO DE MENSAJE =====\n")
@@ -0,0 +1,292 @@
+"""
+Caché de respuestas de los modelos de lenguaje, direccionada por contenido.
+
+La clave de cada respuesta es el hash SHA-256 de ``(modelo, prompt, parámetros)``,
+así que un prompt que es función pura de datos estructurados (la descripción de
+una propiedad, el resumen de un requerimiento, la extracción de JSON a partir
+de ese resumen) solo se envía a OpenAI la primera vez.
+
+Las respuestas se guardan en un archivo SQLite compartido por todos los
+procesos. Cada entrada expira según el TTL y, cuando el archivo supera el
+tamaño máximo, se eliminan las entradas usadas hace más tiempo (LRU).
+
+Puntos de uso:
+- ``completar(client, **kwargs)``: envuelve ``client.chat.completions.create``
+  del SDK de OpenAI y devuelve el texto de la respuesta.
+- ``cache_langchain()``: caché para ``ChatOpenAI(cache=...)`` de LangChain.
+- ``CacheLLM.buscar_similar`` / ``guardar_similar``: búsqueda opcional por
+  similitud de embeddings, para preguntas casi iguales en el chat de un mismo
+  edificio (ver chat/IA_services/IA_services.py).
+
+Configuración por variables de entorno:
+    LLM_CACHE            1 activa la caché (por defecto), 0 la desactiva
+    LLM_CACHE_PATH       archivo SQLite (por defecto llm_cache.sqlite3 en la raíz del proyecto)
+    LLM_CACHE_MAX_MB     tamaño máximo de las respuestas guardadas (por defecto 100)
+    LLM_CACHE_TTL        segundos de vida de una respuesta (por defecto 7 días)
+    LLM_CACHE_SEMANTICO  1 activa la búsqueda por similitud (por defecto 0)
+    LLM_CACHE_SIMILITUD  similitud coseno mínima para reutilizar una respuesta (por defecto 0.95)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import numpy as np
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+LLM_CACHE = os.getenv("LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(Path(__file__).resolve().parent.parent / "llm_cache.sqlite3"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", 100))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 60 * 60))
+LLM_CACHE_SEMANTICO = os.getenv("LLM_CACHE_SEMANTICO", "0") == "1"
+LLM_CACHE_SIMILITUD = float(os.getenv("LLM_CACHE_SIMILITUD", 0.95))
+MODELO_EMBEDDINGS = "text-embedding-3-small"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS respuestas (
+    clave TEXT PRIMARY KEY,
+    modelo TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    tamano INTEGER NOT NULL,
+    creado REAL NOT NULL,
+    usado REAL NOT NULL,
+    aciertos INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS respuestas_usado ON respuestas (usado);
+CREATE TABLE IF NOT EXISTS similares (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    contexto TEXT NOT NULL,
+    pregunta TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    respuesta TEXT NOT NULL,
+    creado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS similares_contexto ON similares (contexto, creado);
+"""
+
+
+def clave(modelo: str, prompt: Any, parametros: Any = None) -> str:
+    """Hash del contenido de una llamada; el orden de las claves no importa."""
+    contenido = json.dumps([modelo, prompt, parametros], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheLLM:
+    """Almacén SQLite con TTL, expulsión LRU por tamaño y contadores de aciertos."""
+
+    # Cada cuántas escrituras se revisa el tamaño total y se purgan expiradas
+    PODAR_CADA = 50
+    # Entradas por contexto que se comparan en la búsqueda por similitud
+    SIMILARES_MAX = 500
+
+    def __init__(self, ruta: str = LLM_CACHE_PATH, max_mb: float = LLM_CACHE_MAX_MB, ttl: int = LLM_CACHE_TTL):
+        self.ruta = ruta
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.aciertos_similares = 0
+
+    def _conexion(self) -> sqlite3.Connection:
+        # Una conexión por hilo; WAL permite leer mientras otro proceso escribe
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=10)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.executescript(ESQUEMA)
+            self._local.conexion = conexion
+        return conexion
+
+    def _contar(self, atributo: str) -> None:
+        with self._lock:
+            setattr(self, atributo, getattr(self, atributo) + 1)
+
+    def obtener(self, clave: str) -> Optional[str]:
+        conexion = self._conexion()
+        ahora = time.time()
+        fila = conexion.execute("SELECT valor, creado FROM respuestas WHERE clave = ?", (clave,)).fetchone()
+        if fila is None or fila[1] + self.ttl < ahora:
+            if fila is not None:
+                conexion.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                conexion.commit()
+            self._contar("fallos")
+            return None
+        conexion.execute("UPDATE respuestas SET usado = ?, aciertos = aciertos + 1 WHERE clave = ?", (ahora, clave))
+        conexion.commit()
+        self._contar("aciertos")
+        return fila[0]
+
+    def guardar(self, clave: str, modelo: str, valor: str) -> None:
+        conexion = self._conexion()
+        ahora = time.time()
+        conexion.execute(
+            "INSERT OR REPLACE INTO respuestas (clave, modelo, valor, tamano, creado, usado) VALUES (?, ?, ?, ?, ?, ?)",
+            (clave, modelo, valor, len(valor.encode("utf-8")), ahora, ahora),
+        )
+        conexion.commit()
+        with self._lock:
+            self._escrituras += 1
+            podar = self._escrituras % self.PODAR_CADA == 0
+        if podar:
+            self.podar()
+
+    def podar(self) -> None:
+        """Elimina las entradas expiradas y, si se supera el tamaño máximo, las menos usadas."""
+        conexion = self._conexion()
+        limite = time.time() - self.ttl
+        conexion.execute("DELETE FROM respuestas WHERE creado < ?", (limite,))
+        conexion.execute("DELETE FROM similares WHERE creado < ?", (limite,))
+        conexion.execute(
+            """
+            DELETE FROM respuestas WHERE clave IN (
+                SELECT clave FROM (
+                    SELECT clave, SUM(tamano) OVER (ORDER BY usado DESC) AS acumulado FROM respuestas
+                ) WHERE acumulado > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+        conexion.commit()
+
+    def buscar_similar(self, contexto: str, vector: np.ndarray, umbral: float = LLM_CACHE_SIMILITUD) -> Optional[str]:
+        """Respuesta guardada para la pregunta más parecida del mismo contexto, si supera ``umbral``."""
+        filas = self._conexion().execute(
+            "SELECT vector, respuesta FROM similares WHERE contexto = ? AND creado >= ? ORDER BY creado DESC LIMIT ?",
+            (contexto, time.time() - self.ttl, self.SIMILARES_MAX),
+        ).fetchall()
+        if not filas:
+            return None
+        matriz = np.frombuffer(b"".join(fila[0] for fila in filas), dtype=np.float32).reshape(len(filas), -1)
+        similitudes = matriz @ vector
+        mejor = int(np.argmax(similitudes))
+        if similitudes[mejor] < umbral:
+            return None
+        self._contar("aciertos_similares")
+        return filas[mejor][1]
+
+    def guardar_similar(self, contexto: str, pregunta: str, vector: np.ndarray, respuesta: str) -> None:
+        conexion = self._conexion()
+        conexion.execute(
+            "INSERT INTO similares (contexto, pregunta, vector, respuesta, creado) VALUES (?, ?, ?, ?, ?)",
+            (contexto, pregunta, vector.astype(np.float32).tobytes(), respuesta, time.time()),
+        )
+        conexion.commit()
+
+    def estadisticas(self) -> dict:
+        entradas, tamano = self._conexion().execute(
+            "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM respuestas"
+        ).fetchone()
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else None,
+            "aciertos_similares": self.aciertos_similares,
+            "entradas": entradas,
+            "bytes": tamano,
+        }
+
+    def limpiar(self) -> None:
+        conexion = self._conexion()
+        conexion.execute("DELETE FROM respuestas")
+        conexion.execute("DELETE FROM similares")
+        conexion.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache() -> CacheLLM:
+    """Instancia compartida del proceso (el archivo se abre en el primer uso)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheLLM()
+    return _cache
+
+
+def completar(client, **kwargs) -> str:
+    """
+    ``client.chat.completions.create(**kwargs)`` con caché; devuelve el texto de
+    la primera opción. Solo para prompts deterministas (sin historial de chat).
+    """
+    if not LLM_CACHE or kwargs.get("stream"):
+        return client.chat.completions.create(**kwargs).choices[0].message.content
+
+    modelo = kwargs.get("model", "")
+    parametros = {k: v for k, v in kwargs.items() if k not in ("model", "messages")}
+    llave = clave(modelo, kwargs.get("messages"), parametros)
+    cache = obtener_cache()
+    try:
+        texto = cache.obtener(llave)
+    except sqlite3.Error as e:
+        print(f"Error al leer la caché de LLM: {str(e)}")
+        texto = None
+    if texto is not None:
+        print(f"Respuesta de {modelo} servida desde la caché")
+        return texto
+
+    texto = client.chat.completions.create(**kwargs).choices[0].message.content
+    if texto:
+        try:
+            cache.guardar(llave, modelo, texto)
+        except sqlite3.Error as e:
+            print(f"Error al guardar en la caché de LLM: {str(e)}")
+    return texto
+
+
+class CacheLangChain(BaseCache):
+    """Adaptador de ``CacheLLM`` a la interfaz de caché de LangChain."""
+
+    def __init__(self, cache: Optional[CacheLLM] = None):
+        self._cache = cache
+
+    @property
+    def cache(self) -> CacheLLM:
+        return self._cache or obtener_cache()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+        try:
+            valor = self.cache.obtener(clave(llm_string, prompt))
+        except sqlite3.Error as e:
+            print(f"Error al leer la caché de LLM: {str(e)}")
+            return None
+        if valor is None:
+            return None
+        print("Respuesta de LangChain servida desde la caché")
+        with warnings.catch_warnings():
+            # loads() está en beta en langchain_core y avisa en cada llamada
+            warnings.simplefilter("ignore")
+            return loads(valor)
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]) -> None:
+        try:
+            self.cache.guardar(clave(llm_string, prompt), llm_string[:200], dumps(list(return_val)))
+        except sqlite3.Error as e:
+            print(f"Error al guardar en la caché de LLM: {str(e)}")
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.limpiar()
+
+
+def cache_langchain() -> Optional[CacheLangChain]:
+    """Valor para ``ChatOpenAI(cache=...)``; None deja el comportamiento por defecto."""
+    return CacheLangChain() if LLM_CACHE else None
+
+
+def vector_normalizado(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norma = np.linalg.norm(vector)
+    return vector / norma if norma else vector
@@ -0,0 +1,205 @@
+"""
+Historial de conversación acotado por tokens para los agentes.
+
+Solo los últimos turnos se envían literalmente al modelo, mientras quepan en un
+presupuesto de tokens. Los turnos más antiguos se resumen en un texto que se
+guarda y solo se vuelve a calcular cuando la ventana se desplaza, es decir,
+cuando un turno sale de ella. Así el tamaño del prompt deja de crecer con la
+conversación.
+
+Los tokens se cuentan localmente con tiktoken. Si la codificación no se puede
+cargar (por ejemplo, sin acceso a internet la primera vez), se usa una
+estimación de 4 caracteres por token.
+
+Configuración por variables de entorno:
+    AGENT_HISTORIAL_TOKENS  tokens máximos del historial literal (por defecto 3000)
+    AGENT_HISTORIAL_TURNOS  turnos (pregunta + respuesta) literales como máximo (por defecto 10)
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, get_buffer_string
+
+HISTORIAL_TOKENS = int(os.getenv("AGENT_HISTORIAL_TOKENS", 3000))
+HISTORIAL_TURNOS = int(os.getenv("AGENT_HISTORIAL_TURNOS", 10))
+MODELO_TOKENIZADOR = "gpt-4o-mini"
+
+
+@lru_cache(maxsize=1)
+def _codificador():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(MODELO_TOKENIZADOR)
+    except Exception as e:
+        print(f"No se pudo cargar tiktoken, se estiman los tokens por longitud: {str(e)}")
+        return None
+
+
+@lru_cache(maxsize=4096)
+def contar_tokens(texto: str) -> int:
+    """Tokens de un texto (memoizado: los mensajes del historial se cuentan una vez)."""
+    codificador = _codificador()
+    if codificador is None:
+        return len(texto) // 4 + 1
+    return len(codificador.encode(texto))
+
+
+def tokens_mensaje(mensaje: BaseMessage) -> int:
+    # 4 tokens aproximados por el envoltorio de cada mensaje en la API de chat
+    return contar_tokens(str(mensaje.content)) + 4
+
+
+def dividir_ventana(mensajes: List[BaseMessage], max_tokens: int = HISTORIAL_TOKENS,
+                    max_turnos: int = HISTORIAL_TURNOS) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """
+    Separa ``mensajes`` en ``(antiguos, recientes)``. ``recientes`` son los
+    últimos mensajes que caben en ``max_tokens`` y ``max_turnos`` (None: sin
+    límite de turnos); siempre empieza en un mensaje del usuario para no
+    cortar un turno por la mitad.
+    """
+    inicio = len(mensajes)
+    tokens = turnos = 0
+    for i in range(len(mensajes) - 1, -1, -1):
+        tokens += tokens_mensaje(mensajes[i])
+        if tokens > max_tokens:
+            break
+        if isinstance(mensajes[i], HumanMessage):
+            turnos += 1
+            if max_turnos is not None and turnos > max_turnos:
+                break
+            inicio = i
+    if inicio == len(mensajes):
+        # El último turno se conserva siempre, aunque por sí solo supere el presupuesto
+        humanos = [i for i, m in enumerate(mensajes) if isinstance(m, HumanMessage)]
+        inicio = humanos[-1] if humanos else 0
+    return mensajes[:inicio], mensajes[inicio:]
+
+
+def resumir_mensajes(llm, resumen: str, mensajes: List[BaseMessage],
+                     instrucciones: str = "Resume la conversación entre un cliente y un agente inmobiliario.") -> str:
+    """Incorpora ``mensajes`` al ``resumen`` anterior usando el ``llm``."""
+    prompt = (
+        f"{instrucciones}\n"
+        "Conserva los datos útiles para continuarla: necesidades del cliente, presupuesto, "
+        "zonas, propiedades mencionadas, datos ya respondidos y citas acordadas. "
+        "Máximo 150 palabras.\n\n"
+        f"Resumen anterior:\n{resumen or 'Sin resumen previo.'}\n\n"
+        f"Mensajes nuevos:\n{get_buffer_string(mensajes, human_prefix='Cliente', ai_prefix='Agente')}"
+    )
+    return llm.invoke([HumanMessage(content=prompt)]).content.strip()
+
+
+# Resúmenes ya calculados por acotar_mensajes, por contenido de los turnos resumidos (LRU)
+_resumenes = OrderedDict()
+RESUMENES_MAX = 256
+_resumenes_lock = threading.Lock()
+
+
+def _resumen_cacheado(llm, mensajes: List[BaseMessage]) -> str:
+    clave = hashlib.sha1(get_buffer_string(mensajes).encode('utf-8')).hexdigest()
+    with _resumenes_lock:
+        if clave in _resumenes:
+            _resumenes.move_to_end(clave)
+            return _resumenes[clave]
+    resumen = resumir_mensajes(llm, '', mensajes)
+    with _resumenes_lock:
+        _resumenes[clave] = resumen
+        if len(_resumenes) > RESUMENES_MAX:
+            _resumenes.popitem(last=False)
+    return resumen
+
+
+def acotar_mensajes(llm, mensajes: List[BaseMessage], max_tokens: int = HISTORIAL_TOKENS,
+                    max_turnos: int = HISTORIAL_TURNOS) -> List[BaseMessage]:
+    """
+    Versión acotada de una lista de mensajes lista para ``llm.invoke``: los
+    mensajes de sistema iniciales, un resumen de los turnos que no caben y los
+    turnos recientes. El resumen se memoiza por contenido, así que solo se
+    recalcula cuando cambian los turnos que quedan fuera de la ventana.
+    """
+    fijos = 0
+    while fijos < len(mensajes) and isinstance(mensajes[fijos], SystemMessage):
+        fijos += 1
+    antiguos, recientes = dividir_ventana(mensajes[fijos:], max_tokens, max_turnos)
+    if not antiguos:
+        return list(mensajes)
+
+    print(f"Historial acotado: {len(antiguos)} mensajes resumidos, {len(recientes)} literales")
+    resumen = _resumen_cacheado(llm, antiguos)
+    return list(mensajes[:fijos]) + [
+        SystemMessage(content=f"Resumen de la conversación anterior:\n{resumen}")
+    ] + recientes
+
+
+class HistorialAcotado(BaseChatMemory):
+    """
+    Memoria compatible con ``ConversationBufferMemory`` (``memory_key``,
+    ``load_memory_variables``, ``save_context``, ``chat_memory``) que guarda
+    literalmente solo la ventana reciente y mantiene un resumen del resto.
+    """
+    llm: Any
+    memory_key: str = "history"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    max_tokens: int = HISTORIAL_TOKENS
+    max_turnos: int = HISTORIAL_TURNOS
+    resumen: str = ""
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        mensajes = list(self.chat_memory.messages)
+        if self.return_messages:
+            if self.resumen:
+                mensajes = [SystemMessage(content=f"Resumen de la conversación anterior:\n{self.resumen}")] + mensajes
+            return {self.memory_key: mensajes}
+
+        buffer = get_buffer_string(mensajes, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        if self.resumen:
+            buffer = f"Resumen de la conversación anterior:\n{self.resumen}\n\n{buffer}"
+        return {self.memory_key: buffer}
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self.compactar()
+
+    def compactar(self) -> bool:
+        """Pasa al resumen los turnos que ya no caben en la ventana."""
+        mensajes = list(self.chat_memory.messages)
+        antiguos, recientes = dividir_ventana(mensajes, self.max_tokens, self.max_turnos)
+        if not antiguos:
+            return False
+        try:
+            self.resumen = resumir_mensajes(self.llm, self.resumen, antiguos)
+        except Exception as e:
+            # Sin resumen se conserva el historial completo; se reintenta en el próximo turno
+            print(f"Error al resumir el historial: {str(e)}")
+            return False
+        self.chat_memory.clear()
+        self.chat_memory.add_messages(recientes)
+        return True
+
+    def clear(self) -> None:
+        super().clear()
+        self.resumen = ""
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "resumen": self.resumen,
+            "historial": [[m.type, m.content] for m in self.chat_memory.messages],
+        }
+
+    def cargar_estado(self, estado: Dict[str, Any]) -> None:
+        self.resumen = estado.get("resumen", "")
+        for tipo, contenido in estado.get("historial", []):
+            if tipo == "human":
+                self.chat_memory.add_user_message(contenido)
+            else:
+                self.chat_memory.add_ai_message(contenido)
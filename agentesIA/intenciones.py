@@ -0,0 +1,303 @@
+"""
+Detección de intención para los mensajes que recibe NORA.
+
+El texto se normaliza una sola vez (minúsculas y sin tildes) y se recorre con
+una única expresión regular precompilada que contiene todas las palabras clave
+con límites de palabra. Cada palabra clave aporta una o más etiquetas
+(categorías de intención o valores de un dato), así que una sola pasada sirve
+para decidir la ruta (disponibilidad, crear cita, agenda, propiedades o
+general) y extraer los datos: fecha, hora, agente, tipo de propiedad,
+ubicación, precio y modalidad de negocio.
+
+Las palabras clave se escriben sin tildes; el plural se acepta siempre.
+
+Uso:
+    intencion = detectar_intencion(mensaje)
+    if intencion.ruta == 'propiedades':
+        buscar_propiedades(intencion.criterios())
+
+Para medir el tiempo por mensaje: ``python -m agentesIA.intenciones``.
+"""
+import datetime
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+PROPIEDADES = 'propiedades'
+AGENDA = 'agenda'
+CREAR_CITA = 'crear_cita'
+DISPONIBILIDAD = 'disponibilidad'
+
+DIAS_SEMANA = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+NOMBRES_DIAS = ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']
+MESES = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
+    'julio': 7, 'agosto': 8, 'septiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
+}
+
+# palabra clave -> etiquetas. Una etiqueta es una categoría de intención o "dato=valor".
+PALABRAS_CLAVE = {
+    PROPIEDADES: [
+        "propiedad", "casa", "apartamento", "lote", "terreno", "oficina", "local",
+        "inmueble", "venta", "arriendo", "alquiler", "comprar", "rentar", "disponible",
+        "inventario", "mostrar", "ver", "listar", "economica", "economico", "barata", "barato", "precio",
+    ],
+    AGENDA: [
+        "agendar", "cita", "reunion", "visita", "programar", "calendario", "agenda",
+        "disponibilidad", "horario", "fecha", "hora", "dia", "semana", "mes", "contactar",
+        "hablar", "conocer", "entrevistar", "consultar",
+    ],
+    CREAR_CITA: [
+        "crear", "agendar", "programar", "reservar", "quiero una cita", "necesito una cita",
+        "hacer una cita", "concertar", "confirmar",
+    ],
+    DISPONIBILIDAD: [
+        "disponibilidad", "disponible", "horario", "cuando", "que dias", "que horas",
+        "tienes tiempo", "hay espacio",
+    ],
+    'tipo': ["casa", "apartamento", "lote", "terreno", "oficina", "local"],
+    'ubicacion': ["bogota", "medellin", "cali", "barranquilla", "cartagena"],
+    'fecha': ["manana", "fin de semana", "finde", "proxima semana"]
+             + [f"proximo {dia}" for dia in DIAS_SEMANA],
+    'hora': ["medio dia", "mediodia", "tarde", "por la manana"],
+}
+# Valores de los datos cuando no son la palabra clave misma
+VALORES = {
+    'terraza': 'caracteristica=Terraza',
+    'balcon': 'caracteristica=Balcón',
+    'economica': 'precio=economico', 'economico': 'precio=economico',
+    'barata': 'precio=economico', 'barato': 'precio=economico',
+    'lujo': 'precio=lujo', 'cara': 'precio=lujo', 'caro': 'precio=lujo',
+    'venta': 'negocio=Venta', 'comprar': 'negocio=Venta',
+    'arriendo': 'negocio=Renta', 'alquiler': 'negocio=Renta', 'rentar': 'negocio=Renta',
+    'finde': 'fecha=fin de semana',
+    'mediodia': 'hora=medio dia',
+}
+
+RE_FECHA_ISO = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+RE_FECHA_NATURAL = re.compile(r'\b(\d{1,2}) de (' + '|'.join(MESES) + r') de (\d{4})\b')
+RE_HORA = re.compile(r'\b(\d{1,2}):(\d{2})\b')
+RE_HORA_SIMPLE = re.compile(r'\ba las (\d{1,2})\b')
+RE_AGENTE_ID = re.compile(r'\bagente (\d+)\b')
+RE_NOTAS = re.compile(r'para (ver|hablar|consultar|discutir) (.*?)(\.|$)', re.IGNORECASE)
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes ni diéresis (la ñ pasa a n)."""
+    descompuesto = unicodedata.normalize('NFD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def _construir_etiquetas() -> Dict[str, Set[str]]:
+    etiquetas = {}
+    for grupo, palabras in PALABRAS_CLAVE.items():
+        es_dato = grupo not in (PROPIEDADES, AGENDA, CREAR_CITA, DISPONIBILIDAD)
+        for palabra in palabras:
+            etiquetas.setdefault(palabra, set()).add(f'{grupo}={palabra}' if es_dato else grupo)
+    for palabra, etiqueta in VALORES.items():
+        etiquetas.setdefault(palabra, set()).add(etiqueta)
+
+    # Una frase consume las palabras que contiene ("quiero una cita" incluye "cita"),
+    # así que hereda sus etiquetas
+    for frase in [p for p in etiquetas if ' ' in p]:
+        for palabra in frase.split():
+            for forma in (palabra, palabra[:-1] if palabra.endswith('s') else None):
+                etiquetas[frase] |= {e for e in etiquetas.get(forma, ()) if '=' not in e}
+    return etiquetas
+
+
+ETIQUETAS = _construir_etiquetas()
+# Frases más largas primero para que la alternancia prefiera la coincidencia más larga
+RE_PALABRAS_CLAVE = re.compile(
+    r'\b(' + '|'.join(re.escape(p) for p in sorted(ETIQUETAS, key=len, reverse=True)) + r')(?:es|s)?\b'
+)
+
+
+def proximo_dia_semana(hoy: datetime.date, dia: int) -> datetime.date:
+    """Próxima fecha (nunca hoy) que cae en el día de la semana ``dia`` (0 = lunes)."""
+    dias_hasta = (dia - hoy.weekday()) % 7 or 7
+    return hoy + datetime.timedelta(days=dias_hasta)
+
+
+@dataclass
+class Intencion:
+    """Resultado de ``detectar_intencion``."""
+    texto: str
+    palabras: Dict[str, List[str]] = field(default_factory=dict)
+    datos: Dict[str, str] = field(default_factory=dict)
+    fecha: Optional[datetime.date] = None
+    # Cómo se expresó la fecha: iso, natural, manana, fin de semana, proxima semana, proximo <dia>
+    referencia_fecha: Optional[str] = None
+    hora: Optional[str] = None
+    agente_id: Optional[str] = None
+    notas: Optional[str] = None
+
+    @property
+    def propiedades(self) -> bool:
+        return PROPIEDADES in self.palabras
+
+    @property
+    def agenda(self) -> bool:
+        return AGENDA in self.palabras
+
+    @property
+    def crear_cita(self) -> bool:
+        return CREAR_CITA in self.palabras
+
+    @property
+    def disponibilidad(self) -> bool:
+        return DISPONIBILIDAD in self.palabras
+
+    @property
+    def ruta(self) -> str:
+        """disponibilidad | crear_cita | agenda | propiedades | general"""
+        if self.agenda and self.disponibilidad and not self.crear_cita:
+            return DISPONIBILIDAD
+        if self.agenda and self.crear_cita:
+            return CREAR_CITA
+        if self.agenda:
+            return AGENDA
+        if self.propiedades:
+            return PROPIEDADES
+        return 'general'
+
+    def criterios(self) -> Dict[str, object]:
+        """Criterios para ``buscar_propiedades`` a partir de los datos detectados."""
+        criterios = {}
+        if 'tipo' in self.datos:
+            criterios['tipo'] = self.datos['tipo']
+        if 'ubicacion' in self.datos:
+            criterios['ubicacion'] = self.datos['ubicacion']
+        if 'caracteristica' in self.datos:
+            criterios['caracteristicas'] = [self.datos['caracteristica']]
+        if self.datos.get('precio') == 'economico':
+            criterios['precio_max'] = 300000
+        elif self.datos.get('precio') == 'lujo':
+            criterios['precio_min'] = 400000
+        if 'negocio' in self.datos:
+            criterios['tipo_negocio'] = self.datos['negocio']
+        return criterios
+
+
+def detectar_intencion(mensaje: str, hoy: Optional[datetime.date] = None) -> Intencion:
+    """Normaliza ``mensaje`` una vez y extrae intención y datos en una sola pasada."""
+    hoy = hoy or datetime.date.today()
+    texto = normalizar(mensaje)
+    intencion = Intencion(texto=texto)
+
+    for coincidencia in RE_PALABRAS_CLAVE.finditer(texto):
+        palabra = coincidencia.group(1)
+        for etiqueta in ETIQUETAS[palabra]:
+            if '=' in etiqueta:
+                dato, valor = etiqueta.split('=', 1)
+                # Se conserva el primer valor de cada dato, como en el texto
+                intencion.datos.setdefault(dato, valor)
+            else:
+                intencion.palabras.setdefault(etiqueta, []).append(palabra)
+
+    _extraer_fecha(intencion, hoy)
+    _extraer_hora(intencion)
+
+    agente = RE_AGENTE_ID.search(texto)
+    if agente:
+        intencion.agente_id = agente.group(1)
+    notas = RE_NOTAS.search(mensaje)
+    if notas:
+        intencion.notas = notas.group(2).strip()
+    return intencion
+
+
+def _extraer_fecha(intencion: Intencion, hoy: datetime.date) -> None:
+    texto = intencion.texto
+    iso = RE_FECHA_ISO.search(texto)
+    if iso:
+        try:
+            intencion.fecha = datetime.date(*map(int, iso.groups()))
+            intencion.referencia_fecha = 'iso'
+            return
+        except ValueError:
+            pass
+
+    referencia = intencion.datos.get('fecha')
+    if referencia and referencia.startswith('proximo '):
+        intencion.fecha = proximo_dia_semana(hoy, DIAS_SEMANA.index(referencia.split(' ', 1)[1]))
+        intencion.referencia_fecha = referencia
+        return
+
+    natural = RE_FECHA_NATURAL.search(texto)
+    if natural:
+        try:
+            intencion.fecha = datetime.date(int(natural.group(3)), MESES[natural.group(2)], int(natural.group(1)))
+            intencion.referencia_fecha = 'natural'
+            return
+        except ValueError:
+            print(f"Fecha inválida: {natural.group(0)}")
+
+    if referencia == 'manana':
+        intencion.fecha = hoy + datetime.timedelta(days=1)
+    elif referencia == 'fin de semana':
+        intencion.fecha = proximo_dia_semana(hoy, 5)
+    elif referencia == 'proxima semana':
+        intencion.fecha = proximo_dia_semana(hoy, 0)
+    intencion.referencia_fecha = referencia
+
+
+def _extraer_hora(intencion: Intencion) -> None:
+    hora = RE_HORA.search(intencion.texto)
+    if hora:
+        intencion.hora = f"{int(hora.group(1)):02d}:{hora.group(2)}:00"
+        return
+    hora = RE_HORA_SIMPLE.search(intencion.texto)
+    if hora:
+        intencion.hora = f"{int(hora.group(1)):02d}:00:00"
+        return
+    momento = intencion.datos.get('hora')
+    if momento == 'medio dia':
+        intencion.hora = "12:00:00"
+    elif momento == 'tarde':
+        intencion.hora = "15:00:00"
+    elif momento == 'por la manana':
+        intencion.hora = "10:00:00"
+
+
+def buscar_agente(intencion: Intencion, agentes: List[dict]) -> Optional[int]:
+    """
+    Id del agente mencionado en el mensaje: primero "agente <id>" (si existe en
+    ``agentes``), luego el nombre completo y por último el nombre de pila.
+    ``agentes`` es la lista de la API de agentes (con ``user`` expandido).
+    """
+    if intencion.agente_id:
+        for agente in agentes:
+            if str(agente.get('id')) == intencion.agente_id:
+                return agente.get('id')
+        print(f"ADVERTENCIA: El ID de agente {intencion.agente_id} no existe en la base de datos")
+
+    texto = f" {intencion.texto} "
+    por_nombre = None
+    for agente in agentes:
+        user = agente.get('user') or {}
+        nombre = normalizar(user.get('first_name') or '').strip()
+        completo = normalizar(f"{user.get('first_name', '')} {user.get('last_name', '')}").strip()
+        if completo and f" {completo} " in texto:
+            return agente.get('id')
+        if por_nombre is None and len(nombre) > 2 and re.search(rf'\b{re.escape(nombre)}\b', intencion.texto):
+            por_nombre = agente.get('id')
+    return por_nombre
+
+
+if __name__ == '__main__':
+    import timeit
+
+    ejemplos = [
+        "Hola, buenas tardes",
+        "Quiero ver apartamentos económicos en arriendo en Bogotá con balcón",
+        "¿Qué disponibilidad hay para una visita el próximo sábado?",
+        "Quiero agendar una cita con Ana mañana a las 3 para ver propiedades en el centro",
+        "Necesito una cita con el agente 12 el 14 de marzo de 2025 a las 14:30",
+    ]
+    repeticiones = 20000
+    for ejemplo in ejemplos:
+        segundos = timeit.timeit(lambda: detectar_intencion(ejemplo), number=repeticiones)
+        intencion = detectar_intencion(ejemplo)
+        print(f"{segundos / repeticiones * 1e6:6.1f} µs  {intencion.ruta:<15} {ejemplo}")
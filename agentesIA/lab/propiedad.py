@@ -1,8 +1,10 @@
 import os
 import sys
 from dotenv import load_dotenv
-from langchain.memory import ConversationBufferMemory
-from langchain_openai import ChatOpenAI
+from agentesIA import preguntas
+from agentesIA.cache_llm import cache_langchain
+from agentesIA.historial import HistorialAcotado
+from crm.IA.base import chat_openai
 # Importar la herramienta del segundo archivo
 import propiedadTool
 
@@ -13,6 +15,12 @@ sys.stdout.reconfigure(encoding='utf-8')
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Modelo de lenguaje compartido por todas las sesiones (no guarda estado)
+llm = chat_openai(model_name="gpt-4o-mini", temperature=0.7, openai_api_key=OPENAI_API_KEY)
+# El resumen es función de las respuestas y el historial: determinista (temperatura 0)
+# para poder guardarlo en la caché de LLM
+llm_resumen = chat_openai(model_name="gpt-4o-mini", temperature=0, openai_api_key=OPENAI_API_KEY, cache=cache_langchain())
+
 # Lista de aspectos clave a preguntar sobre una propiedad
 aspectos = [
     "tipo_propiedad", "titulo", "modalidad_de_negocio", "descripcion", 
@@ -24,14 +32,17 @@ aspectos = [
 class AgenteInmobiliarioPropiedad:
     def __init__(self):
         # Inicializar la memoria de la conversación
-        self.memory = ConversationBufferMemory(memory_key="history")
+        self.memory = HistorialAcotado(llm=llm, memory_key="history")
         
-        # Inicializar el modelo de lenguaje con GPT-4
-        self.llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.7, openai_api_key=OPENAI_API_KEY)
+        # Modelo de lenguaje compartido
+        self.llm = llm
         
         # Diccionario para almacenar las respuestas del usuario
         self.respuestas_usuario = {aspecto: None for aspecto in aspectos}
         
+        # Aspecto que ya se volvió a preguntar por una respuesta ambigua
+        self.aclarando = None
+        
         # IDs para la propiedad
         self.agente_id = 12   # Valor por defecto
         self.propietario_id = None  # El propietario puede ser opcional
@@ -45,10 +56,34 @@ class AgenteInmobiliarioPropiedad:
     
     def reset(self):
         """Reinicia la conversación y las respuestas"""
-        self.memory = ConversationBufferMemory(memory_key="history")
+        self.memory = HistorialAcotado(llm=llm, memory_key="history")
         self.respuestas_usuario = {aspecto: None for aspecto in aspectos}
+        self.aclarando = None
         # No reiniciamos los IDs, ya que son específicos de la sesión
     
+    def to_state(self):
+        """Estado compacto del agente para guardarlo en el almacén de sesiones."""
+        return {
+            "ids": [self.agente_id, self.propietario_id],
+            # Solo las respuestas ya contestadas; el resto se completa con None al restaurar
+            "respuestas": {k: v for k, v in self.respuestas_usuario.items() if v is not None},
+            "aclarando": self.aclarando,
+            # Turnos recientes literales y resumen de los anteriores
+            **self.memory.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, estado):
+        """Reconstruye un agente a partir de ``to_state()``."""
+        agente = cls()
+        agente.agente_id, agente.propietario_id = estado.get("ids", [agente.agente_id, agente.propietario_id])
+        for aspecto, respuesta in estado.get("respuestas", {}).items():
+            if aspecto in agente.respuestas_usuario:
+                agente.respuestas_usuario[aspecto] = respuesta
+        agente.aclarando = estado.get("aclarando")
+        agente.memory.cargar_estado(estado)
+        return agente
+    
     def proximo_aspecto(self):
         """Retorna el primer aspecto sin respuesta o None si todos están completos."""
         for aspecto, respuesta in self.respuestas_usuario.items():
@@ -56,26 +91,15 @@ class AgenteInmobiliarioPropiedad:
                 return aspecto
         return None
     
-    def generar_pregunta_natural(self, aspecto):
+    def generar_pregunta(self, aspecto, respuesta_ambigua=None):
         """
-        Usa el LLM para generar una pregunta natural y conversacional,
-        teniendo en cuenta las respuestas previas del usuario.
+        Pregunta sobre ``aspecto`` desde el banco de plantillas, sin llamar al
+        modelo. Solo si la última respuesta fue ambigua el modelo la reformula.
         """
-        historial = self.memory.load_memory_variables({})["history"]
-        respuestas_previas = "\n".join(f"{k}: {v}" for k, v in self.respuestas_usuario.items() if v)
-
-        prompt_natural = (
-            f"Actúa como un agente inmobiliario experto en registrar propiedades en una plataforma. "
-            f"Debes hacer preguntas naturales y contextuales para obtener información sobre una propiedad que el usuario quiere publicar. "
-            f"Toma en cuenta la información que el usuario ya proporcionó.\n\n"
-            f"Historial de conversación:\n{historial}\n\n"
-            f"Respuestas previas del usuario:\n{respuestas_previas}\n\n"
-            f"Genera una pregunta NATURAL sobre '{aspecto}' de la propiedad, usando el contexto si es relevante. "
-            f"Explica brevemente qué es este aspecto si es técnico o poco claro (como 'metro_cuadrado_construido')."
-        )
-
-        pregunta_generada = self.llm.predict(prompt_natural)
-        return pregunta_generada
+        pregunta = preguntas.renderizar(preguntas.PROPIEDAD, aspecto, self.respuestas_usuario)
+        if respuesta_ambigua:
+            pregunta = preguntas.pulir(self.llm, pregunta, respuesta_ambigua, aspecto)
+        return pregunta
     
     def generar_resumen(self):
         """
@@ -102,7 +126,7 @@ class AgenteInmobiliarioPropiedad:
         )
         
         # Usar el LLM para generar el resumen
-        resumen = self.llm.predict(prompt_resumen)
+        resumen = llm_resumen.predict(prompt_resumen)
         return resumen
     
     def procesar_mensaje(self, mensaje_usuario):
@@ -127,7 +151,7 @@ class AgenteInmobiliarioPropiedad:
             # Primer mensaje o reinicio
             saludo = "¡Hola! Te ayudaré a registrar tu propiedad en nuestra plataforma."
             # Generar la primera pregunta inmediatamente
-            primera_pregunta = self.generar_pregunta_natural(proximo)
+            primera_pregunta = self.generar_pregunta(proximo)
             pregunta_completa = f"{saludo} {primera_pregunta}"
             
             return {
@@ -136,9 +160,23 @@ class AgenteInmobiliarioPropiedad:
                 "proximo_aspecto": proximo
             }
         else:
-            # Guardar la respuesta del usuario para el aspecto actual
             aspecto_actual = proximo
-            self.respuestas_usuario[aspecto_actual] = mensaje_usuario
+            entendido, valor = preguntas.interpretar(preguntas.PROPIEDAD[aspecto_actual]["tipo"], mensaje_usuario)
+            if not entendido and self.aclarando != aspecto_actual:
+                # Respuesta ambigua: se vuelve a preguntar una vez, reformulada por el modelo
+                self.aclarando = aspecto_actual
+                pregunta = self.generar_pregunta(aspecto_actual, mensaje_usuario)
+                self.memory.save_context({"input": mensaje_usuario}, {"output": pregunta})
+                return {
+                    "tipo": "pregunta",
+                    "mensaje": pregunta,
+                    "proximo_aspecto": aspecto_actual
+                }
+            
+            # Guardar la respuesta del usuario para el aspecto actual; las cantidades ya interpretadas
+            # se guardan como número y el resto como texto, con sus detalles para el resumen
+            self.aclarando = None
+            self.respuestas_usuario[aspecto_actual] = valor if isinstance(valor, (int, float)) else mensaje_usuario
             
             # Guardar en la memoria de la conversación
             self.memory.save_context({"input": f"Pregunta sobre {aspecto_actual}"}, {"output": mensaje_usuario})
@@ -157,7 +195,7 @@ class AgenteInmobiliarioPropiedad:
                 }
             
             # Generar una pregunta para el próximo aspecto
-            pregunta = self.generar_pregunta_natural(proximo)
+            pregunta = self.generar_pregunta(proximo)
         
         return {
             "tipo": "pregunta",
@@ -218,17 +256,17 @@ class AgenteInmobiliarioPropiedad:
                 aspecto = aspecto.strip()
                 if aspecto in self.respuestas_usuario:
                     self.respuestas_usuario[aspecto] = None
+        self.aclarando = None
         
         return {
             "tipo": "modificacion",
             "mensaje": "He reiniciado los aspectos solicitados. Continuemos con la conversación."
         }
 
-# Instancia del agente para uso general
-agente_propiedad = AgenteInmobiliarioPropiedad()
-
 # Función para chatear con el agente por consola (para mantener compatibilidad)
 def chatear_con_agente():
+    # En consola hay una sola conversación; la API usa el almacén de sesiones
+    agente_propiedad = AgenteInmobiliarioPropiedad()
     print("Agente Inmobiliario: ¡Hola! Te ayudaré a registrar tu propiedad.")
     
     while True:
@@ -282,7 +320,7 @@ def chatear_con_agente():
             break
 
         # Genera una pregunta considerando el contexto
-        pregunta_aspecto = agente_propiedad.generar_pregunta_natural(proximo)
+        pregunta_aspecto = agente_propiedad.generar_pregunta(proximo)
         print(f"Agente Inmobiliario: {pregunta_aspecto}")
 
         user_input = input("🧑 Tú: ")
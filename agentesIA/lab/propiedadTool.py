@@ -1,9 +1,9 @@
 import json
-import requests
 import os
 from dotenv import load_dotenv
 from datetime import datetime
-from langchain_openai import ChatOpenAI
+from crm.IA.base import chat_openai
+from agentesIA.cache_llm import cache_langchain
 
 # Cargar variables de entorno
 load_dotenv()
@@ -168,7 +168,7 @@ def agent_tool(resumen=None, respuestas=None, agente_id=12, propietario_id=None)
             f"Devuelve solo el objeto JSON mejorado sin ningún texto adicional."
         )
         
-        llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.2, openai_api_key=OPENAI_API_KEY)
+        llm = chat_openai(model_name="gpt-4o-mini", temperature=0.2, openai_api_key=OPENAI_API_KEY, cache=cache_langchain())
         llm_output = llm.predict(prompt_structure)
         print("Respuesta LLM:", llm_output[:150] + "..." if len(llm_output) > 150 else llm_output)
         
@@ -193,22 +193,26 @@ def agent_tool(resumen=None, respuestas=None, agente_id=12, propietario_id=None)
         print(f"Error al procesar datos de la propiedad: {str(e)}")
         # Continuamos con el payload básico
 
-    # Realizar el llamado a la API para crear la propiedad
-    api_url = "http://localhost:8000/crm/propiedadAI/"
+    # Registrar la propiedad a través de la capa de servicios del CRM
+    from crm.services import usar_http, llamar_api
 
     try:
-        print("Enviando payload a la API:", json.dumps(payload)[:100] + "..." if len(json.dumps(payload)) > 100 else json.dumps(payload))
-        response = requests.post(api_url, json=payload)
-        if response.status_code == 201:
+        print("Enviando payload:", json.dumps(payload)[:100] + "..." if len(json.dumps(payload)) > 100 else json.dumps(payload))
+        if usar_http():
+            # Despliegue remoto: el agente corre fuera del servidor del CRM
+            exito, resultado = llamar_api("POST", "/crm/propiedadAI/", payload, esperado=(201,))
+        else:
+            from crm.services.propiedades import crear_propiedad
+            exito, resultado = crear_propiedad(payload)
+
+        if exito:
             print("Propiedad creada exitosamente:")
-            print(response.json())
-            return True, response.json()
+            print(resultado)
         else:
-            print("Error al crear la propiedad:")
-            print(response.status_code, response.text)
-            return False, {"error": f"Error {response.status_code}: {response.text}"}
+            print("Error al crear la propiedad:", resultado)
+        return exito, resultado
     except Exception as e:
-        print("Excepción al realizar la solicitud POST:", str(e))
+        print("Excepción al registrar la propiedad:", str(e))
         return False, {"error": str(e)}
 
 # Ejecutar el agent tool solo cuando se llama directamente
@@ -1,8 +1,14 @@
+import json
 import os
 import sys
+from typing import List, Literal, Optional
 from dotenv import load_dotenv
-from langchain.memory import ConversationBufferMemory
-from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+from agentesIA import preguntas
+from agentesIA.cache_llm import cache_langchain
+from agentesIA.historial import HistorialAcotado
+from agentesIA.preguntas import SIN_PREFERENCIA
+from crm.IA.base import chat_openai
 # Importar la herramienta del segundo archivo
 import requerimientoTool
 
@@ -13,6 +19,14 @@ sys.stdout.reconfigure(encoding='utf-8')
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Modelo de lenguaje compartido por todas las sesiones (no guarda estado)
+llm = chat_openai(model_name="gpt-4o-mini", temperature=0.7, openai_api_key=OPENAI_API_KEY)
+# El resumen es función de las respuestas y el historial: determinista (temperatura 0)
+# para poder guardarlo en la caché de LLM
+llm_resumen = chat_openai(model_name="gpt-4o-mini", temperature=0, openai_api_key=OPENAI_API_KEY, cache=cache_langchain())
+# Extracción de aspectos con salida estructurada (JSON schema)
+llm_extraccion = chat_openai(model_name="gpt-4o-mini", temperature=0.2, openai_api_key=OPENAI_API_KEY)
+
 # Lista de aspectos clave a preguntar
 aspectos = [
     "tipo_negocio", "tipo_propiedad", "personas", "mascotas", 
@@ -21,17 +35,56 @@ aspectos = [
     "aspectos_negociables", "aspectos_no_negociables", "fecha_ideal"
 ]
 
+# Las respuestas de hasta estas palabras al aspecto preguntado se interpretan sin el modelo
+PALABRAS_LOCALES = 4
+
+PREGUNTA_INICIAL = "Para empezar, ¿buscas comprar o alquilar, y qué tipo de propiedad tienes en mente?"
+
+
+class DatosRequerimiento(BaseModel):
+    """Aspectos del requerimiento mencionados por el usuario; null si no los menciona."""
+    tipo_negocio: Optional[Literal["compra", "alquiler"]] = Field(None, description="Operación que busca")
+    tipo_propiedad: Optional[str] = Field(None, description="Casa, apartamento, oficina, local, lote...")
+    personas: Optional[int] = Field(None, description="Personas que vivirán en la propiedad")
+    mascotas: Optional[Literal["si", "no"]] = Field(None, description="Si tiene mascotas")
+    presupuesto_min: Optional[float] = Field(None, description="Presupuesto mínimo en pesos (número completo)")
+    presupuesto_max: Optional[float] = Field(None, description="Presupuesto máximo en pesos (número completo)")
+    area: Optional[int] = Field(None, description="Área mínima en m²")
+    habitaciones: Optional[int] = None
+    banos: Optional[int] = None
+    parqueaderos: Optional[int] = None
+    ubicacion: Optional[str] = Field(None, description="Ciudad, zona, localidad o barrio")
+    cercanias: Optional[List[str]] = Field(None, description="Lugares que quiere tener cerca")
+    aspectos_negociables: Optional[str] = None
+    aspectos_no_negociables: Optional[str] = None
+    fecha_ideal: Optional[str] = Field(None, description="Fecha ideal de entrega en formato YYYY-MM-DD")
+
+
+class TurnoRequerimiento(BaseModel):
+    """Aspectos extraídos de un mensaje del usuario en una sola llamada al modelo."""
+    datos: DatosRequerimiento
+    sin_preferencia: List[str] = Field(
+        default_factory=list,
+        description="Aspectos pendientes que el usuario dice que le son indiferentes",
+    )
+
+
+extractor = llm_extraccion.with_structured_output(TurnoRequerimiento)
+
 class AgenteInmobiliario:
     def __init__(self):
         # Inicializar la memoria de la conversación
-        self.memory = ConversationBufferMemory(memory_key="history")
+        self.memory = HistorialAcotado(llm=llm, memory_key="history")
         
-        # Inicializar el modelo de lenguaje con GPT-4
-        self.llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.7, openai_api_key=OPENAI_API_KEY)
+        # Modelo de lenguaje compartido
+        self.llm = llm
         
         # Diccionario para almacenar las respuestas del usuario
         self.respuestas_usuario = {aspecto: None for aspecto in aspectos}
         
+        # Resumen ya generado para las respuestas actuales (se invalida si cambian)
+        self.resumen = None
+        
         # IDs para el requerimiento
         self.cliente_id = 29  # Valor por defecto
         self.agente_id = 12   # Valor por defecto
@@ -45,10 +98,34 @@ class AgenteInmobiliario:
     
     def reset(self):
         """Reinicia la conversación y las respuestas"""
-        self.memory = ConversationBufferMemory(memory_key="history")
+        self.memory = HistorialAcotado(llm=llm, memory_key="history")
         self.respuestas_usuario = {aspecto: None for aspecto in aspectos}
+        self.resumen = None
         # No reiniciamos los IDs, ya que son específicos de la sesión
     
+    def to_state(self):
+        """Estado compacto del agente para guardarlo en el almacén de sesiones."""
+        return {
+            "ids": [self.cliente_id, self.agente_id],
+            # Solo las respuestas ya contestadas; el resto se completa con None al restaurar
+            "respuestas": {k: v for k, v in self.respuestas_usuario.items() if v is not None},
+            "resumen_requerimiento": self.resumen,
+            # Turnos recientes literales y resumen de los anteriores
+            **self.memory.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, estado):
+        """Reconstruye un agente a partir de ``to_state()``."""
+        agente = cls()
+        agente.cliente_id, agente.agente_id = estado.get("ids", [agente.cliente_id, agente.agente_id])
+        for aspecto, respuesta in estado.get("respuestas", {}).items():
+            if aspecto in agente.respuestas_usuario:
+                agente.respuestas_usuario[aspecto] = respuesta
+        agente.resumen = estado.get("resumen_requerimiento")
+        agente.memory.cargar_estado(estado)
+        return agente
+    
     def proximo_aspecto(self):
         """Retorna el primer aspecto sin respuesta o None si todos están completos."""
         for aspecto, respuesta in self.respuestas_usuario.items():
@@ -56,25 +133,52 @@ class AgenteInmobiliario:
                 return aspecto
         return None
     
-    def generar_pregunta_natural(self, aspecto):
+    def aspectos_pendientes(self):
+        return [aspecto for aspecto, respuesta in self.respuestas_usuario.items() if respuesta is None]
+    
+    def extraer_aspectos(self, mensaje_usuario):
         """
-        Usa el LLM para generar una pregunta natural y conversacional,
-        teniendo en cuenta las respuestas previas del usuario.
+        Una sola llamada con salida estructurada: extrae todos los aspectos que
+        el usuario menciona en el mensaje.
         """
         historial = self.memory.load_memory_variables({})["history"]
-        respuestas_previas = "\n".join(f"{k}: {v}" for k, v in self.respuestas_usuario.items() if v)
-
-        prompt_natural = (
-            f"Actúa como un agente inmobiliario experto en entender necesidades de clientes. "
-            f"Debes hacer preguntas naturales y contextuales para obtener información sobre una propiedad. "
-            f"Toma en cuenta la información que el usuario ya proporcionó.\n\n"
+        conocidos = {k: v for k, v in self.respuestas_usuario.items() if v is not None}
+        prompt = (
+            "Eres un agente inmobiliario que recopila el requerimiento de un cliente.\n"
+            "Extrae del mensaje del usuario TODOS los aspectos que mencione, aunque no se le hayan preguntado. "
+            "Corrige un aspecto ya conocido solo si el usuario lo cambia explícitamente. "
+            "Convierte cifras como '2 millones' o '300 mil' a números completos.\n\n"
             f"Historial de conversación:\n{historial}\n\n"
-            f"Respuestas previas del usuario:\n{respuestas_previas}\n\n"
-            f"Genera una pregunta NATURAL sobre '{aspecto}', usando el contexto si es relevante."
+            f"Aspectos conocidos: {json.dumps(conocidos, ensure_ascii=False)}\n"
+            f"Aspectos pendientes: {', '.join(self.aspectos_pendientes())}\n\n"
+            f"Mensaje del usuario: {mensaje_usuario}"
         )
-
-        pregunta_generada = self.llm.predict(prompt_natural)
-        return pregunta_generada
+        return extractor.invoke(prompt)
+    
+    def actualizar_respuestas(self, turno):
+        """Incorpora a las respuestas los aspectos extraídos. Devuelve los aspectos actualizados."""
+        actualizados = []
+        for aspecto, valor in turno.datos.model_dump().items():
+            if valor not in (None, "", []) and aspecto in self.respuestas_usuario:
+                self.respuestas_usuario[aspecto] = valor
+                actualizados.append(aspecto)
+        for aspecto in turno.sin_preferencia:
+            if self.respuestas_usuario.get(aspecto, "") is None:
+                self.respuestas_usuario[aspecto] = SIN_PREFERENCIA
+                actualizados.append(aspecto)
+        if actualizados:
+            self.resumen = None
+        return actualizados
+    
+    def generar_pregunta(self, aspecto, respuesta_ambigua=None):
+        """
+        Pregunta sobre ``aspecto`` desde el banco de plantillas, sin llamar al
+        modelo. Solo si la última respuesta fue ambigua el modelo la reformula.
+        """
+        pregunta = preguntas.renderizar(preguntas.REQUERIMIENTO, aspecto, self.respuestas_usuario)
+        if respuesta_ambigua:
+            pregunta = preguntas.pulir(self.llm, pregunta, respuesta_ambigua, aspecto)
+        return pregunta
     
     def generar_resumen(self):
         """
@@ -100,68 +204,77 @@ class AgenteInmobiliario:
             "Resumen:"
         )
         
-        # Usar el LLM para generar el resumen
-        resumen = self.llm.predict(prompt_resumen)
-        return resumen
+        # Usar el LLM para generar el resumen; se conserva hasta que cambien las respuestas
+        self.resumen = llm_resumen.predict(prompt_resumen)
+        return self.resumen
+    
+    def _respuesta_resumen(self):
+        return {
+            "tipo": "resumen",
+            "mensaje": "Gracias, te enseñaré el resumen de tu requerimiento",
+            "resumen": self.resumen or self.generar_resumen(),
+            "requiere_confirmacion": True
+        }
     
     def procesar_mensaje(self, mensaje_usuario):
         """
         Procesa un mensaje del usuario y devuelve la respuesta del agente.
-        Si el proximo_aspecto es None, significa que todos los aspectos han sido respondidos.
+        Las respuestas cortas al aspecto preguntado (un número, sí/no, compra o
+        alquiler) se interpretan localmente; el resto pasa por una sola llamada
+        al modelo que extrae todos los aspectos mencionados. La siguiente
+        pregunta sale del banco de plantillas y solo se reformula con el modelo
+        si el mensaje no aportó ningún aspecto. Cuando no queda ningún aspecto
+        pendiente se devuelve el resumen.
         """
-        proximo = self.proximo_aspecto()
+        pendientes = self.aspectos_pendientes()
         
-        if proximo is None:
+        if not pendientes:
             # Todos los aspectos han sido respondidos
-            resumen = self.generar_resumen()
-            return {
-                "tipo": "resumen",
-                "mensaje": "Gracias, te enseñaré el resumen de tu requerimiento",
-                "resumen": resumen,
-                "requiere_confirmacion": True
-            }
+            return self._respuesta_resumen()
         
-        # Si todavía hay aspectos por preguntar
         if not mensaje_usuario:
-            # Primer mensaje o reinicio
+            # Primer mensaje o reinicio: la primera pregunta es fija, sin llamar al modelo
             saludo = "¡Hola! Te ayudaré a encontrar la propiedad ideal."
-            # Generar la primera pregunta inmediatamente
-            primera_pregunta = self.generar_pregunta_natural(proximo)
-            pregunta_completa = f"{saludo} {primera_pregunta}"
-            
             return {
                 "tipo": "pregunta",
-                "mensaje": pregunta_completa,
-                "proximo_aspecto": proximo
+                "mensaje": f"{saludo} {PREGUNTA_INICIAL}",
+                "proximo_aspecto": pendientes[0]
             }
+        
+        aspecto = pendientes[0]
+        ambigua = False
+        entendido, valor = preguntas.interpretar(
+            preguntas.REQUERIMIENTO[aspecto]["tipo"], mensaje_usuario, max_palabras=PALABRAS_LOCALES
+        )
+        # La pregunta inicial pide dos aspectos: su respuesta siempre pasa por el modelo
+        if entendido and len(pendientes) < len(self.respuestas_usuario):
+            # Respuesta corta al aspecto preguntado: se interpreta sin llamar al modelo
+            self.respuestas_usuario[aspecto] = valor
+            self.resumen = None
         else:
-            # Guardar la respuesta del usuario para el aspecto actual
-            aspecto_actual = proximo
-            self.respuestas_usuario[aspecto_actual] = mensaje_usuario
-            
-            # Guardar en la memoria de la conversación
-            self.memory.save_context({"input": f"Pregunta sobre {aspecto_actual}"}, {"output": mensaje_usuario})
-            
-            # Obtener el siguiente aspecto
-            proximo = self.proximo_aspecto()
-            
-            if proximo is None:
-                # Si ya respondió todos los aspectos
-                resumen = self.generar_resumen()
-                return {
-                    "tipo": "resumen",
-                    "mensaje": "Gracias, te enseñaré el resumen de tu requerimiento",
-                    "resumen": resumen,
-                    "requiere_confirmacion": True
-                }
-            
-            # Generar una pregunta para el próximo aspecto
-            pregunta = self.generar_pregunta_natural(proximo)
+            try:
+                turno = self.extraer_aspectos(mensaje_usuario)
+                actualizados = self.actualizar_respuestas(turno)
+                ambigua = not actualizados
+                print(f"Aspectos extraídos: {actualizados}")
+            except Exception as e:
+                # Sin extracción estructurada, el mensaje responde al primer aspecto pendiente
+                print(f"Error al extraer aspectos: {str(e)}")
+                self.respuestas_usuario[aspecto] = mensaje_usuario
+                self.resumen = None
         
+        # Guardar el turno en la memoria de la conversación
+        pendientes = self.aspectos_pendientes()
+        if not pendientes:
+            self.memory.save_context({"input": mensaje_usuario}, {"output": "Resumen del requerimiento"})
+            return self._respuesta_resumen()
+        
+        pregunta = self.generar_pregunta(pendientes[0], mensaje_usuario if ambigua else None)
+        self.memory.save_context({"input": mensaje_usuario}, {"output": pregunta})
         return {
             "tipo": "pregunta",
             "mensaje": pregunta,
-            "proximo_aspecto": proximo
+            "proximo_aspecto": pendientes[0]
         }
     
     def confirmar_resumen(self, confirmacion):
@@ -170,14 +283,16 @@ class AgenteInmobiliario:
         Devuelve el resultado de la operación.
         """
         if confirmacion:
-            resumen = self.generar_resumen()
+            # El resumen ya mostrado al usuario se reutiliza
+            resumen = self.resumen or self.generar_resumen()
             
             print(f"Confirmando resumen - Cliente ID: {self.cliente_id}, Agente ID: {self.agente_id}")
             
-            # Pasamos los IDs al método agent_tool
-            exito, resultado = requerimientoTool.agent_tool(
-                resumen, 
-                cliente_id=self.cliente_id, 
+            # Los aspectos ya están estructurados: se registran sin volver a extraerlos del resumen
+            exito, resultado = requerimientoTool.registrar_desde_respuestas(
+                self.respuestas_usuario,
+                resumen,
+                cliente_id=self.cliente_id,
                 agente_id=self.agente_id
             )
             
@@ -216,17 +331,17 @@ class AgenteInmobiliario:
                 aspecto = aspecto.strip()
                 if aspecto in self.respuestas_usuario:
                     self.respuestas_usuario[aspecto] = None
+        self.resumen = None
         
         return {
             "tipo": "modificacion",
             "mensaje": "He reiniciado los aspectos solicitados. Continuemos con la conversación."
         }
 
-# Instancia del agente para uso general
-agente = AgenteInmobiliario()
-
 # Función para chatear con el agente por consola (para mantener compatibilidad)
 def chatear_con_agente():
+    # En consola hay una sola conversación; la API usa el almacén de sesiones
+    agente = AgenteInmobiliario()
     print("Agente Inmobiliario: ¡Hola! Te ayudaré a encontrar la propiedad ideal.")
     
     while True:
@@ -277,7 +392,7 @@ def chatear_con_agente():
             break
 
         # Genera una pregunta considerando el contexto
-        pregunta_aspecto = agente.generar_pregunta_natural(proximo)
+        pregunta_aspecto = agente.generar_pregunta(proximo)
         print(f"Agente Inmobiliario: {pregunta_aspecto}")
 
         user_input = input("🧑 Tú: ")
@@ -1,9 +1,10 @@
 import json
-import requests
 import os
 from dotenv import load_dotenv
 from datetime import datetime
-from langchain_openai import ChatOpenAI
+from crm.IA.base import chat_openai
+from agentesIA.cache_llm import cache_langchain
+from agentesIA.preguntas import OPERACIONES, SIN_PREFERENCIA
 
 # Cargar variables de entorno
 load_dotenv()
@@ -70,7 +71,7 @@ def agent_tool(resumen=None, cliente_id=29, agente_id=12):
             f"- no_negocibles (texto)\n"
         )
         
-        llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0.2, openai_api_key=OPENAI_API_KEY)
+        llm = chat_openai(model_name="gpt-4o-mini", temperature=0.2, openai_api_key=OPENAI_API_KEY, cache=cache_langchain())
         llm_output = llm.predict(prompt_simple)
         print("Respuesta LLM:", llm_output[:150] + "..." if len(llm_output) > 150 else llm_output)
         
@@ -95,22 +96,93 @@ def agent_tool(resumen=None, cliente_id=29, agente_id=12):
         print(f"Error al extraer datos del resumen: {str(e)}")
         # Continuamos con el payload predeterminado
 
-    # 3. Realizar el llamado a la API para crear el requerimiento
-    api_url = "http://localhost:8000/crm/requerimientoAI/"  # Ajusta la URL según tu entorno
+    # 3. Registrar el requerimiento a través de la capa de servicios del CRM
+    return registrar_requerimiento(payload)
+
+
+def _numero(valor, tipo=int):
+    """Convierte un aspecto a número; los aspectos indiferentes o no numéricos quedan en None."""
+    try:
+        return tipo(valor) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _fecha(valor):
+    """Fecha u hora ISO 8601 tal cual; el resto ("lo antes posible", "sin preferencia") queda en None."""
+    if not isinstance(valor, str):
+        return None
+    try:
+        datetime.fromisoformat(valor.strip())
+    except ValueError:
+        return None
+    return valor.strip()
+
+
+def payload_desde_respuestas(respuestas, resumen, cliente_id=29, agente_id=12):
+    """Arma el payload de RequerimientoModel a partir de los aspectos ya estructurados por el agente."""
+    operacion = respuestas.get("tipo_negocio")
+    if operacion not in OPERACIONES:
+        # "sin preferencia" u otro valor que no es una operación del modelo
+        operacion = ""
+    tipo_propiedad = respuestas.get("tipo_propiedad")
+    if not isinstance(tipo_propiedad, str) or tipo_propiedad == SIN_PREFERENCIA:
+        tipo_propiedad = ""
+    payload = {
+        "agente": agente_id,
+        "cliente": cliente_id,
+        "descripcion": resumen,
+        "tipo_negocio": {
+            "operacion": operacion,
+            "tipo_propiedad": tipo_propiedad,
+        },
+        "habitantes": _numero(respuestas.get("personas")),
+        "area_minima": _numero(respuestas.get("area")),
+        "habitaciones": _numero(respuestas.get("habitaciones")),
+        "banos": _numero(respuestas.get("banos")),
+        "parqueaderos": _numero(respuestas.get("parqueaderos")),
+        "mascotas": respuestas.get("mascotas") if respuestas.get("mascotas") in ("si", "no") else None,
+        "cercanias": respuestas.get("cercanias") if isinstance(respuestas.get("cercanias"), list) else None,
+        "fecha_ideal_entrega": _fecha(respuestas.get("fecha_ideal")),
+        "negocibles": respuestas.get("aspectos_negociables"),
+        "no_negocibles": respuestas.get("aspectos_no_negociables"),
+    }
+    # El presupuesto de arriendo y el de compra se guardan en campos distintos
+    sufijo = "_compra" if operacion == "compra" else ""
+    payload[f"presupuesto_minimo{sufijo}"] = _numero(respuestas.get("presupuesto_min"), float)
+    payload[f"presupuesto_maximo{sufijo}"] = _numero(respuestas.get("presupuesto_max"), float)
+
+    # Los campos sin dato se omiten para que apliquen los valores por defecto del modelo
+    return {clave: valor for clave, valor in payload.items() if valor is not None}
+
+
+def registrar_desde_respuestas(respuestas, resumen, cliente_id=29, agente_id=12):
+    """Registra el requerimiento con los aspectos del agente, sin volver a extraerlos del resumen."""
+    print(f"Registrando requerimiento estructurado - Cliente ID: {cliente_id}, Agente ID: {agente_id}")
+    return registrar_requerimiento(payload_desde_respuestas(respuestas, resumen, cliente_id, agente_id))
+
+
+def registrar_requerimiento(payload):
+    """Crea el requerimiento con la capa de servicios del CRM (o por HTTP). Devuelve ``(exito, datos)``."""
+    from crm.services import usar_http, llamar_api
 
     try:
-        print("Enviando payload a la API:", json.dumps(payload)[:100] + "..." if len(json.dumps(payload)) > 100 else json.dumps(payload))
-        response = requests.post(api_url, json=payload)
-        if response.status_code == 201:
+        print("Enviando payload:", json.dumps(payload)[:100] + "..." if len(json.dumps(payload)) > 100 else json.dumps(payload))
+        if usar_http():
+            # Despliegue remoto: el agente corre fuera del servidor del CRM
+            exito, resultado = llamar_api("POST", "/crm/requerimientoAI/", payload, esperado=(201,))
+        else:
+            from crm.services.requerimientos import crear_requerimiento
+            exito, resultado = crear_requerimiento(payload)
+
+        if exito:
             print("Requerimiento creado exitosamente:")
-            print(response.json())
-            return True, response.json()
+            print(resultado)
         else:
-            print("Error al crear el requerimiento:")
-            print(response.status_code, response.text)
-            return False, {"error": f"Error {response.status_code}: {response.text}"}
+            print("Error al crear el requerimiento:", resultado)
+        return exito, resultado
     except Exception as e:
-        print("Excepción al realizar la solicitud POST:", str(e))
+        print("Excepción al registrar el requerimiento:", str(e))
         return False, {"error": str(e)}
 
 # Ejecutar el agent tool solo cuando se llama directamente
@@ -0,0 +1,423 @@
+"""
+Banco de preguntas de los agentes que recopilan datos por aspectos
+(requerimiento de un cliente y registro de una propiedad).
+
+Cada aspecto tiene varias plantillas. Se eligen las que solo usan datos ya
+recopilados, prefiriendo las que usan más (por ejemplo "¿Cuántas habitaciones
+necesitas en tu {tipo_propiedad}?" cuando ya se conoce el tipo), y se escoge
+una al azar para no repetir siempre la misma frase. Redactar la pregunta es
+local e instantáneo.
+
+Las respuestas cortas a aspectos simples (números, montos, sí/no, una opción
+de una lista) se interpretan localmente con ``interpretar``. Solo cuando la
+respuesta es ambigua el agente pide al modelo que reformule la pregunta
+(``pulir``), con un prompt corto que no incluye el historial.
+"""
+import random
+import re
+import string
+import unicodedata
+
+# Valor de los aspectos que el usuario declara indiferentes
+SIN_PREFERENCIA = "sin preferencia"
+
+# Tipos de respuesta que se interpretan localmente
+ENTERO = "entero"
+NUMERO = "numero"
+MONTO = "monto"
+SI_NO = "si_no"
+TEXTO = "texto"
+
+NUMEROS_EN_LETRAS = {
+    "cero": 0, "ninguno": 0, "ninguna": 0, "un": 1, "uno": 1, "una": 1, "dos": 2,
+    "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7, "ocho": 8,
+    "nueve": 9, "diez": 10, "primer": 1, "primero": 1, "segundo": 2, "tercer": 3,
+    "tercero": 3, "cuarto": 4, "quinto": 5,
+}
+MULTIPLICADORES = {"mil": 1_000, "k": 1_000, "millon": 1_000_000, "millones": 1_000_000, "m": 1_000_000}
+
+AFIRMATIVAS = ("si", "claro", "obvio", "correcto", "tiene", "tengo", "con")
+NEGATIVAS = ("no", "ninguno", "ninguna", "sin", "nada")
+
+AMBIGUAS = (
+    "ni idea", "depende", "tal vez", "quizas", "no estoy segur", "mas o menos",
+    "no lo se", "no sabria", "no recuerdo",
+)
+INDIFERENTES = (
+    "me da igual", "da lo mismo", "no importa", "indiferente", "cualquiera",
+    "sin preferencia", "lo que sea",
+)
+
+# Cifras que no son parte de una unidad como "m2"
+_RE_NUMERO = re.compile(r"(?<![a-z])\d+(?:[.,']\d+)*")
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c)).strip()
+
+
+def es_ambigua(texto):
+    normalizado = normalizar(texto)
+    if not normalizado or "?" in normalizado:
+        return True
+    if re.match(r"^(no se|nose)\b[\s.,!]*$", normalizado):
+        return True
+    return any(marca in normalizado for marca in AMBIGUAS)
+
+
+def _numero(token, decimales):
+    """Convierte '2.500.000', '1,5' o '85' a número; None si no tiene sentido ('2,5' baños)."""
+    partes = re.split(r"[.,']", token)
+    if len(partes) == 2 and len(partes[1]) <= 2:
+        return float(f"{partes[0]}.{partes[1]}") if decimales else None
+    if any(len(parte) != 3 for parte in partes[1:]):
+        return None
+    return int("".join(partes))
+
+
+def _cantidad(normalizado, decimales=False):
+    """
+    Único número del texto o None si hay cero o varios. Las cifras tienen
+    prioridad; los números en letras solo cuentan si no hay cifras.
+    """
+    encontrados = [_numero(t, decimales) for t in _RE_NUMERO.findall(normalizado)]
+    if not encontrados:
+        encontrados = [NUMEROS_EN_LETRAS[p] for p in re.findall(r"[a-z]+", normalizado) if p in NUMEROS_EN_LETRAS]
+    return encontrados[0] if len(encontrados) == 1 and encontrados[0] is not None else None
+
+
+def _monto(normalizado):
+    """'2 millones', '1,5 millones', '300 mil', '$2.500.000' -> número completo."""
+    coincidencias = re.findall(r"(?<![a-z])(\d+(?:[.,']\d+)*)\s*(millones|millon|mil|k|m)?\b", normalizado)
+    if len(coincidencias) != 1:
+        return None
+    cifra, unidad = coincidencias[0]
+    valor = _numero(cifra, decimales=bool(unidad))
+    return float(valor * MULTIPLICADORES.get(unidad, 1)) if valor is not None else None
+
+
+def interpretar(tipo, texto, max_palabras=None):
+    """
+    Interpreta localmente la respuesta a un aspecto. Devuelve
+    ``(True, valor)`` si se entiende sin el modelo o ``(False, None)`` si es
+    ambigua o no es una respuesta simple. ``tipo`` es uno de los tipos del
+    módulo, un diccionario ``{valor: (sinónimos...)}`` para aspectos con
+    opciones o ``None`` para aspectos que siempre necesitan al modelo.
+    ``max_palabras`` limita la interpretación local a respuestas cortas (las
+    largas pueden mencionar otros aspectos).
+    """
+    if tipo is None or not texto or es_ambigua(texto):
+        return False, None
+    normalizado = normalizar(texto)
+    palabras = re.findall(r"\w+", normalizado)
+    if tipo == TEXTO:
+        return True, texto.strip()
+    if max_palabras and len(palabras) > max_palabras:
+        return False, None
+    if any(marca in normalizado for marca in INDIFERENTES):
+        return True, SIN_PREFERENCIA
+
+    if tipo in (ENTERO, NUMERO):
+        valor = _cantidad(normalizado, decimales=tipo == NUMERO)
+        if valor is None and palabras and palabras[0] in NEGATIVAS:
+            valor = 0
+        return (valor is not None), valor
+    if tipo == MONTO:
+        valor = _monto(normalizado)
+        return (valor is not None), valor
+    if tipo == SI_NO:
+        if palabras and palabras[0] in NEGATIVAS:
+            return True, "no"
+        if palabras and palabras[0] in AFIRMATIVAS:
+            return True, "si"
+        return False, None
+    if isinstance(tipo, dict):
+        elegidas = [
+            valor for valor, sinonimos in tipo.items()
+            if any(re.search(rf"\b{sinonimo}\b", normalizado) for sinonimo in sinonimos)
+        ]
+        return (True, elegidas[0]) if len(elegidas) == 1 else (False, None)
+    return False, None
+
+
+def _campos(plantilla):
+    return {campo for _, campo, _, _ in string.Formatter().parse(plantilla) if campo}
+
+
+def _texto(aspecto, valor):
+    if aspecto.startswith("presupuesto") and isinstance(valor, (int, float)):
+        return f"${valor:,.0f}".replace(",", ".")
+    if isinstance(valor, list):
+        return ", ".join(str(v) for v in valor)
+    return str(valor)
+
+
+def contexto(respuestas):
+    """Datos ya recopilados listos para las plantillas (sin los indiferentes)."""
+    datos = {
+        aspecto: _texto(aspecto, valor) for aspecto, valor in respuestas.items()
+        if valor not in (None, "", []) and valor != SIN_PREFERENCIA
+    }
+    operacion = respuestas.get("tipo_negocio")
+    if operacion in OPERACIONES:
+        datos["operacion"] = OPERACIONES[operacion]
+    return datos
+
+
+def renderizar(banco, aspecto, respuestas):
+    """Pregunta sobre ``aspecto`` a partir de las plantillas del banco."""
+    datos = contexto(respuestas)
+    plantillas = banco[aspecto]["plantillas"]
+    posibles = [p for p in plantillas if _campos(p) <= datos.keys()]
+    if not posibles:
+        return f"¿Me puedes indicar {aspecto.replace('_', ' ')}?"
+    mas_especificas = max(len(_campos(p)) for p in posibles)
+    plantilla = random.choice([p for p in posibles if len(_campos(p)) == mas_especificas])
+    return plantilla.format(**datos)
+
+
+def pulir(llm, pregunta, respuesta, aspecto):
+    """
+    Reformula con el modelo una pregunta cuya respuesta fue ambigua. Si la
+    llamada falla se devuelve la pregunta de la plantilla.
+    """
+    prompt = (
+        "Eres un agente inmobiliario amable. Hiciste esta pregunta al usuario:\n"
+        f"{pregunta}\n"
+        f"El usuario respondió: \"{respuesta}\", que no deja claro el dato '{aspecto.replace('_', ' ')}'.\n"
+        "Reformula la pregunta en una o dos frases naturales, reconociendo lo que dijo y aclarando "
+        "qué tipo de respuesta necesitas (por ejemplo un número o sí/no). Responde solo con la pregunta."
+    )
+    try:
+        return llm.predict(prompt).strip()
+    except Exception as e:
+        print(f"Error al reformular la pregunta sobre {aspecto}: {str(e)}")
+        return pregunta
+
+
+OPERACIONES = {"compra": "comprar", "alquiler": "alquilar"}
+
+# Requerimiento de un cliente (agentesIA/lab/requerimiento.py). Los aspectos de
+# texto libre usan tipo None: sus respuestas las interpreta el extractor.
+REQUERIMIENTO = {
+    "tipo_negocio": {
+        "tipo": {
+            "compra": ("comprar", "compra", "compro", "adquirir"),
+            "alquiler": ("alquilar", "alquiler", "arrendar", "arriendo", "rentar", "renta"),
+        },
+        "plantillas": [
+            "¿Buscas comprar o alquilar?",
+            "Para orientarte mejor, ¿tu idea es comprar o alquilar?",
+        ],
+    },
+    "tipo_propiedad": {
+        "tipo": None,
+        "plantillas": [
+            "¿Qué tipo de propiedad buscas? ¿Apartamento, casa, oficina, local o lote?",
+            "¿Qué tipo de propiedad te gustaría {operacion}? ¿Apartamento, casa, oficina u otra?",
+        ],
+    },
+    "personas": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántas personas vivirán en la propiedad?",
+            "¿Cuántas personas vivirían en tu {tipo_propiedad}?",
+        ],
+    },
+    "mascotas": {
+        "tipo": SI_NO,
+        "plantillas": [
+            "¿Tienes mascotas?",
+            "¿Alguna de las {personas} personas tiene mascotas?",
+        ],
+    },
+    "presupuesto_min": {
+        "tipo": MONTO,
+        "plantillas": [
+            "¿Cuál es tu presupuesto mínimo?",
+            "Hablemos de presupuesto: para {operacion}, ¿desde qué valor estás buscando?",
+        ],
+    },
+    "presupuesto_max": {
+        "tipo": MONTO,
+        "plantillas": [
+            "¿Y cuál es tu presupuesto máximo?",
+            "Partiendo de {presupuesto_min}, ¿hasta cuánto estarías dispuesto a pagar?",
+        ],
+    },
+    "area": {
+        "tipo": NUMERO,
+        "plantillas": [
+            "¿Qué área mínima necesitas, en metros cuadrados?",
+            "¿Qué área mínima, en m², necesitas para tu {tipo_propiedad}?",
+        ],
+    },
+    "habitaciones": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántas habitaciones necesitas?",
+            "¿Cuántas habitaciones necesitas en tu {tipo_propiedad}?",
+            "Siendo {personas} personas, ¿cuántas habitaciones te gustaría tener?",
+        ],
+    },
+    "banos": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántos baños necesitas?",
+            "Con {habitaciones} habitaciones, ¿cuántos baños te gustaría tener?",
+        ],
+    },
+    "parqueaderos": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántos parqueaderos necesitas?",
+            "¿Necesitas parqueaderos en tu {tipo_propiedad}? ¿Cuántos?",
+        ],
+    },
+    "ubicacion": {
+        "tipo": None,
+        "plantillas": [
+            "¿En qué ciudad, zona o barrio te gustaría que estuviera?",
+            "¿En qué zona o barrio te gustaría {operacion} tu {tipo_propiedad}?",
+        ],
+    },
+    "cercanias": {
+        "tipo": None,
+        "plantillas": [
+            "¿Qué lugares te gustaría tener cerca? Por ejemplo colegios, parques, transporte o centros comerciales.",
+            "En {ubicacion}, ¿qué lugares te gustaría tener cerca? Por ejemplo colegios, parques o transporte.",
+        ],
+    },
+    "aspectos_negociables": {
+        "tipo": None,
+        "plantillas": [
+            "¿Qué aspectos de la propiedad estarías dispuesto a negociar?",
+        ],
+    },
+    "aspectos_no_negociables": {
+        "tipo": None,
+        "plantillas": [
+            "¿Y qué aspectos no son negociables para ti?",
+        ],
+    },
+    "fecha_ideal": {
+        "tipo": None,
+        "plantillas": [
+            "¿Para qué fecha te gustaría tener la propiedad?",
+            "¿Para cuándo te gustaría {operacion} tu {tipo_propiedad}?",
+        ],
+    },
+}
+
+# Registro de una propiedad (agentesIA/lab/propiedad.py)
+PROPIEDAD = {
+    "tipo_propiedad": {
+        "tipo": TEXTO,
+        "plantillas": [
+            "¿Qué tipo de propiedad quieres publicar? ¿Apartamento, casa, oficina, local o lote?",
+        ],
+    },
+    "titulo": {
+        "tipo": TEXTO,
+        "plantillas": [
+            "¿Qué título te gustaría para la publicación? Por ejemplo: 'Apartamento iluminado cerca al parque'.",
+            "¿Qué título le pondrías a la publicación de tu {tipo_propiedad}?",
+        ],
+    },
+    "modalidad_de_negocio": {
+        "tipo": {
+            "venta": ("venta", "vender", "vendo"),
+            "arriendo": ("arriendo", "arrendar", "alquiler", "alquilar", "renta", "rentar"),
+            "ambas": ("ambas", "ambos", "las dos", "los dos"),
+        },
+        "plantillas": [
+            "¿La propiedad es para venta, arriendo o ambas?",
+            "¿Quieres publicar tu {tipo_propiedad} para venta, arriendo o ambas?",
+        ],
+    },
+    "descripcion": {
+        "tipo": TEXTO,
+        "plantillas": [
+            "Cuéntame cómo es la propiedad: lo que la hace especial, su estado y sus acabados.",
+            "Cuéntame sobre tu {tipo_propiedad}: qué tiene de especial, su estado y sus acabados.",
+        ],
+    },
+    "direccion": {
+        "tipo": TEXTO,
+        "plantillas": [
+            "¿Cuál es la dirección de la propiedad?",
+            "¿Cuál es la dirección de tu {tipo_propiedad}?",
+        ],
+    },
+    "nivel": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿En qué piso o nivel está la propiedad?",
+        ],
+    },
+    "metro_cuadrado_construido": {
+        "tipo": NUMERO,
+        "plantillas": [
+            "¿Cuántos metros cuadrados construidos tiene? Es el área techada, incluyendo muros.",
+        ],
+    },
+    "metro_cuadrado_propiedad": {
+        "tipo": NUMERO,
+        "plantillas": [
+            "¿Y cuál es el área total de la propiedad en metros cuadrados, incluyendo zonas no construidas?",
+            "Además de los {metro_cuadrado_construido} m² construidos, ¿cuál es el área total de la propiedad?",
+        ],
+    },
+    "habitaciones": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántas habitaciones tiene?",
+            "¿Cuántas habitaciones tiene tu {tipo_propiedad}?",
+        ],
+    },
+    "habitacion_de_servicio": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántas habitaciones de servicio tiene?",
+        ],
+    },
+    "banos": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántos baños tiene?",
+            "Con {habitaciones} habitaciones, ¿cuántos baños tiene?",
+        ],
+    },
+    "terraza": {
+        "tipo": SI_NO,
+        "plantillas": [
+            "¿Tiene terraza?",
+        ],
+    },
+    "balcon": {
+        "tipo": SI_NO,
+        "plantillas": [
+            "¿Tiene balcón?",
+        ],
+    },
+    "garajes": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántos garajes o parqueaderos tiene?",
+        ],
+    },
+    "depositos": {
+        "tipo": ENTERO,
+        "plantillas": [
+            "¿Cuántos depósitos o cuartos útiles tiene?",
+        ],
+    },
+    "mascotas": {
+        "tipo": SI_NO,
+        "plantillas": [
+            "Por último, ¿se admiten mascotas?",
+        ],
+    },
+}
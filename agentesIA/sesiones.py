@@ -0,0 +1,272 @@
+"""
+Almacén de sesiones para los agentes conversacionales.
+
+Cada conversación se identifica con un ``session_id``. El estado del agente se
+serializa a JSON compacto y se guarda en un backend intercambiable (memoria del
+proceso, tabla en la base de datos o Redis). Encima del backend se mantiene una
+caché LRU en proceso con expiración por TTL, para no reconstruir el agente en
+cada mensaje.
+
+Configuración por variables de entorno:
+    AGENT_SESSION_BACKEND  memoria | db | redis   (por defecto: db)
+    AGENT_SESSION_TTL      segundos de vida de una sesión inactiva
+    AGENT_SESSION_LRU      número máximo de agentes vivos por proceso
+    REDIS_URL              url de Redis (``fakeredis://`` usa fakeredis)
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import timedelta
+
+SESSION_BACKEND = os.getenv("AGENT_SESSION_BACKEND", "db")
+SESSION_TTL = int(os.getenv("AGENT_SESSION_TTL", 6 * 60 * 60))
+SESSION_LRU = int(os.getenv("AGENT_SESSION_LRU", 1000))
+
+
+def serializar_estado(estado):
+    """Serializa el estado de un agente a JSON compacto."""
+    return json.dumps(estado, separators=(",", ":"), ensure_ascii=False)
+
+
+class MemoriaBackend:
+    """Backend en memoria del proceso. Útil con un solo worker o en desarrollo."""
+
+    compartido = False
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def cargar(self, clave):
+        with self._lock:
+            registro = self._datos.get(clave)
+            if registro is None:
+                return None
+            version, estado, expira = registro
+            if expira < time.time():
+                del self._datos[clave]
+                return None
+            return version, estado
+
+    def version(self, clave):
+        registro = self.cargar(clave)
+        return registro[0] if registro else None
+
+    def guardar(self, clave, estado, ttl):
+        version = time.time_ns()
+        with self._lock:
+            self._datos[clave] = (version, estado, time.time() + ttl)
+        return version
+
+    def eliminar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+
+class BaseDatosBackend:
+    """Backend sobre la tabla ``AgenteSesionModel`` (SQLite por defecto)."""
+
+    compartido = True
+    # Cada cuántos guardados se purgan las sesiones expiradas
+    PURGAR_CADA = 200
+
+    def __init__(self):
+        self._guardados = 0
+
+    @property
+    def modelo(self):
+        # Importación diferida: el módulo se carga antes de que Django esté listo
+        from crm.models import AgenteSesionModel
+        return AgenteSesionModel
+
+    def cargar(self, clave):
+        from django.utils import timezone
+        return (
+            self.modelo.objects
+            .filter(clave=clave, expira__gt=timezone.now())
+            .values_list('version', 'estado')
+            .first()
+        )
+
+    def version(self, clave):
+        from django.utils import timezone
+        return (
+            self.modelo.objects
+            .filter(clave=clave, expira__gt=timezone.now())
+            .values_list('version', flat=True)
+            .first()
+        )
+
+    def guardar(self, clave, estado, ttl):
+        from django.utils import timezone
+        version = time.time_ns()
+        expira = timezone.now() + timedelta(seconds=ttl)
+        self.modelo.objects.update_or_create(
+            clave=clave,
+            defaults={'estado': estado, 'version': version, 'expira': expira},
+        )
+        self._guardados += 1
+        if self._guardados % self.PURGAR_CADA == 0:
+            self.purgar()
+        return version
+
+    def eliminar(self, clave):
+        self.modelo.objects.filter(clave=clave).delete()
+
+    def purgar(self):
+        """Elimina las sesiones expiradas."""
+        from django.utils import timezone
+        eliminadas, _ = self.modelo.objects.filter(expira__lte=timezone.now()).delete()
+        if eliminadas:
+            print(f"Sesiones de agentes expiradas eliminadas: {eliminadas}")
+
+
+class RedisBackend:
+    """Backend sobre Redis; acepta ``fakeredis://`` para pruebas locales."""
+
+    compartido = True
+
+    def __init__(self, url=None):
+        url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        if url.startswith("fakeredis://"):
+            import fakeredis
+            self.redis = fakeredis.FakeRedis()
+        else:
+            import redis
+            self.redis = redis.Redis.from_url(url)
+
+    def _claves(self, clave):
+        return f"agente:{clave}", f"agente:{clave}:v"
+
+    def cargar(self, clave):
+        clave_estado, clave_version = self._claves(clave)
+        estado, version = self.redis.mget(clave_estado, clave_version)
+        if estado is None or version is None:
+            return None
+        return int(version), estado.decode("utf-8")
+
+    def version(self, clave):
+        version = self.redis.get(self._claves(clave)[1])
+        return int(version) if version is not None else None
+
+    def guardar(self, clave, estado, ttl):
+        clave_estado, clave_version = self._claves(clave)
+        version = time.time_ns()
+        pipe = self.redis.pipeline()
+        pipe.set(clave_estado, estado, ex=ttl)
+        pipe.set(clave_version, version, ex=ttl)
+        pipe.execute()
+        return version
+
+    def eliminar(self, clave):
+        self.redis.delete(*self._claves(clave))
+
+
+BACKENDS = {
+    'memoria': MemoriaBackend,
+    'db': BaseDatosBackend,
+    'redis': RedisBackend,
+}
+
+
+def crear_backend(nombre=None):
+    nombre = nombre or SESSION_BACKEND
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de sesiones no soportado: {nombre}")
+    return BACKENDS[nombre]()
+
+
+class AgentSessionStore:
+    """
+    Almacén de agentes por sesión.
+
+    ``fabrica`` crea un agente nuevo y ``restaurar`` reconstruye uno a partir
+    del diccionario devuelto por ``agente.to_state()``.
+    """
+
+    def __init__(self, nombre, fabrica, restaurar, backend=None,
+                 ttl=SESSION_TTL, max_entradas=SESSION_LRU):
+        self.nombre = nombre
+        self.fabrica = fabrica
+        self.restaurar = restaurar
+        self.backend = backend or crear_backend()
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        # clave -> (agente, version, ultimo_acceso)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        # clave -> cerrojo de la sesión; se libera solo cuando nadie lo usa
+        self._cerrojos = weakref.WeakValueDictionary()
+
+    def _clave(self, session_id):
+        return f"{self.nombre}:{session_id}"
+
+    def _cachear(self, clave, agente, version):
+        with self._lock:
+            self._lru[clave] = (agente, version, time.time())
+            self._lru.move_to_end(clave)
+            while len(self._lru) > self.max_entradas:
+                self._lru.popitem(last=False)
+
+    def _desde_lru(self, clave):
+        with self._lock:
+            entrada = self._lru.get(clave)
+            if entrada is None:
+                return None
+            agente, version, ultimo_acceso = entrada
+            if time.time() - ultimo_acceso > self.ttl:
+                del self._lru[clave]
+                return None
+            self._lru.move_to_end(clave)
+            return agente, version
+
+    def bloqueo(self, session_id):
+        """
+        Cerrojo de la sesión. Hay que mantenerlo desde ``obtener`` hasta
+        ``guardar``: el agente es mutable y dos peticiones simultáneas de la
+        misma sesión no deben procesar mensajes sobre el mismo objeto.
+        """
+        clave = self._clave(session_id)
+        with self._lock:
+            cerrojo = self._cerrojos.get(clave)
+            if cerrojo is None:
+                cerrojo = threading.Lock()
+                self._cerrojos[clave] = cerrojo
+            return cerrojo
+
+    def obtener(self, session_id, crear=True):
+        """Devuelve el agente de la sesión; crea uno nuevo si no existe."""
+        clave = self._clave(session_id)
+        entrada = self._desde_lru(clave)
+        if entrada is not None:
+            agente, version = entrada
+            # Con un backend compartido otro worker pudo haber avanzado la sesión
+            if not self.backend.compartido or self.backend.version(clave) == version:
+                return agente
+
+        registro = self.backend.cargar(clave)
+        if registro is not None:
+            version, estado = registro
+            agente = self.restaurar(json.loads(estado))
+        elif crear:
+            agente, version = self.fabrica(), None
+        else:
+            return None
+
+        self._cachear(clave, agente, version)
+        return agente
+
+    def guardar(self, session_id, agente):
+        """Persiste el estado del agente y lo deja en la caché LRU."""
+        clave = self._clave(session_id)
+        version = self.backend.guardar(clave, serializar_estado(agente.to_state()), self.ttl)
+        self._cachear(clave, agente, version)
+
+    def eliminar(self, session_id):
+        clave = self._clave(session_id)
+        with self._lock:
+            self._lru.pop(clave, None)
+        self.backend.eliminar(clave)
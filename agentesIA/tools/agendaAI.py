@@ -1,15 +1,17 @@
 import os
 import sys
-import requests
 import json
 from datetime import datetime
 from dotenv import load_dotenv
-from langchain.memory import ConversationBufferMemory
-from langchain_openai import ChatOpenAI
+from agentesIA.historial import HistorialAcotado
+from crm.IA.base import chat_openai
 import re
+import threading
 from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
-from .agendaTool import AgendaReservaTool
+from .agendaTool import AgendaReservaTool, _reservar_por_api, cliente_actual
+from crm.services import usar_http, llamar_api
+from crm.services import agenda as servicio_agenda
 
 # Configurar salida estándar a UTF-8 para evitar problemas de codificación en la terminal
 sys.stdout.reconfigure(encoding='utf-8')
@@ -17,20 +19,20 @@ sys.stdout.reconfigure(encoding='utf-8')
 # Cargar variables de entorno
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 
 def obtener_agendas_abiertas():
     """
-    Llama a la API para obtener las agendas abiertas.
+    Obtiene las agendas abiertas desde el índice en memoria del CRM (o por HTTP
+    en despliegues remotos).
     """
-    try:
-        url = f"{BASE_URL}/crm/agendaAbierta/"
-        response = requests.get(url)
-        response.raise_for_status()  # Lanza una excepción si hay error HTTP
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error al conectar con la API: {e}")
-        return f"Error al conectar con la API: {e}"
+    if not usar_http():
+        return servicio_agenda.agendas_disponibles()
+    
+    exito, agendas = llamar_api("GET", "/crm/agendaAbierta/", esperado=(200,))
+    if not exito:
+        print(f"Error al conectar con la API: {agendas['error']}")
+        return f"Error al conectar con la API: {agendas['error']}"
+    return agendas
 
 def formatear_agendas(agendas):
     """Formatea la información de las agendas para presentarla de manera legible."""
@@ -87,59 +89,25 @@ def reservar_agenda(agenda_id, cliente_id, comentarios="Reservada mediante chatb
         print("\n=== INICIANDO PROCESO DE RESERVA ===")
         print(f"Intentando reservar agenda ID: {agenda_id} para cliente ID: {cliente_id}")
         
-        # Usar la URL específica con el ID de la agenda
-        url = f"{BASE_URL}/crm/agendaAbierta/{agenda_id}/"
-        print(f"URL de reserva: {url}")
-        
-        # Primero obtener la agenda actual
-        print("Obteniendo datos actuales de la agenda...")
-        agendas = obtener_agendas_abiertas()
-        agenda = None
-        
-        for a in agendas:
-            if a.get('id') == agenda_id:
-                agenda = a
-                break
-                
-        if not agenda:
-            print(f"ERROR: No se encontró la agenda con ID {agenda_id}")
-            return {
-                "success": False,
-                "message": f"No se encontró la agenda con ID {agenda_id}"
-            }
-            
-        print(f"Agenda encontrada: {agenda}")
-        
-        # Preparar datos para actualización
-        data = {
-            "agente": agenda.get('agente'),
-            "fecha": agenda.get('fecha'),
-            "hora": agenda.get('hora'),
-            "cliente": cliente_id,
-            "disponible": False,
-            "comentarios": comentarios
-        }
-        print(f"Datos preparados para actualización: {data}")
-        
-        # Realizar la solicitud PUT
-        print("Enviando solicitud PUT para actualizar agenda...")
-        response = requests.put(url, json=data)
-        print(f"Código de respuesta: {response.status_code}")
-        print(f"Respuesta del servidor: {response.text}")
+        # Reserva en una sola transacción (o por HTTP en despliegues remotos)
+        if usar_http():
+            exito, resultado = _reservar_por_api(agenda_id, cliente_id, comentarios)
+        else:
+            exito, resultado = servicio_agenda.reservar_agenda(agenda_id, cliente_id, comentarios)
         
-        if response.status_code == 200:
+        if exito:
             print("¡Reserva exitosa!")
             return {
                 "success": True,
                 "message": "Agenda reservada exitosamente",
-                "data": response.json()
+                "data": resultado
             }
         else:
-            print(f"ERROR: La reserva falló con código {response.status_code}")
+            print(f"ERROR: La reserva falló: {resultado}")
             return {
                 "success": False,
-                "message": f"Error al reservar agenda: {response.status_code}",
-                "error": response.text
+                "message": f"Error al reservar agenda: {resultado.get('error', resultado)}",
+                "error": resultado
             }
     except Exception as e:
         print(f"ERROR CRÍTICO en reservar_agenda: {str(e)}")
@@ -148,17 +116,50 @@ def reservar_agenda(agenda_id, cliente_id, comentarios="Reservada mediante chatb
             "message": f"Error al reservar agenda: {str(e)}"
         }
 
+# El modelo y el ejecutor de LangChain no guardan estado de la conversación: se
+# construyen una vez por proceso y los comparten todos los clientes. La memoria
+# de cada cliente vive en AgenteAgenda y se guarda en el almacén de sesiones.
+# Reentrante: el ejecutor se construye pidiendo el llm compartido
+_lock = threading.RLock()
+_compartidos = {}
+
+
+def _compartido(nombre, crear):
+    objeto = _compartidos.get(nombre)
+    if objeto is None:
+        with _lock:
+            objeto = _compartidos.get(nombre)
+            if objeto is None:
+                objeto = _compartidos[nombre] = crear()
+    return objeto
+
+
+def llm_agenda():
+    return _compartido("llm", lambda: chat_openai(
+        model_name="gpt-4o-mini", 
+        temperature=0.7, 
+        openai_api_key=OPENAI_API_KEY
+    ))
+
+
+def ejecutor_agenda():
+    """Ejecutor STRUCTURED_CHAT sin memoria; el cliente se toma de ``cliente_actual``."""
+    return _compartido("ejecutor", lambda: initialize_agent(
+        tools=[AgendaReservaTool()],
+        llm=llm_agenda(),
+        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True,
+        handle_parsing_errors=True
+    ))
+
+
 class AgenteAgenda:
     def __init__(self, cliente_id=None):
-        # Inicializar la memoria de la conversación
-        self.memory = ConversationBufferMemory()
+        # Modelo de lenguaje compartido por el proceso
+        self.llm = llm_agenda()
         
-        # Inicializar el modelo de lenguaje
-        self.llm = ChatOpenAI(
-            model_name="gpt-4o-mini", 
-            temperature=0.7, 
-            openai_api_key=OPENAI_API_KEY
-        )
+        # Inicializar la memoria de la conversación (ventana reciente + resumen)
+        self.memory = HistorialAcotado(llm=self.llm)
         
         # Estado del agente
         self.ultima_consulta_agendas = None
@@ -166,25 +167,25 @@ class AgenteAgenda:
         
         # Establecer el ID del cliente desde el inicio
         self.cliente_id = cliente_id
-        
-        # Inicializar herramientas
-        self.tools = [
-            AgendaReservaTool(cliente_id=cliente_id),
-        ]
-        
-        # Inicializar el agente
-        self.agent = initialize_agent(
-            tools=self.tools,
-            llm=self.llm,
-            agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True,
-            memory=self.memory,
-            handle_parsing_errors=True
-        )
+    
+    @property
+    def agent(self):
+        return ejecutor_agenda()
+    
+    def to_state(self):
+        """Estado compacto del agente para guardarlo en el almacén de sesiones."""
+        return {"cliente_id": self.cliente_id, **self.memory.to_state()}
+    
+    @classmethod
+    def from_state(cls, estado):
+        """Reconstruye un agente a partir de ``to_state()``."""
+        agente = cls(cliente_id=estado.get("cliente_id"))
+        agente.memory.cargar_estado(estado)
+        return agente
     
     def reset(self):
         """Reinicia la conversación y las respuestas"""
-        self.memory = ConversationBufferMemory()
+        self.memory = HistorialAcotado(llm=self.llm)
         self.ultima_consulta_agendas = None
         self.agendas_cache = None
     
@@ -251,6 +252,9 @@ class AgenteAgenda:
             # Obtener agendas disponibles
             agendas = obtener_agendas_abiertas()
             
+            # El ejecutor es compartido: el historial de este cliente va en el contexto
+            historial = self.memory.load_memory_variables({}).get("history", "")
+            
             # Crear el contexto para el agente
             contexto = f"""
             Eres un asistente virtual especializado en agendas inmobiliarias.
@@ -271,10 +275,18 @@ class AgenteAgenda:
             3. Confirma el resultado al usuario
             
             No pidas el ID del cliente, ya lo tenemos: {self.cliente_id}
+            
+            Historial de conversación:
+            {historial or 'Sin mensajes previos.'}
             """
             
-            # Ejecutar el agente con el contexto
-            respuesta = self.agent.run(f"{contexto}\n\nUsuario: {mensaje_usuario}")
+            # Ejecutar el agente con el contexto; la herramienta de reserva lee el cliente de cliente_actual
+            token = cliente_actual.set(self.cliente_id)
+            try:
+                respuesta = self.agent.run(f"{contexto}\n\nUsuario: {mensaje_usuario}")
+            finally:
+                cliente_actual.reset(token)
+            self.memory.save_context({"input": mensaje_usuario}, {"output": respuesta})
             
             return {
                 "tipo": "respuesta",
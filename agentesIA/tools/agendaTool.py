@@ -1,14 +1,20 @@
+from contextvars import ContextVar
 from typing import Type, List, Dict, Optional, Any
 from pydantic import BaseModel, Field
 from langchain.tools import BaseTool
 from datetime import datetime, time
-import requests
 import json
 import logging
+from crm.services import usar_http, llamar_api
+from crm.services import agenda as servicio_agenda
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Cliente de la conversación en curso. Permite compartir una sola instancia de
+# AgendaReservaTool (y del agente que la usa) entre todos los clientes.
+cliente_actual: ContextVar[Optional[int]] = ContextVar('cliente_actual', default=None)
+
 class AgendaQuerySchema(BaseModel):
     """Esquema para crear una agenda o cita con un agente inmobiliario."""
     agente_id: int = Field(..., description="ID del agente con el que se desea agendar la cita")
@@ -60,10 +66,6 @@ class AgendaTool(BaseTool):
                     "error": "No se pudo identificar al cliente. Por favor inicie sesión."
                 }
             
-            # Crear la agenda usando la API
-            #url = "http://127.0.0.1:8000/crm/agenda/"  # URL directa en lugar de usar settings
-            url = "http://127.0.0.1:8000/crm/agendaAbierta/"  # URL directa en lugar de usar settings
-            
             # Datos para la creación de la agenda
             data = {
                 "cliente": self.cliente_id,
@@ -76,11 +78,13 @@ class AgendaTool(BaseTool):
             
             logger.info(f"Enviando datos de agenda: {data}")
             
-            # Realizar la petición POST
-            response = requests.post(url, json=data)
+            # Crear la agenda directamente con el ORM (o por HTTP en despliegues remotos)
+            if usar_http():
+                exito, agenda_data = llamar_api("POST", "/crm/agendaAbierta/", data, esperado=(201,))
+            else:
+                exito, agenda_data = servicio_agenda.crear_agenda_abierta(data)
             
-            if response.status_code == 201:  # Creado exitosamente
-                agenda_data = response.json()
+            if exito:
                 logger.info(f"Agenda creada exitosamente: {agenda_data}")
                 return {
                     "success": True,
@@ -88,14 +92,7 @@ class AgendaTool(BaseTool):
                     "agenda": agenda_data
                 }
             else:
-                error_msg = "Error desconocido al crear la agenda"
-                try:
-                    error_data = response.json()
-                    if isinstance(error_data, dict):
-                        error_msg = str(error_data)
-                except:
-                    error_msg = f"Error {response.status_code}: {response.text}"
-                
+                error_msg = str(agenda_data) if agenda_data else "Error desconocido al crear la agenda"
                 logger.error(f"Error al crear agenda: {error_msg}")
                 return {
                     "success": False,
@@ -117,19 +114,19 @@ def obtener_agentes_disponibles() -> List[Dict[str, Any]]:
     #    Lista de diccionarios con información de los agentes
   
     try:
-        # Usar URL directa en lugar de settings.BASE_URL
-        url = "http://127.0.0.1:8000/accounts/agente/"
-        logger.info(f"Obteniendo agentes desde: {url}")
-        
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            agentes = response.json()
-            logger.info(f"Se encontraron {len(agentes)} agentes")
-            return agentes
+        if usar_http():
+            logger.info("Obteniendo agentes desde la API remota")
+            exito, agentes = llamar_api("GET", "/accounts/agente/?expand=user&page_size=500", esperado=(200,))
+            if not exito:
+                logger.error(f"Error al obtener agentes: {agentes}")
+                return []
+            # El listado viene paginado: {"next", "previous", "results"}
+            agentes = agentes.get('results', []) if isinstance(agentes, dict) else agentes
         else:
-            logger.error(f"Error al obtener agentes: {response.status_code} - {response.text}")
-            return []
+            agentes = servicio_agenda.listar_agentes()
+        
+        logger.info(f"Se encontraron {len(agentes)} agentes")
+        return agentes
     except Exception as e:
         logger.exception(f"Excepción al obtener agentes: {str(e)}")
         return []
@@ -149,6 +146,7 @@ class AgendaReservaTool(BaseTool):
     """
     args_schema: Type[BaseModel] = AgendaReservaSchema
     return_direct: bool = False
+    # Sin cliente_id fijo se usa el de la conversación en curso (cliente_actual)
     cliente_id: Optional[int] = None
 
     def __init__(self, cliente_id: Optional[int] = None, **kwargs):
@@ -159,53 +157,36 @@ class AgendaReservaTool(BaseTool):
         """
         Ejecuta la reserva de la agenda.
         """
-        if not self.cliente_id:
+        cliente_id = self.cliente_id or cliente_actual.get()
+        if not cliente_id:
             return {
                 "success": False,
                 "message": "No se ha proporcionado un ID de cliente válido"
             }
             
         try:
-            logger.info(f"Iniciando reserva de agenda {agenda_id} para cliente {self.cliente_id}")
-            
-            # URL para la actualización de la agenda
-            url = f"http://localhost:8000/crm/agendaAbierta/{agenda_id}/"
+            logger.info(f"Iniciando reserva de agenda {agenda_id} para cliente {cliente_id}")
             
-            # Obtener datos actuales de la agenda
-            response = requests.get(url)
-            if response.status_code != 200:
-                return {
-                    "success": False,
-                    "message": f"No se pudo obtener la agenda: {response.status_code}"
-                }
+            comentarios = comentarios or "Reservada a través del asistente virtual"
             
-            agenda_actual = response.json()
-            
-            # Preparar datos para la actualización
-            data = {
-                "agente": agenda_actual.get('agente'),
-                "fecha": agenda_actual.get('fecha'),
-                "hora": agenda_actual.get('hora'),
-                "cliente": self.cliente_id,
-                "disponible": False,
-                "comentarios": comentarios or "Reservada a través del asistente virtual"
-            }
-            
-            # Realizar la actualización
-            response = requests.put(url, json=data)
+            if usar_http():
+                exito, resultado = _reservar_por_api(agenda_id, cliente_id, comentarios)
+            else:
+                # Una sola transacción: bloquea la agenda, verifica disponibilidad y la asigna
+                exito, resultado = servicio_agenda.reservar_agenda(agenda_id, cliente_id, comentarios)
             
-            if response.status_code == 200:
+            if exito:
                 logger.info(f"Agenda {agenda_id} reservada exitosamente")
                 return {
                     "success": True,
                     "message": "Agenda reservada exitosamente",
-                    "data": response.json()
+                    "data": resultado
                 }
             else:
-                logger.error(f"Error al reservar agenda: {response.status_code}")
+                logger.error(f"Error al reservar agenda: {resultado}")
                 return {
                     "success": False,
-                    "message": f"Error al reservar agenda: {response.status_code}"
+                    "message": f"Error al reservar agenda: {resultado.get('error', resultado)}"
                 }
                 
         except Exception as e:
@@ -214,3 +195,24 @@ class AgendaReservaTool(BaseTool):
                 "success": False,
                 "message": f"Error al reservar agenda: {str(e)}"
             }
+
+
+def _reservar_por_api(agenda_id: int, cliente_id: int, comentarios: str):
+    """Reserva una agenda contra la API remota del CRM (CRM_TRANSPORT=http)."""
+    ruta = f"/crm/agendaAbierta/{agenda_id}/"
+    
+    # Obtener datos actuales de la agenda
+    exito, agenda_actual = llamar_api("GET", ruta, esperado=(200,))
+    if not exito:
+        return False, {"error": f"No se pudo obtener la agenda: {agenda_actual.get('error')}"}
+    
+    # Preparar datos para la actualización
+    data = {
+        "agente": agenda_actual.get('agente'),
+        "fecha": agenda_actual.get('fecha'),
+        "hora": agenda_actual.get('hora'),
+        "cliente": cliente_id,
+        "disponible": False,
+        "comentarios": comentarios
+    }
+    return llamar_api("PUT", ruta, data, esperado=(200,))
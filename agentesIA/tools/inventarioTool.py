@@ -1,6 +1,7 @@
 from typing import Dict, List, Any, Optional, Type, Literal
 from pydantic import BaseModel, Field
 from langchain.tools import BaseTool
+from django.db.models import Q
 from crm.models import PropiedadModel, EdificioModel, LocalidadModel, BarrioModel, ZonaModel
 
 class PropiedadQuerySchema(BaseModel):
@@ -10,6 +11,7 @@ class PropiedadQuerySchema(BaseModel):
     ubicacion: Optional[str] = Field(None, description="Ubicación o zona de la propiedad")
     precio_min: Optional[int] = Field(None, description="Precio mínimo")
     precio_max: Optional[int] = Field(None, description="Precio máximo")
+    tipo_negocio: Optional[str] = Field(None, description="Tipo de negocio (Venta o Renta)")
     habitaciones: Optional[int] = Field(None, description="Número mínimo de habitaciones")
     banos: Optional[int] = Field(None, description="Número mínimo de baños")
     area_min: Optional[int] = Field(None, description="Área mínima en metros cuadrados")
@@ -27,7 +29,8 @@ class InventarioTool(BaseTool):
     
     def _run(self, id: Optional[int] = None, tipo: Optional[str] = None, 
              ubicacion: Optional[str] = None, precio_min: Optional[int] = None, 
-             precio_max: Optional[int] = None, habitaciones: Optional[int] = None,
+             precio_max: Optional[int] = None, tipo_negocio: Optional[str] = None,
+             habitaciones: Optional[int] = None,
              banos: Optional[int] = None, area_min: Optional[int] = None,
              caracteristicas: Optional[List[str]] = None, limit: int = 10) -> Dict[str, Any]:
         """
@@ -56,42 +59,36 @@ class InventarioTool(BaseTool):
                 if edificios.exists():
                     query = query.filter(edificio__in=edificios)
                 
-            if precio_min is not None or precio_max is not None:
-                # Filtrar por precio es más complejo debido a la estructura JSON
-                # Esta es una implementación simplificada
-                filtered_props = []
-                for prop in query:
-                    if not prop.modalidad_de_negocio:
-                        continue
-                        
-                    precio = 0
-                    if isinstance(prop.modalidad_de_negocio, str):
-                        import json
-                        try:
-                            modalidad = json.loads(prop.modalidad_de_negocio)
-                        except:
-                            continue
-                    else:
-                        modalidad = prop.modalidad_de_negocio
-                    
-                    # Obtener precio de venta o renta
-                    if modalidad.get("venta_tradicional", {}).get("activo"):
-                        precio = modalidad.get("venta_tradicional", {}).get("precio", 0)
-                    elif modalidad.get("renta_tradicional", {}).get("activo"):
-                        precio = modalidad.get("renta_tradicional", {}).get("precio", 0)
-                    
-                    # Aplicar filtros de precio
-                    if precio_min is not None and precio < precio_min:
-                        continue
-                    if precio_max is not None and precio > precio_max:
-                        continue
-                        
-                    filtered_props.append(prop.id)
+            # Operación pedida: "venta", "renta" o None (cualquiera)
+            negocio = None
+            if tipo_negocio is not None:
+                if tipo_negocio.lower() == "venta":
+                    negocio = "venta"
+                    query = query.filter(activo_venta=True)
+                elif tipo_negocio.lower() in ("renta", "arriendo", "alquiler"):
+                    negocio = "renta"
+                    query = query.filter(activo_renta=True)
                 
-                if filtered_props:
-                    query = query.filter(id__in=filtered_props)
+            if precio_min is not None or precio_max is not None:
+                # Se filtra sobre las columnas indexadas precio_venta/precio_renta.
+                # Con una operación pedida solo cuenta su precio (una propiedad en
+                # venta y renta se compara por el canon si se busca renta); sin
+                # ella, igual que en el listado: el de venta si está activa, y si
+                # no el de renta.
+                por_venta = Q(activo_venta=True)
+                por_renta = Q(activo_renta=True) if negocio == "renta" else Q(activo_venta=False, activo_renta=True)
+                if precio_min is not None:
+                    por_venta &= Q(precio_venta__gte=precio_min)
+                    por_renta &= Q(precio_renta__gte=precio_min)
+                if precio_max is not None:
+                    por_venta &= Q(precio_venta__lte=precio_max)
+                    por_renta &= Q(precio_renta__lte=precio_max)
+                if negocio == "venta":
+                    query = query.filter(por_venta)
+                elif negocio == "renta":
+                    query = query.filter(por_renta)
                 else:
-                    query = PropiedadModel.objects.none()
+                    query = query.filter(por_venta | por_renta)
             
             if habitaciones is not None:
                 query = query.filter(habitaciones__gte=habitaciones)
@@ -111,29 +108,17 @@ class InventarioTool(BaseTool):
                 # Crear un ID único para la propiedad
                 prop_id = f"prop_{prop.id}"
                 
-                # Extraer modalidad de negocio
-                modalidad = {}
-                if prop.modalidad_de_negocio:
-                    if isinstance(prop.modalidad_de_negocio, str):
-                        import json
-                        try:
-                            modalidad = json.loads(prop.modalidad_de_negocio)
-                        except:
-                            modalidad = {"tipo": "No especificado"}
-                    else:
-                        modalidad = prop.modalidad_de_negocio
-                
-                # Determinar precio basado en modalidad
+                # Determinar precio basado en las columnas de precio
                 precio = 0
                 moneda = "MXN"
-                tipo_negocio = "No especificado"
+                tipo_negocio_prop = "No especificado"
                 
-                if modalidad and "venta_tradicional" in modalidad and modalidad["venta_tradicional"].get("activo"):
-                    precio = modalidad["venta_tradicional"].get("precio", 0)
-                    tipo_negocio = "Venta"
-                elif modalidad and "renta_tradicional" in modalidad and modalidad["renta_tradicional"].get("activo"):
-                    precio = modalidad["renta_tradicional"].get("precio", 0)
-                    tipo_negocio = "Renta"
+                if prop.activo_venta and negocio != "renta":
+                    precio = prop.precio_venta or 0
+                    tipo_negocio_prop = "Venta"
+                elif prop.activo_renta:
+                    precio = prop.precio_renta or 0
+                    tipo_negocio_prop = "Renta"
                 
                 # Obtener características
                 caracteristicas_prop = []
@@ -151,8 +136,8 @@ class InventarioTool(BaseTool):
                     "id": prop.id,
                     "nombre": prop.titulo or f"Propiedad {prop.id}",
                     "tipo": prop.tipo_propiedad or "No especificado",
-                    "tipo_negocio": tipo_negocio,
-                    "precio": precio,
+                    "tipo_negocio": tipo_negocio_prop,
+                    "precio": float(precio),
                     "moneda": moneda,
                     "ubicacion": prop.direccion.get("direccion", "No especificada") if prop.direccion else "No especificada",
                     "superficie": prop.metro_cuadrado_construido or 0,
@@ -186,6 +171,7 @@ class InventarioTool(BaseTool):
                     "ubicacion": ubicacion,
                     "precio_min": precio_min,
                     "precio_max": precio_max,
+                    "tipo_negocio": tipo_negocio,
                     "habitaciones": habitaciones,
                     "banos": banos,
                     "area_min": area_min,
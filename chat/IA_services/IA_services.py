@@ -1,9 +1,11 @@
+import asyncio
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
 import tempfile
 import json
 from .context_builders import AIContextBuilder
+from agentesIA import cache_llm
+from crm.IA.base import async_openai_client, openai_client
 
 
 load_dotenv()
@@ -14,16 +16,35 @@ class AIService:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("No se encontró OPENAI_API_KEY en las variables de entorno")
-        self.client = OpenAI(api_key=api_key)
+        # Clientes compartidos del proceso (pool de conexiones reutilizable)
+        self.client = openai_client()
         self.context_builder = AIContextBuilder()
+
+    @property
+    def async_client(self):
+        # Cliente asíncrono para el chat en streaming desde el consumer de Channels
+        return async_openai_client()
         
     def chat_with_gpt(self, user_message, context_type=None, context_data=None):
         try:
             # Construir el mensaje del sistema según el tipo de contexto
             system_message = self._get_context_message(context_type, context_data)
             
+            # Pregunta casi igual ya respondida en el chat de este edificio
+            contexto = self._contexto_similar(context_type, system_message)
+            vector = None
+            if contexto:
+                vector = self._vector_pregunta(
+                    self.client.embeddings.create(model=cache_llm.MODELO_EMBEDDINGS, input=user_message)
+                )
+                similar = cache_llm.obtener_cache().buscar_similar(contexto, vector)
+                if similar:
+                    print(f"Respuesta servida por similitud para el contexto: {context_type}")
+                    return similar
+            
             print(f"Enviando mensaje a OpenAI con contexto: {context_type}")
-            response = self.client.chat.completions.create(
+            respuesta = cache_llm.completar(
+                self.client,
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": system_message},
@@ -31,12 +52,75 @@ class AIService:
                 ],
                 max_tokens=500
             )
-            return response.choices[0].message.content
+            if vector is not None and respuesta:
+                cache_llm.obtener_cache().guardar_similar(contexto, user_message, vector, respuesta)
+            return respuesta
         except Exception as e:
             error_message = f"Error al comunicarse con OpenAI: {str(e)}"
             print(error_message)
             return error_message
 
+    async def stream_chat(self, user_message, context_type=None, context_data=None, system_message=None):
+        """
+        Versión asíncrona de ``chat_with_gpt`` que va entregando la respuesta por
+        fragmentos (deltas) a medida que OpenAI los genera. ``system_message``
+        permite pasar un prompt ya construido (ver context_cache).
+        """
+        if system_message is None:
+            system_message = self._get_context_message(context_type, context_data)
+
+        # Pregunta casi igual ya respondida en el chat de este edificio
+        contexto = self._contexto_similar(context_type, system_message)
+        vector = None
+        if contexto:
+            try:
+                vector = self._vector_pregunta(
+                    await self.async_client.embeddings.create(model=cache_llm.MODELO_EMBEDDINGS, input=user_message)
+                )
+                similar = await asyncio.to_thread(cache_llm.obtener_cache().buscar_similar, contexto, vector)
+            except Exception as e:
+                print(f"Error en la caché por similitud: {str(e)}")
+                vector = similar = None
+            if similar:
+                print(f"Respuesta servida por similitud para el contexto: {context_type}")
+                yield similar
+                return
+
+        print(f"Enviando mensaje a OpenAI (streaming) con contexto: {context_type}")
+        stream = await self.async_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            max_tokens=500,
+            stream=True
+        )
+        partes = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    partes.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Si el consumer cancela la tarea se cierra la conexión HTTP con OpenAI
+            await stream.close()
+
+        # Solo se guarda una respuesta completa (si se cancela no se llega aquí)
+        if vector is not None and partes:
+            await asyncio.to_thread(
+                cache_llm.obtener_cache().guardar_similar, contexto, user_message, vector, ''.join(partes)
+            )
+
+    def _contexto_similar(self, context_type, system_message):
+        """Clave de la caché por similitud: solo en el chat de edificios y si está activada."""
+        if not cache_llm.LLM_CACHE_SEMANTICO or context_type != 'edificio':
+            return None
+        return cache_llm.clave("gpt-4o-mini", system_message)
+
+    def _vector_pregunta(self, respuesta_embeddings):
+        return cache_llm.vector_normalizado(respuesta_embeddings.data[0].embedding)
+
     def _get_context_message(self, context_type, context_data):
         context_builders = {
             'edificio': self.context_builder.build_edificio_context,
@@ -0,0 +1,77 @@
+"""
+Caché compartida del contexto de los chats (edificio, propiedad, localidad).
+
+Para cada objeto se guarda en la caché de Django el diccionario de datos y el
+prompt de sistema ya construido, bajo la clave ``(tipo, id, versión)``. La
+versión de cada objeto cambia cuando se guarda o elimina (ver
+``chat/signals.py``), así que una conexión nueva al mismo chat no toca la base
+de datos ni vuelve a construir el prompt mientras el objeto no cambie.
+
+La versión vive en la caché de Django, que debe ser compartida entre procesos
+(ver ``igh/cache.py``): con una caché en memoria la invalidación solo la vería
+el worker que guardó el objeto y el resto seguiría sirviendo el contexto viejo.
+
+Configuración por variables de entorno:
+    CHAT_CONTEXTO_TTL  segundos que vive un contexto en caché (por defecto 3600)
+"""
+import os
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from ..data_services.data_fetchers import DataFetcher
+from .context_builders import AIContextBuilder
+
+CHAT_CONTEXTO_TTL = int(os.getenv("CHAT_CONTEXTO_TTL", 3600))
+
+# tipo de contexto -> (obtiene los datos, construye el prompt)
+CONTEXTOS = {
+    'edificio': (DataFetcher.edificio_data, AIContextBuilder.build_edificio_context),
+    'propiedad': (DataFetcher.propiedad_data, AIContextBuilder.build_propiedad_context),
+    'localidad': (DataFetcher.localidad_data, AIContextBuilder.build_localidad_context),
+}
+
+
+def _clave_version(context_type, item_id):
+    return f'chat:contexto:version:{context_type}:{item_id}'
+
+
+def version(context_type, item_id):
+    clave = _clave_version(context_type, item_id)
+    actual = cache.get(clave)
+    if actual is None:
+        actual = time.time_ns()
+        if not cache.add(clave, actual, None):
+            actual = cache.get(clave, actual)
+    return actual
+
+
+def invalidar(context_type, item_id):
+    """Cambia la versión del objeto; su contexto se recalcula en el próximo uso."""
+    cache.set(_clave_version(context_type, str(item_id)), time.time_ns(), None)
+
+
+def obtener_contexto(context_type, item_id):
+    """
+    Devuelve ``{'data': ..., 'prompt': ...}`` para el objeto, o None si el tipo
+    de contexto no es válido o el objeto no existe.
+    """
+    if context_type not in CONTEXTOS:
+        return None
+    item_id = str(item_id)
+
+    clave = f'chat:contexto:{context_type}:{item_id}:{version(context_type, item_id)}'
+    contexto = cache.get(clave)
+    if contexto is None:
+        fetcher, builder = CONTEXTOS[context_type]
+        data = fetcher(item_id)
+        if data is None:
+            return None
+        contexto = {'data': data, 'prompt': builder(data)}
+        cache.set(clave, contexto, CHAT_CONTEXTO_TTL)
+        print(f"Contexto de chat construido: {context_type} {item_id}")
+    return contexto
+
+
+aobtener_contexto = sync_to_async(obtener_contexto)
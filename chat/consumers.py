@@ -1,31 +1,47 @@
+import asyncio
 import json
+import os
+import time
+import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
-from asgiref.sync import sync_to_async
 from .IA_services.IA_services import AIService
 from crm.models import EdificioModel
-from .data_services.data_fetchers import DataFetcher
+from .IA_services.context_cache import aobtener_contexto
+
+# Los deltas de una respuesta se agrupan y se envían al grupo como mucho cada
+# CHAT_DELTA_MS milisegundos: en una sala con muchos clientes (y con Redis,
+# varios procesos) cada group_send se reparte a todos, así que enviar un mensaje
+# por token multiplica el tráfico sin que el usuario note la diferencia.
+# Con 0 se envía cada delta por separado.
+CHAT_DELTA_MS = int(os.getenv("CHAT_DELTA_MS", 50))
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
         self.ai_service = AIService()
-        
+        self.context_type = None
+        self.context_data = None
+        self.system_message = None
+        # Respuestas en curso; se cancelan si el cliente se desconecta
+        self.respuestas = set()
+
         # Extraer el tipo de contexto y el ID del room_name
         context_info = self.room_name.split('_')
         if len(context_info) >= 2:
             self.context_type = context_info[0]
             self.item_id = context_info[1]
-            
-            # Obtener el contexto según el tipo
-            fetcher = DataFetcher()
-            if self.context_type == 'edificio':
-                self.context_data = await fetcher.get_edificio_data(self.item_id)
-            elif self.context_type == 'propiedad':
-                self.context_data = await fetcher.get_propiedad_data(self.item_id)
-            elif self.context_type == 'localidad':
-                self.context_data = await fetcher.get_localidad_data(self.item_id)
-        
+
+            # Contexto y prompt de sistema compartidos entre conexiones (caché)
+            try:
+                contexto = await aobtener_contexto(self.context_type, self.item_id)
+            except Exception as e:
+                print(f"Error al obtener el contexto del chat {self.room_name}: {str(e)}")
+                contexto = None
+            if contexto:
+                self.context_data = contexto['data']
+                self.system_message = contexto['prompt']
+
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
@@ -33,6 +49,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, close_code):
+        for tarea in self.respuestas:
+            tarea.cancel()
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
@@ -41,7 +59,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         data = json.loads(text_data)
         message = data.get('message', '')
-        
+
         # Enviar mensaje del usuario al chat
         await self.channel_layer.group_send(
             self.room_group_name,
@@ -51,29 +69,74 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 'is_user': True
             }
         )
-        
-        # Procesar con OpenAI usando el contexto
-        respuesta = await sync_to_async(self.ai_service.chat_with_gpt)(
-            message, 
-            self.context_type, 
-            self.context_data
-        )
-        
-        # Enviar respuesta de OpenAI
+
+        # La respuesta se genera en una tarea aparte para no bloquear el consumer
+        tarea = asyncio.create_task(self.responder(message))
+        self.respuestas.add(tarea)
+        tarea.add_done_callback(self.respuestas.discard)
+
+    async def responder(self, message):
+        """Envía la respuesta de OpenAI al grupo como deltas y luego el mensaje completo."""
+        message_id = uuid.uuid4().hex
+        partes = []
+        pendientes = 0
+        ultimo_envio = 0.0
+        try:
+            async for delta in self.ai_service.stream_chat(
+                message, self.context_type, self.context_data, system_message=self.system_message
+            ):
+                partes.append(delta)
+                pendientes += 1
+                if time.monotonic() - ultimo_envio >= CHAT_DELTA_MS / 1000:
+                    await self.enviar_delta(message_id, partes[-pendientes:])
+                    pendientes = 0
+                    ultimo_envio = time.monotonic()
+            if pendientes:
+                await self.enviar_delta(message_id, partes[-pendientes:])
+            respuesta = ''.join(partes)
+        except asyncio.CancelledError:
+            print(f"Respuesta {message_id} cancelada: el cliente se desconectó")
+            raise
+        except Exception as e:
+            respuesta = f"Error al comunicarse con OpenAI: {str(e)}"
+            print(respuesta)
+
+        # Enviar respuesta completa de OpenAI
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
+                'id': message_id,
                 'message': respuesta,
                 'is_user': False
             }
         )
 
+    async def enviar_delta(self, message_id, deltas):
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat_delta',
+                'id': message_id,
+                'delta': ''.join(deltas)
+            }
+        )
+
+    async def chat_delta(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'delta',
+            'id': event['id'],
+            'delta': event['delta'],
+            'is_user': False
+        }))
+
     async def chat_message(self, event):
         message = event['message']
         is_user = event['is_user']
 
         await self.send(text_data=json.dumps({
+            'type': 'message',
+            'id': event.get('id'),
             'message': message,
             'is_user': is_user
-        })) 
\ No newline at end of file
+        }))
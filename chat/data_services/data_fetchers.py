@@ -2,10 +2,14 @@ from asgiref.sync import sync_to_async
 from crm.models import EdificioModel, PropiedadModel, LocalidadModel
 
 class DataFetcher:
+    # Versiones síncronas (usadas por chat/IA_services/context_cache.py); las
+    # get_*_data asíncronas de abajo las envuelven para los consumers y vistas async.
+    # Devuelven None si el objeto no existe.
     @staticmethod
-    @sync_to_async
-    def get_edificio_data(edificio_id):
-        edificio = EdificioModel.objects.get(id=edificio_id)
+    def edificio_data(edificio_id):
+        edificio = EdificioModel.objects.filter(id=edificio_id).first()
+        if edificio is None:
+            return None
         return {
             'nombre': edificio.nombre,
             'direccion': edificio.direccion,
@@ -21,9 +25,10 @@ class DataFetcher:
         }
 
     @staticmethod
-    @sync_to_async
-    def get_propiedad_data(propiedad_id):
-        propiedad = PropiedadModel.objects.get(id=propiedad_id)
+    def propiedad_data(propiedad_id):
+        propiedad = PropiedadModel.objects.filter(id=propiedad_id).first()
+        if propiedad is None:
+            return None
         return {
             'titulo': propiedad.titulo,
             'tipo_propiedad': propiedad.tipo_propiedad,
@@ -45,16 +50,20 @@ class DataFetcher:
         }
 
     @staticmethod
-    @sync_to_async
-    def get_localidad_data(localidad_id):
-        try:
-            localidad = LocalidadModel.objects.get(id=localidad_id)
-        except LocalidadModel.DoesNotExist:
-            return None  # O manejar el error de otra manera según tu lógica
+    def localidad_data(localidad_id):
+        localidad = LocalidadModel.objects.filter(id=localidad_id).first()
+        if localidad is None:
+            return None
 
+        # zonas_de_interes es una ForeignKey (una sola zona), no una colección
         zonas_de_interes = localidad.zonas_de_interes
         return {
             'nombre': localidad.nombre,
             'descripcion': localidad.descripcion,
-            'zonas_de_interes': list(zonas_de_interes.all().values_list('nombre', flat=True)) if zonas_de_interes else []
-        } 
\ No newline at end of file
+            'zonas_de_interes': [zonas_de_interes.nombre] if zonas_de_interes else []
+        }
+
+    get_edificio_data = staticmethod(sync_to_async(edificio_data.__func__))
+    get_propiedad_data = staticmethod(sync_to_async(propiedad_data.__func__))
+    get_localidad_data = staticmethod(sync_to_async(localidad_data.__func__))
+ 
\ No newline at end of file
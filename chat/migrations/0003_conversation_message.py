@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_mensajes(apps, schema_editor):
+    """Pasa el JSON de ``messages`` a filas de ConversationMessage."""
+    ConversationHistory = apps.get_model('chat', 'ConversationHistory')
+    ConversationMessage = apps.get_model('chat', 'ConversationMessage')
+
+    for historial in ConversationHistory.objects.iterator(chunk_size=200):
+        # El mensaje de sistema no se guarda: es fijo y se agrega al cargar la ventana
+        mensajes = [m for m in (historial.messages or [])
+                    if isinstance(m, dict) and m.get('role') in ('user', 'assistant')]
+        ConversationMessage.objects.bulk_create([
+            ConversationMessage(conversation_id=historial.pk, seq=seq, role=m['role'], content=m.get('content') or '')
+            for seq, m in enumerate(mensajes, start=1)
+        ], batch_size=1000)
+        ConversationHistory.objects.filter(pk=historial.pk).update(ultimo_seq=len(mensajes))
+
+
+def restaurar_mensajes(apps, schema_editor):
+    """Reconstruye el JSON de ``messages`` a partir de las filas (reversa de copiar_mensajes)."""
+    ConversationHistory = apps.get_model('chat', 'ConversationHistory')
+    ConversationMessage = apps.get_model('chat', 'ConversationMessage')
+
+    for historial in ConversationHistory.objects.iterator(chunk_size=200):
+        mensajes = [
+            {'role': role, 'content': content, 'timestamp': creado.isoformat()}
+            for role, content, creado in ConversationMessage.objects.filter(conversation_id=historial.pk)
+            .order_by('seq').values_list('role', 'content', 'created_at').iterator(chunk_size=1000)
+        ]
+        ConversationHistory.objects.filter(pk=historial.pk).update(messages=mensajes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_alter_conversationhistory_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationhistory',
+            name='resumen',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='conversationhistory',
+            name='resumen_hasta',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversationhistory',
+            name='ultimo_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='conversationhistory',
+            name='user_id',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='ConversationMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('role', models.CharField(choices=[('system', 'Sistema'), ('user', 'Usuario'), ('assistant', 'Asistente')], max_length=10)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mensajes', to='chat.conversationhistory')),
+            ],
+            options={
+                'ordering': ['conversation', 'seq'],
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'seq'), name='mensaje_seq_unico')],
+            },
+        ),
+        migrations.RunPython(copiar_mensajes, restaurar_mensajes),
+        migrations.RemoveField(
+            model_name='conversationhistory',
+            name='messages',
+        ),
+    ]
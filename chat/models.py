@@ -1,6 +1,12 @@
-from django.db import models
+import os
+from django.db import models, transaction
 from django.contrib.auth.models import User
-import datetime
+from django.utils import timezone
+
+# Mensajes recientes que se envían al modelo en cada turno
+VENTANA_MENSAJES = int(os.getenv("CHAT_VENTANA_MENSAJES", 20))
+# Mensajes fuera de la ventana que se acumulan antes de actualizar el resumen
+LOTE_RESUMEN = int(os.getenv("CHAT_LOTE_RESUMEN", 10))
 
 
 # Create your models here.
@@ -18,8 +24,12 @@ class MessageModel(models.Model):
         return f"{self.sender.username} in {self.room.name}: {self.content}"
 
 class ConversationHistory(models.Model):
-    user_id = models.CharField(max_length=100)
-    messages = models.JSONField(default=list)
+    user_id = models.CharField(max_length=100, db_index=True)
+    # Resumen de los mensajes que ya salieron de la ventana (ver ventana())
+    resumen = models.TextField(blank=True, default='')
+    # Último seq incluido en el resumen y último seq asignado a un mensaje
+    resumen_hasta = models.PositiveIntegerField(default=0)
+    ultimo_seq = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -32,14 +42,88 @@ class ConversationHistory(models.Model):
     
     def add_message(self, role, content):
         """Añade un mensaje al historial."""
-        self.messages.append({
-            'role': role,
-            'content': content,
-            'timestamp': datetime.datetime.now().isoformat()
-        })
-        self.save()
+        self.agregar_mensajes([(role, content)])
+
+    def agregar_mensajes(self, mensajes):
+        """
+        Agrega mensajes ``(role, content)`` al final de la conversación.
+        Solo inserta filas nuevas; no reescribe los mensajes anteriores.
+        """
+        if not mensajes:
+            return
+        with transaction.atomic():
+            # Bloquear la fila para asignar los seq sin choques entre peticiones
+            ultimo_seq = (ConversationHistory.objects.select_for_update()
+                          .values_list('ultimo_seq', flat=True).get(pk=self.pk))
+            ConversationMessage.objects.bulk_create([
+                ConversationMessage(conversation_id=self.pk, seq=ultimo_seq + i, role=role, content=content)
+                for i, (role, content) in enumerate(mensajes, start=1)
+            ])
+            self.ultimo_seq = ultimo_seq + len(mensajes)
+            ConversationHistory.objects.filter(pk=self.pk).update(
+                ultimo_seq=self.ultimo_seq, updated_at=timezone.now()
+            )
+
+    def ventana(self):
+        """
+        Mensajes que todavía no están en el resumen, como lista de ``(role, content)``
+        en orden. Son los últimos ``VENTANA_MENSAJES`` más los que esperan a
+        completar un lote de ``compactar`` (menos de ``LOTE_RESUMEN``): el lote solo
+        retrasa el resumen, ningún mensaje queda fuera de ambos. Lee solo esas filas
+        gracias al índice (conversation, seq).
+        """
+        return list(
+            self.mensajes.filter(seq__gt=self.resumen_hasta)
+            .order_by('seq').values_list('role', 'content')
+        )
+
+    def compactar(self, resumir, limite=VENTANA_MENSAJES, lote=LOTE_RESUMEN):
+        """
+        Incorpora al resumen los mensajes que quedaron fuera de la ventana.
+        ``resumir(resumen_anterior, mensajes)`` devuelve el nuevo resumen. Solo se
+        ejecuta cuando hay al menos ``lote`` mensajes pendientes, así el costo por
+        turno sigue siendo constante.
+        """
+        hasta = self.ultimo_seq - limite
+        if hasta - self.resumen_hasta < lote:
+            return False
+        pendientes = list(
+            self.mensajes.filter(seq__gt=self.resumen_hasta, seq__lte=hasta)
+            .order_by('seq').values_list('role', 'content')
+        )
+        self.resumen = resumir(self.resumen, pendientes)
+        self.resumen_hasta = hasta
+        self.save(update_fields=['resumen', 'resumen_hasta', 'updated_at'])
+        return True
     
     def clear_history(self):
         """Limpia el historial de mensajes."""
-        self.messages = []
-        self.save()
\ No newline at end of file
+        with transaction.atomic():
+            self.mensajes.all().delete()
+            self.resumen = ''
+            self.resumen_hasta = 0
+            self.ultimo_seq = 0
+            self.save(update_fields=['resumen', 'resumen_hasta', 'ultimo_seq', 'updated_at'])
+
+
+class ConversationMessage(models.Model):
+    ROLE_CHOICES = [
+        ('system', 'Sistema'),
+        ('user', 'Usuario'),
+        ('assistant', 'Asistente'),
+    ]
+
+    conversation = models.ForeignKey(ConversationHistory, on_delete=models.CASCADE, related_name='mensajes')
+    seq = models.PositiveIntegerField()
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['conversation', 'seq']
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='mensaje_seq_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.role} #{self.seq}: {self.content[:50]}"
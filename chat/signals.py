@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from crm.models import EdificioModel, LocalidadModel, PropiedadModel, ZonasDeInteresModel
+
+from .IA_services import context_cache
+
+# Modelo -> tipo de contexto de chat que lo usa
+TIPOS_CONTEXTO = {
+    EdificioModel: 'edificio',
+    PropiedadModel: 'propiedad',
+    LocalidadModel: 'localidad',
+}
+
+
+def contexto_modificado(sender, instance, **kwargs):
+    context_cache.invalidar(TIPOS_CONTEXTO[sender], instance.pk)
+
+
+for modelo in TIPOS_CONTEXTO:
+    post_save.connect(contexto_modificado, sender=modelo, dispatch_uid=f'chat_contexto_save_{modelo.__name__}')
+    post_delete.connect(contexto_modificado, sender=modelo, dispatch_uid=f'chat_contexto_delete_{modelo.__name__}')
+
+
+@receiver(post_save, sender=ZonasDeInteresModel)
+def zona_de_interes_guardada(sender, instance, **kwargs):
+    # El contexto de una localidad incluye el nombre de su zona de interés
+    for localidad_id in instance.localidades.values_list('id', flat=True):
+        context_cache.invalidar('localidad', localidad_id)
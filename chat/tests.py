@@ -1,3 +1,195 @@
-from django.test import TestCase
+import datetime
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from langchain_core.messages import AIMessage, SystemMessage
+
+from agentesIA import agente, intenciones
+from agentesIA.historial import HISTORIAL_TOKENS, tokens_mensaje
+from crm.models import EdificioModel
+
+from .IA_services import context_cache
+from .models import LOTE_RESUMEN, VENTANA_MENSAJES, ConversationHistory
+
+
+class ContextoChatTests(TestCase):
+    """GET /chat/api/get_context_data/<tipo>/<id>/ y la caché de contexto."""
+
+    def test_objeto_inexistente_devuelve_404(self):
+        for tipo in ('edificio', 'propiedad', 'localidad'):
+            respuesta = self.client.get(f'/chat/api/get_context_data/{tipo}/999999/')
+            self.assertEqual(respuesta.status_code, 404, tipo)
+
+    def test_tipo_no_valido_devuelve_400(self):
+        self.assertEqual(self.client.get('/chat/api/get_context_data/barrio/1/').status_code, 400)
+
+    def test_guardar_invalida_el_contexto(self):
+        edificio = EdificioModel.objects.create(nombre='Torre 93')
+        self.assertEqual(context_cache.obtener_contexto('edificio', edificio.id)['data']['nombre'], 'Torre 93')
+
+        edificio.nombre = 'Torre 94'
+        edificio.save()
+        contexto = context_cache.obtener_contexto('edificio', edificio.id)
+        self.assertEqual(contexto['data']['nombre'], 'Torre 94')
+        self.assertIn('Torre 94', contexto['prompt'])
+
+
+class LLMFalso:
+    """Cuenta las llamadas al modelo separando respuestas y resúmenes."""
+
+    def __init__(self):
+        self.respuestas = 0
+        self.resumenes = 0
+        # Tokens de los mensajes literales (sin los de sistema) de cada respuesta
+        self.tokens_literales = []
+
+    def invoke(self, mensajes):
+        if str(mensajes[-1].content).startswith('Resume la conversación'):
+            self.resumenes += 1
+            return AIMessage(content=f'Resumen {self.resumenes}')
+        self.respuestas += 1
+        self.tokens_literales.append(sum(tokens_mensaje(m) for m in mensajes if not isinstance(m, SystemMessage)))
+        return AIMessage(content=f'Respuesta {self.respuestas}')
+
+
+class ChatConAgenteTests(TestCase):
+    """POST /chat/api/chat_with_agent/ con historial por ventana y resumen."""
+
+    def conversar(self, llm, turnos, mensaje='Cuéntame sobre el proceso de compra'):
+        with mock.patch.object(agente, 'llm', llm):
+            for turno in range(turnos):
+                respuesta = self.client.post(
+                    '/chat/api/chat_with_agent/',
+                    data=json.dumps({'message': f'{mensaje} {turno}', 'cliente_id': '7'}),
+                    content_type='application/json',
+                )
+                self.assertEqual(respuesta.status_code, 200)
+
+    def test_llamadas_al_modelo_por_turno(self):
+        llm = LLMFalso()
+        turnos = 30
+        self.conversar(llm, turnos)
+
+        # Una respuesta por turno y un resumen cada LOTE_RESUMEN mensajes fuera de la ventana,
+        # sin resúmenes adicionales de acotar_mensajes
+        self.assertEqual(llm.respuestas, turnos)
+        self.assertEqual(llm.resumenes, (2 * turnos - VENTANA_MENSAJES) // LOTE_RESUMEN)
+        historial = ConversationHistory.objects.get(user_id='7')
+        self.assertEqual(historial.ultimo_seq, 2 * turnos)
+        self.assertEqual(historial.resumen, f'Resumen {llm.resumenes}')
+
+    def test_la_ventana_respeta_el_limite_de_tokens(self):
+        llm = LLMFalso()
+        self.conversar(llm, 15, mensaje='Busco un apartamento con balcón y buena luz ' * 40)
+        self.assertEqual(llm.respuestas, 15)
+        # Cada mensaje ronda los 400 tokens: sin el límite la ventana llegaría a unos 4.000
+        self.assertLessEqual(max(llm.tokens_literales), HISTORIAL_TOKENS)
+
+
+class VentanaHistorialTests(TestCase):
+    """Ventana de ConversationHistory: cada mensaje está en el resumen o en la ventana."""
+
+    def test_mensajes_pendientes_de_resumir_siguen_en_la_ventana(self):
+        historial = ConversationHistory.objects.create(user_id='7')
+        historial.agregar_mensajes([('user' if n % 2 else 'assistant', f'm{n}') for n in range(1, 39)])
+        historial.resumen_hasta = 10
+        historial.save(update_fields=['resumen_hasta'])
+
+        self.assertEqual([content for _, content in historial.ventana()], [f'm{n}' for n in range(11, 39)])
+        self.assertFalse(historial.compactar(lambda resumen, mensajes: 'nuevo'))
+
+        historial.agregar_mensajes([('user', 'm39'), ('assistant', 'm40')])
+        self.assertTrue(historial.compactar(lambda resumen, mensajes: f'{resumen}+{len(mensajes)}'))
+        self.assertEqual(historial.resumen, '+10')
+        self.assertEqual([content for _, content in historial.ventana()], [f'm{n}' for n in range(21, 41)])
+
+
+class MigracionMensajesTests(TransactionTestCase):
+    """chat.0003 pasa el JSON de messages a filas y la reversa lo reconstruye."""
+
+    antes = [('chat', '0002_alter_conversationhistory_options_and_more')]
+    despues = [('chat', '0003_conversation_message')]
+
+    def migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(destino)
+        return executor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        self.migrar(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_ida_y_vuelta(self):
+        apps = self.migrar(self.despues)
+        historial = apps.get_model('chat', 'ConversationHistory').objects.create(user_id='7', ultimo_seq=2)
+        mensaje = apps.get_model('chat', 'ConversationMessage').objects
+        mensaje.create(conversation_id=historial.pk, seq=1, role='user', content='hola')
+        mensaje.create(conversation_id=historial.pk, seq=2, role='assistant', content='¿en qué te ayudo?')
+
+        apps = self.migrar(self.antes)
+        mensajes = apps.get_model('chat', 'ConversationHistory').objects.get(pk=historial.pk).messages
+        self.assertEqual([(m['role'], m['content']) for m in mensajes],
+                         [('user', 'hola'), ('assistant', '¿en qué te ayudo?')])
+
+        apps = self.migrar(self.despues)
+        self.assertEqual(list(apps.get_model('chat', 'ConversationMessage').objects
+                              .filter(conversation_id=historial.pk).order_by('seq').values_list('content', flat=True)),
+                         ['hola', '¿en qué te ayudo?'])
+
+
+class DetectarIntencionTests(SimpleTestCase):
+    """Ruta y datos que detectar_intencion extrae de mensajes típicos de NORA."""
+
+    # Miércoles
+    hoy = datetime.date(2025, 3, 12)
+
+    def detectar(self, mensaje):
+        return intenciones.detectar_intencion(mensaje, hoy=self.hoy)
+
+    def assertRuta(self, casos):
+        for mensaje, ruta in casos.items():
+            self.assertEqual(self.detectar(mensaje).ruta, ruta, mensaje)
+
+    def test_rutas(self):
+        self.assertRuta({
+            'Busco casas en venta en Medellín': intenciones.PROPIEDADES,
+            'Muéstrame mi agenda del fin de semana': intenciones.AGENDA,
+            'Quiero agendar una cita con Ana mañana a las 3 para ver propiedades en el centro': intenciones.CREAR_CITA,
+            '¿Qué disponibilidad hay para una visita el próximo sábado?': intenciones.DISPONIBILIDAD,
+            '¿Cuándo tienes horario disponible la próxima semana?': intenciones.DISPONIBILIDAD,
+        })
+
+    def test_tildes_y_mayusculas(self):
+        self.assertRuta({
+            'QUIERO UNA CITA EL 2025-03-20': intenciones.CREAR_CITA,
+            'BUSCO CASAS EN VENTA EN MEDELLÍN': intenciones.PROPIEDADES,
+            '¿QUÉ DISPONIBILIDAD HAY PARA UNA VISITA EL PRÓXIMO SÁBADO?': intenciones.DISPONIBILIDAD,
+        })
+        intencion = self.detectar('Quiero ver apartamentos ECONÓMICOS en arriendo en Bogotá con balcón')
+        self.assertEqual(intencion.texto, 'quiero ver apartamentos economicos en arriendo en bogota con balcon')
+        self.assertEqual(intencion.criterios(), {
+            'tipo': 'apartamento', 'ubicacion': 'bogota', 'caracteristicas': ['Balcón'],
+            'precio_max': 300000, 'tipo_negocio': 'Renta',
+        })
+
+    def test_mensaje_general(self):
+        for mensaje in ('Hola, buenas tardes', 'HOLA, ¿CÓMO ESTÁS?'):
+            intencion = self.detectar(mensaje)
+            self.assertEqual(intencion.ruta, 'general', mensaje)
+            self.assertEqual(intencion.palabras, {}, mensaje)
+            self.assertEqual(intencion.criterios(), {}, mensaje)
+
+    def test_datos_de_la_cita(self):
+        intencion = self.detectar('Necesito una cita con el agente 12 el 14 de marzo de 2025 a las 14:30')
+        self.assertEqual((intencion.fecha, intencion.referencia_fecha), (datetime.date(2025, 3, 14), 'natural'))
+        self.assertEqual((intencion.hora, intencion.agente_id), ('14:30:00', '12'))
+
+        intencion = self.detectar('Quiero agendar una cita con Ana mañana a las 3 para ver propiedades en el centro')
+        self.assertEqual((intencion.fecha, intencion.referencia_fecha), (datetime.date(2025, 3, 13), 'manana'))
+        self.assertEqual((intencion.hora, intencion.notas), ('03:00:00', 'propiedades en el centro'))
+
+        intencion = self.detectar('¿Qué disponibilidad hay para una visita el PRÓXIMO SÁBADO?')
+        self.assertEqual((intencion.fecha, intencion.referencia_fecha), (datetime.date(2025, 3, 15), 'proximo sabado'))
@@ -1,11 +1,10 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from crm.models import EdificioModel, PropiedadModel, LocalidadModel
 from django.http import JsonResponse
-from .data_services.data_fetchers import DataFetcher
-from .IA_services.context_builders import AIContextBuilder
+from .IA_services import context_cache
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from agentesIA.agente import procesar_mensaje
+from agentesIA.agente import procesar_mensaje, resumir_conversacion, SYSTEM_MESSAGE
 from langchain_core.messages import HumanMessage, AIMessage
 from agentesIA.tools.requerimientoTool import get_requerimiento_tool
 
@@ -34,20 +33,14 @@ def chat_room(request, room_name):
     })
 
 async def get_context_data(request, context_type, item_id):
-    fetcher = DataFetcher()
-    
-    context_methods = {
-        'edificio': fetcher.get_edificio_data,
-        'propiedad': fetcher.get_propiedad_data,
-        'localidad': fetcher.get_localidad_data,
-    }
-    
-    if context_type not in context_methods:
+    if context_type not in context_cache.CONTEXTOS:
         return JsonResponse({'error': 'Tipo de contexto no válido'}, status=400)
     
     try:
-        data = await context_methods[context_type](item_id)
-        return JsonResponse(data)
+        contexto = await context_cache.aobtener_contexto(context_type, item_id)
+        if contexto is None:
+            return JsonResponse({'error': f'No se encontró {context_type} con ID {item_id}'}, status=404)
+        return JsonResponse(contexto['data'])
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
     
@@ -88,21 +81,11 @@ def chat_context(request):
 async def chat_room_context(request, room_name, context_type, item_id):
     print(f"DEBUG - Entrando a chat_room_context: type={context_type}, id={item_id}")  # DEBUG
     
-    fetcher = DataFetcher()
-    
     try:
-        if context_type == 'edificio':
-            print("DEBUG - Procesando contexto de edificio")  # DEBUG
-            edificio_data = await fetcher.get_edificio_data(item_id)
-            context_agent = AIContextBuilder.build_edificio_context(edificio_data)
-        elif context_type == 'propiedad':
-            print("DEBUG - Procesando contexto de propiedad")  # DEBUG
-            propiedad_data = await fetcher.get_propiedad_data(item_id)
-            context_agent = AIContextBuilder.build_propiedad_context(propiedad_data)
-        elif context_type == 'localidad':
-            print("DEBUG - Procesando contexto de localidad")  # DEBUG
-            localidad_data = await fetcher.get_localidad_data(item_id)
-            context_agent = AIContextBuilder.build_localidad_context(localidad_data)
+        if context_type in context_cache.CONTEXTOS:
+            # El prompt ya construido se comparte con el consumer del websocket
+            contexto = await context_cache.aobtener_contexto(context_type, item_id)
+            context_agent = contexto['prompt'] if contexto else f"No se encontró {context_type} con ID {item_id}."
         else:
             print(f"DEBUG - Tipo de contexto no válido: {context_type}")  # DEBUG
             context_agent = "Tipo de contexto no válido."
@@ -131,55 +114,60 @@ def chat_with_agent(request):
         cliente_id = data.get('cliente_id')
         print(f"Cliente ID recibido en la solicitud: {cliente_id}")
         
-        # Recuperar el historial de conversación de la base de datos
-        historial_mensajes = []
+        # Recuperar solo la ventana reciente del historial y su resumen
+        from langchain_core.messages import SystemMessage
+        from chat.models import ConversationHistory
+        historial = None
+        historial_langchain = []
         if cliente_id:
             try:
-                from chat.models import ConversationHistory
                 historial, created = ConversationHistory.objects.get_or_create(user_id=cliente_id)
-                historial_mensajes = historial.messages
-                print(f"Historial recuperado para cliente {cliente_id}: {len(historial_mensajes)} mensajes")
+                if historial.ultimo_seq:
+                    historial_langchain.append(SystemMessage(content=SYSTEM_MESSAGE))
+                    if historial.resumen:
+                        historial_langchain.append(SystemMessage(
+                            content=f"Resumen de la conversación anterior con el cliente:\n{historial.resumen}"
+                        ))
+                    for role, content in historial.ventana():
+                        if role == 'user':
+                            historial_langchain.append(HumanMessage(content=content))
+                        elif role == 'assistant':
+                            historial_langchain.append(AIMessage(content=content))
+                print(f"Historial recuperado para cliente {cliente_id}: {historial.ultimo_seq} mensajes, "
+                      f"{len(historial_langchain)} en la ventana")
             except Exception as e:
                 print(f"Error al recuperar historial: {str(e)}")
-                historial_mensajes = []
-        
-        # Convertir el historial a objetos de LangChain
-        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-        historial_langchain = []
-        
-        if historial_mensajes:
-            for msg in historial_mensajes:
-                if msg.get('role') == 'user':
-                    historial_langchain.append(HumanMessage(content=msg.get('content', '')))
-                elif msg.get('role') == 'assistant':
-                    historial_langchain.append(AIMessage(content=msg.get('content', '')))
-                elif msg.get('role') == 'system':
-                    historial_langchain.append(SystemMessage(content=msg.get('content', '')))
+                historial = None
+                historial_langchain = []
         
         # Procesar el mensaje usando el agente
-        respuesta, nuevo_historial = procesar_mensaje(mensaje, historial_langchain, cliente_id)
+        # ConversationHistory ya resume lo que sale de la ventana; el agente solo
+        # aplica el límite de tokens
+        respuesta, nuevo_historial = procesar_mensaje(
+            mensaje, list(historial_langchain), cliente_id, historial_acotado=historial is not None
+        )
         
-        # Guardar el nuevo historial en la base de datos
-        if cliente_id:
+        # Guardar solo los mensajes nuevos de este turno
+        if historial is not None:
             try:
-                from chat.models import ConversationHistory
-                historial, created = ConversationHistory.objects.get_or_create(user_id=cliente_id)
-                
-                # Convertir el historial de LangChain a formato JSON
-                historial_json = []
-                for msg in nuevo_historial:
-                    if isinstance(msg, HumanMessage):
-                        historial_json.append({'role': 'user', 'content': msg.content})
-                    elif isinstance(msg, AIMessage):
-                        historial_json.append({'role': 'assistant', 'content': msg.content})
-                    elif isinstance(msg, SystemMessage):
-                        historial_json.append({'role': 'system', 'content': msg.content})
-                
-                historial.messages = historial_json
-                historial.save()
-                print(f"Historial guardado para cliente {cliente_id}: {len(historial_json)} mensajes")
+                nuevos = [HumanMessage(content=mensaje)]
+                nuevos += [msg for msg in nuevo_historial[len(historial_langchain) + 1:] if isinstance(msg, AIMessage)]
+                if len(nuevos) == 1 and isinstance(respuesta, str):
+                    nuevos.append(AIMessage(content=respuesta))
+                historial.agregar_mensajes([
+                    ('user' if isinstance(msg, HumanMessage) else 'assistant', msg.content)
+                    for msg in nuevos if msg.content
+                ])
+                print(f"Historial guardado para cliente {cliente_id}: {historial.ultimo_seq} mensajes")
             except Exception as e:
                 print(f"Error al guardar historial: {str(e)}")
+            
+            # Resumir los mensajes que salieron de la ventana (solo cada LOTE_RESUMEN mensajes)
+            try:
+                if historial.compactar(resumir_conversacion):
+                    print(f"Resumen actualizado para cliente {cliente_id} hasta el mensaje {historial.resumen_hasta}")
+            except Exception as e:
+                print(f"Error al resumir historial: {str(e)}")
         
         # Limpiar la respuesta de caracteres problemáticos
         respuesta_limpia = ''
@@ -1,5 +1,106 @@
+"""
+Clientes de OpenAI compartidos por todo el proceso.
+
+Crear ``OpenAI()`` o ``ChatOpenAI()`` en cada petición abre un cliente HTTP
+nuevo, sin reutilizar conexiones (cada llamada paga DNS y el saludo TLS). Aquí
+se crea un único pool httpx por proceso, con keep-alive, límites de conexiones,
+timeouts y HTTP/2 si el paquete ``h2`` está instalado. Todos los servicios
+(crm/IA, chat/IA_services, agentesIA) piden sus clientes a este módulo. Los
+reintentos con backoff exponencial los hace el SDK de OpenAI (``max_retries``).
+
+Configuración por variables de entorno:
+    OPENAI_MAX_CONEXIONES      conexiones simultáneas del pool (por defecto 100)
+    OPENAI_CONEXIONES_LIBRES   conexiones keep-alive que se conservan (por defecto 20)
+    OPENAI_TIMEOUT             segundos máximos por petición (por defecto 60)
+    OPENAI_TIMEOUT_CONEXION    segundos para abrir la conexión (por defecto 10)
+    OPENAI_REINTENTOS          reintentos ante errores transitorios (por defecto 3)
+    OPENAI_HTTP2               1 usa HTTP/2 cuando está disponible (por defecto 1)
+"""
+import asyncio
+import importlib.util
 import os
-from openai import OpenAI
+import threading
+import weakref
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+OPENAI_MAX_CONEXIONES = int(os.getenv("OPENAI_MAX_CONEXIONES", 100))
+OPENAI_CONEXIONES_LIBRES = int(os.getenv("OPENAI_CONEXIONES_LIBRES", 20))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 60))
+OPENAI_TIMEOUT_CONEXION = float(os.getenv("OPENAI_TIMEOUT_CONEXION", 10))
+OPENAI_REINTENTOS = int(os.getenv("OPENAI_REINTENTOS", 3))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+_lock = threading.Lock()
+_clientes = {}
+# Los clientes asíncronos quedan ligados al event loop donde abren conexiones
+_clientes_async = weakref.WeakKeyDictionary()
+
+
+def _opciones_http():
+    return {
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONEXIONES,
+            max_keepalive_connections=OPENAI_CONEXIONES_LIBRES,
+            keepalive_expiry=30,
+        ),
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_TIMEOUT_CONEXION),
+        "http2": OPENAI_HTTP2,
+    }
+
+
+def _compartido(nombre, crear):
+    cliente = _clientes.get(nombre)
+    if cliente is None:
+        with _lock:
+            cliente = _clientes.get(nombre)
+            if cliente is None:
+                cliente = _clientes[nombre] = crear()
+    return cliente
+
+
+def http_client():
+    """Pool httpx síncrono del proceso."""
+    return _compartido("http", lambda: httpx.Client(**_opciones_http()))
+
+
+def openai_client():
+    """Cliente ``OpenAI`` del proceso, sobre el pool compartido."""
+    return _compartido("openai", lambda: OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client(),
+        max_retries=OPENAI_REINTENTOS,
+        timeout=OPENAI_TIMEOUT,
+    ))
+
+
+def async_openai_client():
+    """Cliente ``AsyncOpenAI`` del event loop actual (uno por loop)."""
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        with _lock:
+            cliente = _clientes_async.get(loop)
+            if cliente is None:
+                cliente = _clientes_async[loop] = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    http_client=httpx.AsyncClient(**_opciones_http()),
+                    max_retries=OPENAI_REINTENTOS,
+                    timeout=OPENAI_TIMEOUT,
+                )
+    return cliente
+
+
+def chat_openai(**kwargs):
+    """``ChatOpenAI`` de LangChain que reutiliza el pool HTTP del proceso."""
+    from langchain_openai import ChatOpenAI
+
+    kwargs.setdefault("http_client", http_client())
+    kwargs.setdefault("max_retries", OPENAI_REINTENTOS)
+    kwargs.setdefault("timeout", OPENAI_TIMEOUT)
+    return ChatOpenAI(**kwargs)
+
 
 class BaseAIService:
     def __init__(self):
@@ -14,7 +115,7 @@ class OpenAIService(BaseAIService):
         self.initialize_client()
     
     def initialize_client(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai_client()
 
 class WhisperService(BaseAIService):
     # Para transcripción de voz
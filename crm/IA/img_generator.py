@@ -1,12 +1,14 @@
-import openai
 import os
 from dotenv import load_dotenv
 
 load_dotenv()  # Asegúrate de que esto esté presente
 
+from .base import openai_client
+
 class AIService:
     def __init__(self):
-        self.client = openai.Client(api_key=os.getenv("OPENAI_API_KEY"))  # Asegúrate de que la variable de entorno esté bien cargada
+        # Cliente compartido del proceso (pool de conexiones reutilizable)
+        self.client = openai_client()
 
     def generate_image(self, dimensions, style="realistic", prompt="", colors=None, quality="standard"):
         try:
@@ -1,19 +1,68 @@
-from openai import OpenAI
 import os
+import io
 from dotenv import load_dotenv
 import base64
+from .base import openai_client
+from agentesIA.cache_llm import completar
 
 load_dotenv()
 
+# OpenAI no aprovecha más resolución que esta según el nivel de detalle:
+# 'high' ajusta la imagen a 2048x2048 y luego reduce su lado menor a 768;
+# 'low' la procesa en 512x512.
+LADO_MAXIMO = {"high": 2048, "low": 512}
+LADO_MENOR_HIGH = 768
+
+
+def escala_detalle(ancho, alto, detail="high"):
+    """Factor (<= 1) que lleva la imagen a la resolución que usa ``detail``."""
+    escala = min(1.0, LADO_MAXIMO.get(detail, 2048) / max(ancho, alto))
+    if detail == "high":
+        escala *= min(1.0, LADO_MENOR_HIGH / (min(ancho, alto) * escala))
+    return escala
+
+
+def preparar_imagen(image_path, detail="high"):
+    """
+    Devuelve la imagen en base64 como JPEG, reducida a la resolución que el
+    modelo realmente usa con ``detail``. Los JPEG se decodifican ya reducidos
+    (``draft``), sin cargar la imagen completa en memoria.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(image_path) as imagen:
+        ancho, alto = imagen.size
+        escala = escala_detalle(ancho, alto, detail)
+        if escala >= 1 and imagen.format == "JPEG":
+            # Ya está en la resolución útil: se envía tal cual
+            with open(image_path, "rb") as image_file:
+                return base64.b64encode(image_file.read()).decode()
+
+        destino = (max(1, round(ancho * escala)), max(1, round(alto * escala)))
+        imagen.draft("RGB", destino)
+        reducida = ImageOps.exif_transpose(imagen).convert("RGB")
+        if (reducida.width >= reducida.height) != (ancho >= alto):
+            # La orientación EXIF giró la imagen 90°
+            destino = destino[::-1]
+        if reducida.size != destino:
+            reducida = reducida.resize(destino, Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    reducida.save(buffer, "JPEG", quality=85)
+    return base64.b64encode(buffer.getvalue()).decode()
+
 class AIService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Cliente compartido del proceso (pool de conexiones reutilizable)
+        self.client = openai_client()
 
     def generate_property_description(self, property_data):
         try:
             prompt = self._create_property_prompt(property_data)
             
-            completion = self.client.chat.completions.create(
+            # La descripción depende solo de los datos de la propiedad: se guarda en caché
+            description = completar(
+                self.client,
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -29,7 +78,7 @@ class AIService:
             
             return {
                 "success": True,
-                "description": completion.choices[0].message.content
+                "description": description
             }
         except Exception as e:
             return {
@@ -75,7 +124,7 @@ class AIService:
             modes.append(f"Renta por ${modalidad['renta_tradicional']['precio']}")
         return ' y '.join(modes) if modes else 'No especificada'
     
-    def analyze_image(self, image_path, analysis_type="ocr"):
+    def analyze_image(self, image_path, analysis_type="ocr", detail="high"):
         prompt_one = [
             "Eres un experto analista inmobiliario con amplia experiencia en valoración de propiedades. Tu tarea es analizar detalladamente la imagen proporcionada y generar una descripción profesional y cautivadora.",
             "IDENTIFICACIÓN INICIAL: Identifica el tipo de espacio o elemento mostrado en la imagen, determina su función principal dentro de la propiedad, observa el contexto general del espacio.",
@@ -83,50 +132,50 @@ class AIService:
             "ELEMENTOS DE CONFORT Y FUNCIONALIDAD: Evalúa la disposición del espacio, identifica elementos que mejoren la habitabilidad, observa características de confort, detecta elementos de automatización o tecnología si están presentes."
         ]
         try:
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode()
+            # Reducida a la resolución que usa el modelo: menos memoria y bytes enviados
+            base64_image = preparar_imagen(image_path, detail)
+
+            # Diferentes prompts según el tipo de análisis
+            if analysis_type == "ocr":
+                system_prompt = """Tu única tarea es extraer y transcribir el texto que aparece en la imagen.
+                Solo devuelve el texto encontrado, sin descripciones ni interpretaciones.
+                Si hay números telefónicos, direcciones, nombres o cualquier otro texto, simplemente transcríbelo.
+                No describas la imagen ni su contenido visual."""
                 
-                # Diferentes prompts según el tipo de análisis
-                if analysis_type == "ocr":
-                    system_prompt = """Tu única tarea es extraer y transcribir el texto que aparece en la imagen.
-                    Solo devuelve el texto encontrado, sin descripciones ni interpretaciones.
-                    Si hay números telefónicos, direcciones, nombres o cualquier otro texto, simplemente transcríbelo.
-                    No describas la imagen ni su contenido visual."""
-                    
-                    user_prompt = "Extrae y transcribe todo el texto que veas en esta imagen, incluyendo números y caracteres especiales:"
-                else:  # analysis_type == "property"
-                    system_prompt = prompt_one
-                    
-                    user_prompt = "Describe detalladamente esta propiedad desde un punto de vista inmobiliario:"
+                user_prompt = "Extrae y transcribe todo el texto que veas en esta imagen, incluyendo números y caracteres especiales:"
+            else:  # analysis_type == "property"
+                system_prompt = prompt_one
                 
-                response = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "\n".join(prompt_one)
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": user_prompt
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{base64_image}",
-                                        "detail": "high"
-                                    }
+                user_prompt = "Describe detalladamente esta propiedad desde un punto de vista inmobiliario:"
+            
+            # La clave incluye la imagen, así que la misma foto no se analiza dos veces
+            return completar(
+                self.client,
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "\n".join(prompt_one)
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": user_prompt
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/jpeg;base64,{base64_image}",
+                                    "detail": detail
                                 }
-                            ]
-                        }
-                    ],
-                    max_tokens=500
-                )
-                
-                return response.choices[0].message.content
+                            }
+                        ]
+                    }
+                ],
+                max_tokens=500
+            )
         except Exception as e:
             print(f"Error al analizar la imagen: {str(e)}")
             return "Error al analizar la imagen"
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        # Registrar las señales (recálculo de coincidencias, caché de catálogos)
+        from . import signals  # noqa: F401
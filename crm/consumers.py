@@ -0,0 +1,33 @@
+import json
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from . import jobs
+from .models import AIQueryModel
+
+
+class AIJobConsumer(AsyncWebsocketConsumer):
+    """Notifica los cambios de estado de un trabajo de IA (ver crm/jobs.py)."""
+
+    async def connect(self):
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        self.group_name = f'ai_job_{self.job_id}'
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        # El trabajo pudo avanzar (o terminar) antes de que se abriera el socket
+        estado = await self.estado_actual()
+        if estado is not None:
+            await self.send(text_data=json.dumps(estado))
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    @database_sync_to_async
+    def estado_actual(self):
+        trabajo = AIQueryModel.objects.filter(id=self.job_id).first()
+        return jobs.serializar(trabajo) if trabajo else None
+
+    async def job_update(self, event):
+        await self.send(text_data=json.dumps(event['job']))
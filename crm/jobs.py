@@ -0,0 +1,269 @@
+"""
+Trabajos en segundo plano para los endpoints lentos de IA.
+
+Transcribir audio, analizar o generar imágenes y redactar descripciones tardan
+lo que tarde OpenAI (5-30 s). En lugar de ocupar un worker HTTP todo ese tiempo,
+la vista registra un ``AIQueryModel`` en estado ``pending``, responde 202 con su
+id y un pool de hilos del proceso ejecuta el trabajo. El resultado queda en
+``output_data`` y se consulta en ``GET /crm/ai-jobs/<id>/``; cada cambio de
+estado también se publica en el grupo de Channels ``ai_job_<id>``
+(``ws/ai-jobs/<id>/``).
+
+Los archivos subidos se copian a un temporal que el propio trabajo elimina al
+terminar, así que el pool debe correr en el mismo equipo que la vista.
+
+El pool vive en memoria: si el proceso se reinicia, los trabajos que tenía en
+cola o en curso quedan en ``pending``/``processing`` para siempre.
+``vencer_trabajos`` marca como fallidos los que superan ``AI_JOBS_TIMEOUT`` y
+elimina sus temporales; se ejecuta al crear el pool de cada proceso y al
+consultar un trabajo, así el cliente que lo sigue recibe el error.
+
+Configuración por variables de entorno:
+    AI_JOBS_WORKERS  hilos que ejecutan trabajos de IA por proceso (por defecto 4)
+    AI_JOBS_TIMEOUT  segundos tras los que un trabajo sin terminar se da por perdido (por defecto 900)
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import AIQueryModel
+
+AI_JOBS_WORKERS = int(os.getenv("AI_JOBS_WORKERS", 4))
+AI_JOBS_TIMEOUT = int(os.getenv("AI_JOBS_TIMEOUT", 900))
+
+PENDIENTE = 'pending'
+EN_PROCESO = 'processing'
+COMPLETADO = 'completed'
+FALLIDO = 'failed'
+
+TRABAJO_VENCIDO = 'El trabajo no terminó a tiempo (el servidor se reinició o se agotó el tiempo)'
+
+# Función que ejecuta cada tipo de trabajo (query_type -> función(input_data) -> output_data)
+TAREAS = {}
+
+_lock = threading.Lock()
+_pool = None
+
+
+def tarea(tipo):
+    """Registra la función que ejecuta los trabajos de ``tipo``."""
+    def registrar(funcion):
+        TAREAS[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                # Primer trabajo del proceso: cerrar los que dejó un proceso anterior
+                try:
+                    vencer_trabajos()
+                except Exception as e:
+                    print(f"Error al vencer trabajos de IA: {str(e)}")
+                _pool = ThreadPoolExecutor(max_workers=AI_JOBS_WORKERS, thread_name_prefix='ai-job')
+    return _pool
+
+
+def guardar_temporal(archivo, sufijo):
+    """
+    Deja un archivo subido en un temporal propio para que el trabajo lo lea
+    después de que termine la petición. Si Django ya lo escribió en disco
+    (``TemporaryUploadedFile``) se crea un enlace duro, sin copiar los datos;
+    los archivos pequeños que llegaron en memoria se escriben una sola vez.
+    """
+    descriptor, ruta = tempfile.mkstemp(suffix=sufijo, prefix='ai-job-')
+    if hasattr(archivo, 'temporary_file_path'):
+        os.close(descriptor)
+        os.unlink(ruta)
+        try:
+            os.link(archivo.temporary_file_path(), ruta)
+            return ruta
+        except OSError:
+            # Otro sistema de archivos: se copia
+            descriptor = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, 'wb') as destino:
+        for chunk in archivo.chunks():
+            destino.write(chunk)
+    return ruta
+
+
+def encolar(query_type, model_type, input_data):
+    """Registra un trabajo y lo envía al pool cuando se confirma la transacción."""
+    if query_type not in TAREAS:
+        raise ValueError(f"Tipo de trabajo no soportado: {query_type}")
+    trabajo = AIQueryModel.objects.create(
+        query_type=query_type,
+        model_type=model_type,
+        input_data=input_data,
+        status=PENDIENTE,
+    )
+    transaction.on_commit(lambda: pool().submit(ejecutar, trabajo.id))
+    return trabajo
+
+
+def serializar(trabajo):
+    """Representación pública de un trabajo (respuesta 202, consulta y notificaciones)."""
+    datos = {
+        'job_id': trabajo.id,
+        'tipo': trabajo.query_type,
+        'status': trabajo.status,
+        'url': f'/crm/ai-jobs/{trabajo.id}/',
+        'created_at': trabajo.created_at.isoformat() if trabajo.created_at else None,
+    }
+    if trabajo.status == COMPLETADO:
+        datos['resultado'] = trabajo.output_data
+    elif trabajo.status == FALLIDO:
+        datos['error'] = trabajo.error_message
+    return datos
+
+
+def notificar(trabajo):
+    """Publica el estado del trabajo en su grupo de Channels."""
+    capa = get_channel_layer()
+    if capa is None:
+        return
+    try:
+        async_to_sync(capa.group_send)(f'ai_job_{trabajo.id}', {
+            'type': 'job_update',
+            'job': serializar(trabajo),
+        })
+    except Exception as e:
+        print(f"Error al notificar el trabajo {trabajo.id}: {str(e)}")
+
+
+def _actualizar(trabajo, **campos):
+    for campo, valor in campos.items():
+        setattr(trabajo, campo, valor)
+    trabajo.save(update_fields=list(campos))
+    notificar(trabajo)
+
+
+def ejecutar(trabajo_id):
+    """Ejecuta un trabajo en un hilo del pool."""
+    try:
+        trabajo = AIQueryModel.objects.filter(id=trabajo_id, status=PENDIENTE).first()
+        if trabajo is None:
+            return
+        _actualizar(trabajo, status=EN_PROCESO)
+        try:
+            resultado = TAREAS[trabajo.query_type](trabajo.input_data)
+        except Exception as e:
+            print(f"Error en el trabajo de IA {trabajo_id} ({trabajo.query_type}): {str(e)}")
+            _actualizar(trabajo, status=FALLIDO, error_message=str(e))
+        else:
+            _actualizar(trabajo, status=COMPLETADO, output_data=resultado)
+    except Exception as e:
+        print(f"Error al ejecutar el trabajo de IA {trabajo_id}: {str(e)}")
+    finally:
+        # Los hilos del pool no pasan por el ciclo de petición de Django
+        close_old_connections()
+
+
+def vencer_trabajos(ids=None):
+    """
+    Marca como fallidos los trabajos ``pending``/``processing`` creados hace más
+    de ``AI_JOBS_TIMEOUT`` segundos (todos o solo ``ids``) y elimina sus
+    archivos temporales. Devuelve cuántos trabajos se marcaron.
+    """
+    limite = timezone.now() - timedelta(seconds=AI_JOBS_TIMEOUT)
+    vencidos = AIQueryModel.objects.filter(status__in=(PENDIENTE, EN_PROCESO), created_at__lt=limite)
+    if ids is not None:
+        vencidos = vencidos.filter(id__in=ids)
+
+    marcados = 0
+    for trabajo in vencidos:
+        # UPDATE condicional: no pisa un trabajo que terminó mientras tanto
+        if not AIQueryModel.objects.filter(id=trabajo.id, status=trabajo.status).update(
+            status=FALLIDO, error_message=TRABAJO_VENCIDO,
+        ):
+            continue
+        trabajo.status, trabajo.error_message = FALLIDO, TRABAJO_VENCIDO
+        archivo = (trabajo.input_data or {}).get('archivo')
+        if archivo and os.path.exists(archivo):
+            _eliminar_temporal(archivo)
+        notificar(trabajo)
+        marcados += 1
+    if marcados:
+        print(f"Trabajos de IA vencidos: {marcados}")
+    return marcados
+
+
+def _eliminar_temporal(ruta):
+    try:
+        os.unlink(ruta)
+    except Exception as e:
+        print(f"Error al eliminar archivo temporal: {e}")
+
+
+@tarea('voice')
+def transcribir_audio(datos):
+    from .IA.base import openai_client
+
+    try:
+        with open(datos['archivo'], 'rb') as audio:
+            resultado = openai_client().audio.transcriptions.create(model="whisper-1", file=audio)
+        return {'text': resultado.text}
+    finally:
+        _eliminar_temporal(datos['archivo'])
+
+
+@tarea('image')
+def analizar_imagen(datos):
+    from .IA.lab_openAI import AIService
+
+    try:
+        return {'text': AIService().analyze_image(
+            datos['archivo'], datos.get('analysis_type', 'ocr'), datos.get('detail', 'high'),
+        )}
+    finally:
+        _eliminar_temporal(datos['archivo'])
+
+
+@tarea('image_generation')
+def generar_imagen(datos):
+    from .IA.base import http_client
+    from .IA.img_generator import AIService
+    from .services import imagenes
+
+    parametros = {clave: datos.get(clave) for clave in ('prompt', 'style', 'dimensions', 'colors', 'quality')}
+    if not datos.get('regenerar'):
+        existente = imagenes.buscar_generada(parametros)
+        if existente is not None:
+            return imagenes.serializar_imagen(existente, reutilizada=True)
+
+    result = AIService().generate_image(
+        parametros['dimensions'],
+        parametros['style'],
+        parametros['prompt'],
+        parametros['colors'],
+        parametros['quality'],
+    )
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+
+    # Se guarda en MEDIA_ROOT; la respuesta lleva la URL, no la imagen en base64
+    exito, datos_imagen = imagenes.guardar_desde_url(http_client(), result["image_url"], parametros)
+    if not exito:
+        raise RuntimeError(datos_imagen["error"])
+    return datos_imagen
+
+
+@tarea('description')
+def describir_propiedad(datos):
+    from .IA.lab_openAI import AIService
+
+    # La vista serializa la propiedad (con el contexto de la petición) al encolar
+    result = AIService().generate_property_description(datos['propiedad'])
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    return {"description": result["description"]}
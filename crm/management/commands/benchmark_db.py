@@ -0,0 +1,154 @@
+"""
+Mide el rendimiento de escritura de la base de datos con peticiones concurrentes.
+
+    python manage.py benchmark_db --hilos 8 --escrituras 200
+    python manage.py benchmark_db --comparar
+
+Cada hilo simula peticiones HTTP: una transacción que inserta una fila y, al
+final, ``close_old_connections()`` como hace Django al terminar cada petición
+(con ``CONN_MAX_AGE=0`` la conexión se cierra y la siguiente petición vuelve a
+conectarse). Las filas de prueba se eliminan al terminar.
+
+Con ``--comparar`` el comando se ejecuta en subprocesos con cada configuración
+de igh/db.py: en SQLite, sin ajustes frente a WAL con conexiones persistentes
+(cada una sobre una base temporal recién migrada); en PostgreSQL, sin
+persistencia, con conexiones persistentes y con el pool de psycopg.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection, transaction
+
+from crm.models import AIQueryModel
+from igh import db
+
+# Estado con el que se marcan las filas de prueba para eliminarlas al terminar
+ESTADO_PRUEBA = 'benchmark'
+
+VARIANTES = {
+    'sqlite': [
+        ('SQLite sin ajustes', {'SQLITE_AJUSTES': '0', 'DB_CONN_MAX_AGE': '0'}),
+        ('SQLite WAL + conexiones persistentes', {'SQLITE_AJUSTES': '1', 'DB_CONN_MAX_AGE': '60'}),
+    ],
+    'postgresql': [
+        ('PostgreSQL sin persistencia', {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '0'}),
+        ('PostgreSQL conexiones persistentes', {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '60'}),
+        ('PostgreSQL pool psycopg', {'DB_POOL': '1'}),
+    ],
+}
+
+
+def _percentil(valores, porcentaje):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * porcentaje / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Mide las escrituras por segundo de la base de datos con peticiones concurrentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Peticiones concurrentes (por defecto 8)')
+        parser.add_argument('--escrituras', type=int, default=200, help='Escrituras por hilo (por defecto 200)')
+        parser.add_argument('--comparar', action='store_true', help='Compara las configuraciones de igh/db.py')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado como JSON')
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1 or options['escrituras'] < 1:
+            raise CommandError('--hilos y --escrituras deben ser positivos')
+        if options['comparar']:
+            return self.comparar(options['hilos'], options['escrituras'])
+
+        resultado = self.medir(options['hilos'], options['escrituras'])
+        if options['json']:
+            self.stdout.write(json.dumps(resultado))
+        else:
+            self.mostrar(db.descripcion(connection.settings_dict), resultado)
+
+    def medir(self, hilos, escrituras):
+        latencias = []
+        errores = []
+        lock = threading.Lock()
+        inicio_comun = threading.Barrier(hilos)
+
+        def peticiones(hilo):
+            propias, fallidas = [], 0
+            inicio_comun.wait()
+            for numero in range(escrituras):
+                inicio = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        AIQueryModel.objects.create(
+                            query_type='description',
+                            model_type='gpt-4o-mini',
+                            input_data={'hilo': hilo, 'numero': numero},
+                            status=ESTADO_PRUEBA,
+                        )
+                except DatabaseError:
+                    # "database is locked" en SQLite, conexiones agotadas en PostgreSQL
+                    fallidas += 1
+                finally:
+                    # Fin de la petición: Django cierra la conexión si no es persistente
+                    close_old_connections()
+                propias.append(time.perf_counter() - inicio)
+            with lock:
+                latencias.extend(propias)
+                errores.append(fallidas)
+            connection.close()
+
+        trabajadores = [threading.Thread(target=peticiones, args=(hilo,)) for hilo in range(hilos)]
+        inicio = time.perf_counter()
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        duracion = time.perf_counter() - inicio
+
+        AIQueryModel.objects.filter(status=ESTADO_PRUEBA).delete()
+        fallidas = sum(errores)
+        return {
+            'hilos': hilos,
+            'escrituras': hilos * escrituras,
+            'errores': fallidas,
+            'duracion': duracion,
+            'por_segundo': (hilos * escrituras - fallidas) / duracion if duracion else 0.0,
+            'p50_ms': statistics.median(latencias) * 1000 if latencias else 0.0,
+            'p95_ms': _percentil(latencias, 95) * 1000,
+            'max_ms': max(latencias, default=0.0) * 1000,
+        }
+
+    def mostrar(self, nombre, resultado):
+        self.stdout.write(
+            f"{nombre}: {resultado['por_segundo']:.0f} escrituras/s "
+            f"({resultado['escrituras']} con {resultado['hilos']} hilos en {resultado['duracion']:.2f}s), "
+            f"p50 {resultado['p50_ms']:.1f} ms, p95 {resultado['p95_ms']:.1f} ms, "
+            f"máx {resultado['max_ms']:.1f} ms, errores {resultado['errores']}"
+        )
+
+    def comparar(self, hilos, escrituras):
+        motor = 'sqlite' if connection.vendor == 'sqlite' else connection.vendor
+        if motor not in VARIANTES:
+            raise CommandError(f'No hay variantes para comparar en {connection.vendor}')
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+        argumentos = ['--hilos', str(hilos), '--escrituras', str(escrituras), '--json']
+
+        for nombre, variables in VARIANTES[motor]:
+            entorno = {**os.environ, **variables}
+            with tempfile.TemporaryDirectory(prefix='benchmark-db-') as carpeta:
+                if motor == 'sqlite':
+                    # Cada variante escribe en su propia base para no heredar el modo WAL
+                    entorno['SQLITE_PATH'] = os.path.join(carpeta, 'db.sqlite3')
+                    subprocess.run([sys.executable, manage, 'migrate', '--noinput', '-v', '0'],
+                                   env=entorno, check=True)
+                salida = subprocess.run([sys.executable, manage, 'benchmark_db', *argumentos],
+                                        env=entorno, check=True, capture_output=True, text=True).stdout
+            self.mostrar(nombre, json.loads(salida.strip().splitlines()[-1]))
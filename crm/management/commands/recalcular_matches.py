@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm import matching
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero las coincidencias (top-K) entre requerimientos abiertos y propiedades'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = matching.recalcular_todo()
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{total} coincidencias guardadas en {duracion:.2f}s'))
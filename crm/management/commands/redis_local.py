@@ -0,0 +1,51 @@
+"""
+Levanta servidores compatibles con Redis (fakeredis por TCP) para probar la capa
+de canales con varios procesos de daphne sin instalar Redis.
+
+    python manage.py redis_local --puertos 6379 6380
+    CHANNEL_BACKEND=redis CHANNEL_SHARDING=anillo \\
+        CHANNEL_REDIS_URLS=redis://127.0.0.1:6379,redis://127.0.0.1:6380 \\
+        daphne -p 8001 igh.asgi:application
+
+Cada puerto es una instancia independiente, así que con varios puertos se
+prueba también el reparto de grupos entre instancias (ver igh/canales.py).
+Los datos viven en memoria y se pierden al detener el comando. No es para
+producción.
+"""
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Levanta servidores fakeredis por TCP para probar la capa de canales de Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Dirección en la que escuchar (por defecto 127.0.0.1)')
+        parser.add_argument('--puertos', type=int, nargs='+', default=[6379], help='Un servidor por puerto (por defecto 6379)')
+
+    def handle(self, *args, **options):
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise CommandError('Instala fakeredis[lua] para usar el servidor local')
+
+        servidores = []
+        try:
+            for puerto in options['puertos']:
+                try:
+                    servidor = TcpFakeServer((options['host'], puerto), server_type='redis')
+                except OSError as e:
+                    raise CommandError(f'No se pudo escuchar en el puerto {puerto}: {str(e)}')
+                servidores.append(servidor)
+                threading.Thread(target=servidor.serve_forever, daemon=True).start()
+                self.stdout.write(f"Redis local en redis://{options['host']}:{puerto}")
+
+            self.stdout.write('Ctrl+C para detener')
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for servidor in servidores:
+                servidor.shutdown()
+                servidor.server_close()
@@ -0,0 +1,448 @@
+"""
+Genera datos de prueba en volumen (agentes, clientes, propiedades y
+requerimientos) para probar con carga la búsqueda del inventario y el matching.
+
+    python manage.py seed --properties 1000000 --seed 42
+
+Las filas se insertan con ``bulk_create`` por lotes. Cada tabla se divide en
+particiones de tamaño fijo que se generan e insertan en procesos separados,
+cada una en su propia transacción. El generador aleatorio de cada partición se
+siembra con ``(semilla, tabla, partición)``, así que la misma semilla produce
+los mismos datos sin importar cuántos procesos se usen. Los textos realistas
+(direcciones, nombres, párrafos) salen de conjuntos que Faker genera una sola
+vez al inicio, y las cédulas y los ids de garajes y depósitos se toman de
+conjuntos únicos calculados de antemano, sin consultar la base de datos.
+
+``bulk_create`` no envía señales: al terminar se invalidan los catálogos y, con
+``--matches``, se recalculan las coincidencias.
+"""
+import multiprocessing
+import os
+import random
+import time
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from accounts.models import AgenteModel, ClienteModel
+from crm import matching
+from crm.models import (
+    AmenidadesModel,
+    BarrioModel,
+    EdificioModel,
+    LocalidadModel,
+    PropiedadModel,
+    RequerimientoModel,
+    ZonaModel,
+)
+from crm.services import catalogos
+
+# Filas por partición (unidad de trabajo de cada proceso)
+TAMANO_PARTICION = 20000
+# Textos que Faker genera una sola vez por ejecución
+TAMANO_CONJUNTOS = 2000
+
+# Permutación afín de los números de 10 dígitos: ids únicos para cualquier índice
+_ID_BASE = 10 ** 9
+_ID_RANGO = 9 * 10 ** 9
+_ID_MULTIPLICADOR = 2654435761  # coprimo con _ID_RANGO
+
+LOCALIDADES = [
+    ('Chapinero', 'CHP', [('Rosales', 6), ('Chicó', 6), ('Quinta Camacho', 5)]),
+    ('Usaquén', 'USQ', [('Santa Bárbara', 5), ('Cedritos', 4), ('Usaquén Centro', 4)]),
+    ('Suba', 'SUB', [('Niza', 4), ('Colina Campestre', 4), ('Suba Centro', 3)]),
+    ('Teusaquillo', 'TEU', [('Galerías', 4), ('La Soledad', 4), ('Palermo', 4)]),
+    ('Santa Fe', 'STF', [('La Macarena', 3), ('Las Aguas', 3), ('La Candelaria', 2)]),
+]
+ZONAS = [
+    ('Zona Norte', 'ZNO', 'residencial'),
+    ('Zona Centro', 'ZCE', 'comercial'),
+    ('Zona Occidental', 'ZOC', 'mixta'),
+]
+AMENIDADES = [
+    ('Piscina', 'Recreación'), ('Gimnasio', 'Deporte'), ('Salón comunal', 'Social'),
+    ('Parque infantil', 'Recreación'), ('Zona BBQ', 'Social'), ('Cancha de tenis', 'Deporte'),
+    ('Seguridad 24 horas', 'Seguridad'), ('Parqueadero visitantes', 'Servicios'),
+    ('Jacuzzi', 'Recreación'), ('Sauna', 'Bienestar'),
+]
+EDIFICIOS_POR_BARRIO = 4
+
+# tipo: (probabilidad, habitaciones, baños, m² construidos, administración)
+TIPOS_PROPIEDAD = {
+    'apartamento': (0.55, (1, 4), (1, 3), (40, 200), (200000, 800000)),
+    'casa': (0.2, (2, 6), (2, 4), (80, 400), (0, 500000)),
+    'oficina': (0.1, (0, 2), (1, 2), (30, 150), (300000, 1000000)),
+    'local': (0.1, (0, 1), (1, 2), (20, 200), (300000, 1000000)),
+    'lote': (0.05, (0, 0), (0, 0), (200, 2000), (0, 0)),
+}
+CERCANIAS = ["parque", "centro comercial", "colegio", "universidad", "hospital", "transporte público"]
+EDIFICACIONES = [
+    "centro_comercial", "centro_empresarial", "condominio_campestre", "edificio_independiente",
+    "independiente", "parcelacion", "unidad_cerrada", "unidad_cerrada_con_zonas_comunes",
+]
+
+def id_unico(indice):
+    """Número de 10 dígitos distinto para cada índice, con apariencia aleatoria."""
+    return str(_ID_BASE + (_ID_MULTIPLICADOR * indice + 7919) % _ID_RANGO)
+
+
+def _rng(semilla, tabla, particion):
+    # random.Random con una cadena como semilla es estable entre ejecuciones
+    return random.Random(f"{semilla}:{tabla}:{particion}")
+
+
+def _texto(rng, conjunto):
+    return conjunto[rng.randrange(len(conjunto))]
+
+
+def _clientes(rng, inicio, fin, ctx):
+    textos = ctx['textos']
+    filas = []
+    for indice in range(inicio, fin):
+        nombre = _texto(rng, textos['nombres'])
+        apellido = _texto(rng, textos['apellidos'])
+        filas.append(ClienteModel(
+            agente_id=rng.choice(ctx['agentes']),
+            nombre=nombre,
+            apellidos=f"{apellido} {_texto(rng, textos['apellidos'])}",
+            telefono="3" + str(rng.randrange(10 ** 9)).zfill(9),
+            correo=f"{nombre.lower()}.{apellido.lower()}.{indice}@{_texto(rng, textos['dominios'])}".replace(' ', ''),
+            cedula=ctx['cedulas_clientes'][indice],
+            canal_ingreso=ctx['canal'],
+            estado_del_cliente=rng.choice(['activo', 'activo', 'activo', 'inactivo']),
+        ))
+    return ClienteModel, filas, None
+
+
+def _modalidad(rng, area):
+    precio_venta = round(area * rng.randint(3_000_000, 9_000_000), -6)
+    precio_renta = int(round(precio_venta * rng.uniform(0.004, 0.007), -4))
+    venta = rng.random() < 0.6
+    renta = not venta or rng.random() < 0.25
+    return {
+        "venta_tradicional": {"activo": venta, "precio": precio_venta},
+        "renta_tradicional": {"activo": renta, "precio": precio_renta},
+        "renta_amoblado": {"activo": renta and rng.random() < 0.15, "precio": int(round(precio_renta * 1.3, -4))},
+    }
+
+
+def _propiedades(rng, inicio, fin, ctx):
+    textos = ctx['textos']
+    tipos = list(TIPOS_PROPIEDAD)
+    pesos = [datos[0] for datos in TIPOS_PROPIEDAD.values()]
+    filas, amenidades = [], []
+    for indice in range(inicio, fin):
+        tipo = rng.choices(tipos, pesos)[0]
+        _, habitaciones, banos, metros, administracion = TIPOS_PROPIEDAD[tipo]
+        area = rng.randint(*metros)
+        edificio = rng.choice(ctx['edificios']) if tipo in ('apartamento', 'oficina') else None
+        estrato = edificio[2] if edificio else rng.randint(1, 6)
+        propiedad = PropiedadModel(
+            agente_id=rng.choice(ctx['agentes']),
+            propietario_id=rng.choice(ctx['clientes']),
+            titulo=f"{tipo.capitalize()} en {_texto(rng, ctx['barrios'])[1]}",
+            modalidad_de_negocio=_modalidad(rng, area),
+            tipo_propiedad=tipo,
+            edificio_id=edificio[0] if edificio else None,
+            descripcion=_texto(rng, textos['parrafos']),
+            direccion={
+                "direccion": _texto(rng, textos['calles']),
+                "datos_adicionales": {
+                    "interior": str(rng.randint(1, 10)),
+                    "torre": rng.choice("ABCD"),
+                    "apartamento": str(rng.randint(1, 20) * 100 + rng.randint(1, 8)),
+                },
+                "coordenada_1": f"{rng.uniform(4.55, 4.80):.6f}",
+                "coordenada_2": f"{rng.uniform(-74.20, -74.02):.6f}",
+            },
+            nivel=rng.randint(1, 20) if tipo == 'apartamento' else 1,
+            metro_cuadrado_construido=area,
+            metro_cuadrado_propiedad=area + rng.randint(0, 50),
+            habitaciones=rng.randint(*habitaciones),
+            habitacion_de_servicio=1 if rng.random() > 0.7 else 0,
+            banos=rng.randint(*banos),
+            terraza='si' if rng.random() > 0.7 else 'no',
+            balcon='si' if rng.random() > 0.6 else 'no',
+            garajes={"cantidad": str(rng.randint(0, 3)), "id": id_unico(2 * indice)},
+            depositos={"cantidad": str(rng.randint(0, 2)), "id": id_unico(2 * indice + 1)},
+            mascotas='si' if rng.random() > 0.5 else 'no',
+            estrato=estrato,
+            valor_predial=rng.randint(500000, 5000000),
+            valor_administracion=rng.randint(*administracion),
+            ano_construccion=rng.randint(1990, 2024),
+            codigo=f"{ctx['canal'].upper()}-{indice}",
+            notas=[{"nota": _texto(rng, textos['parrafos']), "fecha": ctx['hoy']}],
+            honorarios={"porcentaje": rng.randint(3, 10), "valor_fijo": rng.randint(1000000, 5000000)},
+        )
+        # bulk_create no llama a save(): las columnas de precio se calculan aquí
+        propiedad.sincronizar_precios()
+        filas.append(propiedad)
+        amenidades.append(rng.sample(ctx['amenidades'], rng.randint(0, min(5, len(ctx['amenidades'])))))
+    return PropiedadModel, filas, amenidades
+
+
+def _requerimientos(rng, inicio, fin, ctx):
+    textos = ctx['textos']
+    tipos = list(TIPOS_PROPIEDAD)
+    pesos = [datos[0] for datos in TIPOS_PROPIEDAD.values()]
+    ahora = timezone.now()
+    filas = []
+    for _ in range(inicio, fin):
+        compra = rng.random() < 0.5
+        if compra:
+            minimo = rng.randint(100, 800) * 1_000_000
+            maximo = minimo + rng.randint(50, 400) * 1_000_000
+        else:
+            minimo = rng.randint(10, 60) * 100_000
+            maximo = minimo + rng.randint(5, 30) * 100_000
+        area_minima = rng.randint(40, 120)
+        barrio_id, _, localidad_id = _texto(rng, ctx['barrios'])
+        filas.append(RequerimientoModel(
+            agente_id=rng.choice(ctx['agentes']),
+            cliente_id=rng.choice(ctx['clientes']),
+            tiempo_estadia=None if compra else rng.randint(6, 36),
+            tipo_negocio={
+                "operacion": "compra" if compra else "alquiler",
+                "tipo_propiedad": rng.choices(tipos, pesos)[0],
+            },
+            presupuesto_minimo=None if compra else minimo,
+            presupuesto_maximo=None if compra else maximo,
+            presupuesto_minimo_compra=minimo if compra else None,
+            presupuesto_maximo_compra=maximo if compra else None,
+            habitantes=rng.randint(1, 6),
+            area_minima=area_minima,
+            area_maxima=area_minima + rng.randint(20, 100),
+            habitaciones=rng.randint(1, 5),
+            habitaciones_servicio=1 if rng.random() > 0.7 else 0,
+            banos=rng.randint(1, 4),
+            parqueaderos=rng.randint(0, 3),
+            depositos=rng.randint(0, 2),
+            mascotas='si' if rng.random() > 0.5 else 'no',
+            descripcion=_texto(rng, textos['parrafos']),
+            localidad_id=localidad_id if rng.random() < 0.7 else None,
+            zona_id=rng.choice(ctx['zonas']) if rng.random() < 0.3 else None,
+            barrio_id=barrio_id if rng.random() < 0.5 else None,
+            cercanias=rng.sample(CERCANIAS, rng.randint(1, 3)),
+            estado=rng.choice(['pendiente', 'pendiente', 'en_proceso', 'completado']),
+            edificacion={"tipos": rng.sample(EDIFICACIONES, rng.randint(1, 3))},
+            prioridad=rng.choice(['normal', 'alta', 'baja']),
+            fecha_ideal_entrega=ahora + timedelta(days=rng.randint(15, 365)),
+            informacion_legal_financiera={
+                "certificado_libertad": "si" if rng.random() > 0.5 else "no",
+                "hipoteca": "si" if rng.random() > 0.7 else "no",
+            },
+            honorarios={"porcentaje": rng.randint(3, 10), "valor_fijo": rng.randint(1000000, 5000000)},
+            negocibles="Precio, fecha de entrega",
+            no_negocibles="Ubicación, número de habitaciones",
+            comentarios=[{"comentario": _texto(rng, textos['parrafos']), "fecha": ctx['hoy']}],
+        ))
+    return RequerimientoModel, filas, None
+
+
+GENERADORES = {
+    'clientes': _clientes,
+    'propiedades': _propiedades,
+    'requerimientos': _requerimientos,
+}
+
+
+def insertar_particion(tarea):
+    """
+    Genera e inserta una partición en su propia transacción. ``ctx`` lleva los
+    ids de catálogos, agentes y clientes y los textos. Devuelve las filas creadas.
+    """
+    tabla, particion, inicio, fin, ctx = tarea
+    rng = _rng(ctx['semilla'], tabla, particion)
+    modelo, filas, amenidades = GENERADORES[tabla](rng, inicio, fin, ctx)
+    with transaction.atomic():
+        creadas = modelo.objects.bulk_create(filas, batch_size=ctx['lote'])
+        # Los ids de las filas creadas solo se conocen en bases con RETURNING (PostgreSQL, SQLite 3.35+)
+        if amenidades and creadas and creadas[0].pk is not None:
+            relacion = PropiedadModel.amenidades.through
+            relacion.objects.bulk_create([
+                relacion(propiedadmodel_id=propiedad.pk, amenidadesmodel_id=amenidad_id)
+                for propiedad, seleccion in zip(creadas, amenidades)
+                for amenidad_id in seleccion
+            ], batch_size=ctx['lote'])
+    return len(creadas)
+
+
+class Command(BaseCommand):
+    help = 'Genera datos de prueba en volumen (agentes, clientes, propiedades y requerimientos) de forma reproducible'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=1000, help='Propiedades a crear (por defecto 1000)')
+        parser.add_argument('--requirements', type=int, help='Requerimientos a crear (por defecto la mitad de las propiedades)')
+        parser.add_argument('--agents', type=int, help='Agentes a crear (por defecto 1 por cada 1000 propiedades, mínimo 3)')
+        parser.add_argument('--clients', type=int, help='Clientes a crear (por defecto 1 por cada 20 propiedades, mínimo 10)')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla del generador aleatorio (por defecto 42)')
+        parser.add_argument('--batch', type=int, default=1000, help='Filas por INSERT (por defecto 1000)')
+        parser.add_argument('--workers', type=int, help='Procesos (por defecto uno por CPU; 1 con SQLite)')
+        parser.add_argument('--matches', action='store_true', help='Recalcula las coincidencias al terminar')
+
+    def handle(self, *args, **options):
+        semilla = options['seed']
+        propiedades = options['properties']
+        requerimientos = options['requirements'] if options['requirements'] is not None else propiedades // 2
+        agentes = options['agents'] or max(3, propiedades // 1000)
+        clientes = options['clients'] or max(10, propiedades // 20)
+        workers = options['workers'] or os.cpu_count() or 1
+        if min(propiedades, requerimientos) < 0 or min(agentes, clientes, options['batch'], workers) < 1:
+            raise CommandError('Las cantidades deben ser positivas')
+        if connection.vendor == 'sqlite' and workers > 1:
+            # SQLite admite un solo escritor: varios procesos solo esperarían el bloqueo
+            self.stdout.write(self.style.WARNING('SQLite admite un solo escritor: se usa 1 proceso'))
+            workers = 1
+
+        canal = f'seed-{semilla}'
+        if ClienteModel.objects.filter(canal_ingreso=canal).exists():
+            raise CommandError(f'Ya existen datos de la semilla {semilla}; usa otra semilla')
+
+        inicio = time.perf_counter()
+        rng = random.Random(semilla)
+        contexto = {
+            'semilla': semilla,
+            'canal': canal,
+            'lote': options['batch'],
+            'hoy': timezone.now().date().isoformat(),
+            'textos': self.textos(semilla),
+        }
+        contexto.update(self.catalogos())
+
+        # Cédulas distintas entre sí y de las de los agentes que ya existen, sin reintentos
+        existentes = set(AgenteModel.objects.exclude(cedula=None).values_list('cedula', flat=True))
+        cedulas = [cedula for cedula in self.cedulas(rng, agentes + clientes + len(existentes))
+                   if cedula not in existentes]
+        contexto['agentes'] = self.crear_agentes(rng, semilla, cedulas[:agentes], contexto['textos'])
+        contexto['cedulas_clientes'] = cedulas[agentes:agentes + clientes]
+
+        for tabla, total in (('clientes', clientes), ('propiedades', propiedades), ('requerimientos', requerimientos)):
+            if tabla == 'propiedades':
+                # Las propiedades y los requerimientos se asignan a los clientes recién creados
+                contexto['clientes'] = list(
+                    ClienteModel.objects.filter(canal_ingreso=canal).order_by('id').values_list('id', flat=True)
+                )
+                # Las cédulas solo las necesitan los clientes
+                contexto.pop('cedulas_clientes')
+            creadas = self.insertar(tabla, total, contexto, workers)
+            self.stdout.write(f'{tabla}: {creadas} filas ({time.perf_counter() - inicio:.1f}s)')
+
+        catalogos.invalidar()
+        matching.invalidar_indices()
+        if options['matches']:
+            total = matching.recalcular_todo()
+            self.stdout.write(f'coincidencias: {total}')
+        else:
+            self.stdout.write('Las coincidencias no se recalcularon: usa --matches o manage.py recalcular_matches')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Datos de la semilla {semilla} generados en {time.perf_counter() - inicio:.1f}s con {workers} proceso(s)'
+        ))
+
+    def textos(self, semilla):
+        """Conjuntos de textos realistas que se generan una sola vez."""
+        try:
+            from faker import Faker
+        except ImportError:
+            raise CommandError('Instala faker para generar datos de prueba (pip install faker)')
+
+        fake = Faker('es_CO')
+        fake.seed_instance(semilla)
+        return {
+            'nombres': [fake.first_name() for _ in range(TAMANO_CONJUNTOS)],
+            'apellidos': [fake.last_name() for _ in range(TAMANO_CONJUNTOS)],
+            'calles': [fake.street_address() for _ in range(TAMANO_CONJUNTOS)],
+            'parrafos': [fake.paragraph(nb_sentences=4) for _ in range(TAMANO_CONJUNTOS // 4)],
+            'dominios': sorted({fake.free_email_domain() for _ in range(50)}),
+        }
+
+    def catalogos(self):
+        """Ids de los catálogos; si la base está vacía crea un conjunto fijo."""
+        if not LocalidadModel.objects.exists():
+            with transaction.atomic():
+                for nombre, sigla, barrios in LOCALIDADES:
+                    localidad = LocalidadModel.objects.create(nombre=nombre, sigla=sigla)
+                    BarrioModel.objects.bulk_create([
+                        BarrioModel(nombre=barrio, sigla=barrio[:3].upper(), localidad=localidad,
+                                    estrato_predominante=estrato)
+                        for barrio, estrato in barrios
+                    ])
+                zonas = ZonaModel.objects.bulk_create([
+                    ZonaModel(nombre=nombre, sigla=sigla, tipo_zona=tipo) for nombre, sigla, tipo in ZONAS
+                ])
+                barrios = list(BarrioModel.objects.order_by('id'))
+                for posicion, barrio in enumerate(barrios):
+                    zonas[posicion % len(zonas)].barrios.add(barrio)
+                if not AmenidadesModel.objects.exists():
+                    AmenidadesModel.objects.bulk_create([
+                        AmenidadesModel(nombre=nombre, categoria=categoria) for nombre, categoria in AMENIDADES
+                    ])
+                EdificioModel.objects.bulk_create([
+                    EdificioModel(nombre=f'Edificio {barrio.nombre} {numero}', sigla=f'{barrio.sigla}{numero}',
+                                  barrio=barrio, estrato=barrio.estrato_predominante)
+                    for barrio in barrios for numero in range(1, EDIFICIOS_POR_BARRIO + 1)
+                ])
+
+        return {
+            'barrios': list(BarrioModel.objects.order_by('id').values_list('id', 'nombre', 'localidad_id')),
+            'zonas': list(ZonaModel.objects.order_by('id').values_list('id', flat=True)),
+            'amenidades': list(AmenidadesModel.objects.order_by('id').values_list('id', flat=True)),
+            'edificios': list(EdificioModel.objects.order_by('id').values_list('id', 'barrio_id', 'estrato')),
+        }
+
+    def cedulas(self, rng, cantidad):
+        """Cédulas de 10 dígitos distintas: una muestra del rango, sin consultar la base."""
+        return [str(numero) for numero in rng.sample(range(10 ** 9, 10 ** 10), cantidad)]
+
+    def crear_agentes(self, rng, semilla, cedulas, textos):
+        # El hash de la contraseña es lento a propósito: se calcula una vez para todos
+        password = make_password('password123')
+        prefijo = f'seed{semilla}-agente'
+        usuarios = []
+        for numero in range(len(cedulas)):
+            nombre, apellido = _texto(rng, textos['nombres']), _texto(rng, textos['apellidos'])
+            usuarios.append(User(
+                username=f'{prefijo}{numero}',
+                first_name=nombre,
+                last_name=apellido,
+                email=f'{prefijo}{numero}@ejemplo.com',
+                password=password,
+            ))
+        with transaction.atomic():
+            User.objects.bulk_create(usuarios, batch_size=1000)
+            ids = dict(User.objects.filter(username__startswith=prefijo).values_list('username', 'id'))
+            AgenteModel.objects.bulk_create([
+                AgenteModel(
+                    user_id=ids[usuario.username],
+                    telefono="3" + str(rng.randrange(10 ** 9)).zfill(9),
+                    cedula=cedula,
+                    role='admin' if numero == 0 else 'user',
+                    estado='activo',
+                )
+                for numero, (usuario, cedula) in enumerate(zip(usuarios, cedulas))
+            ], batch_size=1000)
+        return list(AgenteModel.objects.filter(user__username__startswith=prefijo).order_by('id').values_list('id', flat=True))
+
+    def insertar(self, tabla, total, contexto, workers):
+        tareas = [
+            (tabla, particion, desde, min(desde + TAMANO_PARTICION, total), contexto)
+            for particion, desde in enumerate(range(0, total, TAMANO_PARTICION))
+        ]
+        if not tareas:
+            return 0
+        if workers == 1 or len(tareas) == 1:
+            return sum(insertar_particion(tarea) for tarea in tareas)
+
+        # Los procesos abren sus propias conexiones. Con 'spawn' (el único modo en
+        # Windows) cada proceso configura Django antes de recibir su primera partición.
+        connections.close_all()
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        proceso = multiprocessing.get_context('spawn')
+        with proceso.Pool(min(workers, len(tareas)), initializer=django.setup) as pool:
+            return sum(pool.imap_unordered(insertar_particion, tareas))
@@ -0,0 +1,509 @@
+"""
+Motor de coincidencias entre requerimientos y propiedades.
+
+Las propiedades y los requerimientos abiertos se cargan en arreglos de NumPy
+(un arreglo por característica). Cada requerimiento se compara contra todo el
+inventario de una sola vez: primero se aplican filtros obligatorios como
+máscaras booleanas (operación, presupuesto, mascotas, tipo de propiedad) y luego
+un puntaje ponderado de criterios blandos (precio, área, habitaciones, baños,
+parqueaderos y ubicación). Los K mejores resultados de cada requerimiento se
+guardan en ``MatchModel``.
+
+Los índices se mantienen en memoria por proceso y se actualizan fila a fila
+cuando se guarda una propiedad o un requerimiento (ver ``crm/signals.py``);
+además se reconstruyen cada ``MATCHING_INDICE_TTL`` segundos para recoger
+cambios hechos por otros workers.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .models import MatchModel, PropiedadModel, RequerimientoModel, ZonaModel
+
+TOP_K = int(os.getenv("MATCHING_TOP_K", 20))
+PUNTAJE_MINIMO = float(os.getenv("MATCHING_PUNTAJE_MINIMO", 0.3))
+INDICE_TTL = int(os.getenv("MATCHING_INDICE_TTL", 300))
+# Margen sobre el presupuesto máximo que todavía se considera compatible
+TOLERANCIA_PRECIO = 0.10
+# Requerimientos procesados a la vez en el recálculo completo
+TAMANO_BLOQUE = 256
+
+PESOS = {
+    'precio': 0.30,
+    'ubicacion': 0.25,
+    'area': 0.15,
+    'habitaciones': 0.15,
+    'banos': 0.10,
+    'parqueaderos': 0.05,
+}
+
+ESTADOS_ABIERTOS = ('pendiente', 'en_proceso')
+
+# Operaciones de un requerimiento
+SIN_OPERACION, COMPRA, ALQUILER = 0, 1, 2
+
+
+def _numero(valor):
+    """Convierte a float; devuelve NaN si no es un número."""
+    if valor is None or isinstance(valor, bool):
+        return np.nan
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _cantidad(valor):
+    """Lee la cantidad de un JSON como {"cantidad": "1"}."""
+    if isinstance(valor, dict):
+        valor = valor.get("cantidad")
+    numero = _numero(valor)
+    return 0.0 if np.isnan(numero) else numero
+
+
+class _CodigosTipo:
+    """Asigna un entero estable a cada tipo de propiedad (0 = sin especificar)."""
+
+    def __init__(self):
+        self._codigos = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, tipo):
+        tipo = (tipo or "").strip().lower()
+        if not tipo:
+            return 0
+        with self._lock:
+            return self._codigos.setdefault(tipo, len(self._codigos) + 1)
+
+
+codigo_tipo = _CodigosTipo()
+
+
+# ---------------------------------------------------------------------------
+# Extracción de características
+# ---------------------------------------------------------------------------
+
+CAMPOS_PROPIEDAD = (
+    'id', 'activo_venta', 'precio_venta', 'activo_renta', 'precio_renta',
+    'metro_cuadrado_construido', 'habitaciones', 'banos', 'garajes', 'mascotas',
+    'tipo_propiedad', 'edificio_id', 'edificio__barrio_id', 'edificio__barrio__localidad_id',
+)
+
+CAMPOS_REQUERIMIENTO = (
+    'id', 'estado', 'tipo_negocio', 'presupuesto_minimo', 'presupuesto_maximo',
+    'presupuesto_minimo_compra', 'presupuesto_maximo_compra', 'area_minima', 'area_maxima',
+    'habitaciones', 'banos', 'parqueaderos', 'mascotas',
+    'localidad_id', 'zona_id', 'barrio_id', 'edificio_id',
+)
+
+
+def _fila_propiedad(valores):
+    return {
+        'venta': bool(valores['activo_venta']),
+        'p_venta': _numero(valores['precio_venta']),
+        'renta': bool(valores['activo_renta']),
+        'p_renta': _numero(valores['precio_renta']),
+        'area': _numero(valores['metro_cuadrado_construido']),
+        'habitaciones': _cantidad(valores['habitaciones']),
+        'banos': _cantidad(valores['banos']),
+        'parqueaderos': _cantidad(valores['garajes']),
+        'mascotas': valores['mascotas'] == 'si',
+        'tipo': codigo_tipo(valores['tipo_propiedad']),
+        'edificio': valores['edificio_id'] or -1,
+        'barrio': valores['edificio__barrio_id'] or -1,
+        'localidad': valores['edificio__barrio__localidad_id'] or -1,
+    }
+
+
+def _fila_requerimiento(valores):
+    tipo_negocio = valores['tipo_negocio'] if isinstance(valores['tipo_negocio'], dict) else {}
+    operacion = str(tipo_negocio.get('operacion') or tipo_negocio.get('tipo') or '').lower()
+    if operacion in ('compra', 'venta'):
+        codigo_operacion = COMPRA
+        minimo, maximo = valores['presupuesto_minimo_compra'], valores['presupuesto_maximo_compra']
+    elif operacion in ('alquiler', 'arriendo', 'renta'):
+        codigo_operacion = ALQUILER
+        minimo, maximo = valores['presupuesto_minimo'], valores['presupuesto_maximo']
+    else:
+        codigo_operacion = SIN_OPERACION
+        minimo = valores['presupuesto_minimo_compra'] or valores['presupuesto_minimo']
+        maximo = valores['presupuesto_maximo_compra'] or valores['presupuesto_maximo']
+    return {
+        'operacion': codigo_operacion,
+        'tipo': codigo_tipo(tipo_negocio.get('tipo_propiedad')),
+        'p_min': _numero(minimo),
+        'p_max': _numero(maximo),
+        'area_min': _numero(valores['area_minima']),
+        'area_max': _numero(valores['area_maxima']),
+        'habitaciones': _cantidad(valores['habitaciones']),
+        'banos': _cantidad(valores['banos']),
+        'parqueaderos': _cantidad(valores['parqueaderos']),
+        'mascotas': valores['mascotas'] == 'si',
+        'localidad': valores['localidad_id'] or -1,
+        'zona': valores['zona_id'] or -1,
+        'barrio': valores['barrio_id'] or -1,
+        'edificio': valores['edificio_id'] or -1,
+    }
+
+
+class Instantanea:
+    """
+    Arreglos de un índice en un momento dado. No se modifican después de
+    publicarse: quien puntúa toma una instantánea y ve ids, columnas y activos
+    del mismo largo aunque otro hilo actualice el índice mientras tanto.
+    """
+
+    def __init__(self, ids, columnas, activos):
+        self.ids = ids
+        self.columnas = columnas
+        self.activos = activos
+
+    def __len__(self):
+        return len(self.ids)
+
+    def vista(self, posiciones=slice(None), eje=0):
+        """Columnas como arreglos 2D para comparar por broadcasting."""
+        forma = (-1, 1) if eje == 0 else (1, -1)
+        return {c: v[posiciones].reshape(forma) for c, v in self.columnas.items()}
+
+
+class IndiceVectorial:
+    """
+    Arreglos de NumPy por columna, con actualización fila a fila. Cada
+    actualización construye arreglos nuevos y los publica con una sola
+    asignación de ``datos`` (ver ``Instantanea``).
+    """
+
+    def __init__(self, filas_por_id):
+        ids = np.fromiter(filas_por_id.keys(), dtype=np.int64, count=len(filas_por_id))
+        filas = list(filas_por_id.values())
+        columnas = filas[0].keys() if filas else ()
+        self.datos = Instantanea(ids, {c: np.array([f[c] for f in filas]) for c in columnas},
+                                 np.ones(len(ids), dtype=bool))
+        self.posiciones = {int(i): n for n, i in enumerate(ids)}
+        self.creado = time.time()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.datos)
+
+    def actualizar(self, id_fila, fila):
+        with self._lock:
+            datos = self.datos
+            posicion = self.posiciones.get(id_fila)
+            if posicion is None:
+                if not datos.columnas:
+                    columnas = {c: np.array([v]) for c, v in fila.items()}
+                else:
+                    columnas = {c: np.append(datos.columnas[c], v) for c, v in fila.items()}
+                self.datos = Instantanea(np.append(datos.ids, id_fila), columnas, np.append(datos.activos, True))
+                self.posiciones[id_fila] = len(datos.ids)
+            else:
+                columnas = {}
+                for columna, valor in fila.items():
+                    columnas[columna] = datos.columnas[columna].copy()
+                    columnas[columna][posicion] = valor
+                activos = datos.activos.copy()
+                activos[posicion] = True
+                self.datos = Instantanea(datos.ids, columnas, activos)
+
+    def eliminar(self, id_fila):
+        with self._lock:
+            posicion = self.posiciones.get(id_fila)
+            if posicion is not None:
+                activos = self.datos.activos.copy()
+                activos[posicion] = False
+                self.datos = Instantanea(self.datos.ids, self.datos.columnas, activos)
+
+
+_lock = threading.Lock()
+_indices = {}
+
+
+def _cargar_propiedades():
+    filas = {}
+    for valores in PropiedadModel.objects.values(*CAMPOS_PROPIEDAD).iterator(chunk_size=5000):
+        filas[valores['id']] = _fila_propiedad(valores)
+    return IndiceVectorial(filas)
+
+
+def _cargar_requerimientos():
+    filas = {}
+    abiertos = RequerimientoModel.objects.filter(estado__in=ESTADOS_ABIERTOS)
+    for valores in abiertos.values(*CAMPOS_REQUERIMIENTO).iterator(chunk_size=5000):
+        filas[valores['id']] = _fila_requerimiento(valores)
+    return IndiceVectorial(filas)
+
+
+def _cargar_zonas():
+    """Pares (zona, barrio) codificados como enteros para usar con np.isin."""
+    pares = ZonaModel.barrios.through.objects.values_list('zonamodel_id', 'barriomodel_id')
+    return np.array([_clave_zona(z, b) for z, b in pares], dtype=np.int64)
+
+
+def _clave_zona(zona, barrio):
+    return np.asarray(zona, dtype=np.int64) * (1 << 32) + np.asarray(barrio, dtype=np.int64)
+
+
+CARGADORES = {
+    'propiedades': _cargar_propiedades,
+    'requerimientos': _cargar_requerimientos,
+    'zonas': _cargar_zonas,
+}
+
+
+def _indice(nombre):
+    with _lock:
+        indice, creado = _indices.get(nombre, (None, 0))
+        if indice is None or time.time() - creado > INDICE_TTL:
+            indice = CARGADORES[nombre]()
+            _indices[nombre] = (indice, time.time())
+        return indice
+
+
+def invalidar_indices():
+    with _lock:
+        _indices.clear()
+
+
+def quitar_del_indice(nombre, id_fila):
+    """Marca una fila como eliminada si el índice ya está cargado."""
+    with _lock:
+        indice, _ = _indices.get(nombre, (None, 0))
+    if indice is not None:
+        indice.eliminar(id_fila)
+
+
+# ---------------------------------------------------------------------------
+# Puntaje
+# ---------------------------------------------------------------------------
+
+def _proporcion(ofrecido, requerido):
+    """1 si se cumple el mínimo requerido; proporcional si se queda corto."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(requerido > 0, np.minimum(1.0, ofrecido / np.where(requerido > 0, requerido, 1)), 1.0)
+
+
+def puntuar(r, p, zonas):
+    """
+    Puntaje en [0, 1] para cada par requerimiento/propiedad.
+    ``r`` y ``p`` son diccionarios de arreglos que se combinan por broadcasting
+    (por ejemplo (M, 1) contra (1, N)). Los pares que no pasan los filtros
+    obligatorios quedan en -1.
+    """
+    operacion = r['operacion']
+    disponible = np.where(operacion == COMPRA, p['venta'],
+                          np.where(operacion == ALQUILER, p['renta'], p['venta'] | p['renta']))
+    precio = np.where(operacion == COMPRA, p['p_venta'],
+                      np.where(operacion == ALQUILER, p['p_renta'],
+                               np.where(p['venta'], p['p_venta'], p['p_renta'])))
+
+    # Filtros obligatorios
+    sin_maximo = np.isnan(r['p_max'])
+    with np.errstate(invalid='ignore'):
+        en_presupuesto = sin_maximo | (precio <= r['p_max'] * (1 + TOLERANCIA_PRECIO))
+    mascotas = ~r['mascotas'] | p['mascotas']
+    tipo = (r['tipo'] == 0) | (p['tipo'] == r['tipo'])
+    valido = disponible & en_presupuesto & mascotas & tipo
+
+    # Precio: 1 dentro del rango, decrece dentro de la tolerancia, 0.6 por debajo del mínimo
+    with np.errstate(invalid='ignore', divide='ignore'):
+        exceso = (precio - r['p_max']) / (r['p_max'] * TOLERANCIA_PRECIO)
+        s_precio = np.where(sin_maximo, 1.0,
+                            np.where(precio <= r['p_max'],
+                                     np.where(precio < np.nan_to_num(r['p_min']), 0.6, 1.0),
+                                     np.clip(1 - exceso, 0, 1)))
+
+        # Área: 1 dentro del rango, proporcional fuera de él, 0.5 si no se conoce
+        area = p['area']
+        s_area = np.ones(np.broadcast(area, r['area_min']).shape)
+        s_area = np.where(~np.isnan(r['area_min']) & (area < r['area_min']), area / r['area_min'], s_area)
+        s_area = np.where(~np.isnan(r['area_max']) & (area > r['area_max']),
+                          1 - (area - r['area_max']) / r['area_max'], s_area)
+        tiene_area = ~np.isnan(r['area_min']) | ~np.isnan(r['area_max'])
+        s_area = np.where(tiene_area & np.isnan(area), 0.5, np.clip(np.nan_to_num(s_area), 0, 1))
+
+    s_habitaciones = _proporcion(p['habitaciones'], r['habitaciones'])
+    s_banos = _proporcion(p['banos'], r['banos'])
+    s_parqueaderos = _proporcion(p['parqueaderos'], r['parqueaderos'])
+
+    # Ubicación: se premia el nivel más específico que coincide
+    pide_ubicacion = (r['edificio'] > 0) | (r['barrio'] > 0) | (r['zona'] > 0) | (r['localidad'] > 0)
+    en_zona = (r['zona'] > 0) & (p['barrio'] > 0) & np.isin(_clave_zona(r['zona'], p['barrio']), zonas)
+    s_ubicacion = np.maximum.reduce([
+        np.where((r['edificio'] > 0) & (p['edificio'] == r['edificio']), 1.0, 0.0),
+        np.where((r['barrio'] > 0) & (p['barrio'] == r['barrio']), 1.0, 0.0),
+        np.where(en_zona, 0.8, 0.0),
+        np.where((r['localidad'] > 0) & (p['localidad'] == r['localidad']), 0.6, 0.0),
+    ])
+    s_ubicacion = np.where(pide_ubicacion, s_ubicacion, 1.0)
+
+    puntaje = (
+        PESOS['precio'] * s_precio
+        + PESOS['ubicacion'] * s_ubicacion
+        + PESOS['area'] * s_area
+        + PESOS['habitaciones'] * s_habitaciones
+        + PESOS['banos'] * s_banos
+        + PESOS['parqueaderos'] * s_parqueaderos
+    ) / sum(PESOS.values())
+    return np.where(valido, np.round(puntaje, 4), -1.0)
+
+
+def _mejores(puntajes, k=None):
+    """Posiciones de los k mejores puntajes (TOP_K por defecto) que superan el mínimo, de mayor a menor."""
+    k = k or TOP_K
+    candidatos = np.flatnonzero(puntajes >= PUNTAJE_MINIMO)
+    if len(candidatos) > k:
+        candidatos = candidatos[np.argpartition(-puntajes[candidatos], k - 1)[:k]]
+    return candidatos[np.argsort(-puntajes[candidatos], kind='stable')]
+
+
+# ---------------------------------------------------------------------------
+# Recálculo
+# ---------------------------------------------------------------------------
+
+def _top_k_requerimiento(fila, indice_propiedades, zonas):
+    propiedades = indice_propiedades.datos
+    if not len(propiedades):
+        return []
+    r = {c: np.asarray(v).reshape(1, 1) for c, v in fila.items()}
+    puntajes = puntuar(r, propiedades.vista(eje=1), zonas)[0]
+    puntajes = np.where(propiedades.activos, puntajes, -1.0)
+    return [(int(propiedades.ids[i]), float(puntajes[i])) for i in _mejores(puntajes)]
+
+
+def recalcular_requerimiento(requerimiento_id):
+    """Recalcula el top-K de un requerimiento contra todo el inventario."""
+    valores = (RequerimientoModel.objects.filter(id=requerimiento_id)
+               .values(*CAMPOS_REQUERIMIENTO).first())
+    requerimientos = _indice('requerimientos')
+
+    if valores is None or valores['estado'] not in ESTADOS_ABIERTOS:
+        requerimientos.eliminar(requerimiento_id)
+        MatchModel.objects.filter(requerimiento_id=requerimiento_id).delete()
+        return []
+
+    fila = _fila_requerimiento(valores)
+    requerimientos.actualizar(requerimiento_id, fila)
+    mejores = _top_k_requerimiento(fila, _indice('propiedades'), _indice('zonas'))
+
+    with transaction.atomic():
+        MatchModel.objects.filter(requerimiento_id=requerimiento_id).delete()
+        MatchModel.objects.bulk_create([
+            MatchModel(requerimiento_id=requerimiento_id, propiedad_id=propiedad_id, puntaje=puntaje)
+            for propiedad_id, puntaje in mejores
+        ])
+    return mejores
+
+
+def requerimientos_llenos(propiedad_id):
+    """
+    Requerimientos que tienen la propiedad entre sus coincidencias y el top-K
+    completo: si la pierden, el siguiente candidato no está guardado y hay que
+    recalcularlos para no quedarse con menos de K.
+    """
+    con_propiedad = MatchModel.objects.filter(propiedad_id=propiedad_id).values('requerimiento_id')
+    return set(
+        MatchModel.objects.filter(requerimiento_id__in=con_propiedad)
+        .values('requerimiento_id').annotate(total=Count('id')).filter(total__gte=TOP_K)
+        .values_list('requerimiento_id', flat=True)
+    )
+
+
+def rellenar(requerimiento_ids):
+    """Recalcula los requerimientos que perdieron una coincidencia con el top-K lleno."""
+    for requerimiento_id in requerimiento_ids:
+        recalcular_requerimiento(requerimiento_id)
+
+
+def recalcular_propiedad(propiedad_id):
+    """
+    Actualiza los top-K de los requerimientos abiertos tras guardar una propiedad.
+    Solo se tocan los requerimientos donde la propiedad entra o sale de su top-K;
+    los que la tenían con la lista llena se recalculan completos.
+    """
+    valores = PropiedadModel.objects.filter(id=propiedad_id).values(*CAMPOS_PROPIEDAD).first()
+    propiedades = _indice('propiedades')
+    if valores is None:
+        propiedades.eliminar(propiedad_id)
+        return 0
+
+    fila = _fila_propiedad(valores)
+    propiedades.actualizar(propiedad_id, fila)
+
+    requerimientos = _indice('requerimientos').datos
+    if not len(requerimientos):
+        return 0
+    p = {c: np.asarray(v).reshape(1, 1) for c, v in fila.items()}
+    puntajes = puntuar(requerimientos.vista(eje=0), p, _indice('zonas'))[:, 0]
+    puntajes = np.where(requerimientos.activos, puntajes, -1.0)
+    candidatos = np.flatnonzero(puntajes >= PUNTAJE_MINIMO)
+    puntaje_por_requerimiento = {int(requerimientos.ids[i]): float(puntajes[i]) for i in candidatos}
+
+    with transaction.atomic():
+        # La propiedad cambió: sus coincidencias anteriores ya no son válidas
+        llenos_antes = requerimientos_llenos(propiedad_id)
+        MatchModel.objects.filter(propiedad_id=propiedad_id).delete()
+        for requerimiento_id in llenos_antes:
+            puntaje_por_requerimiento.pop(requerimiento_id, None)
+
+        ids = list(puntaje_por_requerimiento)
+        estado_actual = {}
+        for inicio in range(0, len(ids), 500):
+            bloque = ids[inicio:inicio + 500]
+            for registro in (MatchModel.objects.filter(requerimiento_id__in=bloque)
+                             .values('requerimiento_id').annotate(total=Count('id'), minimo=Min('puntaje'))):
+                estado_actual[registro['requerimiento_id']] = (registro['total'], registro['minimo'])
+
+        nuevos, llenos = [], []
+        for requerimiento_id, puntaje in puntaje_por_requerimiento.items():
+            total, minimo = estado_actual.get(requerimiento_id, (0, None))
+            if total < TOP_K:
+                nuevos.append(MatchModel(requerimiento_id=requerimiento_id, propiedad_id=propiedad_id, puntaje=puntaje))
+            elif puntaje > minimo:
+                nuevos.append(MatchModel(requerimiento_id=requerimiento_id, propiedad_id=propiedad_id, puntaje=puntaje))
+                llenos.append(requerimiento_id)
+        MatchModel.objects.bulk_create(nuevos, batch_size=1000)
+
+        # Los requerimientos que ya tenían K coincidencias sueltan la peor
+        for requerimiento_id in llenos:
+            peor = (MatchModel.objects.filter(requerimiento_id=requerimiento_id)
+                    .order_by('puntaje', '-id').values_list('id', flat=True).first())
+            MatchModel.objects.filter(id=peor).delete()
+
+        rellenar(llenos_antes)
+    return len(nuevos) + len(llenos_antes)
+
+
+def recalcular_todo():
+    """Recalcula desde cero los top-K de todos los requerimientos abiertos."""
+    invalidar_indices()
+    propiedades, requerimientos = _indice('propiedades').datos, _indice('requerimientos').datos
+    zonas = _indice('zonas')
+    if not len(propiedades) or not len(requerimientos):
+        MatchModel.objects.all().delete()
+        return 0
+    vista_propiedades = propiedades.vista(eje=1)
+    total = 0
+
+    with transaction.atomic():
+        MatchModel.objects.all().delete()
+        for inicio in range(0, len(requerimientos), TAMANO_BLOQUE):
+            bloque = slice(inicio, inicio + TAMANO_BLOQUE)
+            puntajes = puntuar(requerimientos.vista(bloque, eje=0), vista_propiedades, zonas)
+            puntajes = np.where(propiedades.activos[np.newaxis, :], puntajes, -1.0)
+            nuevos = []
+            for fila, requerimiento_id in enumerate(requerimientos.ids[bloque]):
+                for posicion in _mejores(puntajes[fila]):
+                    nuevos.append(MatchModel(
+                        requerimiento_id=int(requerimiento_id),
+                        propiedad_id=int(propiedades.ids[posicion]),
+                        puntaje=float(puntajes[fila, posicion]),
+                    ))
+            MatchModel.objects.bulk_create(nuevos, batch_size=1000)
+            total += len(nuevos)
+    return total
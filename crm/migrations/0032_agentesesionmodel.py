@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0031_agendaabiertamodel_cliente_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgenteSesionModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=150, unique=True)),
+                ('estado', models.TextField()),
+                ('version', models.BigIntegerField(default=0)),
+                ('expira', models.DateTimeField(db_index=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Sesión de agente',
+                'verbose_name_plural': 'Sesiones de agentes',
+            },
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+import json
+import re
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+# Copia congelada de crm.models (_a_precio y precios_de_modalidad): la migración
+# no debe cambiar si más adelante cambia el modelo.
+def _a_precio(valor):
+    """
+    Convierte un precio (número o texto como "$350.000.000" o "2500000.50") a
+    Decimal. Los separadores seguidos de tres cifras son de miles; un último
+    grupo de otra longitud ("2.500.000,50", "1.200.000.5") son los decimales.
+    """
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor))
+    texto = re.sub(r"[^\d.,']", '', str(valor)).strip(".,'")
+    if not texto:
+        return None
+    partes = re.split(r"[.,']+", texto)
+    decimales = partes.pop() if len(partes) > 1 and len(partes[-1]) != 3 else ''
+    if any(len(parte) != 3 for parte in partes[1:]):
+        # Agrupación que no es de miles ("12.34.56"): no es un precio
+        return None
+    entero = ''.join(partes)
+    return Decimal(f"{entero}.{decimales}" if decimales else entero)
+
+
+def precios_de_modalidad(modalidad):
+    """
+    Devuelve ``(precio_venta, precio_renta, activo_venta, activo_renta)`` a partir
+    de ``modalidad_de_negocio``. Acepta el formato del CRM
+    ({"venta_tradicional": {"activo", "precio"}, "renta_tradicional": {...}}),
+    el de los agentes ({"operacion": "venta"|"alquiler"|"ambos", "precio"}) y
+    textos simples como "venta" o "arriendo".
+    """
+    if isinstance(modalidad, str):
+        try:
+            modalidad = json.loads(modalidad)
+        except ValueError:
+            modalidad = {"operacion": modalidad}
+    if not isinstance(modalidad, dict):
+        return None, None, False, False
+
+    venta = modalidad.get("venta_tradicional")
+    renta = modalidad.get("renta_tradicional")
+    if isinstance(venta, dict) or isinstance(renta, dict):
+        venta = venta if isinstance(venta, dict) else {}
+        renta = renta if isinstance(renta, dict) else {}
+        return (_a_precio(venta.get("precio")), _a_precio(renta.get("precio")),
+                bool(venta.get("activo")), bool(renta.get("activo")))
+
+    operacion = str(modalidad.get("operacion", "")).lower()
+    precio = _a_precio(modalidad.get("precio"))
+    activo_venta = operacion in ("venta", "ambos")
+    activo_renta = operacion in ("alquiler", "arriendo", "renta", "ambos")
+    return (precio if activo_venta else None,
+            precio if operacion in ("alquiler", "arriendo", "renta") else None,
+            activo_venta, activo_renta)
+
+
+def rellenar_precios(apps, schema_editor):
+    """Calcula las columnas de precio para las propiedades existentes."""
+    PropiedadModel = apps.get_model('crm', 'PropiedadModel')
+    campos = ['precio_venta', 'precio_renta', 'activo_venta', 'activo_renta']
+    lote = []
+    for propiedad in PropiedadModel.objects.only('id', 'modalidad_de_negocio').iterator(chunk_size=2000):
+        (propiedad.precio_venta, propiedad.precio_renta,
+         propiedad.activo_venta, propiedad.activo_renta) = precios_de_modalidad(propiedad.modalidad_de_negocio)
+        lote.append(propiedad)
+        if len(lote) >= 2000:
+            PropiedadModel.objects.bulk_update(lote, campos)
+            lote = []
+    if lote:
+        PropiedadModel.objects.bulk_update(lote, campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_clientemodel_cedula'),
+        ('crm', '0032_agentesesionmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propiedadmodel',
+            name='activo_renta',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='propiedadmodel',
+            name='activo_venta',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='propiedadmodel',
+            name='precio_renta',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='propiedadmodel',
+            name='precio_venta',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=50, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='propiedadmodel',
+            index=models.Index(fields=['activo_venta', 'precio_venta'], name='crm_propied_activo__708f5e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propiedadmodel',
+            index=models.Index(fields=['activo_renta', 'precio_renta'], name='crm_propied_activo__357489_idx'),
+        ),
+        migrations.RunPython(rellenar_precios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0033_propiedad_precios_denormalizados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntaje', models.FloatField()),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('propiedad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='crm.propiedadmodel')),
+                ('requerimiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='crm.requerimientomodel')),
+            ],
+            options={
+                'ordering': ['-puntaje'],
+                'indexes': [models.Index(fields=['requerimiento', '-puntaje'], name='crm_matchmo_requeri_05b1b7_idx'), models.Index(fields=['propiedad', '-puntaje'], name='crm_matchmo_propied_580a98_idx')],
+                'constraints': [models.UniqueConstraint(fields=('requerimiento', 'propiedad'), name='match_unico')],
+            },
+        ),
+    ]
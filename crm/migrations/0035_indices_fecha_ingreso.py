@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_indices_fecha_ingreso'),
+        ('crm', '0034_matchmodel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='propiedadmodel',
+            index=models.Index(fields=['fecha_ingreso', 'id'], name='crm_propied_fecha_i_a0105f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requerimientomodel',
+            index=models.Index(fields=['fecha_ingreso', 'id'], name='requerimien_fecha_i_641a90_idx'),
+        ),
+    ]
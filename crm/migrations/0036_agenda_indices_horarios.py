@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_indices_fecha_ingreso'),
+        ('crm', '0035_indices_fecha_ingreso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorarioAgenteModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')])),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('duracion_minutos', models.PositiveIntegerField(default=60)),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['agente', 'dia_semana', 'hora_inicio'],
+            },
+        ),
+        migrations.AddField(
+            model_name='agendaabiertamodel',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='agendaabiertamodel',
+            index=models.Index(fields=['agente', 'fecha', 'hora', 'disponible'], name='crm_agendaa_agente__55c64c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agendaabiertamodel',
+            index=models.Index(fields=['disponible', 'fecha', 'hora'], name='crm_agendaa_disponi_fe7aba_idx'),
+        ),
+        migrations.AddField(
+            model_name='horarioagentemodel',
+            name='agente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios', to='accounts.agentemodel'),
+        ),
+    ]
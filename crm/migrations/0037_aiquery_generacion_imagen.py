@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0036_agenda_indices_horarios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aiquerymodel',
+            name='query_type',
+            field=models.CharField(choices=[('description', 'Descripción de propiedad'), ('voice', 'Transcripción de voz'), ('image', 'Análisis de imagen'), ('image_generation', 'Generación de imagen')], max_length=20),
+        ),
+    ]
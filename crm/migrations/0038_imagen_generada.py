@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0037_aiquery_generacion_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImagenGeneradaModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave_prompt', models.CharField(db_index=True, max_length=64)),
+                ('hash_contenido', models.CharField(db_index=True, max_length=64)),
+                ('archivo', models.FileField(upload_to='imagenes_generadas/')),
+                ('prompt', models.TextField(blank=True)),
+                ('parametros', models.JSONField(default=dict)),
+                ('tamano_bytes', models.PositiveIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-creado'],
+            },
+        ),
+    ]
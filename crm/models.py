@@ -2,6 +2,65 @@ from django.db import models
 from accounts.models import AgenteModel, ClienteModel
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
+from decimal import Decimal
+import json
+import re
+
+
+def _a_precio(valor):
+    """
+    Convierte un precio (número o texto como "$350.000.000" o "2500000.50") a
+    Decimal. Los separadores seguidos de tres cifras son de miles; un último
+    grupo de otra longitud ("2.500.000,50", "1.200.000.5") son los decimales.
+    """
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float, Decimal)):
+        return Decimal(str(valor))
+    texto = re.sub(r"[^\d.,']", '', str(valor)).strip(".,'")
+    if not texto:
+        return None
+    partes = re.split(r"[.,']+", texto)
+    decimales = partes.pop() if len(partes) > 1 and len(partes[-1]) != 3 else ''
+    if any(len(parte) != 3 for parte in partes[1:]):
+        # Agrupación que no es de miles ("12.34.56"): no es un precio
+        return None
+    entero = ''.join(partes)
+    return Decimal(f"{entero}.{decimales}" if decimales else entero)
+
+
+def precios_de_modalidad(modalidad):
+    """
+    Devuelve ``(precio_venta, precio_renta, activo_venta, activo_renta)`` a partir
+    de ``modalidad_de_negocio``. Acepta el formato del CRM
+    ({"venta_tradicional": {"activo", "precio"}, "renta_tradicional": {...}}),
+    el de los agentes ({"operacion": "venta"|"alquiler"|"ambos", "precio"}) y
+    textos simples como "venta" o "arriendo".
+    """
+    if isinstance(modalidad, str):
+        try:
+            modalidad = json.loads(modalidad)
+        except ValueError:
+            modalidad = {"operacion": modalidad}
+    if not isinstance(modalidad, dict):
+        return None, None, False, False
+
+    venta = modalidad.get("venta_tradicional")
+    renta = modalidad.get("renta_tradicional")
+    if isinstance(venta, dict) or isinstance(renta, dict):
+        venta = venta if isinstance(venta, dict) else {}
+        renta = renta if isinstance(renta, dict) else {}
+        return (_a_precio(venta.get("precio")), _a_precio(renta.get("precio")),
+                bool(venta.get("activo")), bool(renta.get("activo")))
+
+    operacion = str(modalidad.get("operacion", "")).lower()
+    precio = _a_precio(modalidad.get("precio"))
+    activo_venta = operacion in ("venta", "ambos")
+    activo_renta = operacion in ("alquiler", "arriendo", "renta", "ambos")
+    return (precio if activo_venta else None,
+            precio if operacion in ("alquiler", "arriendo", "renta") else None,
+            activo_venta, activo_renta)
+
 
 class AmenidadesModel(models.Model):
     nombre = models.CharField(max_length=100)
@@ -124,6 +183,32 @@ class PropiedadModel(models.Model):
     notas = models.JSONField(blank=True, null=True) 
     honorarios = models.JSONField(blank=True, null=True)
     multimedia = GenericRelation('MultimediaModel', related_query_name='propiedad', blank=True, null=True)
+    # Columnas derivadas de modalidad_de_negocio para filtrar precios en SQL.
+    # Se recalculan en save(); no se editan directamente.
+    precio_venta = models.DecimalField(max_digits=50, decimal_places=2, null=True, blank=True, editable=False)
+    precio_renta = models.DecimalField(max_digits=50, decimal_places=2, null=True, blank=True, editable=False)
+    activo_venta = models.BooleanField(default=False, editable=False)
+    activo_renta = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['activo_venta', 'precio_venta']),
+            models.Index(fields=['activo_renta', 'precio_renta']),
+            # Paginación por cursor sobre fecha_ingreso (desempate por id)
+            models.Index(fields=['fecha_ingreso', 'id']),
+        ]
+
+    def sincronizar_precios(self):
+        """Actualiza las columnas de precio a partir de modalidad_de_negocio."""
+        (self.precio_venta, self.precio_renta,
+         self.activo_venta, self.activo_renta) = precios_de_modalidad(self.modalidad_de_negocio)
+
+    def save(self, *args, **kwargs):
+        self.sincronizar_precios()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'modalidad_de_negocio' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'precio_venta', 'precio_renta', 'activo_venta', 'activo_renta'}
+        super().save(*args, **kwargs)
 
     """
     def generar_codigo(self):
@@ -257,6 +342,7 @@ class RequerimientoModel(models.Model):
         indexes = [
             models.Index(fields=['tipo_negocio']),
             models.Index(fields=['estado']),
+            models.Index(fields=['fecha_ingreso', 'id']),
         ]
 
     def __str__(self):
@@ -426,6 +512,7 @@ class AIQueryModel(models.Model):
         ('description', 'Descripción de propiedad'),
         ('voice', 'Transcripción de voz'),
         ('image', 'Análisis de imagen'),
+        ('image_generation', 'Generación de imagen'),
     ]
     
     MODEL_TYPES = [
@@ -440,10 +527,30 @@ class AIQueryModel(models.Model):
     input_data = models.JSONField()
     output_data = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # pending -> processing -> completed | failed; ver crm/jobs.py
     status = models.CharField(max_length=20, default='pending')
     error_message = models.TextField(null=True, blank=True)
 
 
+class ImagenGeneradaModel(models.Model):
+    """Imagen generada con IA, guardada en MEDIA_ROOT; ver crm/services/imagenes.py."""
+    # sha256 de los parámetros de generación: el mismo pedido reutiliza la imagen
+    clave_prompt = models.CharField(max_length=64, db_index=True)
+    # sha256 del archivo: dos imágenes idénticas comparten el mismo archivo
+    hash_contenido = models.CharField(max_length=64, db_index=True)
+    archivo = models.FileField(upload_to='imagenes_generadas/')
+    prompt = models.TextField(blank=True)
+    parametros = models.JSONField(default=dict)
+    tamano_bytes = models.PositiveIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-creado']
+
+    def __str__(self):
+        return f"{self.prompt[:50]} ({self.hash_contenido[:12]})"
+
+
 class AgendaModel(models.Model):
     cliente = models.ForeignKey(ClienteModel, on_delete=models.CASCADE)
     agente = models.ForeignKey(AgenteModel, on_delete=models.CASCADE, null=True, blank=True)
@@ -460,4 +567,73 @@ class AgendaAbiertaModel(models.Model):
     cliente = models.ForeignKey(ClienteModel, on_delete=models.CASCADE, null=True, blank=True)
     disponible = models.BooleanField(default=True)
     comentarios = models.TextField(blank=True, null=True)
-   
\ No newline at end of file
+    # Se incrementa en cada reserva o liberación; ver crm/services/agenda.py
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Próximos horarios libres de un agente y detección de duplicados
+            models.Index(fields=['agente', 'fecha', 'hora', 'disponible']),
+            # Próximos horarios libres de cualquier agente
+            models.Index(fields=['disponible', 'fecha', 'hora']),
+        ]
+
+class HorarioAgenteModel(models.Model):
+    """Franja de atención semanal de un agente, usada para generar agendas abiertas."""
+    DIAS_SEMANA = [
+        (0, 'Lunes'),
+        (1, 'Martes'),
+        (2, 'Miércoles'),
+        (3, 'Jueves'),
+        (4, 'Viernes'),
+        (5, 'Sábado'),
+        (6, 'Domingo'),
+    ]
+
+    agente = models.ForeignKey(AgenteModel, on_delete=models.CASCADE, related_name='horarios')
+    dia_semana = models.PositiveSmallIntegerField(choices=DIAS_SEMANA)
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    duracion_minutos = models.PositiveIntegerField(default=60)
+    activo = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['agente', 'dia_semana', 'hora_inicio']
+
+    def __str__(self):
+        return f"{self.agente} - {self.get_dia_semana_display()} {self.hora_inicio}-{self.hora_fin}"
+   
+class AgenteSesionModel(models.Model):
+    """Estado serializado de una conversación con un agente de IA."""
+    clave = models.CharField(max_length=150, unique=True)
+    estado = models.TextField()
+    version = models.BigIntegerField(default=0)
+    expira = models.DateTimeField(db_index=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Sesión de agente'
+        verbose_name_plural = 'Sesiones de agentes'
+
+    def __str__(self):
+        return self.clave
+
+class MatchModel(models.Model):
+    """Mejores coincidencias (top-K) entre requerimientos y propiedades; ver crm/matching.py."""
+    requerimiento = models.ForeignKey(RequerimientoModel, on_delete=models.CASCADE, related_name='matches')
+    propiedad = models.ForeignKey(PropiedadModel, on_delete=models.CASCADE, related_name='matches')
+    puntaje = models.FloatField()
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-puntaje']
+        constraints = [
+            models.UniqueConstraint(fields=['requerimiento', 'propiedad'], name='match_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['requerimiento', '-puntaje']),
+            models.Index(fields=['propiedad', '-puntaje']),
+        ]
+
+    def __str__(self):
+        return f'Requerimiento {self.requerimiento_id} - Propiedad {self.propiedad_id} ({self.puntaje})'
@@ -0,0 +1,6 @@
+from django.urls import re_path
+from .consumers import AIJobConsumer
+
+websocket_urlpatterns = [
+    re_path(r'ws/ai-jobs/(?P<job_id>\d+)/$', AIJobConsumer.as_asgi()),
+]
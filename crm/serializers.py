@@ -1,8 +1,12 @@
 from rest_framework import serializers
-from .models import AmenidadesModel, CaracteristicasInterioresModel, ZonasDeInteresModel, LocalidadModel, BarrioModel, ZonaModel, EdificioModel, PropiedadModel, AgenteModel, ClienteModel, MultimediaModel, RequerimientoModel, TareaModel, FaseSeguimientoModel, PuntoDeInteresModel, AgendaModel, AgendaAbiertaModel
+from .models import AmenidadesModel, CaracteristicasInterioresModel, ZonasDeInteresModel, LocalidadModel, BarrioModel, ZonaModel, EdificioModel, PropiedadModel, AgenteModel, ClienteModel, MultimediaModel, RequerimientoModel, TareaModel, FaseSeguimientoModel, PuntoDeInteresModel, AgendaModel, AgendaAbiertaModel, HorarioAgenteModel, MatchModel
 import json
+from collections import defaultdict
 from accounts.serializers import ClienteSerializer
 from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import Q
+from igh.api import CamposDinamicosMixin
 
 class MultimediaModelSerializer(serializers.ModelSerializer):
     archivo_url = serializers.SerializerMethodField()
@@ -19,7 +23,109 @@ class MultimediaModelSerializer(serializers.ModelSerializer):
             return obj.archivo.url
         return None
 
-class AmenidadesModelSerializer(serializers.ModelSerializer):
+
+def _multimedia_prefetch(instancia):
+    return 'multimedia' in getattr(instancia, '_prefetched_objects_cache', {})
+
+
+class MultimediaLoader:
+    """
+    Carga en una sola consulta la multimedia de todos los objetos que se van a
+    serializar, incluidos los anidados (edificio de una propiedad, puntos de
+    interés de una zona...). Se comparte entre serializadores a través del
+    contexto con la clave ``multimedia_loader``.
+    """
+
+    def __init__(self):
+        self._grupos = defaultdict(list)
+        self._cargados = set()
+
+    def precargar(self, serializer, instancias):
+        pendientes = defaultdict(set)
+        self._recolectar(serializer, instancias, pendientes)
+        if not pendientes:
+            return
+
+        tipos = ContentType.objects.get_for_models(*pendientes)
+        modelos = {tipo.id: modelo for modelo, tipo in tipos.items()}
+        filtro = Q()
+        for modelo, ids in pendientes.items():
+            filtro |= Q(content_type=tipos[modelo], object_id__in=ids)
+            self._cargados.update((modelo, pk) for pk in ids)
+
+        for multimedia in MultimediaModel.objects.filter(filtro):
+            self._grupos[(modelos[multimedia.content_type_id], multimedia.object_id)].append(multimedia)
+
+    def obtener(self, instancia):
+        """Multimedia precargada de la instancia, o None si no se precargó."""
+        clave = (type(instancia), instancia.pk)
+        if clave not in self._cargados:
+            return None
+        return self._grupos.get(clave, [])
+
+    def _recolectar(self, serializer, instancias, pendientes):
+        instancias = [instancia for instancia in instancias if instancia is not None]
+        if not instancias:
+            return
+
+        if isinstance(serializer, MultimediaMixin) and 'multimedia' in serializer.fields:
+            for instancia in instancias:
+                if (type(instancia), instancia.pk) not in self._cargados and not _multimedia_prefetch(instancia):
+                    pendientes[type(instancia)].add(instancia.pk)
+
+        # Recorrer los serializadores anidados de solo lectura
+        for campo in serializer.fields.values():
+            es_lista = isinstance(campo, serializers.ListSerializer)
+            hijo = campo.child if es_lista else campo
+            if campo.write_only or not isinstance(hijo, serializers.BaseSerializer):
+                continue
+            if campo.source == '*' or '.' in campo.source:
+                continue
+
+            relacionados = []
+            for instancia in instancias:
+                if es_lista:
+                    # Solo colecciones ya precargadas: recorrerlas no debe costar consultas extra
+                    relacionados.extend(getattr(instancia, '_prefetched_objects_cache', {}).get(campo.source, []))
+                else:
+                    relacionados.append(getattr(instancia, campo.source, None))
+            self._recolectar(hijo, relacionados, pendientes)
+
+
+class MultimediaListSerializer(serializers.ListSerializer):
+    """Precarga la multimedia de toda la lista antes de serializarla."""
+
+    def to_representation(self, data):
+        instancias = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child._multimedia_loader().precargar(self.child, instancias)
+        return super().to_representation(instancias)
+
+
+class MultimediaMixin:
+    """
+    Serializa el campo ``multimedia`` con, en orden: el ``prefetch_related`` de
+    la instancia, el ``MultimediaLoader`` del contexto o una consulta directa.
+    """
+
+    def to_representation(self, instance):
+        if self.parent is None and instance is not None:
+            self._multimedia_loader().precargar(self, [instance])
+        return super().to_representation(instance)
+
+    def _multimedia_loader(self):
+        return self.context.setdefault('multimedia_loader', MultimediaLoader())
+
+    def _multimedia(self, instance):
+        if _multimedia_prefetch(instance):
+            return instance.multimedia.all()
+        loader = self.context.get('multimedia_loader')
+        multimedia = loader.obtener(instance) if loader else None
+        return instance.multimedia.all() if multimedia is None else multimedia
+
+    def get_multimedia(self, obj):
+        return MultimediaModelSerializer(self._multimedia(obj), many=True, context=self.context).data
+
+class AmenidadesModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     icono_url = serializers.SerializerMethodField()
 
     class Meta:
@@ -33,19 +139,20 @@ class AmenidadesModelSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.icono.url)
         return None
 
-class CaracteristicasInterioresModelSerializer(serializers.ModelSerializer):
+class CaracteristicasInterioresModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = CaracteristicasInterioresModel
         fields = '__all__'  
 
-class PuntoDeInteresModelSerializer(serializers.ModelSerializer):
-    multimedia = MultimediaModelSerializer(many=True, read_only=True)
+class PuntoDeInteresModelSerializer(MultimediaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    multimedia = serializers.SerializerMethodField()
     icono_url = serializers.SerializerMethodField()
 
     class Meta:
         model = PuntoDeInteresModel
         fields = ['id', 'nombre', 'categoria', 'descripcion', 'ubicacion', 
                  'multimedia', 'icono', 'icono_url', 'direccion']
+        list_serializer_class = MultimediaListSerializer
 
     def get_icono_url(self, obj):
         if obj.icono:
@@ -55,25 +162,8 @@ class PuntoDeInteresModelSerializer(serializers.ModelSerializer):
             return obj.icono.url
         return None
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        
-        # Obtener multimedia del punto de interés
-        multimedia = MultimediaModel.objects.filter(
-            content_type__model='puntodeinteresmodel',
-            object_id=instance.id
-        )
-        
-        representation['multimedia'] = MultimediaModelSerializer(
-            multimedia, 
-            many=True,
-            context=self.context
-        ).data
-        
-        return representation
-
-class ZonasDeInteresModelSerializer(serializers.ModelSerializer):
-    multimedia = MultimediaModelSerializer(many=True, read_only=True)
+class ZonasDeInteresModelSerializer(MultimediaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    multimedia = serializers.SerializerMethodField()
     icono_url = serializers.SerializerMethodField()
     puntos_de_interes = PuntoDeInteresModelSerializer(many=True, read_only=True)
     
@@ -81,6 +171,7 @@ class ZonasDeInteresModelSerializer(serializers.ModelSerializer):
         model = ZonasDeInteresModel
         fields = ['id', 'nombre', 'categoria', 'descripcion', 'ubicacion', 
                  'multimedia', 'icono', 'icono_url', 'puntos_de_interes']
+        list_serializer_class = MultimediaListSerializer
 
     def get_icono_url(self, obj):
         if obj.icono:
@@ -118,49 +209,15 @@ class ZonasDeInteresModelSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class LocalidadModelSerializer(serializers.ModelSerializer):
-    multimedia = MultimediaModelSerializer(many=True, read_only=True)
+class LocalidadModelSerializer(MultimediaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    multimedia = serializers.SerializerMethodField()
     puntos_de_interes = PuntoDeInteresModelSerializer(read_only=True)
     zonas_de_interes = ZonasDeInteresModelSerializer(read_only=True)
 
     class Meta:
         model = LocalidadModel
         fields = ['id', 'nombre', 'sigla', 'descripcion', 'multimedia', 'zonas_de_interes', 'puntos_de_interes']
-
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        
-        # Obtener multimedia de la localidad
-        multimedia = MultimediaModel.objects.filter(
-            content_type__model='localidadmodel',
-            object_id=instance.id
-        )
-        
-        representation['multimedia'] = MultimediaModelSerializer(
-            multimedia, 
-            many=True,
-            context=self.context
-        ).data
-
-        # Manejar zonas_de_interes como ForeignKey (no como colección)
-        if hasattr(instance, 'zonas_de_interes') and instance.zonas_de_interes is not None:
-            representation['zonas_de_interes'] = ZonasDeInteresModelSerializer(
-                instance.zonas_de_interes,
-                context=self.context
-            ).data
-        else:
-            representation['zonas_de_interes'] = None
-            
-        # Manejar puntos_de_interes como ForeignKey (no como colección)
-        if hasattr(instance, 'puntos_de_interes') and instance.puntos_de_interes is not None:
-            representation['puntos_de_interes'] = PuntoDeInteresModelSerializer(
-                instance.puntos_de_interes,
-                context=self.context
-            ).data
-        else:
-            representation['puntos_de_interes'] = None
-        
-        return representation
+        list_serializer_class = MultimediaListSerializer
 
     def update(self, instance, validated_data):
         # Obtener las zonas de interés del request data
@@ -196,14 +253,14 @@ class LocalidadModelSerializer(serializers.ModelSerializer):
 
         return instance
 
-class BarrioModelSerializer(serializers.ModelSerializer):
-    multimedia = MultimediaModelSerializer(many=True, read_only=True)
+class BarrioModelSerializer(MultimediaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    multimedia = serializers.SerializerMethodField()
     localidad_nombre = serializers.CharField(source='localidad.nombre', read_only=True)
     localidad = serializers.PrimaryKeyRelatedField(
         queryset=LocalidadModel.objects.all(),
         required=True
     )
-    puntos_de_interes = PuntoDeInteresModelSerializer(many=True, read_only=True)
+    puntos_de_interes = PuntoDeInteresModelSerializer(read_only=True)
     puntos_de_interes_ids = serializers.PrimaryKeyRelatedField(
         source='puntos_de_interes',
         queryset=PuntoDeInteresModel.objects.all(),
@@ -211,7 +268,7 @@ class BarrioModelSerializer(serializers.ModelSerializer):
         required=False,
         write_only=True
     )
-    zonas_de_interes = ZonasDeInteresModelSerializer(many=True, read_only=True)
+    zonas_de_interes = ZonasDeInteresModelSerializer(read_only=True)
     zonas_de_interes_ids = serializers.PrimaryKeyRelatedField(
         source='zonas_de_interes',
         queryset=ZonasDeInteresModel.objects.all(),
@@ -229,6 +286,7 @@ class BarrioModelSerializer(serializers.ModelSerializer):
             'multimedia', 'zonas_de_interes', 'zonas_de_interes_ids',
             'puntos_de_interes', 'puntos_de_interes_ids'
         ]
+        list_serializer_class = MultimediaListSerializer
 
     def update(self, instance, validated_data):
         # Manejar la localidad
@@ -260,14 +318,14 @@ class BarrioModelSerializer(serializers.ModelSerializer):
             
         return representation
 
-class ZonaModelSerializer(serializers.ModelSerializer):
+class ZonaModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = ZonaModel
         fields = '__all__'  
 
-class EdificioModelSerializer(serializers.ModelSerializer):
-    multimedia = MultimediaModelSerializer(many=True, read_only=True)
-    puntos_de_interes = PuntoDeInteresModelSerializer(many=True, read_only=True)
+class EdificioModelSerializer(MultimediaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    multimedia = serializers.SerializerMethodField()
+    puntos_de_interes = PuntoDeInteresModelSerializer(read_only=True)
     puntos_de_interes_ids = serializers.PrimaryKeyRelatedField(
         source='puntos_de_interes',
         queryset=PuntoDeInteresModel.objects.all(),
@@ -275,7 +333,7 @@ class EdificioModelSerializer(serializers.ModelSerializer):
         required=False,
         write_only=True
     )
-    zonas_de_interes = ZonasDeInteresModelSerializer(many=True, read_only=True)
+    zonas_de_interes = ZonasDeInteresModelSerializer(read_only=True)
     zonas_de_interes_ids = serializers.PrimaryKeyRelatedField(
         source='zonas_de_interes',
         queryset=ZonasDeInteresModel.objects.all(),
@@ -303,23 +361,7 @@ class EdificioModelSerializer(serializers.ModelSerializer):
             'puntos_de_interes', 'puntos_de_interes_ids',
             'amenidades', 'amenidades_ids', 'tipo_edificio', 'estado'
         ]
-
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        
-        # Obtener multimedia del edificio
-        multimedia = MultimediaModel.objects.filter(
-            content_type__model='edificiomodel',
-            object_id=instance.id
-        )
-        
-        representation['multimedia'] = MultimediaModelSerializer(
-            multimedia, 
-            many=True,
-            context=self.context
-        ).data
-        
-        return representation
+        list_serializer_class = MultimediaListSerializer
 
     def update(self, instance, validated_data):
         print("Datos validados en update:", validated_data)
@@ -343,8 +385,8 @@ class EdificioModelSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class PropiedadModelSerializer(serializers.ModelSerializer):
-    multimedia = MultimediaModelSerializer(many=True, read_only=True)
+class PropiedadModelSerializer(MultimediaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    multimedia = serializers.SerializerMethodField()
     edificio = EdificioModelSerializer(read_only=True)  # Para lectura
     edificio_id = serializers.PrimaryKeyRelatedField(  # Para escritura
         source='edificio',
@@ -353,7 +395,7 @@ class PropiedadModelSerializer(serializers.ModelSerializer):
         allow_null=True
     )
     propietario = ClienteSerializer(read_only=True)
-    puntos_de_interes = PuntoDeInteresModelSerializer(many=True, read_only=True)
+    puntos_de_interes = PuntoDeInteresModelSerializer(read_only=True)
     puntos_de_interes_ids = serializers.PrimaryKeyRelatedField(
         source='puntos_de_interes',
         queryset=PuntoDeInteresModel.objects.all(),
@@ -361,7 +403,7 @@ class PropiedadModelSerializer(serializers.ModelSerializer):
         required=False,
         write_only=True
     )
-    zonas_de_interes = ZonasDeInteresModelSerializer(many=True, read_only=True)
+    zonas_de_interes = ZonasDeInteresModelSerializer(read_only=True)
     zonas_de_interes_ids = serializers.PrimaryKeyRelatedField(
         source='zonas_de_interes',
         queryset=ZonasDeInteresModel.objects.all(),
@@ -373,40 +415,12 @@ class PropiedadModelSerializer(serializers.ModelSerializer):
     class Meta:
         model = PropiedadModel
         fields = '__all__'
+        list_serializer_class = MultimediaListSerializer
 
     def to_representation(self, instance):
         if not instance:
             return {}
-            
-        representation = super().to_representation(instance)
-        
-        # Obtener multimedia de la propiedad
-        multimedia = MultimediaModel.objects.filter(
-            content_type__model='propiedadmodel',
-            object_id=instance.id
-        )
-        
-        representation['multimedia'] = MultimediaModelSerializer(
-            multimedia, 
-            many=True,
-            context=self.context
-        ).data
-
-        # Verificar zonas_de_interes antes de acceder
-        if hasattr(instance, 'zonas_de_interes') and instance.zonas_de_interes is not None:
-            representation['zonas_de_interes'] = ZonasDeInteresModelSerializer(
-                instance.zonas_de_interes,
-                context=self.context
-            ).data
-
-        # Verificar puntos_de_interes antes de acceder
-        if hasattr(instance, 'puntos_de_interes') and instance.puntos_de_interes is not None:
-            representation['puntos_de_interes'] = PuntoDeInteresModelSerializer(
-                instance.puntos_de_interes,
-                context=self.context
-            ).data
-
-        return representation
+        return super().to_representation(instance)
 
     def validate(self, data):
         print("\n=== Validación del Serializador ===")
@@ -462,28 +476,91 @@ class PropiedadModelSerializer(serializers.ModelSerializer):
             print(f"Error al crear propiedad: {str(e)}")
             raise serializers.ValidationError(f"Error al crear la propiedad: {str(e)}")
 
-class RequerimientoModelSerializer(serializers.ModelSerializer):
+class RequerimientoModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = RequerimientoModel
         fields = '__all__'  
 
-class TareaModelSerializer(serializers.ModelSerializer):
+class TareaModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = TareaModel
         fields = '__all__'  
 
-class FaseSeguimientoModelSerializer(serializers.ModelSerializer):
+class FaseSeguimientoModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = FaseSeguimientoModel
         fields = '__all__'
 
-class AgendaModelSerializer(serializers.ModelSerializer):
+class AgendaModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = AgendaModel
         fields = '__all__'
 
-class AgendaAbiertaModelSerializer(serializers.ModelSerializer):
+class AgendaAbiertaModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = AgendaAbiertaModel
         fields = '__all__'
+        read_only_fields = ['version']
+
+class HorarioAgenteModelSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HorarioAgenteModel
+        fields = '__all__'
+
+    def validate(self, data):
+        inicio = data.get('hora_inicio', getattr(self.instance, 'hora_inicio', None))
+        fin = data.get('hora_fin', getattr(self.instance, 'hora_fin', None))
+        if inicio and fin and fin <= inicio:
+            raise serializers.ValidationError({'hora_fin': 'La hora final debe ser posterior a la hora inicial'})
+        if data.get('duracion_minutos') == 0:
+            raise serializers.ValidationError({'duracion_minutos': 'La duración debe ser mayor que cero'})
+        return data
+
+class RangoHorarioSerializer(serializers.Serializer):
+    inicio = serializers.TimeField()
+    fin = serializers.TimeField()
+
+    def validate(self, data):
+        if data['fin'] <= data['inicio']:
+            raise serializers.ValidationError('La hora final debe ser posterior a la hora inicial')
+        return data
 
+class ReglaRecurrenciaSerializer(serializers.Serializer):
+    """Regla para abrir agendas en bloque: días de la semana, rangos de horas y duración de cada franja."""
+    agente = serializers.PrimaryKeyRelatedField(queryset=AgenteModel.objects.all())
+    desde = serializers.DateField()
+    hasta = serializers.DateField()
+    dias_semana = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6), allow_empty=False,
+        help_text='0 = lunes ... 6 = domingo',
+    )
+    horas = RangoHorarioSerializer(many=True, allow_empty=False)
+    duracion_minutos = serializers.IntegerField(min_value=5, max_value=24 * 60)
+    excluir = serializers.ListField(child=serializers.DateField(), required=False, default=list)
+
+    def validate(self, data):
+        if data['hasta'] < data['desde']:
+            raise serializers.ValidationError({'hasta': 'La fecha final debe ser posterior a la inicial'})
+        if (data['hasta'] - data['desde']).days > 366:
+            raise serializers.ValidationError({'hasta': 'El rango no puede superar un año'})
+        # El servicio trabaja con ids, como los demás datos de franjas
+        data['agente'] = data['agente'].id
+        return data
+
+class ProximasAgendasSerializer(serializers.Serializer):
+    """Filtros de GET /crm/agendaAbierta/?agente=&fecha=&propiedad=&limite=."""
+    agente = serializers.IntegerField(min_value=1, required=False)
+    fecha = serializers.DateField(required=False)
+    propiedad = serializers.IntegerField(min_value=1, required=False)
+    limite = serializers.IntegerField(min_value=1, max_value=100, required=False, default=10)
+
+class MatchModelSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    propiedad_titulo = serializers.CharField(source='propiedad.titulo', read_only=True)
+    propiedad_codigo = serializers.CharField(source='propiedad.codigo', read_only=True)
+    cliente = serializers.IntegerField(source='requerimiento.cliente_id', read_only=True)
+    cliente_nombre = serializers.CharField(source='requerimiento.cliente.nombre', read_only=True, default=None)
+
+    class Meta:
+        model = MatchModel
+        fields = ['id', 'requerimiento', 'propiedad', 'puntaje', 'actualizado',
+                  'propiedad_titulo', 'propiedad_codigo', 'cliente', 'cliente_nombre']
@@ -0,0 +1,39 @@
+"""
+Capa de servicios del CRM.
+
+Las vistas y las herramientas de los agentes llaman estas funciones
+directamente a través del ORM, sin volver a entrar al servidor por HTTP.
+Todas devuelven una tupla ``(exito, datos)``.
+
+Para despliegues donde los agentes corren en otra máquina se puede forzar el
+transporte HTTP con ``CRM_TRANSPORT=http``; en ese caso las herramientas usan
+``llamar_api`` contra ``CRM_BASE_URL``. Las vistas siempre usan el ORM.
+"""
+import os
+
+TRANSPORTE = os.getenv("CRM_TRANSPORT", "local")
+BASE_URL = os.getenv("CRM_BASE_URL", os.getenv("BASE_URL", "http://localhost:8000"))
+
+
+def usar_http():
+    """Indica si las herramientas deben hablar con el CRM por HTTP."""
+    return TRANSPORTE == "http"
+
+
+def llamar_api(metodo, ruta, payload=None, esperado=(200, 201)):
+    """Llama a la API remota del CRM y devuelve ``(exito, datos)``."""
+    import requests
+
+    url = f"{BASE_URL}{ruta}"
+    try:
+        response = requests.request(metodo, url, json=payload, timeout=30)
+    except requests.exceptions.RequestException as e:
+        print(f"Error al conectar con la API ({url}): {e}")
+        return False, {"error": str(e)}
+
+    if response.status_code in esperado:
+        try:
+            return True, response.json()
+        except ValueError:
+            return True, {}
+    return False, {"error": f"Error {response.status_code}: {response.text}"}
@@ -0,0 +1,284 @@
+"""
+Agendas abiertas y reservas.
+
+Las agendas disponibles se mantienen en un índice en memoria del proceso, para
+que el agente de agendas no consulte la base de datos en cada mensaje. El índice
+lleva la versión de la caché de Django con la que se construyó; las señales de
+``crm/signals.py`` cambian esa versión al guardar o eliminar una agenda y cada
+worker reconstruye su copia en la siguiente lectura. Para que el cambio llegue a
+todos los workers la caché debe ser compartida (ver ``igh/cache.py``).
+
+Las reservas usan un UPDATE condicional (``disponible=True`` en el WHERE), así
+que de dos reservas simultáneas del mismo horario solo una afecta la fila. Las
+agendas también se pueden generar en bloque a partir de los horarios semanales
+de cada agente (``HorarioAgenteModel``) o de reglas de recurrencia enviadas a
+``POST /crm/agendaAbierta/bulk/``.
+
+Configuración por variables de entorno:
+    AGENDAS_MASIVAS_MAX  agendas que puede abrir una sola solicitud masiva (por defecto 10000)
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.models import AgenteModel
+from accounts.serializers import AgenteSerializer
+from ..models import AgendaAbiertaModel, HorarioAgenteModel, PropiedadModel
+from ..serializers import AgendaAbiertaModelSerializer
+
+
+CLAVE_VERSION = 'crm:agendas:version'
+# Máximo de agendas que puede abrir una sola solicitud masiva
+AGENDAS_MASIVAS_MAX = int(os.getenv("AGENDAS_MASIVAS_MAX", 10000))
+# Días que puede abarcar una generación en bloque (igual que ReglaRecurrenciaSerializer)
+RANGO_MAXIMO_DIAS = 366
+
+_indice_lock = threading.Lock()
+_indice = {'version': None, 'agendas': []}
+
+
+def listar_agendas_abiertas():
+    """Devuelve las agendas abiertas que siguen disponibles."""
+    agendas = AgendaAbiertaModel.objects.filter(disponible=True)
+    return AgendaAbiertaModelSerializer(agendas, many=True).data
+
+
+def version_agendas():
+    """
+    Versión actual de las agendas en la caché compartida. Es un valor opaco que
+    solo sirve para comparar: cambia con cada ``invalidar_agendas()`` y, si la
+    clave no está en la caché (primer uso o expulsión), se crea una nueva, lo
+    que obliga a reconstruir los índices.
+    """
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        actual = time.time_ns()
+        # add() evita pisar una versión escrita por otra petición al mismo tiempo
+        if not cache.add(CLAVE_VERSION, actual, None):
+            actual = cache.get(CLAVE_VERSION, actual)
+    return actual
+
+
+def invalidar_agendas():
+    cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def agendas_disponibles():
+    """
+    Agendas abiertas desde el índice en memoria. Solo se consulta la base de
+    datos cuando la versión cambió desde la última lectura de este proceso.
+    """
+    actual = version_agendas()
+    if _indice['version'] != actual:
+        with _indice_lock:
+            if _indice['version'] != actual:
+                _indice['agendas'] = listar_agendas_abiertas()
+                _indice['version'] = actual
+    return _indice['agendas']
+
+
+def obtener_agenda(agenda_id):
+    """Devuelve ``(exito, datos)`` con la agenda solicitada."""
+    agenda = AgendaAbiertaModel.objects.filter(id=agenda_id).first()
+    if agenda is None:
+        return False, {'error': 'Agenda no encontrada'}
+    return True, AgendaAbiertaModelSerializer(agenda).data
+
+
+def crear_agenda_abierta(data):
+    """Abre una nueva agenda. Devuelve ``(exito, datos)``."""
+    serializer = AgendaAbiertaModelSerializer(data=data)
+    if serializer.is_valid():
+        serializer.save()
+        return True, serializer.data
+    return False, serializer.errors
+
+
+def actualizar_agenda_abierta(agenda_id, data):
+    """Actualiza una agenda existente. Devuelve ``(exito, datos)``."""
+    agenda = AgendaAbiertaModel.objects.filter(id=agenda_id).first()
+    if agenda is None:
+        return False, {'error': 'Agenda no encontrada'}
+    serializer = AgendaAbiertaModelSerializer(agenda, data=data)
+    if serializer.is_valid():
+        serializer.save()
+        return True, serializer.data
+    return False, serializer.errors
+
+
+def reservar_agenda(agenda_id, cliente_id, comentarios=None):
+    """
+    Reserva una agenda abierta para un cliente con un UPDATE condicional: la
+    fila solo cambia si sigue disponible, también en SQLite, donde
+    ``select_for_update`` no bloquea. Devuelve ``(exito, datos)``.
+    """
+    if cliente_id is None:
+        return False, {'error': 'Se requiere el cliente para reservar la agenda'}
+    comentarios = comentarios or "Reservada a través del asistente virtual"
+    with transaction.atomic():
+        reservadas = AgendaAbiertaModel.objects.filter(id=agenda_id, disponible=True).update(
+            cliente_id=cliente_id,
+            disponible=False,
+            comentarios=comentarios,
+            version=F('version') + 1,
+        )
+        if not reservadas:
+            if AgendaAbiertaModel.objects.filter(id=agenda_id).exists():
+                return False, {'error': f"La agenda {agenda_id} ya no está disponible"}
+            return False, {'error': f"No se encontró la agenda con ID {agenda_id}"}
+        # update() no emite señales: el índice se invalida aquí
+        transaction.on_commit(invalidar_agendas)
+        agenda = AgendaAbiertaModel.objects.get(id=agenda_id)
+
+    print(f"Agenda {agenda_id} reservada para el cliente {cliente_id}")
+    return True, AgendaAbiertaModelSerializer(agenda).data
+
+
+def proximas_agendas(agente_id=None, fecha=None, propiedad_id=None, limite=10):
+    """
+    Próximas agendas libres, en orden cronológico, de un agente, de un día o
+    del agente a cargo de una propiedad. Devuelve ``(exito, datos)``.
+    """
+    if propiedad_id is not None:
+        agente_id = PropiedadModel.objects.filter(id=propiedad_id).values_list('agente_id', flat=True).first()
+        if agente_id is None:
+            return False, {'error': 'La propiedad no existe o no tiene un agente asignado'}
+
+    agendas = AgendaAbiertaModel.objects.filter(disponible=True)
+    if agente_id is not None:
+        agendas = agendas.filter(agente_id=agente_id)
+    if fecha is not None:
+        agendas = agendas.filter(fecha=fecha)
+    else:
+        ahora = timezone.localtime()
+        agendas = agendas.filter(Q(fecha__gt=ahora.date()) | Q(fecha=ahora.date(), hora__gte=ahora.time()))
+
+    agendas = agendas.order_by('fecha', 'hora')[:limite]
+    return True, AgendaAbiertaModelSerializer(agendas, many=True).data
+
+
+def _horas_del_dia(fecha, hora_inicio, hora_fin, duracion_minutos):
+    """Horas de inicio de las franjas completas entre ``hora_inicio`` y ``hora_fin``."""
+    inicio = datetime.combine(fecha, hora_inicio)
+    fin = datetime.combine(fecha, hora_fin)
+    paso = timedelta(minutes=duracion_minutos)
+    while inicio + paso <= fin:
+        yield inicio.time()
+        inicio += paso
+
+
+def expandir_horarios(horarios, desde, hasta):
+    """Genera las franjas ``(agente_id, fecha, hora)`` de los horarios entre dos fechas (inclusive)."""
+    por_dia = {}
+    for horario in horarios:
+        por_dia.setdefault(horario.dia_semana, []).append(horario)
+
+    fecha = desde
+    while fecha <= hasta:
+        for horario in por_dia.get(fecha.weekday(), []):
+            for hora in _horas_del_dia(fecha, horario.hora_inicio, horario.hora_fin, horario.duracion_minutos):
+                yield horario.agente_id, fecha, hora
+        fecha += timedelta(days=1)
+
+
+def expandir_regla(regla):
+    """
+    Genera las franjas ``(agente_id, fecha, hora)`` de una regla de recurrencia
+    ya validada (ver ``ReglaRecurrenciaSerializer``).
+    """
+    dias = set(regla['dias_semana'])
+    excluidas = set(regla.get('excluir', []))
+    fecha = regla['desde']
+    while fecha <= regla['hasta']:
+        if fecha.weekday() in dias and fecha not in excluidas:
+            for rango in regla['horas']:
+                for hora in _horas_del_dia(fecha, rango['inicio'], rango['fin'], regla['duracion_minutos']):
+                    yield regla['agente'], fecha, hora
+        fecha += timedelta(days=1)
+
+
+def crear_agendas(franjas, lote=500):
+    """
+    Inserta en bloque las franjas ``(agente_id, fecha, hora)`` que todavía no
+    existen, en una sola transacción. Devuelve las agendas creadas.
+    """
+    franjas = set(franjas)
+    if not franjas:
+        return []
+
+    agentes = {agente_id for agente_id, _, _ in franjas}
+    fechas = [fecha for _, fecha, _ in franjas]
+    with transaction.atomic():
+        # Una sola consulta sobre el índice (agente, fecha, hora, disponible)
+        existentes = set(AgendaAbiertaModel.objects.filter(
+            agente_id__in=agentes, fecha__range=(min(fechas), max(fechas)),
+        ).values_list('agente_id', 'fecha', 'hora'))
+        nuevas = [
+            AgendaAbiertaModel(agente_id=agente_id, fecha=fecha, hora=hora)
+            for agente_id, fecha, hora in sorted(franjas - existentes)
+        ]
+        AgendaAbiertaModel.objects.bulk_create(nuevas, batch_size=lote)
+        # bulk_create no emite señales: el índice se invalida aquí
+        transaction.on_commit(invalidar_agendas)
+    return nuevas
+
+
+def crear_agendas_recurrentes(reglas):
+    """
+    Abre en una sola transacción las agendas de una o varias reglas de
+    recurrencia, omitiendo las que ya existen. Devuelve ``(exito, datos)``.
+    """
+    franjas = set()
+    for regla in reglas:
+        franjas.update(expandir_regla(regla))
+        if len(franjas) > AGENDAS_MASIVAS_MAX:
+            return False, {'error': f"Las reglas generan más de {AGENDAS_MASIVAS_MAX} agendas; divida la solicitud"}
+
+    creadas = crear_agendas(franjas)
+    print(f"Agendas recurrentes: {len(creadas)} nuevas de {len(franjas)} franjas")
+    return True, {
+        'franjas': len(franjas),
+        'creadas': len(creadas),
+        'omitidas': len(franjas) - len(creadas),
+    }
+
+
+def generar_desde_horarios(agente_id, desde, hasta):
+    """
+    Abre las agendas de un agente entre dos fechas según sus horarios
+    semanales activos. Devuelve ``(exito, datos)``.
+    """
+    if hasta < desde:
+        return False, {'error': 'La fecha final debe ser posterior a la inicial'}
+    if (hasta - desde).days > RANGO_MAXIMO_DIAS:
+        return False, {'error': 'El rango no puede superar un año'}
+
+    horarios = list(HorarioAgenteModel.objects.filter(agente_id=agente_id, activo=True))
+    if not horarios:
+        return False, {'error': f"El agente {agente_id} no tiene horarios configurados"}
+
+    franjas = list(islice(expandir_horarios(horarios, desde, hasta), AGENDAS_MASIVAS_MAX + 1))
+    if len(franjas) > AGENDAS_MASIVAS_MAX:
+        return False, {'error': f"Los horarios generan más de {AGENDAS_MASIVAS_MAX} agendas; divida la solicitud"}
+    creadas = crear_agendas(franjas)
+    print(f"Agendas generadas para el agente {agente_id}: {len(creadas)} nuevas de {len(franjas)} franjas")
+    return True, {
+        'agente': agente_id,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'franjas': len(franjas),
+        'creadas': len(creadas),
+    }
+
+
+def listar_agentes():
+    """Devuelve los agentes registrados con la misma forma que /accounts/agente/."""
+    agentes = AgenteModel.objects.select_related('user')
+    return AgenteSerializer(agentes, many=True).data
@@ -0,0 +1,76 @@
+"""
+Catálogos de referencia en formato compacto ``{id, nombre}``.
+
+El resultado se guarda en la caché de Django bajo una clave que incluye la
+versión actual de los catálogos. Las señales de ``crm/signals.py`` cambian la
+versión cuando se guarda o elimina un registro, así que las entradas viejas
+simplemente dejan de leerse y expiran solas.
+
+La versión tiene que estar en una caché compartida por todos los workers (ver
+igh/cache.py): con una caché por proceso, ``invalidar()`` solo la cambiaría en
+el worker que guardó y los demás seguirían respondiendo el ETag viejo.
+"""
+import os
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from ..models import AmenidadesModel, BarrioModel, EdificioModel, LocalidadModel, ZonaModel
+
+CATALOGOS_TTL = int(os.getenv("CATALOGOS_TTL", 300))
+CLAVE_VERSION = 'crm:catalogos:version'
+
+CATALOGOS = {
+    'edificios': EdificioModel,
+    'amenidades': AmenidadesModel,
+    'localidades': LocalidadModel,
+    'barrios': BarrioModel,
+    'zonas': ZonaModel,
+}
+
+
+def version():
+    """Versión actual de los catálogos (nanosegundos del último cambio)."""
+    actual = cache.get(CLAVE_VERSION)
+    if actual is None:
+        actual = time.time_ns()
+        # add() evita pisar una versión escrita por otra petición al mismo tiempo
+        if not cache.add(CLAVE_VERSION, actual, None):
+            actual = cache.get(CLAVE_VERSION, actual)
+    return actual
+
+
+def ultima_modificacion():
+    return datetime.fromtimestamp(version() / 1e9, tz=timezone.utc)
+
+
+def invalidar():
+    cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def obtener_catalogos(nombres=None):
+    """
+    Devuelve ``(exito, datos)`` con los catálogos pedidos; ``nombres`` es una
+    lista de claves de ``CATALOGOS`` (por defecto, todos).
+    """
+    nombres = list(nombres or CATALOGOS)
+    desconocidos = [nombre for nombre in nombres if nombre not in CATALOGOS]
+    if desconocidos:
+        return False, {'error': f"Catálogos no soportados: {', '.join(desconocidos)}"}
+
+    actual = version()
+    claves = {nombre: f'crm:catalogos:{actual}:{nombre}' for nombre in nombres}
+    en_cache = cache.get_many(claves.values())
+
+    datos, faltantes = {}, {}
+    for nombre, clave in claves.items():
+        if clave in en_cache:
+            datos[nombre] = en_cache[clave]
+        else:
+            datos[nombre] = list(CATALOGOS[nombre].objects.order_by('nombre').values('id', 'nombre'))
+            faltantes[clave] = datos[nombre]
+
+    if faltantes:
+        cache.set_many(faltantes, CATALOGOS_TTL)
+    return True, datos
@@ -0,0 +1,81 @@
+"""
+Imágenes generadas con IA guardadas en el almacenamiento de medios.
+
+La imagen se descarga por partes desde la URL temporal de OpenAI a un archivo
+temporal, calculando su sha256 mientras llega, y luego se guarda en
+``MEDIA_ROOT/imagenes_generadas/``; nunca hay una copia completa en memoria.
+Los pedidos con los mismos parámetros reutilizan la imagen ya guardada y dos
+imágenes con el mismo contenido comparten un solo archivo.
+"""
+import hashlib
+import json
+import tempfile
+
+from django.core.files import File
+
+from ..models import ImagenGeneradaModel
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+def clave_prompt(parametros):
+    """sha256 de los parámetros de generación normalizados."""
+    normalizados = {
+        clave: (valor.strip().lower() if isinstance(valor, str) else valor)
+        for clave, valor in parametros.items()
+    }
+    texto = json.dumps(normalizados, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def serializar_imagen(imagen, reutilizada=False):
+    return {
+        "success": True,
+        "id": imagen.id,
+        "image_url": imagen.archivo.url,
+        "tamano_bytes": imagen.tamano_bytes,
+        "reutilizada": reutilizada,
+    }
+
+
+def buscar_generada(parametros):
+    """Imagen ya generada con los mismos parámetros, o ``None``."""
+    return ImagenGeneradaModel.objects.filter(clave_prompt=clave_prompt(parametros)).first()
+
+
+def guardar_desde_url(cliente_http, url, parametros):
+    """
+    Descarga la imagen de ``url`` por partes y la registra. Devuelve
+    ``(exito, datos)``.
+    """
+    sha = hashlib.sha256()
+    tamano = 0
+    with tempfile.TemporaryFile() as temporal:
+        with cliente_http.stream("GET", url) as respuesta:
+            if respuesta.status_code != 200:
+                return False, {"error": f"No se pudo descargar la imagen ({respuesta.status_code})"}
+            for bloque in respuesta.iter_bytes(TAMANO_BLOQUE):
+                sha.update(bloque)
+                temporal.write(bloque)
+                tamano += len(bloque)
+
+        hash_contenido = sha.hexdigest()
+        imagen = ImagenGeneradaModel(
+            clave_prompt=clave_prompt(parametros),
+            hash_contenido=hash_contenido,
+            prompt=parametros.get('prompt', ''),
+            parametros=parametros,
+            tamano_bytes=tamano,
+        )
+
+        existente = ImagenGeneradaModel.objects.filter(hash_contenido=hash_contenido).first()
+        if existente is not None:
+            # Mismo contenido: se reutiliza el archivo ya guardado
+            imagen.archivo.name = existente.archivo.name
+            imagen.save()
+        else:
+            temporal.seek(0)
+            imagen.archivo.save(f"{hash_contenido}.png", File(temporal), save=True)
+
+    print(f"Imagen generada guardada: {imagen.archivo.name} ({tamano} bytes)")
+    return True, serializar_imagen(imagen)
@@ -0,0 +1,102 @@
+import json
+import re
+
+from django.db import transaction
+
+from ..serializers import PropiedadModelSerializer
+
+
+def normalizar_propiedad(data):
+    """
+    Normaliza el payload de una propiedad generada por IA.
+    Devuelve ``(data, error)``; ``error`` es None si el payload es válido.
+    """
+    data = data.copy()
+
+    # Validar que el campo agente esté presente
+    if 'agente' not in data:
+        print("Error: El campo 'agente' es obligatorio y no está presente.")
+        return data, {"error": "El campo 'agente' es obligatorio"}
+
+    # Asegurarse de que modalidad_de_negocio sea un JSON válido
+    if 'modalidad_de_negocio' in data and isinstance(data['modalidad_de_negocio'], str):
+        try:
+            data['modalidad_de_negocio'] = json.loads(data['modalidad_de_negocio'])
+            print("modalidad_de_negocio convertido a JSON válido:", data['modalidad_de_negocio'])
+        except json.JSONDecodeError:
+            # Si no es un JSON válido, convertirlo a un formato válido
+            data['modalidad_de_negocio'] = {"operacion": data['modalidad_de_negocio']}
+            print("modalidad_de_negocio no era un JSON válido, convertido a formato válido:", data['modalidad_de_negocio'])
+
+    # Asegurarse de que direccion sea un JSON válido
+    if 'direccion' in data and isinstance(data['direccion'], str):
+        try:
+            data['direccion'] = json.loads(data['direccion'])
+            print("direccion convertido a JSON válido:", data['direccion'])
+        except json.JSONDecodeError:
+            # Si no es un JSON válido, convertirlo a un formato válido
+            data['direccion'] = {"direccion": data['direccion']}
+            print("direccion no era un JSON válido, convertido a formato válido:", data['direccion'])
+
+    # Asegurarse de que garajes y depositos sean JSON válidos
+    for field in ['garajes', 'depositos']:
+        if field in data and isinstance(data[field], str):
+            try:
+                data[field] = json.loads(data[field])
+                print(f"{field} convertido a JSON válido:", data[field])
+            except json.JSONDecodeError:
+                # Si no es un JSON válido, intentar extraer un número
+                match = re.search(r'\d+', data[field])
+                if match:
+                    data[field] = {"cantidad": match.group(0)}
+                    print(f"{field} no era un JSON válido, convertido a formato válido:", data[field])
+                else:
+                    data[field] = {"cantidad": "1"}
+
+    # Convertir campos numéricos si vienen como strings
+    numeric_fields = ['nivel', 'metro_cuadrado_construido', 'metro_cuadrado_propiedad',
+                      'habitaciones', 'habitacion_de_servicio', 'banos']
+    for field in numeric_fields:
+        if field in data and isinstance(data[field], str):
+            try:
+                # Intentar extraer un número si el campo contiene texto
+                match = re.search(r'\d+', data[field])
+                if match:
+                    data[field] = int(match.group(0))
+                else:
+                    data[field] = int(data[field])
+                print(f"Campo '{field}' convertido a entero:", data[field])
+            except ValueError:
+                print(f"Error: El campo '{field}' debe ser un número entero.")
+                # Establecer valor por defecto en lugar de retornar error
+                if field in ['habitaciones', 'banos', 'nivel']:
+                    data[field] = 0
+                else:
+                    data[field] = None
+
+    # Normalizar campos de selección
+    for field in ['terraza', 'balcon', 'mascotas']:
+        if field in data and isinstance(data[field], str):
+            if data[field].lower() in ['sí', 'si', 'yes', 'y', 'true', '1']:
+                data[field] = 'si'
+            else:
+                data[field] = 'no'
+
+    return data, None
+
+
+def crear_propiedad(data):
+    """Crea una propiedad en una sola transacción. Devuelve ``(exito, datos)``."""
+    data, error = normalizar_propiedad(data)
+    if error:
+        return False, error
+
+    serializer = PropiedadModelSerializer(data=data)
+    if serializer.is_valid():
+        with transaction.atomic():
+            serializer.save()
+        print("Nueva propiedad guardada exitosamente.")
+        return True, serializer.data
+
+    print("Errores de validación en el serializer:", serializer.errors)
+    return False, {"error": "Errores de validación en los datos proporcionados.", "detalles": serializer.errors}
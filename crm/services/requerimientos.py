@@ -0,0 +1,70 @@
+import json
+
+from django.db import transaction
+
+from ..serializers import RequerimientoModelSerializer
+
+
+def normalizar_requerimiento(data):
+    """
+    Normaliza el payload de un requerimiento generado por IA.
+    Devuelve ``(data, error)``; ``error`` es None si el payload es válido.
+    """
+    data = data.copy()
+
+    # Validar que los campos obligatorios estén presentes
+    if 'agente' not in data or 'cliente' not in data:
+        print("Error: Los campos 'agente' y 'cliente' son obligatorios y no están presentes.")
+        return data, {"error": "Los campos 'agente' y 'cliente' son obligatorios"}
+
+    # Asegurarse de que tipo_negocio sea un JSON válido
+    if 'tipo_negocio' in data and isinstance(data['tipo_negocio'], str):
+        try:
+            data['tipo_negocio'] = json.loads(data['tipo_negocio'])
+            print("tipo_negocio convertido a JSON válido:", data['tipo_negocio'])
+        except json.JSONDecodeError:
+            # Si no es un JSON válido, convertirlo a un formato válido
+            data['tipo_negocio'] = {"tipo": data['tipo_negocio']}
+            print("tipo_negocio no era un JSON válido, convertido a formato válido:", data['tipo_negocio'])
+
+    # Convertir campos numéricos si vienen como strings
+    numeric_fields = ['habitantes', 'area_minima', 'habitaciones', 'banos', 'parqueaderos']
+    for field in numeric_fields:
+        if field in data and isinstance(data[field], str):
+            try:
+                data[field] = int(data[field])
+                print(f"Campo '{field}' convertido a entero:", data[field])
+            except ValueError:
+                print(f"Error: El campo '{field}' debe ser un número entero.")
+                return data, {"error": f"El campo '{field}' debe ser un número entero"}
+
+    # Convertir campos decimales si vienen como strings
+    decimal_fields = ['presupuesto_minimo', 'presupuesto_maximo',
+                      'presupuesto_minimo_compra', 'presupuesto_maximo_compra']
+    for field in decimal_fields:
+        if field in data and isinstance(data[field], str):
+            try:
+                data[field] = float(data[field])
+                print(f"Campo '{field}' convertido a decimal:", data[field])
+            except ValueError:
+                print(f"Error: El campo '{field}' debe ser un número decimal.")
+                return data, {"error": f"El campo '{field}' debe ser un número decimal. Por favor, asegúrate de que el valor proporcionado sea un número válido."}
+
+    return data, None
+
+
+def crear_requerimiento(data):
+    """Crea un requerimiento en una sola transacción. Devuelve ``(exito, datos)``."""
+    data, error = normalizar_requerimiento(data)
+    if error:
+        return False, error
+
+    serializer = RequerimientoModelSerializer(data=data)
+    if serializer.is_valid():
+        with transaction.atomic():
+            serializer.save()
+        print("Nuevo requerimiento guardado exitosamente.")
+        return True, serializer.data
+
+    print("Errores de validación en el serializer:", serializer.errors)
+    return False, {"error": "Errores de validación en los datos proporcionados.", "detalles": serializer.errors}
@@ -0,0 +1,68 @@
+import os
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import matching
+from .models import AgendaAbiertaModel, PropiedadModel, RequerimientoModel
+from .services import agenda, catalogos
+
+# Permite desactivar el recálculo automático en cargas masivas (MATCHING_AUTO=0)
+MATCHING_AUTO = os.getenv("MATCHING_AUTO", "1") == "1"
+
+
+def _en_commit(funcion, *args):
+    """Ejecuta el recálculo después del commit; un error nunca rompe el guardado."""
+    def ejecutar():
+        try:
+            funcion(*args)
+        except Exception as e:
+            print(f"Error al recalcular coincidencias ({funcion.__name__}{args}): {str(e)}")
+    transaction.on_commit(ejecutar)
+
+
+@receiver(post_save, sender=PropiedadModel)
+def propiedad_guardada(sender, instance, raw=False, **kwargs):
+    if MATCHING_AUTO and not raw:
+        _en_commit(matching.recalcular_propiedad, instance.id)
+
+
+@receiver(post_save, sender=RequerimientoModel)
+def requerimiento_guardado(sender, instance, raw=False, **kwargs):
+    if MATCHING_AUTO and not raw:
+        _en_commit(matching.recalcular_requerimiento, instance.id)
+
+
+@receiver(pre_delete, sender=PropiedadModel)
+def propiedad_por_eliminar(sender, instance, **kwargs):
+    # Antes de que la cascada borre sus coincidencias: los top-K llenos se recalculan
+    if MATCHING_AUTO:
+        _en_commit(matching.rellenar, matching.requerimientos_llenos(instance.id))
+
+
+@receiver(post_delete, sender=PropiedadModel)
+def propiedad_eliminada(sender, instance, **kwargs):
+    # Las filas de MatchModel se eliminan en cascada; solo hay que sacarla del índice
+    matching.quitar_del_indice('propiedades', instance.id)
+
+
+@receiver(post_delete, sender=RequerimientoModel)
+def requerimiento_eliminado(sender, instance, **kwargs):
+    matching.quitar_del_indice('requerimientos', instance.id)
+
+
+def catalogo_modificado(sender, **kwargs):
+    catalogos.invalidar()
+
+
+for modelo in catalogos.CATALOGOS.values():
+    post_save.connect(catalogo_modificado, sender=modelo, dispatch_uid=f'catalogos_save_{modelo.__name__}')
+    post_delete.connect(catalogo_modificado, sender=modelo, dispatch_uid=f'catalogos_delete_{modelo.__name__}')
+
+
+@receiver(post_save, sender=AgendaAbiertaModel)
+@receiver(post_delete, sender=AgendaAbiertaModel)
+def agenda_modificada(sender, **kwargs):
+    # Tras el commit, para que ningún worker reconstruya el índice con datos sin confirmar
+    transaction.on_commit(agenda.invalidar_agendas)
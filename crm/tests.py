@@ -1,3 +1,682 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import date, time, timedelta
+from time import sleep
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from accounts.models import AgenteModel, ClienteModel
+from agentesIA import preguntas
+from agentesIA.sesiones import AgentSessionStore, MemoriaBackend
+from agentesIA.tools.inventarioTool import InventarioTool
+from agentesIA.lab.requerimientoTool import payload_desde_respuestas, registrar_desde_respuestas
+from . import jobs, matching
+from .services import agenda as servicio_agenda
+from .models import AgendaAbiertaModel, AIQueryModel, AmenidadesModel, BarrioModel, EdificioModel, HorarioAgenteModel, LocalidadModel, MatchModel, MultimediaModel, PropiedadModel, PuntoDeInteresModel, RequerimientoModel, ZonasDeInteresModel, _a_precio, precios_de_modalidad
+
+
+class SesionesAgenteTests(TestCase):
+    """Cada conversación con los agentes de captura tiene su propio session_id."""
+
+    def enviar(self, url, **datos):
+        return self.client.post(url, data=json.dumps(datos), content_type='application/json')
+
+    def test_iniciar_sin_session_id_genera_uno_por_conversacion(self):
+        for url in ('/crm/requerimientoAgent/', '/crm/propiedadAgent/'):
+            primera = self.enviar(url, action='iniciar').json()
+            segunda = self.enviar(url, action='iniciar').json()
+            self.assertTrue(primera['session_id'])
+            self.assertNotEqual(primera['session_id'], segunda['session_id'])
+
+    def test_mensaje_sin_session_id_se_rechaza(self):
+        for url in ('/crm/requerimientoAgent/', '/crm/propiedadAgent/', '/crm/agendaAgent/'):
+            respuesta = self.enviar(url, action='mensaje', mensaje='hola')
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn('session_id', respuesta.json()['error'])
+
+    def test_peticiones_simultaneas_de_una_sesion_se_serializan(self):
+        class Contador:
+            def __init__(self, valor=0):
+                self.valor = valor
+
+            def to_state(self):
+                return {'valor': self.valor}
+
+        sesiones = AgentSessionStore('prueba', Contador, lambda estado: Contador(**estado), backend=MemoriaBackend())
+
+        def mensaje():
+            with sesiones.bloqueo('s1'):
+                agente = sesiones.obtener('s1')
+                valor = agente.valor
+                sleep(0.05)
+                agente.valor = valor + 1
+                sesiones.guardar('s1', agente)
+
+        hilos = [threading.Thread(target=mensaje) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(sesiones.obtener('s1').valor, 4)
+        self.assertIs(sesiones.bloqueo('s1'), sesiones.bloqueo('s1'))
+        self.assertIsNot(sesiones.bloqueo('s1'), sesiones.bloqueo('s2'))
+
+
+class PreciosTests(SimpleTestCase):
+    """Columnas de precio desnormalizadas a partir de modalidad_de_negocio."""
+
+    def test_separadores_de_miles_y_decimales(self):
+        casos = {
+            '$350.000.000': Decimal('350000000'),
+            '2500000.50': Decimal('2500000.50'),
+            '2.500.000,50': Decimal('2500000.50'),
+            '2,500,000.50': Decimal('2500000.50'),
+            "1'200.000": Decimal('1200000'),
+            '850.000 COP': Decimal('850000'),
+            1500000: Decimal('1500000'),
+        }
+        for texto, esperado in casos.items():
+            self.assertEqual(_a_precio(texto), esperado, texto)
+
+    def test_textos_que_no_son_precios(self):
+        for texto in (None, '', '$', 'a convenir', '12.34.56', True):
+            self.assertIsNone(_a_precio(texto), texto)
+
+    def test_formatos_de_modalidad(self):
+        self.assertEqual(
+            precios_de_modalidad({'operacion': 'alquiler', 'precio': '2500000.50'}),
+            (None, Decimal('2500000.50'), False, True),
+        )
+        self.assertEqual(
+            precios_de_modalidad({
+                'venta_tradicional': {'activo': True, 'precio': '$450.000.000'},
+                'renta_tradicional': {'activo': False},
+            }),
+            (Decimal('450000000'), None, True, False),
+        )
+        self.assertEqual(precios_de_modalidad('arriendo'), (None, None, False, True))
+        self.assertEqual(precios_de_modalidad(None), (None, None, False, False))
+
+
+class PreciosPropiedadTests(TestCase):
+
+    def test_guardar_sincroniza_las_columnas(self):
+        propiedad = PropiedadModel.objects.create(
+            modalidad_de_negocio={'operacion': 'ambos', 'precio': '380.000.000'},
+        )
+        propiedad.refresh_from_db()
+        self.assertEqual(propiedad.precio_venta, Decimal('380000000'))
+        self.assertTrue(propiedad.activo_venta)
+        self.assertTrue(propiedad.activo_renta)
+
+
+class InventarioPreciosTests(TestCase):
+    """Filtro de precio del inventario según la operación pedida."""
+
+    def setUp(self):
+        crear = PropiedadModel.objects.create
+        self.ambas = crear(titulo='Ambas', modalidad_de_negocio={
+            'venta_tradicional': {'activo': True, 'precio': '450.000.000'},
+            'renta_tradicional': {'activo': True, 'precio': '2.500.000'},
+        })
+        self.renta = crear(titulo='Renta', modalidad_de_negocio={'operacion': 'alquiler', 'precio': '2.000.000'})
+        self.venta = crear(titulo='Venta', modalidad_de_negocio={'operacion': 'venta', 'precio': '2.800.000'})
+
+    def buscar(self, **filtros):
+        resultado = InventarioTool()._run(**filtros)
+        return {p['nombre']: (p['tipo_negocio'], p['precio']) for p in resultado['propiedades'].values()}
+
+    def test_renta_compara_el_canon(self):
+        self.assertEqual(self.buscar(tipo_negocio='Renta', precio_max=3000000), {
+            'Ambas': ('Renta', 2500000.0), 'Renta': ('Renta', 2000000.0),
+        })
+
+    def test_venta_compara_el_precio_de_venta(self):
+        self.assertEqual(self.buscar(tipo_negocio='Venta', precio_min=100000000), {'Ambas': ('Venta', 450000000.0)})
+        self.assertEqual(self.buscar(tipo_negocio='Venta', precio_max=3000000), {'Venta': ('Venta', 2800000.0)})
+
+    def test_sin_operacion_usa_venta_y_luego_renta(self):
+        self.assertEqual(set(self.buscar(precio_max=3000000)), {'Renta', 'Venta'})
+
+
+def _valores_propiedad(**cambios):
+    valores = dict.fromkeys(matching.CAMPOS_PROPIEDAD)
+    valores.update(activo_venta=False, activo_renta=True, precio_renta=2000000,
+                   metro_cuadrado_construido=70, habitaciones=3, banos=2, mascotas='si')
+    valores.update(cambios)
+    return valores
+
+
+def _valores_requerimiento(**cambios):
+    valores = dict.fromkeys(matching.CAMPOS_REQUERIMIENTO)
+    valores.update(estado='pendiente', tipo_negocio={'operacion': 'alquiler'},
+                   presupuesto_minimo=1500000, presupuesto_maximo=2500000,
+                   habitaciones=3, banos=2, parqueaderos=0, mascotas='no')
+    valores.update(cambios)
+    return valores
+
+
+def _puntaje(requerimiento, propiedad, zonas=()):
+    r = {c: np.asarray(v).reshape(1, 1) for c, v in matching._fila_requerimiento(requerimiento).items()}
+    p = {c: np.asarray(v).reshape(1, 1) for c, v in matching._fila_propiedad(propiedad).items()}
+    return float(matching.puntuar(r, p, np.array(zonas, dtype=np.int64))[0, 0])
+
+
+class PuntuarTests(SimpleTestCase):
+    """Filtros obligatorios y puntaje ponderado de crm/matching.py."""
+
+    def test_coincidencia_completa(self):
+        self.assertEqual(_puntaje(_valores_requerimiento(), _valores_propiedad()), 1.0)
+
+    def test_filtros_obligatorios(self):
+        requerimiento = _valores_requerimiento()
+        # Solo en venta
+        self.assertEqual(_puntaje(requerimiento, _valores_propiedad(activo_renta=False, activo_venta=True)), -1.0)
+        # Más del 10 % por encima del presupuesto
+        self.assertEqual(_puntaje(requerimiento, _valores_propiedad(precio_renta=2800000)), -1.0)
+        # Pide mascotas y la propiedad no las admite
+        self.assertEqual(_puntaje(_valores_requerimiento(mascotas='si'), _valores_propiedad(mascotas='no')), -1.0)
+
+    def test_criterios_blandos_bajan_el_puntaje(self):
+        requerimiento = _valores_requerimiento()
+        completo = _puntaje(requerimiento, _valores_propiedad())
+        dentro_de_tolerancia = _puntaje(requerimiento, _valores_propiedad(precio_renta=2700000))
+        menos_habitaciones = _puntaje(requerimiento, _valores_propiedad(habitaciones=1))
+        self.assertLess(dentro_de_tolerancia, completo)
+        self.assertGreater(dentro_de_tolerancia, 0)
+        self.assertLess(menos_habitaciones, completo)
+
+    def test_ubicacion(self):
+        requerimiento = _valores_requerimiento(barrio_id=7, localidad_id=3)
+        en_barrio = _puntaje(requerimiento, _valores_propiedad(edificio__barrio_id=7, edificio__barrio__localidad_id=3))
+        en_localidad = _puntaje(requerimiento, _valores_propiedad(edificio__barrio_id=8, edificio__barrio__localidad_id=3))
+        fuera = _puntaje(requerimiento, _valores_propiedad(edificio__barrio_id=9, edificio__barrio__localidad_id=4))
+        self.assertGreater(en_barrio, en_localidad)
+        self.assertGreater(en_localidad, fuera)
+
+    def test_mejores_ordena_y_descarta_bajo_el_minimo(self):
+        puntajes = np.array([0.5, 0.9, 0.1, -1.0, 0.7])
+        self.assertEqual(list(matching._mejores(puntajes, k=2)), [1, 4])
+        self.assertEqual(list(matching._mejores(puntajes, k=10)), [1, 4, 0])
+
+
+class IndiceVectorialTests(SimpleTestCase):
+    """Lecturas del índice mientras otro hilo lo actualiza."""
+
+    def test_instantaneas_consistentes_durante_actualizaciones(self):
+        indice = matching.IndiceVectorial({1: matching._fila_propiedad(_valores_propiedad())})
+        requerimiento = {c: np.asarray(v).reshape(1, 1)
+                         for c, v in matching._fila_requerimiento(_valores_requerimiento()).items()}
+        zonas = np.array([], dtype=np.int64)
+        terminado = threading.Event()
+        errores = []
+
+        def escribir():
+            try:
+                for n in range(2, 1500):
+                    indice.actualizar(n, matching._fila_propiedad(_valores_propiedad(habitaciones=n % 5)))
+                    if n % 3 == 0:
+                        indice.eliminar(n - 1)
+            finally:
+                terminado.set()
+
+        def leer():
+            while not terminado.is_set():
+                datos = indice.datos
+                try:
+                    puntajes = matching.puntuar(requerimiento, datos.vista(eje=1), zonas)[0]
+                    np.where(datos.activos, puntajes, -1.0)
+                    self.assertEqual({len(v) for v in datos.columnas.values()}, {len(datos.ids)})
+                except Exception as e:
+                    errores.append(e)
+                    return
+
+        hilos = [threading.Thread(target=escribir), threading.Thread(target=leer)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+        self.assertEqual(len(indice), 1499)
+        self.assertEqual(int(indice.datos.activos.sum()), 1499 - 499)
+
+
+class TopKTests(TestCase):
+    """Mantenimiento incremental de MatchModel al guardar y eliminar propiedades."""
+
+    def setUp(self):
+        parche = mock.patch.object(matching, 'TOP_K', 2)
+        parche.start()
+        self.addCleanup(parche.stop)
+        matching.invalidar_indices()
+        self.addCleanup(matching.invalidar_indices)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.requerimiento = RequerimientoModel.objects.create(
+                tipo_negocio={'operacion': 'alquiler'}, presupuesto_maximo=2500000, habitaciones=4,
+            )
+            # Puntajes decrecientes: 4, 3, 2 y 1 habitaciones
+            self.propiedades = [
+                PropiedadModel.objects.create(
+                    modalidad_de_negocio={'operacion': 'alquiler', 'precio': '2.000.000'}, habitaciones=n,
+                )
+                for n in (4, 3, 2, 1)
+            ]
+
+    def top_k(self):
+        return list(MatchModel.objects.filter(requerimiento=self.requerimiento)
+                    .order_by('-puntaje').values_list('propiedad_id', flat=True))
+
+    def test_guarda_los_k_mejores(self):
+        self.assertEqual(self.top_k(), [self.propiedades[0].id, self.propiedades[1].id])
+        self.assertEqual(self.top_k(), [m[0] for m in matching._top_k_requerimiento(
+            matching._fila_requerimiento(RequerimientoModel.objects.filter(id=self.requerimiento.id)
+                                         .values(*matching.CAMPOS_REQUERIMIENTO).first()),
+            matching._indice('propiedades'), matching._indice('zonas'))])
+
+    def test_propiedad_que_deja_de_coincidir_se_reemplaza(self):
+        mejor = self.propiedades[0]
+        mejor.modalidad_de_negocio = {'operacion': 'venta', 'precio': '900.000.000'}
+        with self.captureOnCommitCallbacks(execute=True):
+            mejor.save()
+        self.assertEqual(self.top_k(), [self.propiedades[1].id, self.propiedades[2].id])
+
+    def test_propiedad_que_baja_de_puntaje_sale_del_top_k(self):
+        mejor = self.propiedades[0]
+        mejor.habitaciones = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            mejor.save()
+        self.assertEqual(self.top_k(), [self.propiedades[1].id, self.propiedades[2].id])
+
+    def test_propiedad_nueva_desplaza_a_la_peor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            nueva = PropiedadModel.objects.create(
+                modalidad_de_negocio={'operacion': 'alquiler', 'precio': '2.100.000'}, habitaciones=5,
+            )
+        self.assertEqual(set(self.top_k()), {nueva.id, self.propiedades[0].id})
+
+    def test_endpoints_de_coincidencias(self):
+        respuesta = self.client.get(f'/crm/requerimientos/{self.requerimiento.id}/matches/')
+        self.assertEqual([m['propiedad'] for m in respuesta.json()], self.top_k())
+        respuesta = self.client.get(f'/crm/propiedades/{self.propiedades[0].id}/interesados/')
+        self.assertEqual([m['requerimiento'] for m in respuesta.json()], [self.requerimiento.id])
+        self.assertEqual(self.client.get('/crm/requerimientos/999999/matches/').status_code, 404)
+        self.assertEqual(self.client.get('/crm/propiedades/999999/interesados/').status_code, 404)
+
+    def test_eliminar_una_propiedad_rellena_la_lista(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.propiedades[0].delete()
+        self.assertEqual(self.top_k(), [self.propiedades[1].id, self.propiedades[2].id])
+
+
+class CatalogosTests(TestCase):
+    """GET /crm/catalogos/ con ETag basado en la versión compartida de los catálogos."""
+
+    def test_la_cache_es_compartida_entre_procesos(self):
+        self.assertNotIn('LocMemCache', settings.CACHES['default']['BACKEND'])
+
+    def test_etag_cambia_al_modificar_un_catalogo(self):
+        respuesta = self.client.get('/crm/catalogos/?tipos=localidades')
+        etag = respuesta['ETag']
+        self.assertEqual(self.client.get('/crm/catalogos/?tipos=localidades', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        LocalidadModel.objects.create(nombre='Chapinero')
+        respuesta = self.client.get('/crm/catalogos/?tipos=localidades', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([l['nombre'] for l in respuesta.json()['localidades']], ['Chapinero'])
+
+
+class CamposDinamicosTests(TestCase):
+    """?fields= y ?expand= en los listados y el detalle de propiedades."""
+
+    def setUp(self):
+        self.edificio = EdificioModel.objects.create(nombre='Torre 93')
+        self.propiedad = PropiedadModel.objects.create(titulo='Apartamento', edificio=self.edificio)
+
+    def test_fields_limita_los_campos(self):
+        resultado = self.client.get('/crm/propiedades/?fields=id,titulo').json()['results'][0]
+        self.assertEqual(set(resultado), {'id', 'titulo'})
+
+    def test_listado_sin_expand_devuelve_ids(self):
+        resultado = self.client.get('/crm/propiedades/').json()['results'][0]
+        self.assertEqual(resultado['edificio'], self.edificio.id)
+
+    def test_expand_anida_el_objeto(self):
+        resultado = self.client.get('/crm/propiedades/?expand=edificio').json()['results'][0]
+        self.assertEqual(resultado['edificio']['nombre'], 'Torre 93')
+        self.assertIsNone(resultado['propietario'])
+
+    def test_detalle_expande_todo(self):
+        resultado = self.client.get(f'/crm/propiedades/{self.propiedad.id}/').json()['propiedad']
+        self.assertEqual(resultado['edificio']['nombre'], 'Torre 93')
+
+
+class ConsultasListadoTests(TestCase):
+    """Los listados de propiedades y edificios hacen las mismas consultas con 1 o con muchas filas."""
+
+    def crear_filas(self, cantidad):
+        localidad = LocalidadModel.objects.create(nombre='Chapinero')
+        for n in range(cantidad):
+            punto = PuntoDeInteresModel.objects.create(nombre=f'Parque {n}', categoria='parque')
+            zona = ZonasDeInteresModel.objects.create(nombre=f'Zona {n}', categoria='comercial')
+            zona.puntos_de_interes.add(punto)
+            amenidad = AmenidadesModel.objects.create(nombre=f'Piscina {n}', categoria='recreación')
+            edificio = EdificioModel.objects.create(
+                nombre=f'Torre {n}', barrio=BarrioModel.objects.create(nombre=f'Barrio {n}', localidad=localidad),
+                puntos_de_interes=punto, zonas_de_interes=zona,
+            )
+            edificio.amenidades.add(amenidad)
+            propiedad = PropiedadModel.objects.create(
+                titulo=f'Apartamento {n}', edificio=edificio, puntos_de_interes=punto, zonas_de_interes=zona,
+            )
+            propiedad.amenidades.add(amenidad)
+            for objeto in (edificio, propiedad, punto, zona):
+                MultimediaModel.objects.create(contenido=objeto, tipo='foto', archivo=f'multimedia/{n}.jpg')
+
+    def test_numero_de_consultas_constante(self):
+        # Propiedades: listado, multimedia (toda, también la anidada), amenidades, puntos de la zona,
+        # amenidades y puntos de la zona del edificio. Edificios: las cuatro primeras.
+        for url, consultas in (('/crm/propiedades/', 6), ('/crm/edificios/', 4)):
+            for cantidad in (1, 5):
+                with self.subTest(url=url, cantidad=cantidad):
+                    MultimediaModel.objects.all().delete()
+                    PropiedadModel.objects.all().delete()
+                    EdificioModel.objects.all().delete()
+                    self.crear_filas(cantidad)
+                    with self.assertNumQueries(consultas):
+                        respuesta = self.client.get(url)
+                    resultados = respuesta.json()['results']
+                    self.assertEqual(len(resultados), cantidad)
+                    self.assertTrue(all(len(r['multimedia']) == 1 for r in resultados))
+
+
+class ReservasTests(TransactionTestCase):
+    """Reservas concurrentes de una agenda abierta (UPDATE condicional)."""
+
+    def test_dos_reservas_simultaneas_solo_una_gana(self):
+        agente = AgenteModel.objects.create(telefono='3000000000')
+        clientes = [ClienteModel.objects.create(nombre=f'Cliente {n}') for n in range(2)]
+        agenda = AgendaAbiertaModel.objects.create(agente=agente, fecha=date(2030, 1, 7), hora=time(9))
+        inicio_comun = threading.Barrier(len(clientes))
+        resultados = []
+
+        def reservar(cliente):
+            try:
+                inicio_comun.wait()
+                for _ in range(50):
+                    try:
+                        resultados.append(servicio_agenda.reservar_agenda(agenda.id, cliente.id))
+                        return
+                    except OperationalError:
+                        # La base en memoria de las pruebas no aplica el busy timeout
+                        # de SQLite: se reintenta como lo haría una base en archivo
+                        sleep(0.01)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(cliente,)) for cliente in clientes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        ganadores = [datos for exito, datos in resultados if exito]
+        self.assertEqual(len(resultados), 2)
+        self.assertEqual(len(ganadores), 1)
+        agenda.refresh_from_db()
+        self.assertFalse(agenda.disponible)
+        self.assertEqual(agenda.version, 1)
+        self.assertEqual(agenda.cliente_id, ganadores[0]['cliente'])
+
+    def test_reserva_sin_cliente_se_rechaza(self):
+        agenda = AgendaAbiertaModel.objects.create(fecha=date(2030, 1, 7), hora=time(9))
+        exito, datos = servicio_agenda.reservar_agenda(agenda.id, None)
+        self.assertFalse(exito)
+        agenda.refresh_from_db()
+        self.assertTrue(agenda.disponible)
+
+
+class AgendasTests(TestCase):
+    """Filtros de GET /crm/agendaAbierta/ y generación desde horarios."""
+
+    def setUp(self):
+        self.agente = AgenteModel.objects.create(telefono='3000000000')
+        HorarioAgenteModel.objects.create(agente=self.agente, dia_semana=0, hora_inicio=time(8),
+                                          hora_fin=time(12), duracion_minutos=30)
+
+    def test_filtros_invalidos_devuelven_400(self):
+        for consulta in ('limite=diez', 'limite=0', 'fecha=notadate', 'agente=xyz'):
+            respuesta = self.client.get(f'/crm/agendaAbierta/?{consulta}')
+            self.assertEqual(respuesta.status_code, 400, consulta)
+
+    def test_filtros_validos(self):
+        AgendaAbiertaModel.objects.create(agente=self.agente, fecha=date(2030, 1, 7), hora=time(9))
+        respuesta = self.client.get(f'/crm/agendaAbierta/?agente={self.agente.id}&fecha=2030-01-07&limite=5')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()), 1)
+
+    def test_generar_desde_horarios(self):
+        exito, datos = servicio_agenda.generar_desde_horarios(self.agente.id, date(2030, 1, 7), date(2030, 1, 13))
+        self.assertTrue(exito)
+        self.assertEqual(datos['creadas'], 8)
+
+    def test_generar_desde_horarios_limita_el_rango(self):
+        exito, _ = servicio_agenda.generar_desde_horarios(self.agente.id, date(2030, 1, 1), date(2031, 6, 1))
+        self.assertFalse(exito)
+        with mock.patch.object(servicio_agenda, 'AGENDAS_MASIVAS_MAX', 10):
+            exito, _ = servicio_agenda.generar_desde_horarios(self.agente.id, date(2030, 1, 7), date(2030, 1, 20))
+        self.assertFalse(exito)
+        self.assertFalse(AgendaAbiertaModel.objects.exists())
+
+
+class AgendasMasivasTests(TestCase):
+    """POST /crm/agendaAbierta/bulk/ con reglas de recurrencia."""
+
+    def setUp(self):
+        self.agente = AgenteModel.objects.create(telefono='3000000000')
+
+    def enviar(self, datos):
+        return self.client.post('/crm/agendaAbierta/bulk/', data=json.dumps(datos), content_type='application/json')
+
+    def regla(self, **cambios):
+        # Lunes y miércoles de una semana, de 8 a 10 en franjas de 30 minutos: 8 agendas
+        regla = {
+            'agente': self.agente.id, 'desde': '2030-01-07', 'hasta': '2030-01-13',
+            'dias_semana': [0, 2], 'horas': [{'inicio': '08:00', 'fin': '10:00'}], 'duracion_minutos': 30,
+        }
+        regla.update(cambios)
+        return regla
+
+    def test_no_duplica_franjas_existentes(self):
+        AgendaAbiertaModel.objects.create(agente=self.agente, fecha=date(2030, 1, 7), hora=time(8))
+        respuesta = self.enviar({'reglas': [self.regla(), self.regla(dias_semana=[0])]})
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json(), {'franjas': 8, 'creadas': 7, 'omitidas': 1})
+        self.assertEqual(AgendaAbiertaModel.objects.filter(agente=self.agente).count(), 8)
+
+        # Repetir la solicitud no crea nada
+        self.assertEqual(self.enviar(self.regla()).json()['creadas'], 0)
+        self.assertEqual(AgendaAbiertaModel.objects.count(), 8)
+
+    def test_excluir_fechas(self):
+        respuesta = self.enviar(self.regla(excluir=['2030-01-09']))
+        self.assertEqual(respuesta.json()['creadas'], 4)
+
+    def test_limite_de_agendas(self):
+        with mock.patch.object(servicio_agenda, 'AGENDAS_MASIVAS_MAX', 5):
+            respuesta = self.enviar(self.regla())
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(AgendaAbiertaModel.objects.exists())
+
+
+class PoolInmediato:
+    """Ejecuta los trabajos en el hilo de la prueba, dentro de su transacción."""
+
+    def submit(self, funcion, *args):
+        funcion(*args)
+
+
+class TrabajosIATests(TestCase):
+    """Estados de los trabajos de IA: pending -> processing -> completed | failed."""
+
+    def setUp(self):
+        for nombre, valor in (('pool', lambda: PoolInmediato()), ('close_old_connections', lambda: None)):
+            parche = mock.patch.object(jobs, nombre, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.estados = []
+        parche = mock.patch.object(jobs, 'notificar', lambda trabajo: self.estados.append(trabajo.status))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def encolar(self, funcion):
+        with mock.patch.dict(jobs.TAREAS, {'description': funcion}):
+            with self.captureOnCommitCallbacks(execute=True):
+                trabajo = jobs.encolar('description', 'gpt-4o-mini', {'texto': 'hola'})
+        trabajo.refresh_from_db()
+        return trabajo
+
+    def test_trabajo_completado(self):
+        trabajo = self.encolar(lambda datos: {'description': datos['texto'].upper()})
+        self.assertEqual(self.estados, [jobs.EN_PROCESO, jobs.COMPLETADO])
+        self.assertEqual(trabajo.output_data, {'description': 'HOLA'})
+        respuesta = self.client.get(f'/crm/ai-jobs/{trabajo.id}/').json()
+        self.assertEqual(respuesta['status'], 'completed')
+        self.assertEqual(respuesta['resultado'], {'description': 'HOLA'})
+
+    def test_trabajo_fallido(self):
+        def falla(datos):
+            raise RuntimeError('sin conexión')
+
+        trabajo = self.encolar(falla)
+        self.assertEqual(self.estados, [jobs.EN_PROCESO, jobs.FALLIDO])
+        self.assertEqual(trabajo.error_message, 'sin conexión')
+
+    def test_tipo_no_soportado(self):
+        with self.assertRaises(ValueError):
+            jobs.encolar('desconocido', 'gpt-4o-mini', {})
+
+    def test_trabajos_vencidos_fallan_y_eliminan_su_temporal(self):
+        descriptor, ruta = tempfile.mkstemp(prefix='ai-job-')
+        os.close(descriptor)
+        antiguo = timezone.now() - timedelta(seconds=jobs.AI_JOBS_TIMEOUT + 60)
+
+        def crear(estado, **datos):
+            return AIQueryModel.objects.create(query_type='voice', model_type='whisper', input_data=datos, status=estado)
+
+        perdido = crear(jobs.EN_PROCESO, archivo=ruta)
+        en_cola = crear(jobs.PENDIENTE)
+        reciente = crear(jobs.PENDIENTE)
+        terminado = crear(jobs.COMPLETADO)
+        AIQueryModel.objects.exclude(id=reciente.id).update(created_at=antiguo)
+
+        self.assertEqual(jobs.vencer_trabajos(), 2)
+        self.assertFalse(os.path.exists(ruta))
+        estados = dict(AIQueryModel.objects.values_list('id', 'status'))
+        self.assertEqual(estados, {
+            perdido.id: jobs.FALLIDO, en_cola.id: jobs.FALLIDO,
+            reciente.id: jobs.PENDIENTE, terminado.id: jobs.COMPLETADO,
+        })
+
+    def test_consultar_un_trabajo_vencido(self):
+        trabajo = AIQueryModel.objects.create(query_type='voice', model_type='whisper', input_data={})
+        AIQueryModel.objects.filter(id=trabajo.id).update(
+            created_at=timezone.now() - timedelta(seconds=jobs.AI_JOBS_TIMEOUT + 60))
+        respuesta = self.client.get(f'/crm/ai-jobs/{trabajo.id}/').json()
+        self.assertEqual(respuesta['status'], 'failed')
+        self.assertEqual(respuesta['error'], jobs.TRABAJO_VENCIDO)
+
+
+class PayloadRequerimientoTests(TestCase):
+    """Requerimiento armado con los aspectos que recopila el agente (agentesIA/lab/requerimientoTool.py)."""
+
+    def respuestas(self, **cambios):
+        respuestas = {
+            'tipo_negocio': 'compra', 'tipo_propiedad': 'apartamento', 'personas': 3,
+            'presupuesto_min': 200000000.0, 'presupuesto_max': 250000000.0, 'habitaciones': 3,
+            'mascotas': 'no', 'fecha_ideal': '2030-06-30',
+        }
+        respuestas.update(cambios)
+        return respuestas
+
+    def test_payload_completo(self):
+        payload = payload_desde_respuestas(self.respuestas(), 'Resumen', cliente_id=1, agente_id=2)
+        self.assertEqual(payload['tipo_negocio'], {'operacion': 'compra', 'tipo_propiedad': 'apartamento'})
+        self.assertEqual(payload['presupuesto_maximo_compra'], 250000000.0)
+        self.assertNotIn('presupuesto_maximo', payload)
+        self.assertEqual(payload['fecha_ideal_entrega'], '2030-06-30')
+        self.assertEqual(payload['habitantes'], 3)
+
+    def test_valores_sin_dato_se_omiten(self):
+        payload = payload_desde_respuestas(self.respuestas(
+            tipo_negocio='sin preferencia', tipo_propiedad='sin preferencia', habitaciones='sin preferencia',
+            mascotas='sin preferencia', fecha_ideal='lo antes posible',
+        ), 'Resumen')
+        self.assertEqual(payload['tipo_negocio'], {'operacion': '', 'tipo_propiedad': ''})
+        for campo in ('fecha_ideal_entrega', 'habitaciones', 'mascotas', 'presupuesto_maximo_compra'):
+            self.assertNotIn(campo, payload)
+        self.assertEqual(payload['presupuesto_maximo'], 250000000.0)
+
+    def test_registra_el_requerimiento(self):
+        agente = AgenteModel.objects.create(telefono='3000000000')
+        cliente = ClienteModel.objects.create(nombre='Ana')
+        for fecha in ('2030-06-30', 'sin preferencia'):
+            exito, datos = registrar_desde_respuestas(self.respuestas(fecha_ideal=fecha), 'Resumen', cliente.id, agente.id)
+            self.assertTrue(exito, datos)
+        self.assertEqual(RequerimientoModel.objects.filter(fecha_ideal_entrega__isnull=True).count(), 1)
+
+
+class InterpretarRespuestasTests(SimpleTestCase):
+    """Interpretación local de respuestas cortas (agentesIA/preguntas.py)."""
+
+    def assertInterpreta(self, tipo, casos, **opciones):
+        for texto, esperado in casos.items():
+            self.assertEqual(preguntas.interpretar(tipo, texto, **opciones), (True, esperado), texto)
+
+    def assertNoInterpreta(self, tipo, textos, **opciones):
+        for texto in textos:
+            self.assertEqual(preguntas.interpretar(tipo, texto, **opciones), (False, None), texto)
+
+    def test_enteros(self):
+        self.assertInterpreta(preguntas.ENTERO, {'3': 3, 'tres habitaciones': 3, 'ninguno': 0, 'no, ninguno': 0})
+        self.assertNoInterpreta(preguntas.ENTERO, ['2 o 3', '2,5', 'muchos'])
+
+    def test_numeros_y_montos(self):
+        self.assertInterpreta(preguntas.NUMERO, {'85 m2': 85, '72,5': 72.5})
+        self.assertInterpreta(preguntas.MONTO, {
+            '2 millones': 2000000.0, '1,5 millones': 1500000.0, '300 mil': 300000.0, '$2.500.000': 2500000.0,
+        })
+        self.assertNoInterpreta(preguntas.MONTO, ['entre 2 y 3 millones', 'lo normal'])
+
+    def test_si_no(self):
+        self.assertInterpreta(preguntas.SI_NO, {'Sí, un perro': 'si', 'no': 'no', 'claro': 'si'})
+        self.assertNoInterpreta(preguntas.SI_NO, ['a veces'])
+
+    def test_opciones(self):
+        opciones = preguntas.REQUERIMIENTO['tipo_negocio']['tipo']
+        self.assertInterpreta(opciones, {'Quiero comprar': 'compra', 'en arriendo': 'alquiler'})
+        self.assertNoInterpreta(opciones, ['comprar o arrendar, no sé', 'una casa'])
+
+    def test_indiferentes_y_ambiguas(self):
+        self.assertInterpreta(preguntas.ENTERO, {'me da igual': preguntas.SIN_PREFERENCIA})
+        self.assertNoInterpreta(preguntas.ENTERO, ['no sé', 'depende', '¿cuántas recomiendas?', ''])
+        self.assertNoInterpreta(None, ['3'])
+
+    def test_tipos_de_la_propiedad_siguen_al_modelo(self):
+        # habitacion_de_servicio es un IntegerField: "sí"/"no" no se pueden guardar
+        self.assertEqual(preguntas.PROPIEDAD['habitacion_de_servicio']['tipo'], preguntas.ENTERO)
+        self.assertEqual(preguntas.PROPIEDAD['habitacion_de_servicio']['plantillas'],
+                         ['¿Cuántas habitaciones de servicio tiene?'])
+        self.assertInterpreta(preguntas.ENTERO, {'una': 1, 'no tiene': 0})
+
+    def test_respuestas_largas_necesitan_al_modelo(self):
+        texto = 'Tres, pero también quiero que tenga balcón y esté cerca al parque'
+        self.assertNoInterpreta(preguntas.ENTERO, [texto], max_palabras=6)
+        self.assertInterpreta(preguntas.TEXTO, {f' {texto} ': texto}, max_palabras=6)
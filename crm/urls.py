@@ -3,10 +3,10 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     AmenidadesModelViewSet, CaracteristicasInterioresModelViewSet, ZonasDeInteresModelViewSet, 
     LocalidadModelViewSet, BarrioModelViewSet, ZonaModelViewSet, EdificioModelViewSet, 
-    PropiedadModelViewSet, RequerimientoModelViewSet, TareaModelViewSet, AgendaModelViewSet, 
-    transcribe_audio, analyze_image, PuntoDeInteresModelViewSet, generate_image, 
+    PropiedadModelViewSet, RequerimientoModelViewSet, TareaModelViewSet, AgendaModelViewSet, HorarioAgenteModelViewSet, 
+    transcribe_audio, analyze_image, ai_job, PuntoDeInteresModelViewSet, generate_image, 
     requerimientoAIView, requerimientoAgentView, propiedadAIView, propiedadAgentView,
-    agendaAbiertaView, agendaAgentView
+    agendaAbiertaView, agendaAgentView, catalogosView, generarAgendasView, agendasMasivasView
 )
 from django.conf import settings
 from django.conf.urls.static import static
@@ -24,17 +24,22 @@ router.register(r'requerimientos', RequerimientoModelViewSet)
 router.register(r'tareas', TareaModelViewSet)
 router.register(r'puntos-de-interes', PuntoDeInteresModelViewSet)
 router.register(r'agenda', AgendaModelViewSet)
+router.register(r'horarios-agente', HorarioAgenteModelViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('transcribe-audio/', transcribe_audio, name='transcribe-audio'),
     path('analyze-image/', analyze_image, name='analyze-image'),
     path('generate-image/', generate_image, name='generate-image'),
+    path('ai-jobs/<int:job_id>/', ai_job, name='ai-job'),
     path('requerimientoAI/', requerimientoAIView, name='requerimientoAI'),
     path('requerimientoAgent/', requerimientoAgentView, name='requerimientoAgent'),
     path('propiedadAI/', propiedadAIView, name='propiedadAI'),
     path('propiedadAgent/', propiedadAgentView, name='propiedadAgent'),
     path('agendaAgent/', agendaAgentView, name='agendaAgent'),
     path('agendaAbierta/', agendaAbiertaView, name='agendaAbierta'),
+    path('agendaAbierta/generar/', generarAgendasView, name='generarAgendas'),
+    path('agendaAbierta/bulk/', agendasMasivasView, name='agendasMasivas'),
+    path('catalogos/', catalogosView, name='catalogos'),
     path('agendaAbierta/<int:agenda_id>/', agendaAbiertaView, name='agendaAbierta'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
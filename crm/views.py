@@ -1,24 +1,29 @@
 from django.shortcuts import render, redirect
 from rest_framework import viewsets
-from .models import AmenidadesModel, CaracteristicasInterioresModel, ZonasDeInteresModel, LocalidadModel, BarrioModel, ZonaModel, EdificioModel, PropiedadModel, MultimediaModel, RequerimientoModel, TareaModel, FaseSeguimientoModel, AIQueryModel, PuntoDeInteresModel, AgendaModel, AgendaAbiertaModel
-from .serializers import AmenidadesModelSerializer, CaracteristicasInterioresModelSerializer, ZonasDeInteresModelSerializer, LocalidadModelSerializer, BarrioModelSerializer, ZonaModelSerializer, EdificioModelSerializer, PropiedadModelSerializer, MultimediaModelSerializer, RequerimientoModelSerializer, TareaModelSerializer, FaseSeguimientoModelSerializer, PuntoDeInteresModelSerializer, AgendaModelSerializer, AgendaAbiertaModelSerializer   
+from .models import AmenidadesModel, CaracteristicasInterioresModel, ZonasDeInteresModel, LocalidadModel, BarrioModel, ZonaModel, EdificioModel, PropiedadModel, MultimediaModel, RequerimientoModel, TareaModel, FaseSeguimientoModel, AIQueryModel, PuntoDeInteresModel, AgendaModel, AgendaAbiertaModel, HorarioAgenteModel, MatchModel
+from .serializers import AmenidadesModelSerializer, CaracteristicasInterioresModelSerializer, ZonasDeInteresModelSerializer, LocalidadModelSerializer, BarrioModelSerializer, ZonaModelSerializer, EdificioModelSerializer, PropiedadModelSerializer, MultimediaModelSerializer, RequerimientoModelSerializer, TareaModelSerializer, FaseSeguimientoModelSerializer, PuntoDeInteresModelSerializer, AgendaModelSerializer, HorarioAgenteModelSerializer, ReglaRecurrenciaSerializer, ProximasAgendasSerializer, MatchModelSerializer
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
 import json
 from accounts.models import AgenteModel
 from django.contrib.contenttypes.models import ContentType
 from rest_framework.decorators import action, api_view
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 import logging
-from .IA.lab_openAI import AIService
-import tempfile
+from datetime import date
 import os
-import requests
-import base64
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 import sys
+import uuid
 from agentesIA.tools.agendaAI import AgenteAgenda
+from .services import agenda as servicio_agenda
+from .services import catalogos as servicio_catalogos
+from .services import propiedades as servicio_propiedades
+from .services import requerimientos as servicio_requerimientos
+from . import jobs, matching
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +31,55 @@ logger = logging.getLogger(__name__)
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'agentesIA', 'lab'))
 
 # Importar la clase del agente inmobiliario
-from requerimiento import AgenteInmobiliario, agente
-from propiedad import agente_propiedad
+from requerimiento import AgenteInmobiliario
+from propiedad import AgenteInmobiliarioPropiedad
+from agentesIA.sesiones import AgentSessionStore
+
+# Cada conversación tiene su propio agente, guardado por session_id
+sesiones_requerimiento = AgentSessionStore('requerimiento', AgenteInmobiliario, AgenteInmobiliario.from_state)
+sesiones_propiedad = AgentSessionStore('propiedad', AgenteInmobiliarioPropiedad, AgenteInmobiliarioPropiedad.from_state)
+# El agente de agendas guarda una conversación por cliente
+sesiones_agenda = AgentSessionStore('agenda', AgenteAgenda, AgenteAgenda.from_state)
+
+
+def _session_id(data, action):
+    """
+    ``session_id`` de la conversación. Al iniciar sin uno se genera uno nuevo
+    (el cliente debe reenviarlo en los mensajes siguientes); el resto de
+    acciones sin ``session_id`` devuelven None.
+    """
+    session_id = data.get('session_id')
+    if session_id:
+        return str(session_id)
+    if action == 'iniciar':
+        return uuid.uuid4().hex
+    return None
+
+
+SIN_SESION = {'error': 'Falta session_id: inicia la conversación con action=iniciar y reenvía el session_id recibido'}
 
 # Create your views here.
 
+class LecturaOptimizadaMixin:
+    """
+    Aplica ``select_related``/``prefetch_related`` en las lecturas. En las
+    escrituras no se precarga: la vista puede agregar multimedia a la instancia
+    y volver a serializarla, y la caché del prefetch quedaría desactualizada.
+    """
+    select_lectura = ()
+    prefetch_lectura = ()
+
+    @classmethod
+    def queryset_lectura(cls, queryset=None):
+        queryset = cls.queryset.all() if queryset is None else queryset
+        return queryset.select_related(*cls.select_lectura).prefetch_related(*cls.prefetch_lectura)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in SAFE_METHODS:
+            queryset = self.queryset_lectura(queryset)
+        return queryset
+
 class AmenidadesModelViewSet(viewsets.ModelViewSet):
     queryset = AmenidadesModel.objects.all()
     serializer_class = AmenidadesModelSerializer
@@ -44,10 +93,7 @@ class AmenidadesModelViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         try:
             logger.info("Iniciando listado de amenidades")
-            queryset = self.get_queryset()
-            logger.info(f"Cantidad de amenidades: {queryset.count()}")
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
+            return super().list(request, *args, **kwargs)
         except Exception as e:
             logger.error(f"Error al listar amenidades: {str(e)}")
             return Response(
@@ -70,8 +116,9 @@ class CaracteristicasInterioresModelViewSet(viewsets.ModelViewSet):
     queryset = CaracteristicasInterioresModel.objects.all()
     serializer_class = CaracteristicasInterioresModelSerializer
 
-class ZonasDeInteresModelViewSet(viewsets.ModelViewSet):
+class ZonasDeInteresModelViewSet(LecturaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = ZonasDeInteresModel.objects.all()
+    prefetch_lectura = ('multimedia', 'puntos_de_interes')
     serializer_class = ZonasDeInteresModelSerializer
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
@@ -236,8 +283,10 @@ class ZonasDeInteresModelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class LocalidadModelViewSet(viewsets.ModelViewSet):
+class LocalidadModelViewSet(LecturaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = LocalidadModel.objects.all()
+    select_lectura = ('puntos_de_interes', 'zonas_de_interes')
+    prefetch_lectura = ('multimedia', 'zonas_de_interes__puntos_de_interes')
     serializer_class = LocalidadModelSerializer
 
     def get_serializer_context(self):
@@ -250,10 +299,6 @@ class LocalidadModelViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, context={'request': request})
         return Response(serializer.data)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
 
     @action(detail=True, methods=['POST'])
     def agregar_multimedia(self, request, pk=None):
@@ -385,8 +430,10 @@ class LocalidadModelViewSet(viewsets.ModelViewSet):
         except ZonasDeInteresModel.DoesNotExist:
             return Response({'error': 'Una o más zonas no existen'}, status=status.HTTP_404_NOT_FOUND)
 
-class BarrioModelViewSet(viewsets.ModelViewSet):
+class BarrioModelViewSet(LecturaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = BarrioModel.objects.all()
+    select_lectura = ('localidad', 'puntos_de_interes', 'zonas_de_interes')
+    prefetch_lectura = ('multimedia', 'zonas_de_interes__puntos_de_interes')
     serializer_class = BarrioModelSerializer
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
@@ -534,8 +581,10 @@ class ZonaModelViewSet(viewsets.ModelViewSet):
     queryset = ZonaModel.objects.all()
     serializer_class = ZonaModelSerializer
 
-class EdificioModelViewSet(viewsets.ModelViewSet):
+class EdificioModelViewSet(LecturaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = EdificioModel.objects.all()
+    select_lectura = ('barrio', 'puntos_de_interes', 'zonas_de_interes')
+    prefetch_lectura = ('multimedia', 'amenidades', 'zonas_de_interes__puntos_de_interes')
     serializer_class = EdificioModelSerializer
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
@@ -711,12 +760,28 @@ class EdificioModelViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class PropiedadModelViewSet(viewsets.ModelViewSet):
+class PropiedadModelViewSet(LecturaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = PropiedadModel.objects.all()
     serializer_class = PropiedadModelSerializer
+    ordering = ('-fecha_ingreso',)
+    select_lectura = (
+        'propietario', 'puntos_de_interes', 'zonas_de_interes',
+        'edificio__barrio', 'edificio__puntos_de_interes', 'edificio__zonas_de_interes',
+    )
+    prefetch_lectura = (
+        'multimedia', 'amenidades', 'zonas_de_interes__puntos_de_interes',
+        'edificio__amenidades', 'edificio__zonas_de_interes__puntos_de_interes',
+    )
+
+    # Valor de ?include= en retrieve -> catálogo que agrega (None si no es un catálogo)
+    INCLUDES = {
+        'multimedia': None,
+        'amenidades': 'amenidades',
+        'edificios': 'edificios',
+    }
 
     def get_queryset(self):
-        queryset = PropiedadModel.objects.all()
+        queryset = super().get_queryset()
         propietario_id = self.request.query_params.get('propietario', None)
         
         if propietario_id is not None:
@@ -724,6 +789,22 @@ class PropiedadModelViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    @action(detail=True, methods=['get'])
+    def interesados(self, request, pk=None):
+        """Requerimientos abiertos para los que esta propiedad está en su top-K."""
+        # Fuera del try: un id inexistente es 404, no 400
+        propiedad = self.get_object()
+        try:
+            if request.query_params.get('recalcular'):
+                matching.recalcular_propiedad(propiedad.id)
+            
+            matches = (MatchModel.objects.filter(propiedad=propiedad)
+                       .select_related('propiedad', 'requerimiento__cliente'))
+            return Response(MatchModelSerializer(matches, many=True).data)
+        except Exception as e:
+            print(f"Error al obtener interesados de la propiedad: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     def retrieve(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
@@ -734,29 +815,28 @@ class PropiedadModelViewSet(viewsets.ModelViewSet):
                 )
             
             serializer = self.get_serializer(instance)
-            multimedia = MultimediaModel.objects.filter(
-                content_type__model='propiedadmodel',
-                object_id=instance.id
-            )
-            multimedia_serializer = MultimediaModelSerializer(
-                multimedia, 
-                many=True,
-                context={'request': request}
-            ).data
-            
-            # Obtener edificios disponibles
-            edificios = EdificioModel.objects.all()
-            edificios_serializer = EdificioModelSerializer(edificios, many=True).data
-            
-            return Response({
-                'propiedad': serializer.data,
-                'amenidades_disponibles': AmenidadesModelSerializer(
-                    AmenidadesModel.objects.all(), 
-                    many=True
-                ).data,
-                'multimedia': multimedia_serializer,
-                'edificios_disponibles': edificios_serializer
-            })
+            propiedad = serializer.data
+            respuesta = {'propiedad': propiedad}
+
+            # Expansión opcional: ?include=multimedia,amenidades,edificios
+            include = {valor.strip() for valor in request.query_params.get('include', '').split(',') if valor.strip()}
+            no_soportados = include - set(self.INCLUDES)
+            if no_soportados:
+                return Response(
+                    {'error': f"Valores de include no soportados: {', '.join(sorted(no_soportados))}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if 'multimedia' in include:
+                respuesta['multimedia'] = propiedad['multimedia']
+            catalogos = [self.INCLUDES[valor] for valor in include if self.INCLUDES[valor]]
+            if catalogos:
+                # Listas compactas {id, nombre}; el detalle completo está en /crm/catalogos/
+                _, datos = servicio_catalogos.obtener_catalogos(catalogos)
+                for nombre, lista in datos.items():
+                    respuesta[f'{nombre}_disponibles'] = lista
+
+            return Response(respuesta)
         except Exception as e:
             print(f"Error en retrieve de propiedad: {str(e)}")
             return Response(
@@ -881,23 +961,17 @@ class PropiedadModelViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['POST'])
     def generate_ai_description(self, request, pk=None):
+        """Encola la descripción con IA; el resultado se consulta en /crm/ai-jobs/<id>/."""
         try:
             propiedad = self.get_object()
-            ai_service = AIService()
             
             # Serializar la propiedad para enviar a OpenAI
             serializer = self.get_serializer(propiedad)
-            result = ai_service.generate_property_description(serializer.data)
-            
-            if result["success"]:
-                return Response({
-                    "description": result["description"]
-                })
-            else:
-                return Response(
-                    {"error": result["error"]},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+            trabajo = jobs.encolar('description', 'gpt-4o-mini', {
+                'propiedad_id': propiedad.id,
+                'propiedad': serializer.data,
+            })
+            return Response(jobs.serializar(trabajo), status=status.HTTP_202_ACCEPTED)
         except Exception as e:
             return Response(
                 {"error": str(e)},
@@ -907,6 +981,23 @@ class PropiedadModelViewSet(viewsets.ModelViewSet):
 class RequerimientoModelViewSet(viewsets.ModelViewSet):
     queryset = RequerimientoModel.objects.all()
     serializer_class = RequerimientoModelSerializer
+    ordering = ('-fecha_ingreso',)
+
+    @action(detail=True, methods=['get'])
+    def matches(self, request, pk=None):
+        """Propiedades que mejor coinciden con el requerimiento (top-K precalculado)."""
+        # Fuera del try: un id inexistente es 404, no 400
+        requerimiento = self.get_object()
+        try:
+            if request.query_params.get('recalcular'):
+                matching.recalcular_requerimiento(requerimiento.id)
+            
+            matches = (MatchModel.objects.filter(requerimiento=requerimiento)
+                       .select_related('propiedad', 'requerimiento__cliente'))
+            return Response(MatchModelSerializer(matches, many=True).data)
+        except Exception as e:
+            print(f"Error al obtener coincidencias del requerimiento: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 class TareaModelViewSet(viewsets.ModelViewSet):
     queryset = TareaModel.objects.all()
@@ -961,6 +1052,7 @@ class TareaModelViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 def transcribe_audio(request):
+    """Encola la transcripción del audio; responde 202 con el id del trabajo."""
     try:
         audio_file = request.FILES.get('audio')
         if not audio_file:
@@ -969,29 +1061,10 @@ def transcribe_audio(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Guardar el archivo temporalmente
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_audio:
-            for chunk in audio_file.chunks():
-                temp_audio.write(chunk)
-            temp_audio_path = temp_audio.name
-
-        try:
-            # Usar el servicio AI para transcribir
-            ai_service = AIService()
-            result = ai_service.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=open(temp_audio_path, "rb")
-            )
-
-            # Modificación aquí: accedemos al texto directamente
-            return Response({'text': result.text})  # Cambiamos result por result.text
-
-        finally:
-            # Limpiar el archivo temporal
-            try:
-                os.unlink(temp_audio_path)
-            except Exception as e:
-                print(f"Error al eliminar archivo temporal: {e}")
+        # El trabajo lee el archivo temporal y lo elimina al terminar
+        temp_audio_path = jobs.guardar_temporal(audio_file, '.webm')
+        trabajo = jobs.encolar('voice', 'whisper', {'archivo': temp_audio_path})
+        return Response(jobs.serializar(trabajo), status=status.HTTP_202_ACCEPTED)
 
     except Exception as e:
         print(f"Error en transcribe_audio: {str(e)}")
@@ -1002,30 +1075,30 @@ def transcribe_audio(request):
 
 @api_view(['POST'])
 def analyze_image(request):
+    """Encola el análisis de la imagen; responde 202 con el id del trabajo."""
     try:
         image_file = request.FILES.get('image')
         analysis_type = request.POST.get('analysis_type', 'ocr')  # 'ocr' o 'property'
+        detail = request.POST.get('detail', 'high')  # 'high' o 'low'
         
         if not image_file:
             return Response(
                 {'error': 'No se proporcionó archivo de imagen'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if detail not in ('high', 'low'):
+            return Response(
+                {'error': "detail debe ser 'high' o 'low'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_image:
-            for chunk in image_file.chunks():
-                temp_image.write(chunk)
-            temp_image_path = temp_image.name
-
-        try:
-            ai_service = AIService()
-            result = ai_service.analyze_image(temp_image_path, analysis_type)
-            return Response({'text': result})
-        finally:
-            try:
-                os.unlink(temp_image_path)
-            except Exception as e:
-                print(f"Error al eliminar archivo temporal: {e}")
+        temp_image_path = jobs.guardar_temporal(image_file, '.jpg')
+        trabajo = jobs.encolar('image', 'gpt-4o-mini', {
+            'archivo': temp_image_path,
+            'analysis_type': analysis_type,
+            'detail': detail,
+        })
+        return Response(jobs.serializar(trabajo), status=status.HTTP_202_ACCEPTED)
 
     except Exception as e:
         print(f"Error en analyze_image: {str(e)}")
@@ -1034,8 +1107,19 @@ def analyze_image(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-class PuntoDeInteresModelViewSet(viewsets.ModelViewSet):
+@api_view(['GET'])
+def ai_job(request, job_id):
+    """Estado y resultado de un trabajo de IA encolado."""
+    trabajo = AIQueryModel.objects.filter(id=job_id).first()
+    if trabajo is None:
+        return Response({'error': 'Trabajo no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    if trabajo.status in (jobs.PENDIENTE, jobs.EN_PROCESO) and jobs.vencer_trabajos([trabajo.id]):
+        trabajo.refresh_from_db()
+    return Response(jobs.serializar(trabajo))
+
+class PuntoDeInteresModelViewSet(LecturaOptimizadaMixin, viewsets.ModelViewSet):
     queryset = PuntoDeInteresModel.objects.all()
+    prefetch_lectura = ('multimedia',)
     serializer_class = PuntoDeInteresModelSerializer
     parser_classes = (MultiPartParser, FormParser)
 
@@ -1150,36 +1234,36 @@ class PuntoDeInteresModelViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 def generate_image(request):
+    """
+    Encola la generación de la imagen; responde 202 con el id del trabajo. El
+    resultado es la URL de la imagen guardada en MEDIA_ROOT. Los pedidos
+    repetidos reutilizan la imagen salvo que se envíe ``regenerar``.
+    """
     try:
-        dimensions = request.data.get('dimensions', 1024)
-        style = request.data.get('style', 'icon')
-        prompt = request.data.get('prompt', '')
-        colors = request.data.get('colors', None)
-        quality = request.data.get('quality', 'standard')
-
-        from .IA.img_generator import AIService
-        ai_service = AIService()
-        result = ai_service.generate_image(dimensions, style, prompt, colors, quality)
-
-        if result["success"]:
-            # Descargar la imagen y convertirla a base64
-            response = requests.get(result["image_url"])
-            if response.status_code == 200:
-                image_base64 = base64.b64encode(response.content).decode('utf-8')
-                return Response({
-                    "success": True,
-                    "image_url": result["image_url"],
-                    "image_base64": image_base64
-                })
-            else:
-                return Response({
-                    "error": "No se pudo descargar la imagen"
-                }, status=500)
-        else:
-            return Response({"error": result["error"]}, status=500)
+        trabajo = jobs.encolar('image_generation', 'dalle', {
+            'dimensions': request.data.get('dimensions', 1024),
+            'style': request.data.get('style', 'icon'),
+            'prompt': request.data.get('prompt', ''),
+            'colors': request.data.get('colors', None),
+            'quality': request.data.get('quality', 'standard'),
+            'regenerar': bool(request.data.get('regenerar', False)),
+        })
+        return Response(jobs.serializar(trabajo), status=status.HTTP_202_ACCEPTED)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
+class HorarioAgenteModelViewSet(viewsets.ModelViewSet):
+    queryset = HorarioAgenteModel.objects.all()
+    serializer_class = HorarioAgenteModelSerializer
+
+    def get_queryset(self):
+        """Filtra los horarios por agente (?agente=ID)."""
+        queryset = HorarioAgenteModel.objects.all()
+        agente_id = self.request.query_params.get('agente', None)
+        if agente_id is not None:
+            queryset = queryset.filter(agente_id=agente_id)
+        return queryset
+
 class AgendaModelViewSet(viewsets.ModelViewSet):
     queryset = AgendaModel.objects.all()
     serializer_class = AgendaModelSerializer
@@ -1230,49 +1314,64 @@ def requerimientoAgentView(request):
             data = json.loads(request.body)
             action = data.get('action', '')
             
-            # Mejorar el log para depuración
-            print(f"RequerimientoAgentView: Action={action}, Data={data}")
-            
-            # Verificar si se proporcionaron IDs de cliente y agente
-            if action == 'iniciar':
-                # Obtener IDs (usar valores por defecto si no se proporcionan)
-                cliente_id = data.get('cliente_id', 29)
-                if cliente_id is None:
-                    print("Error: El ID del cliente es nulo. Usando valor por defecto: 29")
-                    cliente_id = 29
+            session_id = _session_id(data, action)
+            if session_id is None:
+                return JsonResponse(SIN_SESION, status=400)
+            # Una petición a la vez por sesión: el agente se modifica al procesar
+            with sesiones_requerimiento.bloqueo(session_id):
+                agente = sesiones_requerimiento.obtener(session_id)
+            
+                # Mejorar el log para depuración
+                print(f"RequerimientoAgentView: Action={action}, Data={data}")
+            
+                # Verificar si se proporcionaron IDs de cliente y agente
+                if action == 'iniciar':
+                    # Obtener IDs (usar valores por defecto si no se proporcionan)
+                    cliente_id = data.get('cliente_id', 29)
+                    if cliente_id is None:
+                        print("Error: El ID del cliente es nulo. Usando valor por defecto: 29")
+                        cliente_id = 29
                 
-                agente_id = data.get('agente_id', 12)
-                if agente_id is None:
-                    print("Error: El ID del agente es nulo. Usando valor por defecto: 12")
-                    agente_id = 12
+                    agente_id = data.get('agente_id', 12)
+                    if agente_id is None:
+                        print("Error: El ID del agente es nulo. Usando valor por defecto: 12")
+                        agente_id = 12
                 
-                print(f"Iniciando conversación con Cliente ID: {cliente_id}, Agente ID: {agente_id}")
+                    print(f"Iniciando conversación con Cliente ID: {cliente_id}, Agente ID: {agente_id}")
                 
-                # Configurar los IDs en el agente
-                agente.set_ids(cliente_id=cliente_id, agente_id=agente_id)
+                    # Configurar los IDs en el agente
+                    agente.set_ids(cliente_id=cliente_id, agente_id=agente_id)
                 
-                # Reiniciar el agente para una nueva conversación
-                agente.reset()
-                response = agente.procesar_mensaje('')
-                return JsonResponse(response)
-            
-            elif action == 'mensaje':
-                mensaje = data.get('mensaje', '')
-                response = agente.procesar_mensaje(mensaje)
-                return JsonResponse(response)
-            
-            elif action == 'confirmar':
-                confirmacion = data.get('confirmacion', False)
-                response = agente.confirmar_resumen(confirmacion)
-                return JsonResponse(response)
-            
-            elif action == 'modificar':
-                aspectos = data.get('aspectos', 'todos')
-                response = agente.modificar_aspectos(aspectos)
-                return JsonResponse(response)
+                    # Reiniciar el agente para una nueva conversación
+                    agente.reset()
+                    response = agente.procesar_mensaje('')
+                    sesiones_requerimiento.guardar(session_id, agente)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                elif action == 'mensaje':
+                    mensaje = data.get('mensaje', '')
+                    response = agente.procesar_mensaje(mensaje)
+                    sesiones_requerimiento.guardar(session_id, agente)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                elif action == 'confirmar':
+                    confirmacion = data.get('confirmacion', False)
+                    response = agente.confirmar_resumen(confirmacion)
+                    sesiones_requerimiento.guardar(session_id, agente)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                elif action == 'modificar':
+                    aspectos = data.get('aspectos', 'todos')
+                    response = agente.modificar_aspectos(aspectos)
+                    sesiones_requerimiento.guardar(session_id, agente)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
             
-            else:
-                return JsonResponse({'error': 'Acción no reconocida'}, status=400)
+                else:
+                    return JsonResponse({'error': 'Acción no reconocida'}, status=400)
                 
         except Exception as e:
             print(f"Error al procesar la solicitud: {str(e)}")
@@ -1291,64 +1390,10 @@ def requerimientoAIView(request):
         data = request.data
         print("Datos recibidos:", data)
         
-        # Validar que los campos obligatorios estén presentes
-        if 'agente' not in data or 'cliente' not in data:
-            print("Error: Los campos 'agente' y 'cliente' son obligatorios y no están presentes.")
-            return Response(
-                {"error": "Los campos 'agente' y 'cliente' son obligatorios"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Asegurarse de que tipo_negocio sea un JSON válido
-        if 'tipo_negocio' in data and isinstance(data['tipo_negocio'], str):
-            try:
-                data['tipo_negocio'] = json.loads(data['tipo_negocio'])
-                print("tipo_negocio convertido a JSON válido:", data['tipo_negocio'])
-            except json.JSONDecodeError:
-                # Si no es un JSON válido, convertirlo a un formato válido
-                data['tipo_negocio'] = {"tipo": data['tipo_negocio']}
-                print("tipo_negocio no era un JSON válido, convertido a formato válido:", data['tipo_negocio'])
-        
-        # Convertir campos numéricos si vienen como strings
-        numeric_fields = ['habitantes', 'area_minima', 'habitaciones', 'banos', 'parqueaderos']
-        for field in numeric_fields:
-            if field in data and isinstance(data[field], str):
-                try:
-                    data[field] = int(data[field])
-                    print(f"Campo '{field}' convertido a entero:", data[field])
-                except ValueError:
-                    print(f"Error: El campo '{field}' debe ser un número entero.")
-                    return Response(
-                        {"error": f"El campo '{field}' debe ser un número entero"}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-        
-        # Convertir campos decimales si vienen como strings
-        decimal_fields = ['presupuesto_minimo', 'presupuesto_maximo', 
-                         'presupuesto_minimo_compra', 'presupuesto_maximo_compra']
-        for field in decimal_fields:
-            if field in data and isinstance(data[field], str):
-                try:
-                    data[field] = float(data[field])
-                    print(f"Campo '{field}' convertido a decimal:", data[field])
-                except ValueError:
-                    print(f"Error: El campo '{field}' debe ser un número decimal.")
-                    return Response(
-                        {"error": f"El campo '{field}' debe ser un número decimal. Por favor, asegúrate de que el valor proporcionado sea un número válido."}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-        
-        # Crear el serializer con los datos validados
-        serializer = RequerimientoModelSerializer(data=data)
-        print("Serializer creado con los datos validados.")
-        
-        if serializer.is_valid():
-            serializer.save()  # Guardar el nuevo requerimiento en la base de datos
-            print("Nuevo requerimiento guardado exitosamente.")
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
-        print("Errores de validación en el serializer:", serializer.errors)
-        return Response({"error": "Errores de validación en los datos proporcionados.", "detalles": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        exito, resultado = servicio_requerimientos.crear_requerimiento(data)
+        if exito:
+            return Response(resultado, status=status.HTTP_201_CREATED)
+        return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
     
     # Si es una solicitud GET, podríamos devolver un formulario o documentación
     print("Solicitud GET recibida. Instrucciones para el usuario.")
@@ -1362,45 +1407,60 @@ def propiedadAgentView(request):
             data = json.loads(request.body)
             action = data.get('action', '')
             
-            # Mejorar el log para depuración
-            print(f"PropiedadAgentView: Action={action}, Data={data}")
-            
-            # Verificar si se proporcionaron IDs
-            if action == 'iniciar':
-                # Obtener IDs (usar valores por defecto si no se proporcionan)
-                agente_id = data.get('agente_id', 12)
-                if agente_id is None:
-                    print("Error: El ID del agente es nulo. Usando valor por defecto: 12")
-                    agente_id = 12
+            session_id = _session_id(data, action)
+            if session_id is None:
+                return JsonResponse(SIN_SESION, status=400)
+            # Una petición a la vez por sesión: el agente se modifica al procesar
+            with sesiones_propiedad.bloqueo(session_id):
+                agente_propiedad = sesiones_propiedad.obtener(session_id)
+            
+                # Mejorar el log para depuración
+                print(f"PropiedadAgentView: Action={action}, Data={data}")
+            
+                # Verificar si se proporcionaron IDs
+                if action == 'iniciar':
+                    # Obtener IDs (usar valores por defecto si no se proporcionan)
+                    agente_id = data.get('agente_id', 12)
+                    if agente_id is None:
+                        print("Error: El ID del agente es nulo. Usando valor por defecto: 12")
+                        agente_id = 12
                 
-                propietario_id = data.get('propietario_id')
-                print(f"Iniciando conversación con Agente ID: {agente_id}, Propietario ID: {propietario_id}")
+                    propietario_id = data.get('propietario_id')
+                    print(f"Iniciando conversación con Agente ID: {agente_id}, Propietario ID: {propietario_id}")
                 
-                # Configurar los IDs en el agente
-                agente_propiedad.set_ids(agente_id=agente_id, propietario_id=propietario_id)
+                    # Configurar los IDs en el agente
+                    agente_propiedad.set_ids(agente_id=agente_id, propietario_id=propietario_id)
                 
-                # Reiniciar el agente para una nueva conversación
-                agente_propiedad.reset()
-                response = agente_propiedad.procesar_mensaje('')
-                return JsonResponse(response)
-            
-            elif action == 'mensaje':
-                mensaje = data.get('mensaje', '')
-                response = agente_propiedad.procesar_mensaje(mensaje)
-                return JsonResponse(response)
-            
-            elif action == 'confirmar':
-                confirmacion = data.get('confirmacion', False)
-                response = agente_propiedad.confirmar_resumen(confirmacion)
-                return JsonResponse(response)
-            
-            elif action == 'modificar':
-                aspectos = data.get('aspectos', 'todos')
-                response = agente_propiedad.modificar_aspectos(aspectos)
-                return JsonResponse(response)
+                    # Reiniciar el agente para una nueva conversación
+                    agente_propiedad.reset()
+                    response = agente_propiedad.procesar_mensaje('')
+                    sesiones_propiedad.guardar(session_id, agente_propiedad)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                elif action == 'mensaje':
+                    mensaje = data.get('mensaje', '')
+                    response = agente_propiedad.procesar_mensaje(mensaje)
+                    sesiones_propiedad.guardar(session_id, agente_propiedad)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                elif action == 'confirmar':
+                    confirmacion = data.get('confirmacion', False)
+                    response = agente_propiedad.confirmar_resumen(confirmacion)
+                    sesiones_propiedad.guardar(session_id, agente_propiedad)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                elif action == 'modificar':
+                    aspectos = data.get('aspectos', 'todos')
+                    response = agente_propiedad.modificar_aspectos(aspectos)
+                    sesiones_propiedad.guardar(session_id, agente_propiedad)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
             
-            else:
-                return JsonResponse({'error': 'Acción no reconocida'}, status=400)
+                else:
+                    return JsonResponse({'error': 'Acción no reconocida'}, status=400)
                 
         except Exception as e:
             print(f"Error al procesar la solicitud: {str(e)}")
@@ -1419,97 +1479,35 @@ def propiedadAIView(request):
         data = request.data
         print("Datos recibidos:", data)
         
-        # Validar que el campo agente esté presente
-        if 'agente' not in data:
-            print("Error: El campo 'agente' es obligatorio y no está presente.")
-            return Response(
-                {"error": "El campo 'agente' es obligatorio"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Asegurarse de que modalidad_de_negocio sea un JSON válido
-        if 'modalidad_de_negocio' in data and isinstance(data['modalidad_de_negocio'], str):
-            try:
-                data['modalidad_de_negocio'] = json.loads(data['modalidad_de_negocio'])
-                print("modalidad_de_negocio convertido a JSON válido:", data['modalidad_de_negocio'])
-            except json.JSONDecodeError:
-                # Si no es un JSON válido, convertirlo a un formato válido
-                data['modalidad_de_negocio'] = {"operacion": data['modalidad_de_negocio']}
-                print("modalidad_de_negocio no era un JSON válido, convertido a formato válido:", data['modalidad_de_negocio'])
-        
-        # Asegurarse de que direccion sea un JSON válido
-        if 'direccion' in data and isinstance(data['direccion'], str):
-            try:
-                data['direccion'] = json.loads(data['direccion'])
-                print("direccion convertido a JSON válido:", data['direccion'])
-            except json.JSONDecodeError:
-                # Si no es un JSON válido, convertirlo a un formato válido
-                data['direccion'] = {"direccion": data['direccion']}
-                print("direccion no era un JSON válido, convertido a formato válido:", data['direccion'])
-        
-        # Asegurarse de que garajes y depositos sean JSON válidos
-        for field in ['garajes', 'depositos']:
-            if field in data and isinstance(data[field], str):
-                try:
-                    data[field] = json.loads(data[field])
-                    print(f"{field} convertido a JSON válido:", data[field])
-                except json.JSONDecodeError:
-                    # Si no es un JSON válido, intentar extraer un número
-                    import re
-                    match = re.search(r'\d+', data[field])
-                    if match:
-                        cantidad = match.group(0)
-                        data[field] = {"cantidad": cantidad}
-                        print(f"{field} no era un JSON válido, convertido a formato válido:", data[field])
-                    else:
-                        data[field] = {"cantidad": "1"}
-        
-        # Convertir campos numéricos si vienen como strings
-        numeric_fields = ['nivel', 'metro_cuadrado_construido', 'metro_cuadrado_propiedad',
-                         'habitaciones', 'habitacion_de_servicio', 'banos']
-        for field in numeric_fields:
-            if field in data and isinstance(data[field], str):
-                try:
-                    # Intentar extraer un número si el campo contiene texto
-                    import re
-                    match = re.search(r'\d+', data[field])
-                    if match:
-                        data[field] = int(match.group(0))
-                    else:
-                        data[field] = int(data[field])
-                    print(f"Campo '{field}' convertido a entero:", data[field])
-                except ValueError:
-                    print(f"Error: El campo '{field}' debe ser un número entero.")
-                    # Establecer valor por defecto en lugar de retornar error
-                    if field in ['habitaciones', 'banos', 'nivel']:
-                        data[field] = 0
-                    else:
-                        data[field] = None
-        
-        # Normalizar campos de selección
-        for field in ['terraza', 'balcon', 'mascotas']:
-            if field in data and isinstance(data[field], str):
-                if data[field].lower() in ['sí', 'si', 'yes', 'y', 'true', '1']:
-                    data[field] = 'si'
-                else:
-                    data[field] = 'no'
-        
-        # Crear el serializer con los datos validados
-        serializer = PropiedadModelSerializer(data=data)
-        print("Serializer creado con los datos validados.")
-        
-        if serializer.is_valid():
-            serializer.save()  # Guardar la nueva propiedad en la base de datos
-            print("Nueva propiedad guardada exitosamente.")
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        
-        print("Errores de validación en el serializer:", serializer.errors)
-        return Response({"error": "Errores de validación en los datos proporcionados.", "detalles": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        exito, resultado = servicio_propiedades.crear_propiedad(data)
+        if exito:
+            return Response(resultado, status=status.HTTP_201_CREATED)
+        return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
     
     # Si es una solicitud GET, podríamos devolver un formulario o documentación
     print("Solicitud GET recibida. Instrucciones para el usuario.")
     return Response({"message": "Usa POST para crear una nueva propiedad"})
 
+@condition(
+    etag_func=lambda request, *args, **kwargs: str(servicio_catalogos.version()),
+    last_modified_func=lambda request, *args, **kwargs: servicio_catalogos.ultima_modificacion(),
+)
+@api_view(['GET'])
+def catalogosView(request):
+    """
+    Catálogos de referencia compactos ({id, nombre}) para selects del frontend.
+    ?tipos=edificios,amenidades limita los catálogos devueltos.
+    """
+    try:
+        tipos = [tipo.strip() for tipo in request.query_params.get('tipos', '').split(',') if tipo.strip()]
+        exito, datos = servicio_catalogos.obtener_catalogos(tipos)
+        if not exito:
+            return Response(datos, status=status.HTTP_400_BAD_REQUEST)
+        return Response(datos)
+    except Exception as e:
+        print(f"Error al obtener catálogos: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @csrf_exempt
 def agendaAbiertaView(request, agenda_id=None):
     """Vista para que los agentes puedan abrir una nueva agenda, listar, editar o eliminar agendas existentes."""
@@ -1517,16 +1515,23 @@ def agendaAbiertaView(request, agenda_id=None):
         try:
             if agenda_id:
                 # Si se proporciona un ID, obtener esa agenda específica
-                agenda = AgendaAbiertaModel.objects.get(id=agenda_id)
-                serializer = AgendaAbiertaModelSerializer(agenda)
-                return JsonResponse(serializer.data)
+                exito, resultado = servicio_agenda.obtener_agenda(agenda_id)
+                return JsonResponse(resultado, status=200 if exito else 404)
+            elif any(filtro in request.GET for filtro in ('agente', 'fecha', 'propiedad', 'limite')):
+                # Próximas agendas libres de un agente, un día o una propiedad
+                filtros = ProximasAgendasSerializer(data=request.GET)
+                if not filtros.is_valid():
+                    return JsonResponse(filtros.errors, status=400)
+                exito, resultado = servicio_agenda.proximas_agendas(
+                    agente_id=filtros.validated_data.get('agente'),
+                    fecha=filtros.validated_data.get('fecha'),
+                    propiedad_id=filtros.validated_data.get('propiedad'),
+                    limite=filtros.validated_data['limite'],
+                )
+                return JsonResponse(resultado, status=200 if exito else 404, safe=False)
             else:
                 # Si no hay ID, obtener solo las agendas disponibles
-                agendas = AgendaAbiertaModel.objects.filter(disponible=True)
-                serializer = AgendaAbiertaModelSerializer(agendas, many=True)
-                return JsonResponse(serializer.data, safe=False)
-        except AgendaAbiertaModel.DoesNotExist:
-            return JsonResponse({'error': 'Agenda no encontrada'}, status=404)
+                return JsonResponse(servicio_agenda.listar_agendas_abiertas(), safe=False)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -1536,27 +1541,19 @@ def agendaAbiertaView(request, agenda_id=None):
                 return JsonResponse({'error': 'Se requiere ID de agenda'}, status=400)
             
             data = json.loads(request.body)
-            agenda = AgendaAbiertaModel.objects.get(id=agenda_id)
-            serializer = AgendaAbiertaModelSerializer(agenda, data=data)
+            if not AgendaAbiertaModel.objects.filter(id=agenda_id).exists():
+                return JsonResponse({'error': 'Agenda no encontrada'}, status=404)
             
-            if serializer.is_valid():
-                serializer.save()
-                return JsonResponse(serializer.data, status=200)
-            return JsonResponse(serializer.errors, status=400)
-        except AgendaAbiertaModel.DoesNotExist:
-            return JsonResponse({'error': 'Agenda no encontrada'}, status=404)
+            exito, resultado = servicio_agenda.actualizar_agenda_abierta(agenda_id, data)
+            return JsonResponse(resultado, status=200 if exito else 400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
     elif request.method == 'POST':
         try:
             data = json.loads(request.body)
-            serializer = AgendaAbiertaModelSerializer(data=data)
-            
-            if serializer.is_valid():
-                serializer.save()  # Guardar la nueva agenda en la base de datos
-                return JsonResponse(serializer.data, status=201)  # Retornar el objeto creado
-            return JsonResponse(serializer.errors, status=400)  # Retornar errores de validación
+            exito, resultado = servicio_agenda.crear_agenda_abierta(data)
+            return JsonResponse(resultado, status=201 if exito else 400)  # Objeto creado o errores de validación
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)  # Manejo de errores
 
@@ -1575,6 +1572,50 @@ def agendaAbiertaView(request, agenda_id=None):
 
     return JsonResponse({'error': 'Método no permitido'}, status=405)  # Manejo de métodos no permitidos
 
+@csrf_exempt
+def generarAgendasView(request):
+    """Abre en bloque las agendas de un agente a partir de sus horarios semanales."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    try:
+        data = json.loads(request.body)
+        agente_id = data.get('agente_id')
+        if not agente_id or not data.get('desde') or not data.get('hasta'):
+            return JsonResponse({'error': 'Se requieren agente_id, desde y hasta'}, status=400)
+        try:
+            desde = date.fromisoformat(data['desde'])
+            hasta = date.fromisoformat(data['hasta'])
+        except ValueError:
+            return JsonResponse({'error': 'Las fechas deben tener el formato YYYY-MM-DD'}, status=400)
+
+        exito, resultado = servicio_agenda.generar_desde_horarios(agente_id, desde, hasta)
+        return JsonResponse(resultado, status=201 if exito else 400)
+    except Exception as e:
+        print(f"Error al generar agendas: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+@csrf_exempt
+def agendasMasivasView(request):
+    """
+    Abre en bloque agendas recurrentes. Acepta una regla o ``{"reglas": [...]}``:
+    agente, desde, hasta, dias_semana, horas [{inicio, fin}], duracion_minutos
+    y excluir (fechas sin atención).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    try:
+        data = json.loads(request.body)
+        reglas = data.get('reglas', [data]) if isinstance(data, dict) else data
+        serializer = ReglaRecurrenciaSerializer(data=reglas, many=True)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400, safe=False)
+
+        exito, resultado = servicio_agenda.crear_agendas_recurrentes(serializer.validated_data)
+        return JsonResponse(resultado, status=201 if exito else 400)
+    except Exception as e:
+        print(f"Error al crear agendas masivas: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
 @csrf_exempt
 def agendaAgentView(request):
     """Vista para manejar la conversación con el agente de agendas."""
@@ -1595,20 +1636,37 @@ def agendaAgentView(request):
             
             print(f"Recibida petición con action={action}, cliente_id={cliente_id}")
             
-            # Crear el agente con el cliente_id
-            agente = AgenteAgenda(cliente_id=cliente_id)
-            
-            if action == 'iniciar':
-                response = agente.procesar_mensaje('Hola')  # Mensaje inicial
-                return JsonResponse(response)
-            
-            elif action == 'mensaje':
-                mensaje = data.get('mensaje', '')
-                response = agente.procesar_mensaje(mensaje)
-                return JsonResponse(response)
-            
+            # Recuperar la conversación por session_id o, si no se envía, por cliente
+            # (el ejecutor de LangChain es compartido)
+            if data.get('session_id') or cliente_id is None:
+                session_id = _session_id(data, action)
             else:
-                return JsonResponse({'error': 'Acción no reconocida'}, status=400)
+                session_id = str(cliente_id)
+            if session_id is None:
+                return JsonResponse(SIN_SESION, status=400)
+            # Una petición a la vez por sesión: el agente se modifica al procesar
+            with sesiones_agenda.bloqueo(session_id):
+                agente = sesiones_agenda.obtener(session_id)
+                # Sin cliente_id se conserva el de la sesión guardada
+                if cliente_id is not None:
+                    agente.cliente_id = cliente_id
+            
+                if action == 'iniciar':
+                    agente.reset()
+                    response = agente.procesar_mensaje('Hola')  # Mensaje inicial
+                    sesiones_agenda.guardar(session_id, agente)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                elif action == 'mensaje':
+                    mensaje = data.get('mensaje', '')
+                    response = agente.procesar_mensaje(mensaje)
+                    sesiones_agenda.guardar(session_id, agente)
+                    response['session_id'] = session_id
+                    return JsonResponse(response)
+            
+                else:
+                    return JsonResponse({'error': 'Acción no reconocida'}, status=400)
                 
         except Exception as e:
             print(f"Error en agendaAgentView: {str(e)}")
@@ -0,0 +1,120 @@
+"""
+Utilidades compartidas por las APIs de DRF del proyecto.
+
+- ``PaginacionCursor``: paginación por keyset (cursor) para todos los listados.
+- ``OrdenamientoFilter``: ``?ordering=`` limitado a columnas indexadas.
+- ``CamposDinamicosMixin``: ``?fields=`` y ``?expand=`` en los serializadores.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _parametro_lista(valor):
+    return [parte.strip() for parte in (valor or '').split(',') if parte.strip()]
+
+
+class PaginacionCursor(CursorPagination):
+    """
+    ``CursorPagination`` de DRF. El cursor guarda el valor del primer campo de
+    orden en el último elemento de la página (``fecha_ingreso`` en propiedades,
+    requerimientos, agentes y clientes; ``id`` en el resto) más un
+    desplazamiento para saltar los elementos que comparten ese valor. Cada
+    página es ``WHERE fecha_ingreso < valor ORDER BY fecha_ingreso DESC, id DESC
+    LIMIT n`` sobre el índice ``(fecha_ingreso, id)``, así que el costo no crece
+    con la posición en la tabla (a diferencia de OFFSET); solo las filas con la
+    misma fecha se recorren con el desplazamiento.
+    Respuesta: ``{"next": url, "previous": url, "results": [...]}``.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Desempate por id para que el orden sea total y estable entre páginas
+        # (el cursor solo usa el primer campo; el id no entra en el WHERE)
+        if not any(campo.lstrip('-') in ('id', 'pk') for campo in ordering):
+            direccion = '-' if ordering[0].startswith('-') else ''
+            ordering = ordering + (f'{direccion}id',)
+        return ordering
+
+
+class OrdenamientoFilter(OrderingFilter):
+    """
+    ``?ordering=`` limitado a ``ordering_fields`` de la vista; si la vista no los
+    declara, solo se aceptan los campos de su ``ordering`` por defecto y ``id``.
+    """
+
+    def get_valid_fields(self, queryset, view, context=None):
+        if getattr(view, 'ordering_fields', None) is not None:
+            return super().get_valid_fields(queryset, view, context)
+        campos = [campo.lstrip('-') for campo in (self.get_default_ordering(view) or ())]
+        return [(campo, campo) for campo in dict.fromkeys(campos + ['id'])]
+
+
+class CamposDinamicosMixin:
+    """
+    Selección de campos en lecturas (GET):
+
+    - ``?fields=id,titulo`` devuelve solo esos campos.
+    - ``?expand=edificio,propietario`` indica qué serializadores anidados se
+      ejecutan; el resto se devuelve como id (o lista de ids).
+      Sin ``expand``, los listados devuelven ids y el detalle expande todo.
+
+    Solo se aplica al serializador raíz de la respuesta, no a los anidados.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self._es_raiz():
+            return fields
+
+        expand = request.query_params.get('expand')
+        if expand is not None:
+            expandir = set(_parametro_lista(expand))
+        elif isinstance(self.parent, serializers.ListSerializer):
+            expandir = set()
+        else:
+            expandir = None  # detalle: se expande todo
+
+        if expandir is not None:
+            for nombre, campo in list(fields.items()):
+                if nombre not in expandir:
+                    colapsado = self._colapsar(nombre, campo)
+                    if colapsado is not None:
+                        fields[nombre] = colapsado
+
+        pedidos = _parametro_lista(request.query_params.get('fields'))
+        if pedidos:
+            fields = {nombre: campo for nombre, campo in fields.items() if nombre in pedidos}
+        return fields
+
+    def _es_raiz(self):
+        return self.parent is None or (
+            self.parent is self.root and isinstance(self.parent, serializers.ListSerializer)
+        )
+
+    def _colapsar(self, nombre, campo):
+        """Reemplaza un serializador anidado por el id de la relación."""
+        es_lista = isinstance(campo, serializers.ListSerializer)
+        anidado = campo.child if es_lista else campo
+        if not isinstance(anidado, serializers.BaseSerializer):
+            return None
+
+        fuente = campo.source or nombre
+        try:
+            relacion = self.Meta.model._meta.get_field(fuente)
+        except FieldDoesNotExist:
+            return None
+        if not relacion.is_relation:
+            return None
+
+        opciones = {'read_only': True, 'many': relacion.many_to_many or relacion.one_to_many}
+        if fuente != nombre:
+            opciones['source'] = fuente
+        return serializers.PrimaryKeyRelatedField(**opciones)
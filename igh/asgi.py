@@ -20,12 +20,13 @@ from channels.auth import AuthMiddlewareStack
 
 # Ahora puedes importar las rutas websocket de manera segura
 from chat.routing import websocket_urlpatterns
+from crm.routing import websocket_urlpatterns as crm_websocket_urlpatterns
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
         URLRouter(
-            websocket_urlpatterns
+            websocket_urlpatterns + crm_websocket_urlpatterns
         )
     ),
 })
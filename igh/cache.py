@@ -0,0 +1,44 @@
+"""
+Configuración de la caché de Django por variables de entorno.
+
+La caché debe ser compartida por todos los procesos: los catálogos
+(crm/services/catalogos.py), el contexto de los chats
+(chat/IA_services/context_cache.py) y las agendas (crm/services/agenda.py)
+guardan en ella una versión que cambia al modificar los datos. Con una caché
+en memoria del proceso (``LocMemCache``) el cambio solo lo ve el worker que
+guardó y el resto sigue sirviendo datos viejos indefinidamente.
+
+Por defecto se usa una tabla de la base de datos (``DatabaseCache``); la
+migración ``crm.0039_tabla_cache`` la crea, y también se puede crear con
+``python manage.py createcachetable``. Con ``CACHE_BACKEND=redis`` se usa Redis.
+``CACHE_BACKEND=memoria`` solo es válido con un único proceso (desarrollo).
+
+Configuración por variables de entorno:
+    CACHE_BACKEND    db (por defecto), redis o memoria
+    CACHE_TABLA      tabla de la caché en la base de datos (por defecto igh_cache)
+    CACHE_REDIS_URL  URL de Redis para la caché (por defecto redis://127.0.0.1:6379/1)
+"""
+import os
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "db").lower()
+CACHE_TABLA = os.getenv("CACHE_TABLA", "igh_cache")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/1")
+
+
+def cache_compartida():
+    """Diccionario ``CACHES`` según las variables de entorno."""
+    if CACHE_BACKEND == "db":
+        config = {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": CACHE_TABLA,
+        }
+    elif CACHE_BACKEND == "redis":
+        config = {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    elif CACHE_BACKEND == "memoria":
+        config = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    else:
+        raise ValueError(f"CACHE_BACKEND no soportado: {CACHE_BACKEND}")
+    return {"default": config}
@@ -0,0 +1,70 @@
+"""
+Configuración de la capa de canales (Channels) por variables de entorno.
+
+``InMemoryChannelLayer`` solo entrega mensajes dentro del proceso: un
+``group_send`` del chat no llega a los clientes conectados a otro proceso de
+daphne. Con ``CHANNEL_BACKEND=redis`` se usa ``channels_redis`` y se pueden
+levantar varios procesos de websockets detrás del balanceador.
+
+Con varias instancias de Redis en ``CHANNEL_REDIS_URLS`` los grupos y canales se
+reparten entre ellas. ``channels_redis`` divide el espacio de hashes en tramos
+iguales, así que al añadir una instancia casi todos los grupos cambian de
+servidor; con ``CHANNEL_SHARDING=anillo`` se usa un anillo de hash consistente
+con nodos virtuales y solo se mueve la parte que le toca a la instancia nueva.
+El reparto depende del orden y de las URLs, así que todos los procesos deben
+tener la misma lista.
+
+Para desarrollo y pruebas sin Redis (requieren ``pip install "fakeredis[lua]"``,
+que no está en requirements.txt):
+    CHANNEL_BACKEND=fakeredis  la capa de Redis completa (scripts Lua, serialización,
+                               grupos) contra un fakeredis en memoria del proceso
+    manage.py redis_local      servidor compatible con Redis (fakeredis por TCP) para
+                               probar varios procesos de daphne con CHANNEL_BACKEND=redis
+
+Configuración por variables de entorno:
+    CHANNEL_BACKEND        memoria (por defecto), redis o fakeredis
+    CHANNEL_REDIS_URLS     URLs de Redis separadas por comas (por defecto redis://127.0.0.1:6379/0)
+    CHANNEL_SHARDING       tramos (reparto de channels_redis, por defecto) o anillo (hash consistente)
+    CHANNEL_NODOS_VIRTUALES  nodos virtuales por instancia en el anillo (por defecto 160)
+    CHANNEL_PREFIX         prefijo de las claves en Redis (por defecto igh)
+    CHANNEL_CAPACITY       mensajes pendientes por canal antes de descartar (por defecto 100)
+    CHANNEL_EXPIRY         segundos que un mensaje espera a ser leído (por defecto 60)
+    CHANNEL_GROUP_EXPIRY   segundos que un canal permanece en un grupo sin renovarse (por defecto 86400)
+"""
+import os
+
+CHANNEL_BACKEND = os.getenv("CHANNEL_BACKEND", "memoria").lower()
+CHANNEL_REDIS_URLS = [
+    url.strip()
+    for url in os.getenv("CHANNEL_REDIS_URLS", "redis://127.0.0.1:6379/0").split(",")
+    if url.strip()
+]
+CHANNEL_SHARDING = os.getenv("CHANNEL_SHARDING", "tramos").lower()
+CHANNEL_NODOS_VIRTUALES = int(os.getenv("CHANNEL_NODOS_VIRTUALES", 160))
+CHANNEL_PREFIX = os.getenv("CHANNEL_PREFIX", "igh")
+CHANNEL_CAPACITY = int(os.getenv("CHANNEL_CAPACITY", 100))
+CHANNEL_EXPIRY = int(os.getenv("CHANNEL_EXPIRY", 60))
+CHANNEL_GROUP_EXPIRY = int(os.getenv("CHANNEL_GROUP_EXPIRY", 86400))
+
+
+def capas_de_canales():
+    """Diccionario ``CHANNEL_LAYERS`` según las variables de entorno."""
+    if CHANNEL_BACKEND == "memoria":
+        return {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+    config = {
+        "prefix": CHANNEL_PREFIX,
+        "capacity": CHANNEL_CAPACITY,
+        "expiry": CHANNEL_EXPIRY,
+        "group_expiry": CHANNEL_GROUP_EXPIRY,
+    }
+    if CHANNEL_BACKEND == "fakeredis":
+        return {"default": {"BACKEND": "igh.capas.CapaFakeRedis", "CONFIG": config}}
+    if CHANNEL_BACKEND != "redis":
+        raise ValueError(f"CHANNEL_BACKEND no soportado: {CHANNEL_BACKEND}")
+
+    config["hosts"] = CHANNEL_REDIS_URLS
+    if CHANNEL_SHARDING == "anillo":
+        config["nodos_virtuales"] = CHANNEL_NODOS_VIRTUALES
+        return {"default": {"BACKEND": "igh.capas.CapaRedisAnillo", "CONFIG": config}}
+    return {"default": {"BACKEND": "channels_redis.core.RedisChannelLayer", "CONFIG": config}}
@@ -0,0 +1,78 @@
+"""
+Capas de canales sobre Redis (ver igh/canales.py, que las selecciona).
+
+Este módulo importa ``channels_redis`` y solo se carga cuando
+``CHANNEL_BACKEND`` lo pide, así que con la capa en memoria no hace falta
+tenerlo instalado.
+
+requirements.txt fija ``redis`` 5.x: desde la versión 8, redis-py usa por
+defecto un ``socket_timeout`` de 5 s, el mismo tiempo que dura el ``BZPOPMIN``
+con el que ``channels_redis`` espera mensajes, y la lectura falla con
+``TimeoutError`` en lugar de devolver vacío.
+"""
+import bisect
+import hashlib
+
+from channels_redis.core import RedisChannelLayer
+
+
+def _hash(valor):
+    if isinstance(valor, str):
+        valor = valor.encode("utf8")
+    return int.from_bytes(hashlib.blake2b(valor, digest_size=8).digest(), "big")
+
+
+class Anillo:
+    """
+    Anillo de hash consistente: cada instancia ocupa ``nodos_virtuales`` puntos
+    del anillo y una clave pertenece al primer punto que la sigue.
+    """
+
+    def __init__(self, nombres, nodos_virtuales=160):
+        puntos = sorted(
+            (_hash(f"{nombre}#{virtual}"), indice)
+            for indice, nombre in enumerate(nombres)
+            for virtual in range(nodos_virtuales)
+        )
+        self.hashes = [punto for punto, _ in puntos]
+        self.indices = [indice for _, indice in puntos]
+
+    def __len__(self):
+        return len(set(self.indices))
+
+    def indice(self, clave):
+        posicion = bisect.bisect(self.hashes, _hash(clave)) % len(self.hashes)
+        return self.indices[posicion]
+
+
+class CapaRedisAnillo(RedisChannelLayer):
+    """``RedisChannelLayer`` que reparte grupos y canales con un anillo de hash consistente."""
+
+    def __init__(self, *args, nodos_virtuales=160, **kwargs):
+        super().__init__(*args, **kwargs)
+        nombres = [host.get("address") or str(sorted(host.items())) for host in self.hosts]
+        self.anillo = Anillo(nombres, nodos_virtuales)
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        return self.anillo.indice(value)
+
+
+class CapaFakeRedis(RedisChannelLayer):
+    """``RedisChannelLayer`` contra un fakeredis compartido por todo el proceso."""
+
+    _servidor = None
+
+    def __init__(self, *args, **kwargs):
+        kwargs["hosts"] = [{"address": "redis://fakeredis"}]
+        super().__init__(*args, **kwargs)
+
+    def create_pool(self, index):
+        import fakeredis
+        from fakeredis.aioredis import FakeConnection
+        from redis import asyncio as aioredis
+
+        if CapaFakeRedis._servidor is None:
+            CapaFakeRedis._servidor = fakeredis.FakeServer()
+        return aioredis.ConnectionPool(connection_class=FakeConnection, server=CapaFakeRedis._servidor)
@@ -0,0 +1,122 @@
+"""
+Configuración de la base de datos por variables de entorno.
+
+Con ``DB_ENGINE=postgresql`` se usa PostgreSQL con conexiones persistentes
+(``CONN_MAX_AGE``) o, con ``DB_POOL=1``, con el pool de conexiones de psycopg
+(``psycopg[pool]``); Django no admite las dos cosas a la vez, así que con pool
+``CONN_MAX_AGE`` queda en 0 y el pool reutiliza las conexiones.
+
+Sin configurar nada se usa SQLite. En cada conexión nueva (señal
+``connection_created``) se activan el modo WAL, que deja leer mientras otro
+escribe, ``synchronous=NORMAL`` (seguro con WAL y sin un fsync por
+transacción), ``busy_timeout`` para esperar el bloqueo en vez de fallar y
+``mmap_size`` para leer sin copias. Las transacciones empiezan con
+``BEGIN IMMEDIATE``: toman el bloqueo de escritura al inicio y esperan su turno,
+en vez de fallar con "database is locked" al pasar de lectura a escritura.
+
+``manage.py benchmark_db`` mide el rendimiento de escritura con peticiones
+concurrentes y, con ``--comparar``, lo compara entre configuraciones.
+
+Configuración por variables de entorno:
+    DB_ENGINE            sqlite (por defecto) o postgresql
+    DB_NAME              nombre de la base de PostgreSQL
+    DB_USER              usuario de PostgreSQL
+    DB_PASSWORD          contraseña de PostgreSQL
+    DB_HOST              servidor de PostgreSQL (por defecto localhost)
+    DB_PORT              puerto de PostgreSQL (por defecto 5432)
+    DB_CONN_MAX_AGE      segundos que se conserva abierta una conexión (por defecto 60; 0 cierra al final de cada petición)
+    DB_POOL              1 usa el pool de psycopg en lugar de conexiones persistentes (por defecto 0)
+    DB_POOL_MIN          conexiones mínimas del pool (por defecto 2)
+    DB_POOL_MAX          conexiones máximas del pool (por defecto 10)
+    DB_POOL_TIMEOUT      segundos de espera por una conexión libre del pool (por defecto 10)
+    DB_PGBOUNCER         1 si se conecta a través de PgBouncer en modo transacción (desactiva los cursores del servidor)
+    SQLITE_PATH          archivo SQLite (por defecto db.sqlite3 en la raíz del proyecto)
+    SQLITE_AJUSTES       1 aplica WAL y el resto de ajustes (por defecto), 0 deja los valores de SQLite
+    SQLITE_BUSY_TIMEOUT  milisegundos de espera por el bloqueo de escritura (por defecto 5000)
+    SQLITE_MMAP_MB       megabytes del archivo que se leen con mmap (por defecto 256)
+"""
+import os
+
+from django.db.backends.signals import connection_created
+
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite").lower()
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", 60))
+DB_POOL = os.getenv("DB_POOL", "0") == "1"
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+SQLITE_AJUSTES = os.getenv("SQLITE_AJUSTES", "1") == "1"
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", 256))
+
+
+def base_de_datos(base_dir):
+    """Diccionario ``DATABASES['default']`` según las variables de entorno."""
+    if DB_ENGINE in ("postgresql", "postgres"):
+        return _postgresql()
+    return _sqlite(base_dir)
+
+
+def _postgresql():
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("DB_NAME", "igh"),
+        "USER": os.getenv("DB_USER", ""),
+        "PASSWORD": os.getenv("DB_PASSWORD", ""),
+        "HOST": os.getenv("DB_HOST", "localhost"),
+        "PORT": os.getenv("DB_PORT", "5432"),
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": DB_CONN_MAX_AGE > 0,
+        "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
+        "OPTIONS": {},
+    }
+    if DB_POOL:
+        config["CONN_MAX_AGE"] = 0
+        config["CONN_HEALTH_CHECKS"] = False
+        config["OPTIONS"]["pool"] = {
+            "min_size": DB_POOL_MIN,
+            "max_size": DB_POOL_MAX,
+            "timeout": DB_POOL_TIMEOUT,
+        }
+    return config
+
+
+def _sqlite(base_dir):
+    config = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("SQLITE_PATH") or base_dir / "db.sqlite3",
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+    }
+    if SQLITE_AJUSTES:
+        config["OPTIONS"] = {
+            "timeout": SQLITE_BUSY_TIMEOUT / 1000,
+            "transaction_mode": "IMMEDIATE",
+        }
+    return config
+
+
+def descripcion(config):
+    """Resumen legible de una configuración (para los comandos de diagnóstico)."""
+    if config["ENGINE"].endswith("sqlite3"):
+        ajustes = "WAL, synchronous=NORMAL" if SQLITE_AJUSTES else "sin ajustes"
+        return f"SQLite ({ajustes}, CONN_MAX_AGE={config.get('CONN_MAX_AGE', 0)})"
+    if "pool" in config.get("OPTIONS", {}):
+        pool = config["OPTIONS"]["pool"]
+        return f"PostgreSQL (pool psycopg {pool['min_size']}-{pool['max_size']})"
+    return f"PostgreSQL (CONN_MAX_AGE={config.get('CONN_MAX_AGE', 0)})"
+
+
+def ajustar_sqlite(sender, connection, **kwargs):
+    """Aplica los PRAGMA de rendimiento a cada conexión SQLite nueva."""
+    if connection.vendor != "sqlite" or not SQLITE_AJUSTES:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+
+
+# Se registra al importar la configuración, antes de abrir cualquier conexión
+connection_created.connect(ajustar_sqlite, dispatch_uid="igh_ajustar_sqlite")
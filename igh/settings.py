@@ -14,6 +14,10 @@ from pathlib import Path
 from datetime import timedelta
 import os
 
+from igh.cache import cache_compartida
+from igh.canales import capas_de_canales
+from igh.db import base_de_datos
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -85,23 +89,21 @@ WSGI_APPLICATION = 'igh.wsgi.application'
 ASGI_APPLICATION = 'igh.asgi.application'
 
 # Configuración de Channel Layers
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# En memoria (un solo proceso) o Redis para varios procesos de daphne; ver igh/canales.py
+CHANNEL_LAYERS = capas_de_canales()
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# PostgreSQL (con pool o conexiones persistentes) o SQLite en modo WAL; ver igh/db.py
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': base_de_datos(BASE_DIR),
 }
 
+# Caché compartida entre procesos (base de datos o Redis); ver igh/cache.py
+CACHES = cache_compartida()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -170,6 +172,10 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ),
+    # Todos los listados se paginan por cursor (?cursor=, ?page_size=)
+    'DEFAULT_PAGINATION_CLASS': 'igh.api.PaginacionCursor',
+    'PAGE_SIZE': 50,
+    'DEFAULT_FILTER_BACKENDS': ('igh.api.OrdenamientoFilter',),
 }
 
 SIMPLE_JWT = {